@@ -22,9 +22,19 @@ set params [dict create]
 open_bd_design [get_files zynq_ps.bd]
 set s_axi_dma [get_bd_intf_ports s_axi_dma]
 dict set params AXI_DATA_WIDTH [get_property CONFIG.DATA_WIDTH $s_axi_dma]
-dict set params AXI_DMA_MAX_BURST_LEN = 10
+dict set params AXI_DMA_MAX_BURST_LEN [get_property CONFIG.MAX_BURST_LENGTH $s_axi_dma]
 dict set params AXI_ID_WIDTH [get_property CONFIG.ID_WIDTH $s_axi_dma]
-dict set params AXI_ADDR_WIDTH = 32
+dict set params AXI_ADDR_WIDTH [get_property CONFIG.ADDR_WIDTH $s_axi_dma]
+
+# separate DMA channel per port, "make DMA_PER_PORT=1" (after a "make clean")
+if {[info exists ::env(DMA_PER_PORT)]} {
+    dict set params DMA_PER_PORT $::env(DMA_PER_PORT)
+}
+
+# receive buffer shared between the ports, "make SHARED_BUFFER=1"
+if {[info exists ::env(SHARED_BUFFER)]} {
+    dict set params SHARED_BUFFER $::env(SHARED_BUFFER)
+}
 
 # AXI lite interface configuration (control)
 set m_axil_dma [get_bd_intf_ports m_axil_dma]
@@ -43,6 +53,14 @@ set m_axil_mdio [get_bd_intf_ports m_axil_mdio]
 dict set params AXIL_MDIO_DATA_WIDTH [get_property CONFIG.DATA_WIDTH $m_axil_mdio]
 dict set params AXIL_MDIO_ADDR_WIDTH 8
 
+set m_axil_filter [get_bd_intf_ports m_axil_filter]
+dict set params AXIL_FILTER_DATA_WIDTH [get_property CONFIG.DATA_WIDTH $m_axil_filter]
+dict set params AXIL_FILTER_ADDR_WIDTH 10
+
+set m_axil_clock [get_bd_intf_ports m_axil_clock]
+dict set params AXIL_CLOCK_DATA_WIDTH [get_property CONFIG.DATA_WIDTH $m_axil_clock]
+dict set params AXIL_CLOCK_ADDR_WIDTH 8
+
 # apply parameters to top-level
 set param_list {}
 dict for {name value} $params {
@@ -72,7 +72,10 @@ module axi_dma_wr #
     // (multiple descriptors per AXI stream frame)
     parameter ENABLE_SG = 0,
     // Enable support for unaligned transfers
-    parameter ENABLE_UNALIGNED = 0
+    parameter ENABLE_UNALIGNED = 0,
+    // Maximum number of outstanding AXI write bursts, each burst uses a
+    // separate AXI ID, so at most 2**AXI_ID_WIDTH
+    parameter AXI_MAX_OUTSTANDING = 16
 )
 (
     input  wire                       clk,
@@ -154,7 +157,7 @@ parameter OFFSET_MASK = AXI_STRB_WIDTH > 1 ? {OFFSET_WIDTH{1'b1}} : 0;
 parameter ADDR_MASK = {AXI_ADDR_WIDTH{1'b1}} << $clog2(AXI_STRB_WIDTH);
 parameter CYCLE_COUNT_WIDTH = LEN_WIDTH - AXI_BURST_SIZE + 1;
 
-parameter STATUS_FIFO_ADDR_WIDTH = 5;
+parameter STATUS_FIFO_ADDR_WIDTH = AXI_MAX_OUTSTANDING > 1 ? $clog2(AXI_MAX_OUTSTANDING) : 1;
 parameter OUTPUT_FIFO_ADDR_WIDTH = 5;
 
 // bus width assertions
@@ -193,6 +196,16 @@ initial begin
         $error("Error: scatter/gather is not yet implemented (instance %m)");
         $finish;
     end
+
+    if (AXI_MAX_OUTSTANDING < 1 || 2**$clog2(AXI_MAX_OUTSTANDING) != AXI_MAX_OUTSTANDING) begin
+        $error("Error: AXI_MAX_OUTSTANDING must be a power of two (instance %m)");
+        $finish;
+    end
+
+    if (STATUS_FIFO_ADDR_WIDTH > AXI_ID_WIDTH) begin
+        $error("Error: AXI_ID_WIDTH too small for AXI_MAX_OUTSTANDING (instance %m)");
+        $finish;
+    end
 end
 
 localparam [1:0]
@@ -269,6 +282,17 @@ reg [AXIS_DEST_WIDTH-1:0] status_fifo_wr_dest;
 reg [AXIS_USER_WIDTH-1:0] status_fifo_wr_user;
 reg status_fifo_wr_last;
 
+/*
+ * The AXI ID of a burst is its slot in the status FIFO. The bursts complete
+ * in any order, the write response marks the slot as done and the status is
+ * returned in order once the oldest slot is done.
+ */
+reg [STATUS_FIFO_ADDR_WIDTH-1:0] aw_slot_reg = {STATUS_FIFO_ADDR_WIDTH{1'b0}};
+reg [(2**STATUS_FIFO_ADDR_WIDTH)-1:0] status_fifo_done_reg = {2**STATUS_FIFO_ADDR_WIDTH{1'b0}};
+reg [1:0] status_fifo_bresp[(2**STATUS_FIFO_ADDR_WIDTH)-1:0];
+wire [STATUS_FIFO_ADDR_WIDTH-1:0] status_fifo_rd_slot = status_fifo_rd_ptr_reg[STATUS_FIFO_ADDR_WIDTH-1:0];
+wire [STATUS_FIFO_ADDR_WIDTH-1:0] b_slot = m_axi_bid;
+
 reg [STATUS_FIFO_ADDR_WIDTH+1-1:0] active_count_reg = 0;
 reg active_count_av_reg = 1'b1;
 reg inc_active;
@@ -284,6 +308,7 @@ reg [AXIS_USER_WIDTH-1:0] m_axis_write_desc_status_user_reg = {AXIS_USER_WIDTH{1
 reg [3:0] m_axis_write_desc_status_error_reg = 4'd0, m_axis_write_desc_status_error_next;
 reg m_axis_write_desc_status_valid_reg = 1'b0, m_axis_write_desc_status_valid_next;
 
+reg [AXI_ID_WIDTH-1:0] m_axi_awid_reg = {AXI_ID_WIDTH{1'b0}}, m_axi_awid_next;
 reg [AXI_ADDR_WIDTH-1:0] m_axi_awaddr_reg = {AXI_ADDR_WIDTH{1'b0}}, m_axi_awaddr_next;
 reg [7:0] m_axi_awlen_reg = 8'd0, m_axi_awlen_next;
 reg m_axi_awvalid_reg = 1'b0, m_axi_awvalid_next;
@@ -321,7 +346,7 @@ assign m_axis_write_desc_status_valid = m_axis_write_desc_status_valid_reg;
 
 assign s_axis_write_data_tready = s_axis_write_data_tready_reg;
 
-assign m_axi_awid = {AXI_ID_WIDTH{1'b0}};
+assign m_axi_awid = m_axi_awid_reg;
 assign m_axi_awaddr = m_axi_awaddr_reg;
 assign m_axi_awlen = m_axi_awlen_reg;
 assign m_axi_awsize = AXI_BURST_SIZE;
@@ -376,6 +401,7 @@ always @* begin
 
     s_axis_write_data_tready_next = 1'b0;
 
+    m_axi_awid_next = m_axi_awid_reg;
     m_axi_awaddr_next = m_axi_awaddr_reg;
     m_axi_awlen_next = m_axi_awlen_reg;
     m_axi_awvalid_next = m_axi_awvalid_reg && !m_axi_awready;
@@ -383,7 +409,7 @@ always @* begin
     m_axi_wstrb_int = shift_axis_tkeep;
     m_axi_wlast_int = 1'b0;
     m_axi_wvalid_int = 1'b0;
-    m_axi_bready_next = 1'b0;
+    m_axi_bready_next = 1'b1;
 
     transfer_in_save = 1'b0;
     flush_save = 1'b0;
@@ -424,11 +450,7 @@ always @* begin
     status_fifo_wr_user = axis_user_reg;
     status_fifo_wr_last = 1'b0;
 
-    if (m_axi_bready && m_axi_bvalid && (m_axi_bresp == AXI_RESP_SLVERR || m_axi_bresp == AXI_RESP_DECERR)) begin
-        bresp_next = m_axi_bresp;
-    end else begin
-        bresp_next = bresp_reg;
-    end
+    bresp_next = bresp_reg;
 
     case (state_reg)
         STATE_IDLE: begin
@@ -487,6 +509,7 @@ always @* begin
             end
 
             if (!m_axi_awvalid_reg && active_count_av_reg) begin
+                m_axi_awid_next = aw_slot_reg;
                 m_axi_awaddr_next = addr_reg;
                 m_axi_awlen_next = output_cycle_count_next;
                 m_axi_awvalid_next = s_axis_write_data_tvalid || !first_cycle_reg;
@@ -737,8 +760,12 @@ always @* begin
 
     if (status_fifo_rd_ptr_reg != status_fifo_wr_ptr_reg) begin
         // status FIFO not empty
-        if (m_axi_bready && m_axi_bvalid) begin
-            // got write completion, pop and return status
+        if (status_fifo_done_reg[status_fifo_rd_slot]) begin
+            // oldest burst completed, pop and return status
+            if (status_fifo_bresp[status_fifo_rd_slot] == AXI_RESP_SLVERR || status_fifo_bresp[status_fifo_rd_slot] == AXI_RESP_DECERR) begin
+                bresp_next = status_fifo_bresp[status_fifo_rd_slot];
+            end
+
             m_axis_write_desc_status_len_next = status_fifo_len[status_fifo_rd_ptr_reg[STATUS_FIFO_ADDR_WIDTH-1:0]];
             m_axis_write_desc_status_tag_next = status_fifo_tag[status_fifo_rd_ptr_reg[STATUS_FIFO_ADDR_WIDTH-1:0]];
             m_axis_write_desc_status_id_next = status_fifo_id[status_fifo_rd_ptr_reg[STATUS_FIFO_ADDR_WIDTH-1:0]];
@@ -753,16 +780,12 @@ always @* begin
             end
             m_axis_write_desc_status_valid_next = status_fifo_last[status_fifo_rd_ptr_reg[STATUS_FIFO_ADDR_WIDTH-1:0]];
             status_fifo_rd_ptr_next = status_fifo_rd_ptr_reg + 1;
-            m_axi_bready_next = 1'b0;
 
             if (status_fifo_last[status_fifo_rd_ptr_reg[STATUS_FIFO_ADDR_WIDTH-1:0]]) begin
                 bresp_next = AXI_RESP_OKAY;
             end
 
             dec_active = 1'b1;
-        end else begin
-            // wait for write completion
-            m_axi_bready_next = 1'b1;
         end
     end
 end
@@ -782,6 +805,7 @@ always @(posedge clk) begin
 
     s_axis_write_data_tready_reg <= s_axis_write_data_tready_next;
 
+    m_axi_awid_reg <= m_axi_awid_next;
     m_axi_awaddr_reg <= m_axi_awaddr_next;
     m_axi_awlen_reg <= m_axi_awlen_next;
     m_axi_awvalid_reg <= m_axi_awvalid_next;
@@ -832,14 +856,27 @@ always @(posedge clk) begin
     end
     status_fifo_rd_ptr_reg <= status_fifo_rd_ptr_next;
 
-    if (active_count_reg < 2**STATUS_FIFO_ADDR_WIDTH && inc_active && !dec_active) begin
+    if (inc_active) begin
+        aw_slot_reg <= aw_slot_reg + 1;
+    end
+
+    if (dec_active) begin
+        status_fifo_done_reg[status_fifo_rd_slot] <= 1'b0;
+    end
+
+    if (m_axi_bready && m_axi_bvalid) begin
+        status_fifo_done_reg[b_slot] <= 1'b1;
+        status_fifo_bresp[b_slot] <= m_axi_bresp;
+    end
+
+    if (active_count_reg < AXI_MAX_OUTSTANDING && inc_active && !dec_active) begin
         active_count_reg <= active_count_reg + 1;
-        active_count_av_reg <= active_count_reg < (2**STATUS_FIFO_ADDR_WIDTH-1);
+        active_count_av_reg <= active_count_reg < (AXI_MAX_OUTSTANDING-1);
     end else if (active_count_reg > 0 && !inc_active && dec_active) begin
         active_count_reg <= active_count_reg - 1;
         active_count_av_reg <= 1'b1;
     end else begin
-        active_count_av_reg <= active_count_reg < 2**STATUS_FIFO_ADDR_WIDTH;
+        active_count_av_reg <= active_count_reg < AXI_MAX_OUTSTANDING;
     end
 
     if (rst) begin
@@ -861,6 +898,9 @@ always @(posedge clk) begin
         status_fifo_wr_ptr_reg <= 0;
         status_fifo_rd_ptr_reg <= 0;
 
+        aw_slot_reg <= 0;
+        status_fifo_done_reg <= 0;
+
         active_count_reg <= 0;
         active_count_av_reg <= 1'b1;
     end
@@ -0,0 +1,380 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * Register for the time base of pcap_clock, accessible with AXI4 lite
+ *
+ * SET_SEC and SET_NSEC are loaded into the clock together by writing LOAD to
+ * CTRL. RATE is a signed trim of the clock rate in parts per billion and
+ * takes effect when written. Both are handed to the clock domain of
+ * pcap_clock, CTRL reads the pending transfers; writing one of the
+ * registers involved while its transfer is pending is answered with
+ * SLVERR, as are values out of range.
+ *
+ * Reading TIME_SEC latches TIME_NSEC, so the current time is read
+ * consistently by reading TIME_SEC first.
+ *
+ * The SYNC bit of CTRL makes the clock follow the sync line of another
+ * unit, LOCKED tells whether it does. SYNC_OFFSET (ns) and SYNC_FREQ (ppb)
+ * hold the offset to the sync line and the frequency correction of the
+ * last measurement.
+ */
+module axil_clock_regs #
+(
+    // Width of AXI Lite data interface in bits
+    parameter AXIL_DATA_WIDTH = 32,
+    // Width of AXI Lite address in bits
+    parameter AXIL_ADDR_WIDTH = 8,
+    // Width of AXI Lite strobe (width of data bus in words)
+    parameter AXIL_STRB_WIDTH = (AXIL_DATA_WIDTH/8),
+    // Nanoseconds per tick of pcap_clock
+    parameter NSEC_PER_TICK = 8
+)
+(
+    input  wire                       clk,
+    input  wire                       rst,
+
+    /*
+     * AXI lite slave interface
+     */
+    input  wire [AXIL_ADDR_WIDTH-1:0] s_axil_awaddr,
+    input  wire [2:0]                 s_axil_awprot,
+    input  wire                       s_axil_awvalid,
+    output wire                       s_axil_awready,
+    input  wire [AXIL_DATA_WIDTH-1:0] s_axil_wdata,
+    input  wire [AXIL_STRB_WIDTH-1:0] s_axil_wstrb,
+    input  wire                       s_axil_wvalid,
+    output wire                       s_axil_wready,
+    output wire [1:0]                 s_axil_bresp,
+    output wire                       s_axil_bvalid,
+    input  wire                       s_axil_bready,
+
+    input  wire [AXIL_ADDR_WIDTH-1:0] s_axil_araddr,
+    input  wire [2:0]                 s_axil_arprot,
+    input  wire                       s_axil_arvalid,
+    output wire                       s_axil_arready,
+    output wire [AXIL_DATA_WIDTH-1:0] s_axil_rdata,
+    output wire [1:0]                 s_axil_rresp,
+    output wire                       s_axil_rvalid,
+    input  wire                       s_axil_rready,
+
+    /*
+     * Time base of pcap_clock
+     */
+    input  wire                       counter_clk,
+
+    output wire [31:0]                set_sec,
+    output wire [31:0]                set_nsec,
+    output wire                       load_req,
+    input  wire                       load_ack,
+
+    output wire [31:0]                rate_ppb,
+    output wire                       rate_req,
+    input  wire                       rate_ack,
+
+    output wire                       sync_enable,
+    input  wire                       sync_locked,
+    input  wire [31:0]                sync_offset,
+    input  wire [31:0]                sync_freq,
+    input  wire                       sync_toggle,
+
+    input  wire [31:0]                ts_nsec_gray,
+    input  wire [31:0]                ts_sec_gray
+);
+
+localparam [AXIL_ADDR_WIDTH-1:0]
+    CLOCK_CTRL_ID = 8'h00,
+    CLOCK_SET_SEC_ID = 8'h04,
+    CLOCK_SET_NSEC_ID = 8'h08,
+    CLOCK_RATE_ID = 8'h0c,
+    CLOCK_TIME_SEC_ID = 8'h10,
+    CLOCK_TIME_NSEC_ID = 8'h14,
+    CLOCK_SYNC_OFFSET_ID = 8'h18,
+    CLOCK_SYNC_FREQ_ID = 8'h1c;
+
+localparam CTRL_LOAD = 0;
+localparam CTRL_RATE = 1;
+localparam CTRL_SYNC = 2;
+localparam CTRL_LOCKED = 3;
+
+localparam signed [31:0] PPB = 1000000000;
+
+reg bvalid_reg = 1'b0;
+reg [1:0] bresp_reg = 2'b0;
+reg wready_reg = 1'b0;
+
+assign s_axil_bvalid = bvalid_reg;
+assign s_axil_bresp = bresp_reg;
+assign s_axil_awready = wready_reg;
+assign s_axil_wready = wready_reg;
+
+assign s_axil_rresp = rresp_reg;
+assign s_axil_rvalid = rvalid_reg;
+assign s_axil_arready = arready_reg;
+assign s_axil_rdata = rdata_reg;
+
+reg [31:0] set_sec_reg = 32'd0;
+reg [31:0] set_nsec_reg = 32'd0;
+reg load_req_reg = 1'b0;
+reg [31:0] rate_reg = 32'd0;
+reg rate_req_reg = 1'b0;
+reg sync_enable_reg = 1'b0;
+
+assign set_sec = set_sec_reg;
+assign set_nsec = set_nsec_reg;
+assign load_req = load_req_reg;
+assign rate_ppb = rate_reg;
+assign rate_req = rate_req_reg;
+assign sync_enable = sync_enable_reg;
+
+/* Handshake
+ * The acknowledges follow the requests in the clock domain of pcap_clock,
+ * a transfer is pending while they differ. */
+wire load_ack_sync, rate_ack_sync;
+
+word_cdc # (
+    .DATA_WIDTH(2),
+    .DEPTH(2)
+)
+ack_cdc (
+    .input_clk(counter_clk),
+    .output_clk(clk),
+    .rst(1'b0),
+
+    .input_data({load_ack, rate_ack}),
+    .output_data({load_ack_sync, rate_ack_sync})
+);
+
+wire load_pending = load_req_reg != load_ack_sync;
+wire rate_pending = rate_req_reg != rate_ack_sync;
+
+/* Synchronization status
+ * The results change once a second along with sync_toggle, they are taken
+ * over when the toggle arrived in this clock domain. */
+wire sync_locked_sync, sync_toggle_sync;
+reg sync_toggle_reg = 1'b0;
+reg [31:0] sync_offset_reg = 32'd0;
+reg [31:0] sync_freq_reg = 32'd0;
+
+word_cdc # (
+    .DATA_WIDTH(2),
+    .DEPTH(2)
+)
+sync_cdc (
+    .input_clk(counter_clk),
+    .output_clk(clk),
+    .rst(1'b0),
+
+    .input_data({sync_locked, sync_toggle}),
+    .output_data({sync_locked_sync, sync_toggle_sync})
+);
+
+always @(posedge clk) begin
+    sync_toggle_reg <= sync_toggle_sync;
+    if (sync_toggle_reg != sync_toggle_sync) begin
+        sync_offset_reg <= sync_offset * NSEC_PER_TICK;
+        sync_freq_reg <= sync_freq;
+    end
+end
+
+/* Current time
+ * The gray coded time of pcap_clock crosses into this clock domain like it
+ * does into the receive clocks. */
+wire [31:0] ts_nsec_gray_sync, ts_sec_gray_sync;
+wire [31:0] ts_ticks, ts_sec;
+
+word_cdc # (
+    .DATA_WIDTH(64),
+    .DEPTH(2)
+)
+time_cdc (
+    .input_clk(counter_clk),
+    .output_clk(clk),
+    .rst(1'b0),
+
+    .input_data({ts_nsec_gray, ts_sec_gray}),
+    .output_data({ts_nsec_gray_sync, ts_sec_gray_sync})
+);
+
+gray2bin # (
+    .WIDTH(32)
+)
+gray2bin_nsec (
+    .clk(clk),
+    .rst(rst),
+
+    .gray(ts_nsec_gray_sync),
+    .bin(ts_ticks)
+);
+
+gray2bin # (
+    .WIDTH(32)
+)
+gray2bin_sec (
+    .clk(clk),
+    .rst(rst),
+
+    .gray(ts_sec_gray_sync),
+    .bin(ts_sec)
+);
+
+wire signed [31:0] wr_rate = s_axil_wdata;
+
+// WRITE
+always @(posedge clk) begin
+    wready_reg <= wready_reg;
+    bvalid_reg <= bvalid_reg;
+
+    if (rst) begin
+        bvalid_reg <= 1'b0;
+        set_sec_reg <= 32'd0;
+        set_nsec_reg <= 32'd0;
+        sync_enable_reg <= 1'b0;
+    end else begin
+        if (s_axil_wvalid && s_axil_awvalid && s_axil_bready && !wready_reg && !bvalid_reg) begin
+            wready_reg <= 1'b1;
+
+            case (s_axil_awaddr)
+                CLOCK_CTRL_ID: begin
+                    if (s_axil_wdata[CTRL_LOAD] && load_pending) begin
+                        bresp_reg <= 2'b10;
+                    end else begin
+                        load_req_reg <= load_req_reg ^ s_axil_wdata[CTRL_LOAD];
+                        sync_enable_reg <= s_axil_wdata[CTRL_SYNC];
+                        bresp_reg <= 2'b00;
+                    end
+                end
+                CLOCK_SET_SEC_ID: begin
+                    if (load_pending) begin
+                        bresp_reg <= 2'b10;
+                    end else begin
+                        set_sec_reg <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                end
+                CLOCK_SET_NSEC_ID: begin
+                    if (load_pending || s_axil_wdata >= PPB) begin
+                        bresp_reg <= 2'b10;
+                    end else begin
+                        set_nsec_reg <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                end
+                CLOCK_RATE_ID: begin
+                    if (rate_pending || wr_rate >= PPB || wr_rate <= -PPB) begin
+                        bresp_reg <= 2'b10;
+                    end else begin
+                        rate_reg <= s_axil_wdata;
+                        rate_req_reg <= !rate_req_reg;
+                        bresp_reg <= 2'b00;
+                    end
+                end
+                default: begin
+                    bresp_reg <= 2'b11;
+                end
+            endcase
+        end else if (wready_reg && s_axil_bready) begin
+            wready_reg <= 1'b0;
+            bvalid_reg <= 1'b1;
+        end else if (bvalid_reg) begin
+            bvalid_reg <= 1'b0;
+        end
+    end
+end
+
+
+reg [1:0] rresp_reg = 2'b0;
+reg rvalid_reg = 1'b0;
+reg arready_reg = 1'b0;
+reg [AXIL_DATA_WIDTH-1:0] rdata_reg = {AXIL_DATA_WIDTH{1'b0}};
+
+reg [31:0] time_nsec_reg = 32'd0;
+
+// READ
+always @(posedge clk) begin
+    rvalid_reg <= 1'b0;
+    rdata_reg <= rdata_reg;
+    rresp_reg <= rresp_reg;
+    arready_reg <= arready_reg;
+
+    if (s_axil_arvalid && s_axil_rready && !rvalid_reg) begin
+        rvalid_reg <= 1'b1;
+        arready_reg <= 1'b1;
+
+        case (s_axil_araddr)
+            CLOCK_CTRL_ID: begin
+                rdata_reg <= 32'd0;
+                rdata_reg[CTRL_LOAD] <= load_pending;
+                rdata_reg[CTRL_RATE] <= rate_pending;
+                rdata_reg[CTRL_SYNC] <= sync_enable_reg;
+                rdata_reg[CTRL_LOCKED] <= sync_locked_sync;
+                rresp_reg <= 2'b00;
+            end
+            CLOCK_SET_SEC_ID: begin
+                rdata_reg <= set_sec_reg;
+                rresp_reg <= 2'b00;
+            end
+            CLOCK_SET_NSEC_ID: begin
+                rdata_reg <= set_nsec_reg;
+                rresp_reg <= 2'b00;
+            end
+            CLOCK_RATE_ID: begin
+                rdata_reg <= rate_reg;
+                rresp_reg <= 2'b00;
+            end
+            CLOCK_TIME_SEC_ID: begin
+                rdata_reg <= ts_sec;
+                time_nsec_reg <= ts_ticks * NSEC_PER_TICK;
+                rresp_reg <= 2'b00;
+            end
+            CLOCK_TIME_NSEC_ID: begin
+                rdata_reg <= time_nsec_reg;
+                rresp_reg <= 2'b00;
+            end
+            CLOCK_SYNC_OFFSET_ID: begin
+                rdata_reg <= sync_offset_reg;
+                rresp_reg <= 2'b00;
+            end
+            CLOCK_SYNC_FREQ_ID: begin
+                rdata_reg <= sync_freq_reg;
+                rresp_reg <= 2'b00;
+            end
+            default: begin
+                rdata_reg <= {AXIL_DATA_WIDTH{1'b0}};
+                rresp_reg <= 2'b11;
+            end
+        endcase
+    end
+
+    if (rst) begin
+        rvalid_reg <= 1'b0;
+        arready_reg <= 1'b0;
+    end
+end
+
+endmodule
+
+`resetall
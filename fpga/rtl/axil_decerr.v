@@ -0,0 +1,119 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * AXI lite slave answering every access with a decode error
+ *
+ * Terminates the register space of a block which is not part of the build,
+ * so that an access does not hang the interconnect.
+ */
+module axil_decerr #
+(
+    // Width of data bus in bits
+    parameter DATA_WIDTH = 32,
+    // Width of address bus in bits
+    parameter ADDR_WIDTH = 12,
+    // Width of wstrb (width of data bus in words)
+    parameter STRB_WIDTH = (DATA_WIDTH/8)
+)
+(
+    input  wire                   clk,
+    input  wire                   rst,
+
+    input  wire [ADDR_WIDTH-1:0]  s_axil_awaddr,
+    input  wire [2:0]             s_axil_awprot,
+    input  wire                   s_axil_awvalid,
+    output wire                   s_axil_awready,
+    input  wire [DATA_WIDTH-1:0]  s_axil_wdata,
+    input  wire [STRB_WIDTH-1:0]  s_axil_wstrb,
+    input  wire                   s_axil_wvalid,
+    output wire                   s_axil_wready,
+    output wire [1:0]             s_axil_bresp,
+    output wire                   s_axil_bvalid,
+    input  wire                   s_axil_bready,
+    input  wire [ADDR_WIDTH-1:0]  s_axil_araddr,
+    input  wire [2:0]             s_axil_arprot,
+    input  wire                   s_axil_arvalid,
+    output wire                   s_axil_arready,
+    output wire [DATA_WIDTH-1:0]  s_axil_rdata,
+    output wire [1:0]             s_axil_rresp,
+    output wire                   s_axil_rvalid,
+    input  wire                   s_axil_rready
+);
+
+reg s_axil_awready_reg = 1'b0;
+reg s_axil_wready_reg = 1'b0;
+reg s_axil_bvalid_reg = 1'b0;
+reg s_axil_arready_reg = 1'b0;
+reg s_axil_rvalid_reg = 1'b0;
+
+assign s_axil_awready = s_axil_awready_reg;
+assign s_axil_wready = s_axil_wready_reg;
+assign s_axil_bresp = 2'b11;
+assign s_axil_bvalid = s_axil_bvalid_reg;
+assign s_axil_arready = s_axil_arready_reg;
+assign s_axil_rdata = {DATA_WIDTH{1'b0}};
+assign s_axil_rresp = 2'b11;
+assign s_axil_rvalid = s_axil_rvalid_reg;
+
+// WRITE
+always @(posedge clk) begin
+    s_axil_awready_reg <= 1'b0;
+    s_axil_wready_reg <= 1'b0;
+    s_axil_bvalid_reg <= s_axil_bvalid_reg && !s_axil_bready;
+
+    if (s_axil_awvalid && s_axil_wvalid && !s_axil_awready && !s_axil_bvalid_reg) begin
+        s_axil_awready_reg <= 1'b1;
+        s_axil_wready_reg <= 1'b1;
+        s_axil_bvalid_reg <= 1'b1;
+    end
+
+    if (rst) begin
+        s_axil_awready_reg <= 1'b0;
+        s_axil_wready_reg <= 1'b0;
+        s_axil_bvalid_reg <= 1'b0;
+    end
+end
+
+// READ
+always @(posedge clk) begin
+    s_axil_arready_reg <= 1'b0;
+    s_axil_rvalid_reg <= s_axil_rvalid_reg && !s_axil_rready;
+
+    if (s_axil_arvalid && !s_axil_arready && !s_axil_rvalid_reg) begin
+        s_axil_arready_reg <= 1'b1;
+        s_axil_rvalid_reg <= 1'b1;
+    end
+
+    if (rst) begin
+        s_axil_arready_reg <= 1'b0;
+        s_axil_rvalid_reg <= 1'b0;
+    end
+end
+
+endmodule
+
+`resetall
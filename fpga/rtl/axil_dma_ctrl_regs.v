@@ -27,6 +27,17 @@ with aRTS. If not, see <https://www.gnu.org/licenses/>.
 
 /*
  * Register for DMA control, accessible with AXI4 lite
+ *
+ * Completed descriptors (set_interrupt) are coalesced: the interrupt is raised
+ * once IRQ_COALESCE_COUNT descriptors were completed or IRQ_COALESCE_TIME ns
+ * passed since the first of them, whichever comes first. Descriptors completed
+ * while an interrupt is pending are reported by it, as the driver reads
+ * PACKET_COUNT after clearing the interrupt. The reset values (1 and 0 to
+ * disable the timeout) raise an interrupt for every descriptor.
+ *
+ * A count above 1 with the timeout disabled leaves the last descriptors of a
+ * burst unreported until further descriptors complete the count. The driver
+ * does not allow this combination.
  */
 module axil_dma_ctrl_regs #
 (
@@ -39,7 +50,9 @@ module axil_dma_ctrl_regs #
     // Width of DMA length descriptor field
     parameter LEN_WIDTH = 12,
     // Width of AXI address bus in bits
-    parameter AXI_ADDR_WIDTH = 32
+    parameter AXI_ADDR_WIDTH = 32,
+    // Period of clk in ns, used for the interrupt coalescing timeout
+    parameter CLK_PERIOD_NS = 7
 )
 (
     input  wire                       clk,
@@ -77,6 +90,8 @@ module axil_dma_ctrl_regs #
 
     output wire [AXI_ADDR_WIDTH-1:0]  axi_dma_addr,
     output wire                       enable,
+    output wire                       pack_enable,
+    output wire [31:0]                pack_timeout,
     output wire                       soft_reset,
     input  wire                       soft_reset_done,
     input  wire                       status_busy,
@@ -100,6 +115,8 @@ assign s_axil_rdata = rdata_reg;
 
 assign irq = irq_pending_reg;
 assign enable = enable_reg;
+assign pack_enable = pack_enable_reg;
+assign pack_timeout = pack_timeout_reg;
 assign axi_dma_addr = dma_write_desc_adr;
 
 localparam [AXIL_ADDR_WIDTH-1:0]
@@ -108,7 +125,10 @@ localparam [AXIL_ADDR_WIDTH-1:0]
     DMA_CTRL_ID = 8'd8,
     DMA_STATUS_ID = 8'd12,
     DMA_IRQ_TIME_ID = 8'd16,
-    DMA_PACKET_COUNT_ID = 8'd20;
+    DMA_PACKET_COUNT_ID = 8'd20,
+    DMA_PACK_TIMEOUT_ID = 8'd24, // RW, cycles until a partially filled buffer is closed
+    DMA_IRQ_COALESCE_COUNT_ID = 8'd28, // RW, descriptors until the interrupt is raised
+    DMA_IRQ_COALESCE_TIME_ID = 8'd32; // RW, ns until the interrupt is raised, 0 disables (only with a count of 1)
 
 reg [AXI_ADDR_WIDTH-1:0] dma_write_desc_adr = {AXI_ADDR_WIDTH{1'b0}};
 reg [LEN_WIDTH-1:0] dma_write_len_reg = {LEN_WIDTH{1'b0}};
@@ -119,8 +139,20 @@ reg irq_pending_reg = 1'b0;
 reg enable_reg = 1'b0;
 reg soft_reset_reg = 1'b0;
 reg irq_enable_reg = 1'b0;
+reg pack_enable_reg = 1'b0;
+reg [31:0] pack_timeout_reg = 32'b0;
 reg [31:0] irq_time_reg = 32'b0;
 reg [31:0] packet_count_reg = 32'b0;
+reg [31:0] irq_coalesce_count_reg = 32'd1;
+reg [31:0] irq_coalesce_time_reg = 32'd0;
+
+// descriptors completed since the last interrupt and the time since the first
+reg [31:0] unreported_count_reg = 32'd0;
+reg [31:0] unreported_time_reg = 32'd0;
+
+wire [31:0] unreported_count_next = unreported_count_reg + set_interrupt;
+wire irq_coalesce_count_reached = unreported_count_next >= irq_coalesce_count_reg;
+wire irq_coalesce_time_reached = irq_coalesce_time_reg != 0 && unreported_time_reg >= irq_coalesce_time_reg;
 
 assign soft_reset = soft_reset_reg;
 
@@ -144,6 +176,10 @@ always @(posedge clk) begin
         enable_reg <= 1'b0;
         soft_reset_reg <= 1'b0;
         irq_enable_reg <= 1'b0;
+        pack_enable_reg <= 1'b0;
+        pack_timeout_reg <= 32'b0;
+        irq_coalesce_count_reg <= 32'd1;
+        irq_coalesce_time_reg <= 32'd0;
         irq_pending_reg <= 1'b0;
         irq_time_reg <= 32'b0;
         packet_count_reg <= 32'b0;
@@ -171,6 +207,7 @@ always @(posedge clk) begin
                     enable_reg <= s_axil_wdata[0];
                     soft_reset_reg <= s_axil_wdata[1];
                     irq_enable_reg <= s_axil_wdata[2];
+                    pack_enable_reg <= s_axil_wdata[3];
                     bresp_reg <= 2'b00;
                 end
                 DMA_STATUS_ID: begin
@@ -187,6 +224,18 @@ always @(posedge clk) begin
                     packet_count_reg <= s_axil_wdata;
                     bresp_reg <= 2'b00;
                 end
+                DMA_PACK_TIMEOUT_ID: begin
+                    pack_timeout_reg <= s_axil_wdata;
+                    bresp_reg <= 2'b00;
+                end
+                DMA_IRQ_COALESCE_COUNT_ID: begin
+                    irq_coalesce_count_reg <= s_axil_wdata;
+                    bresp_reg <= 2'b00;
+                end
+                DMA_IRQ_COALESCE_TIME_ID: begin
+                    irq_coalesce_time_reg <= s_axil_wdata;
+                    bresp_reg <= 2'b00;
+                end
                 default: begin
                     bresp_reg <= 2'b11;
                 end
@@ -199,8 +248,19 @@ always @(posedge clk) begin
         end
     end
 
-    if (set_interrupt && irq_enable_reg) begin
+    // interrupt coalescing
+    if (rst || soft_reset_reg || irq_pending_reg || !irq_enable_reg) begin
+        unreported_count_reg <= 32'd0;
+        unreported_time_reg <= 32'd0;
+    end else if (unreported_count_next != 0 && (irq_coalesce_count_reached || irq_coalesce_time_reached)) begin
         irq_pending_reg <= 1'b1;
+        unreported_count_reg <= 32'd0;
+        unreported_time_reg <= 32'd0;
+    end else begin
+        unreported_count_reg <= unreported_count_next;
+        if (unreported_count_reg != 0) begin
+            unreported_time_reg <= unreported_time_reg + CLK_PERIOD_NS;
+        end
     end
 end
 
@@ -235,7 +295,7 @@ always @(posedge clk) begin
                 rresp_reg <= 2'b00;
             end
             DMA_CTRL_ID: begin
-                rdata_reg <= {29'b0, irq_enable_reg, soft_reset_reg, enable_reg};
+                rdata_reg <= {28'b0, pack_enable_reg, irq_enable_reg, soft_reset_reg, enable_reg};
                 rresp_reg <= 2'b00;
             end
             DMA_STATUS_ID: begin
@@ -250,6 +310,18 @@ always @(posedge clk) begin
                 rdata_reg <= packet_count_reg;
                 rresp_reg <= 2'b00;
             end
+            DMA_PACK_TIMEOUT_ID: begin
+                rdata_reg <= pack_timeout_reg;
+                rresp_reg <= 2'b00;
+            end
+            DMA_IRQ_COALESCE_COUNT_ID: begin
+                rdata_reg <= irq_coalesce_count_reg;
+                rresp_reg <= 2'b00;
+            end
+            DMA_IRQ_COALESCE_TIME_ID: begin
+                rdata_reg <= irq_coalesce_time_reg;
+                rresp_reg <= 2'b00;
+            end
             default: begin
                 rdata_reg <= {AXIL_DATA_WIDTH{1'b0}};
                 rresp_reg <= 2'b11;
@@ -0,0 +1,394 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * Register for the capture filters, accessible with AXI4 lite
+ *
+ * Every port has its own block of registers at port*0x200, see
+ * axis_pcap_filter for the meaning of the values. Rule n is located at
+ * 0x40 + n*0x20 within the block of a port.
+ */
+module axil_filter_regs #
+(
+    // Width of AXI Lite data interface in bits
+    parameter AXIL_DATA_WIDTH = 32,
+    // Width of AXI Lite address in bits
+    parameter AXIL_ADDR_WIDTH = 10,
+    // Width of AXI Lite strobe (width of data bus in words)
+    parameter AXIL_STRB_WIDTH = (AXIL_DATA_WIDTH/8),
+    // Number of filtered ports
+    parameter PORT_COUNT = 2,
+    // Number of offset/mask/value rules per port
+    parameter RULE_COUNT = 4,
+    // Width of frame length counter
+    parameter FRAME_LEN_WIDTH = 16
+)
+(
+    input  wire                                  clk,
+    input  wire                                  rst,
+
+    /*
+     * AXI lite slave interface
+     */
+    input  wire [AXIL_ADDR_WIDTH-1:0]            s_axil_awaddr,
+    input  wire [2:0]                            s_axil_awprot,
+    input  wire                                  s_axil_awvalid,
+    output wire                                  s_axil_awready,
+    input  wire [AXIL_DATA_WIDTH-1:0]            s_axil_wdata,
+    input  wire [AXIL_STRB_WIDTH-1:0]            s_axil_wstrb,
+    input  wire                                  s_axil_wvalid,
+    output wire                                  s_axil_wready,
+    output wire [1:0]                            s_axil_bresp,
+    output wire                                  s_axil_bvalid,
+    input  wire                                  s_axil_bready,
+
+    input  wire [AXIL_ADDR_WIDTH-1:0]            s_axil_araddr,
+    input  wire [2:0]                            s_axil_arprot,
+    input  wire                                  s_axil_arvalid,
+    output wire                                  s_axil_arready,
+    output wire [AXIL_DATA_WIDTH-1:0]            s_axil_rdata,
+    output wire [1:0]                            s_axil_rresp,
+    output wire                                  s_axil_rvalid,
+    input  wire                                  s_axil_rready,
+
+    /*
+     * Status counters
+     */
+    input  wire [PORT_COUNT-1:0]                 drop_frame,
+    input  wire [PORT_COUNT*FRAME_LEN_WIDTH-1:0] drop_bytes,
+
+    /*
+     * Filter configuration
+     */
+    output wire [PORT_COUNT*32-1:0]              filter_ctrl,
+    output wire [PORT_COUNT*16-1:0]              filter_ethertype,
+    output wire [PORT_COUNT*12-1:0]              filter_vlan_id,
+    output wire [PORT_COUNT*48-1:0]              filter_dst_mac,
+    output wire [PORT_COUNT*48-1:0]              filter_src_mac,
+    output wire [PORT_COUNT*RULE_COUNT*16-1:0]   filter_rule_offset,
+    output wire [PORT_COUNT*RULE_COUNT*64-1:0]   filter_rule_mask,
+    output wire [PORT_COUNT*RULE_COUNT*64-1:0]   filter_rule_value
+);
+
+// registers of a port are located at port*2**PORT_SHIFT
+localparam PORT_SHIFT = 9;
+
+localparam [PORT_SHIFT-1:0]
+    FILTER_CONTROL_ID = 9'h00,
+    FILTER_ETHERTYPE_ID = 9'h04,
+    FILTER_VLAN_ID_ID = 9'h08,
+    FILTER_DST_MAC_LO_ID = 9'h10,
+    FILTER_DST_MAC_HI_ID = 9'h14,
+    FILTER_SRC_MAC_LO_ID = 9'h18,
+    FILTER_SRC_MAC_HI_ID = 9'h1c,
+    FILTER_DROPPED_FRAMES_ID = 9'h20,
+    FILTER_DROPPED_BYTES_ID = 9'h24,
+    FILTER_RULE_ID = 9'h40;
+
+// offsets within the registers of a rule
+localparam [4:0]
+    RULE_OFFSET_ID = 5'h00,
+    RULE_MASK_LO_ID = 5'h04,
+    RULE_MASK_HI_ID = 5'h08,
+    RULE_VALUE_LO_ID = 5'h0c,
+    RULE_VALUE_HI_ID = 5'h10;
+
+reg bvalid_reg = 1'b0;
+reg [1:0] bresp_reg = 2'b0;
+reg wready_reg = 1'b0;
+
+assign s_axil_bvalid = bvalid_reg;
+assign s_axil_bresp = bresp_reg;
+assign s_axil_awready = wready_reg;
+assign s_axil_wready = wready_reg;
+
+assign s_axil_rresp = rresp_reg;
+assign s_axil_rvalid = rvalid_reg;
+assign s_axil_arready = arready_reg;
+assign s_axil_rdata = rdata_reg;
+
+reg [31:0] ctrl_reg [PORT_COUNT-1:0];
+reg [15:0] ethertype_reg [PORT_COUNT-1:0];
+reg [11:0] vlan_id_reg [PORT_COUNT-1:0];
+reg [47:0] dst_mac_reg [PORT_COUNT-1:0];
+reg [47:0] src_mac_reg [PORT_COUNT-1:0];
+reg [31:0] dropped_frames_reg [PORT_COUNT-1:0];
+reg [31:0] dropped_bytes_reg [PORT_COUNT-1:0];
+
+reg [15:0] rule_offset_reg [PORT_COUNT*RULE_COUNT-1:0];
+reg [63:0] rule_mask_reg [PORT_COUNT*RULE_COUNT-1:0];
+reg [63:0] rule_value_reg [PORT_COUNT*RULE_COUNT-1:0];
+
+genvar n, m;
+
+generate
+    for (n = 0; n < PORT_COUNT; n = n + 1) begin : port
+        assign filter_ctrl[n*32 +: 32] = ctrl_reg[n];
+        assign filter_ethertype[n*16 +: 16] = ethertype_reg[n];
+        assign filter_vlan_id[n*12 +: 12] = vlan_id_reg[n];
+        assign filter_dst_mac[n*48 +: 48] = dst_mac_reg[n];
+        assign filter_src_mac[n*48 +: 48] = src_mac_reg[n];
+
+        for (m = 0; m < RULE_COUNT; m = m + 1) begin : rule
+            assign filter_rule_offset[(n*RULE_COUNT+m)*16 +: 16] = rule_offset_reg[n*RULE_COUNT+m];
+            assign filter_rule_mask[(n*RULE_COUNT+m)*64 +: 64] = rule_mask_reg[n*RULE_COUNT+m];
+            assign filter_rule_value[(n*RULE_COUNT+m)*64 +: 64] = rule_value_reg[n*RULE_COUNT+m];
+        end
+    end
+endgenerate
+
+wire [AXIL_ADDR_WIDTH-1:0] wr_port = s_axil_awaddr >> PORT_SHIFT;
+wire [PORT_SHIFT-1:0] wr_addr = s_axil_awaddr[PORT_SHIFT-1:0];
+wire [PORT_SHIFT-1:0] wr_rule_addr = wr_addr - FILTER_RULE_ID;
+wire [AXIL_ADDR_WIDTH-1:0] wr_rule = wr_port*RULE_COUNT + (wr_rule_addr >> 5);
+wire wr_is_rule = wr_addr >= FILTER_RULE_ID && (wr_rule_addr >> 5) < RULE_COUNT;
+
+wire [AXIL_ADDR_WIDTH-1:0] rd_port = s_axil_araddr >> PORT_SHIFT;
+wire [PORT_SHIFT-1:0] rd_addr = s_axil_araddr[PORT_SHIFT-1:0];
+wire [PORT_SHIFT-1:0] rd_rule_addr = rd_addr - FILTER_RULE_ID;
+wire [AXIL_ADDR_WIDTH-1:0] rd_rule = rd_port*RULE_COUNT + (rd_rule_addr >> 5);
+wire rd_is_rule = rd_addr >= FILTER_RULE_ID && (rd_rule_addr >> 5) < RULE_COUNT;
+
+integer i;
+
+// WRITE
+always @(posedge clk) begin
+    wready_reg <= wready_reg;
+    bvalid_reg <= bvalid_reg;
+
+    if (rst) begin
+        bvalid_reg <= 1'b0;
+
+        for (i = 0; i < PORT_COUNT; i = i + 1) begin
+            ctrl_reg[i] <= 32'b0;
+            ethertype_reg[i] <= 16'b0;
+            vlan_id_reg[i] <= 12'b0;
+            dst_mac_reg[i] <= 48'b0;
+            src_mac_reg[i] <= 48'b0;
+            dropped_frames_reg[i] <= 32'b0;
+            dropped_bytes_reg[i] <= 32'b0;
+        end
+
+        for (i = 0; i < PORT_COUNT*RULE_COUNT; i = i + 1) begin
+            rule_offset_reg[i] <= 16'b0;
+            rule_mask_reg[i] <= 64'b0;
+            rule_value_reg[i] <= 64'b0;
+        end
+    end else begin
+        // update status signals
+        for (i = 0; i < PORT_COUNT; i = i + 1) begin
+            dropped_frames_reg[i] <= dropped_frames_reg[i] + drop_frame[i];
+            if (drop_frame[i]) begin
+                dropped_bytes_reg[i] <= dropped_bytes_reg[i] + drop_bytes[i*FRAME_LEN_WIDTH +: FRAME_LEN_WIDTH];
+            end
+        end
+
+        if (s_axil_wvalid && s_axil_awvalid && s_axil_bready && !wready_reg && !bvalid_reg) begin
+            wready_reg <= 1'b1;
+
+            if (wr_port >= PORT_COUNT) begin
+                bresp_reg <= 2'b11;
+            end else if (wr_is_rule) begin
+                case (wr_rule_addr[4:0])
+                    RULE_OFFSET_ID: begin
+                        rule_offset_reg[wr_rule] <= s_axil_wdata[15:0];
+                        bresp_reg <= 2'b00;
+                    end
+                    RULE_MASK_LO_ID: begin
+                        rule_mask_reg[wr_rule][31:0] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    RULE_MASK_HI_ID: begin
+                        rule_mask_reg[wr_rule][63:32] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    RULE_VALUE_LO_ID: begin
+                        rule_value_reg[wr_rule][31:0] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    RULE_VALUE_HI_ID: begin
+                        rule_value_reg[wr_rule][63:32] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    default: begin
+                        bresp_reg <= 2'b11;
+                    end
+                endcase
+            end else begin
+                case (wr_addr)
+                    FILTER_CONTROL_ID: begin
+                        ctrl_reg[wr_port] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_ETHERTYPE_ID: begin
+                        ethertype_reg[wr_port] <= s_axil_wdata[15:0];
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_VLAN_ID_ID: begin
+                        vlan_id_reg[wr_port] <= s_axil_wdata[11:0];
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_DST_MAC_LO_ID: begin
+                        dst_mac_reg[wr_port][31:0] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_DST_MAC_HI_ID: begin
+                        dst_mac_reg[wr_port][47:32] <= s_axil_wdata[15:0];
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_SRC_MAC_LO_ID: begin
+                        src_mac_reg[wr_port][31:0] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_SRC_MAC_HI_ID: begin
+                        src_mac_reg[wr_port][47:32] <= s_axil_wdata[15:0];
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_DROPPED_FRAMES_ID: begin
+                        dropped_frames_reg[wr_port] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    FILTER_DROPPED_BYTES_ID: begin
+                        dropped_bytes_reg[wr_port] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end
+                    default: begin
+                        bresp_reg <= 2'b11;
+                    end
+                endcase
+            end
+        end else if (wready_reg && s_axil_bready) begin
+            wready_reg <= 1'b0;
+            bvalid_reg <= 1'b1;
+        end else if (bvalid_reg) begin
+            bvalid_reg <= 1'b0;
+        end
+    end
+end
+
+
+reg [1:0] rresp_reg = 2'b0;
+reg rvalid_reg = 1'b0;
+reg arready_reg = 1'b0;
+reg [AXIL_DATA_WIDTH-1:0] rdata_reg = {AXIL_DATA_WIDTH{1'b0}};
+
+// READ
+always @(posedge clk) begin
+    rvalid_reg <= 1'b0;
+    rdata_reg <= rdata_reg;
+    rresp_reg <= rresp_reg;
+    arready_reg <= arready_reg;
+
+    if (s_axil_arvalid && s_axil_rready && !rvalid_reg) begin
+        rvalid_reg <= 1'b1;
+        arready_reg <= 1'b1;
+
+        if (rd_port >= PORT_COUNT) begin
+            rdata_reg <= {AXIL_DATA_WIDTH{1'b0}};
+            rresp_reg <= 2'b11;
+        end else if (rd_is_rule) begin
+            case (rd_rule_addr[4:0])
+                RULE_OFFSET_ID: begin
+                    rdata_reg <= {16'b0, rule_offset_reg[rd_rule]};
+                    rresp_reg <= 2'b00;
+                end
+                RULE_MASK_LO_ID: begin
+                    rdata_reg <= rule_mask_reg[rd_rule][31:0];
+                    rresp_reg <= 2'b00;
+                end
+                RULE_MASK_HI_ID: begin
+                    rdata_reg <= rule_mask_reg[rd_rule][63:32];
+                    rresp_reg <= 2'b00;
+                end
+                RULE_VALUE_LO_ID: begin
+                    rdata_reg <= rule_value_reg[rd_rule][31:0];
+                    rresp_reg <= 2'b00;
+                end
+                RULE_VALUE_HI_ID: begin
+                    rdata_reg <= rule_value_reg[rd_rule][63:32];
+                    rresp_reg <= 2'b00;
+                end
+                default: begin
+                    rdata_reg <= {AXIL_DATA_WIDTH{1'b0}};
+                    rresp_reg <= 2'b11;
+                end
+            endcase
+        end else begin
+            case (rd_addr)
+                FILTER_CONTROL_ID: begin
+                    rdata_reg <= ctrl_reg[rd_port];
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_ETHERTYPE_ID: begin
+                    rdata_reg <= {16'b0, ethertype_reg[rd_port]};
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_VLAN_ID_ID: begin
+                    rdata_reg <= {20'b0, vlan_id_reg[rd_port]};
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_DST_MAC_LO_ID: begin
+                    rdata_reg <= dst_mac_reg[rd_port][31:0];
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_DST_MAC_HI_ID: begin
+                    rdata_reg <= {16'b0, dst_mac_reg[rd_port][47:32]};
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_SRC_MAC_LO_ID: begin
+                    rdata_reg <= src_mac_reg[rd_port][31:0];
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_SRC_MAC_HI_ID: begin
+                    rdata_reg <= {16'b0, src_mac_reg[rd_port][47:32]};
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_DROPPED_FRAMES_ID: begin
+                    rdata_reg <= dropped_frames_reg[rd_port];
+                    rresp_reg <= 2'b00;
+                end
+                FILTER_DROPPED_BYTES_ID: begin
+                    rdata_reg <= dropped_bytes_reg[rd_port];
+                    rresp_reg <= 2'b00;
+                end
+                default: begin
+                    rdata_reg <= {AXIL_DATA_WIDTH{1'b0}};
+                    rresp_reg <= 2'b11;
+                end
+            endcase
+        end
+    end
+
+    if (rst) begin
+        rvalid_reg <= 1'b0;
+        arready_reg <= 1'b0;
+    end
+end
+
+endmodule
+
+`resetall
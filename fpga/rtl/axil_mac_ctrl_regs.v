@@ -37,7 +37,11 @@ module axil_mac_ctrl_regs #
     // Width of AXI Lite strobe (width of data bus in words)
     parameter AXIL_STRB_WIDTH = (AXIL_DATA_WIDTH/8),
     // Width of AXI address bus in bits
-    parameter AXI_ADDR_WIDTH = 32
+    parameter AXI_ADDR_WIDTH = 32,
+    // Depth of the RX FIFOs of the MACs in bytes
+    parameter FIFO_DEPTH = 2**13,
+    // Number of buckets of the FIFO occupancy histograms (power of two)
+    parameter FIFO_HIST_BUCKETS = 8
 )
 (
     input  wire                       clk,
@@ -84,6 +88,12 @@ module axil_mac_ctrl_regs #
     input  wire                       fifo2_good_frame,
     input  wire                       fifo2_overflow,
 
+    /*
+     * RX FIFO occupancy in bytes
+     */
+    input  wire [$clog2(FIFO_DEPTH):0] fifo1_occupancy,
+    input  wire [$clog2(FIFO_DEPTH):0] fifo2_occupancy,
+
     /*
      * Status input
      */
@@ -94,7 +104,9 @@ module axil_mac_ctrl_regs #
      * Control output
      */
     output wire                       ctrl_enable,
-    output wire                       ctrl_mii_select
+    output wire                       ctrl_mii_select,
+    output wire [15:0]                ctrl_mac1_snaplen,
+    output wire [15:0]                ctrl_mac2_snaplen
 );
 
 
@@ -114,6 +126,8 @@ assign s_axil_rdata = rdata_reg;
 
 assign ctrl_enable = enable_reg;
 assign ctrl_mii_select = mii_select_reg;
+assign ctrl_mac1_snaplen = mac1_snaplen_reg;
+assign ctrl_mac2_snaplen = mac2_snaplen_reg;
 
 localparam [AXIL_ADDR_WIDTH-1:0]
     MAC_CONTROL_ID = 8'h00,
@@ -125,18 +139,40 @@ localparam [AXIL_ADDR_WIDTH-1:0]
     FIFO1_BAD_FRAME = 8'h4c,
     FIFO1_GOOD_FRAME = 8'h50,
     FIFO1_OVERFLOW = 8'h54,
+    MAC1_SNAPLEN = 8'h58,
 
     MAC2_START_FRAME_ID = 8'h60,
     MAC2_BAD_FRAME = 8'h64,
     MAC2_BAD_FCS = 8'h68,
     FIFO2_BAD_FRAME = 8'h6c,
     FIFO2_GOOD_FRAME = 8'h70,
-    FIFO2_OVERFLOW = 8'h74;
+    FIFO2_OVERFLOW = 8'h74,
+    MAC2_SNAPLEN = 8'h78,
+
+    FIFO1_HIGH_WATER = 8'h80,
+    FIFO1_HIST = 8'ha0, // one counter per bucket up to 8'hbc
+    FIFO2_HIGH_WATER = 8'hc0,
+    FIFO2_HIST = 8'he0; // one counter per bucket up to 8'hfc
+
+// each bucket covers FIFO_DEPTH/FIFO_HIST_BUCKETS bytes, a full FIFO counts
+// into the last one
+localparam FIFO_HIST_SHIFT = $clog2(FIFO_DEPTH) - $clog2(FIFO_HIST_BUCKETS);
+localparam FIFO_HIST_INDEX_WIDTH = $clog2(FIFO_HIST_BUCKETS);
+
+initial begin
+    if (FIFO_HIST_BUCKETS > 8) begin
+        $error("Error: at most 8 histogram buckets fit into the address map (instance %m)");
+        $finish;
+    end
+end
 
 reg mii_select_reg = 1'b0;
 reg enable_reg = 1'b0;
 reg soft_reset_reg = 1'b0;
 
+// maximum captured bytes per frame, 0 disables truncation
+reg [15:0] mac1_snaplen_reg = 16'd0, mac2_snaplen_reg = 16'd0;
+
 reg [31:0] mac1_start_frame_reg, mac2_start_frame_reg;
 reg [31:0] mac1_bad_frame_reg, mac2_bad_frame_reg;
 reg [31:0] mac1_bad_fcs_reg, mac2_bad_fcs_reg;
@@ -144,6 +180,23 @@ reg [31:0] fifo1_bad_frame_reg, fifo2_bad_frame_reg;
 reg [31:0] fifo1_good_frame_reg, fifo2_good_frame_reg;
 reg [31:0] fifo1_overflow_reg, fifo2_overflow_reg;
 
+// maximum FIFO occupancy since the last write
+reg [$clog2(FIFO_DEPTH):0] fifo1_high_water_reg = 0, fifo2_high_water_reg = 0;
+// clock cycles spent in each bucket of occupancy, saturating
+reg [31:0] fifo1_hist_reg[FIFO_HIST_BUCKETS-1:0];
+reg [31:0] fifo2_hist_reg[FIFO_HIST_BUCKETS-1:0];
+
+wire [FIFO_HIST_INDEX_WIDTH-1:0] fifo1_bucket = fifo1_occupancy >= FIFO_DEPTH ?
+    FIFO_HIST_BUCKETS-1 : fifo1_occupancy >> FIFO_HIST_SHIFT;
+wire [FIFO_HIST_INDEX_WIDTH-1:0] fifo2_bucket = fifo2_occupancy >= FIFO_DEPTH ?
+    FIFO_HIST_BUCKETS-1 : fifo2_occupancy >> FIFO_HIST_SHIFT;
+
+wire fifo1_hist_addr = s_axil_awaddr >> 5 == FIFO1_HIST >> 5;
+wire fifo2_hist_addr = s_axil_awaddr >> 5 == FIFO2_HIST >> 5;
+wire [2:0] fifo_hist_index = s_axil_awaddr >> 2;
+
+integer i;
+
 // TODO: explain simultanious RW behavior
 
 // WRITE
@@ -158,6 +211,8 @@ always @(posedge clk) begin
         bvalid_reg <= 1'b0;
         enable_reg <= 1'b0;
         mii_select_reg <= 1'b0;
+        mac1_snaplen_reg <= 16'd0;
+        mac2_snaplen_reg <= 16'd0;
 
         mac1_start_frame_reg <= 32'b0;
         mac1_bad_frame_reg <= 32'b0;
@@ -172,6 +227,13 @@ always @(posedge clk) begin
         fifo2_bad_frame_reg <= 32'b0;
         fifo2_good_frame_reg <= 32'b0;
         fifo2_overflow_reg <= 32'b0;
+
+        fifo1_high_water_reg <= 0;
+        fifo2_high_water_reg <= 0;
+        for (i = 0; i < FIFO_HIST_BUCKETS; i = i + 1) begin
+            fifo1_hist_reg[i] <= 32'b0;
+            fifo2_hist_reg[i] <= 32'b0;
+        end
     end else begin
         // update status signals
         if (soft_reset_reg) begin
@@ -188,6 +250,13 @@ always @(posedge clk) begin
             fifo2_bad_frame_reg <= 32'b0;
             fifo2_good_frame_reg <= 32'b0;
             fifo2_overflow_reg <= 32'b0;
+
+            fifo1_high_water_reg <= 0;
+            fifo2_high_water_reg <= 0;
+            for (i = 0; i < FIFO_HIST_BUCKETS; i = i + 1) begin
+                fifo1_hist_reg[i] <= 32'b0;
+                fifo2_hist_reg[i] <= 32'b0;
+            end
         end else begin
             mac1_start_frame_reg <= mac1_start_frame_reg + mac1_start_frame;
             mac1_bad_frame_reg <= mac1_bad_frame_reg + mac1_bad_frame;
@@ -202,6 +271,20 @@ always @(posedge clk) begin
             fifo2_bad_frame_reg <= fifo2_bad_frame_reg + fifo2_bad_frame;
             fifo2_good_frame_reg <= fifo2_good_frame_reg + fifo2_good_frame;
             fifo2_overflow_reg <= fifo2_overflow_reg + fifo2_overflow;
+
+            if (fifo1_occupancy > fifo1_high_water_reg) begin
+                fifo1_high_water_reg <= fifo1_occupancy;
+            end
+            if (fifo2_occupancy > fifo2_high_water_reg) begin
+                fifo2_high_water_reg <= fifo2_occupancy;
+            end
+
+            if (fifo1_hist_reg[fifo1_bucket] != 32'hffffffff) begin
+                fifo1_hist_reg[fifo1_bucket] <= fifo1_hist_reg[fifo1_bucket] + 1;
+            end
+            if (fifo2_hist_reg[fifo2_bucket] != 32'hffffffff) begin
+                fifo2_hist_reg[fifo2_bucket] <= fifo2_hist_reg[fifo2_bucket] + 1;
+            end
         end
 
         if (s_axil_wvalid && s_axil_awvalid && s_axil_bready && !wready_reg && !bvalid_reg) begin
@@ -241,6 +324,10 @@ always @(posedge clk) begin
                     fifo1_overflow_reg <= s_axil_wdata;
                     bresp_reg <= 2'b00;
                 end
+                MAC1_SNAPLEN: begin
+                    mac1_snaplen_reg <= s_axil_wdata[15:0];
+                    bresp_reg <= 2'b00;
+                end
                 MAC2_START_FRAME_ID: begin
                     mac2_start_frame_reg <= s_axil_wdata;
                     bresp_reg <= 2'b00;
@@ -265,8 +352,28 @@ always @(posedge clk) begin
                     fifo2_overflow_reg <= s_axil_wdata;
                     bresp_reg <= 2'b00;
                 end
+                MAC2_SNAPLEN: begin
+                    mac2_snaplen_reg <= s_axil_wdata[15:0];
+                    bresp_reg <= 2'b00;
+                end
+                FIFO1_HIGH_WATER: begin
+                    fifo1_high_water_reg <= s_axil_wdata;
+                    bresp_reg <= 2'b00;
+                end
+                FIFO2_HIGH_WATER: begin
+                    fifo2_high_water_reg <= s_axil_wdata;
+                    bresp_reg <= 2'b00;
+                end
                 default: begin
-                    bresp_reg <= 2'b11;
+                    if (fifo1_hist_addr && fifo_hist_index < FIFO_HIST_BUCKETS) begin
+                        fifo1_hist_reg[fifo_hist_index] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end else if (fifo2_hist_addr && fifo_hist_index < FIFO_HIST_BUCKETS) begin
+                        fifo2_hist_reg[fifo_hist_index] <= s_axil_wdata;
+                        bresp_reg <= 2'b00;
+                    end else begin
+                        bresp_reg <= 2'b11;
+                    end
                 end
             endcase
         end else if (wready_reg && s_axil_bready) begin
@@ -287,6 +394,10 @@ reg [AXIL_DATA_WIDTH-1:0] rdata_reg = {AXIL_DATA_WIDTH{1'b0}};
 reg busy_reg = 1'b0;
 reg buffers_empty_reg = 1'b0;
 
+wire fifo1_hist_raddr = s_axil_araddr >> 5 == FIFO1_HIST >> 5;
+wire fifo2_hist_raddr = s_axil_araddr >> 5 == FIFO2_HIST >> 5;
+wire [2:0] fifo_hist_rindex = s_axil_araddr >> 2;
+
 // READ
 always @(posedge clk) begin
     rvalid_reg <= 1'b0;
@@ -334,6 +445,10 @@ always @(posedge clk) begin
                 rdata_reg <= fifo1_overflow_reg;
                 rresp_reg <= 2'b00;
             end
+            MAC1_SNAPLEN: begin
+                rdata_reg <= {16'b0, mac1_snaplen_reg};
+                rresp_reg <= 2'b00;
+            end
             MAC2_START_FRAME_ID: begin
                 rdata_reg <= mac2_start_frame_reg;
                 rresp_reg <= 2'b00;
@@ -358,9 +473,29 @@ always @(posedge clk) begin
                 rdata_reg <= fifo2_overflow_reg;
                 rresp_reg <= 2'b00;
             end
+            MAC2_SNAPLEN: begin
+                rdata_reg <= {16'b0, mac2_snaplen_reg};
+                rresp_reg <= 2'b00;
+            end
+            FIFO1_HIGH_WATER: begin
+                rdata_reg <= fifo1_high_water_reg;
+                rresp_reg <= 2'b00;
+            end
+            FIFO2_HIGH_WATER: begin
+                rdata_reg <= fifo2_high_water_reg;
+                rresp_reg <= 2'b00;
+            end
             default: begin
-                rdata_reg <= {AXIL_DATA_WIDTH{1'b0}};
-                rresp_reg <= 2'b11;
+                if (fifo1_hist_raddr && fifo_hist_rindex < FIFO_HIST_BUCKETS) begin
+                    rdata_reg <= fifo1_hist_reg[fifo_hist_rindex];
+                    rresp_reg <= 2'b00;
+                end else if (fifo2_hist_raddr && fifo_hist_rindex < FIFO_HIST_BUCKETS) begin
+                    rdata_reg <= fifo2_hist_reg[fifo_hist_rindex];
+                    rresp_reg <= 2'b00;
+                end else begin
+                    rdata_reg <= {AXIL_DATA_WIDTH{1'b0}};
+                    rresp_reg <= 2'b11;
+                end
             end
         endcase
     end
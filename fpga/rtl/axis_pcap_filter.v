@@ -0,0 +1,322 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * Capture filter for a stream of PCAP records
+ *
+ * Every record (16 byte header followed by the frame) is matched against the
+ * enabled criteria: destination MAC, source MAC, EtherType, VLAN ID and a
+ * number of offset/mask/value rules. The criteria are combined with AND. If
+ * the filter is enabled, only matching records pass (or only non-matching
+ * ones if inverted). The decision is taken on the last word of a record and
+ * records to be dropped are removed by a frame FIFO, so the output only
+ * carries complete, accepted records.
+ *
+ * filter_ctrl:
+ *   [0]                 enable
+ *   [1]                 invert
+ *   [2]                 match EtherType
+ *   [3]                 match destination MAC
+ *   [4]                 match source MAC
+ *   [5]                 match VLAN ID
+ *   [16+RULE_COUNT-1:16] enable rule n
+ *
+ * MAC addresses are given in their natural notation, i.e. 00:11:22:33:44:55
+ * is 48'h001122334455. For tagged frames (TPID 0x8100 or 0x88a8), the VLAN ID
+ * is taken from the outer tag and the EtherType from behind it.
+ *
+ * A rule compares the stream word containing frame byte filter_rule_offset
+ * (rounded down to a multiple of KEEP_WIDTH): lane i holds frame byte
+ * offset+i at bits [8*i+7:8*i]. Lanes above DATA_WIDTH are ignored. A rule
+ * does not match if a masked byte lies beyond the end of the frame.
+ */
+module axis_pcap_filter #
+(
+    // Width of AXI stream interfaces in bits
+    parameter DATA_WIDTH = 64,
+    // tkeep signal width (words per cycle)
+    parameter KEEP_WIDTH = ((DATA_WIDTH+7)/8),
+    // Width of AXI stream tuser signal
+    parameter USER_WIDTH = 1,
+    // Number of offset/mask/value rules
+    parameter RULE_COUNT = 4,
+    // Depth of the frame FIFO in bytes, must hold at least one record
+    parameter FIFO_DEPTH = 4096,
+    // Width of frame length counter
+    parameter FRAME_LEN_WIDTH = 16
+)
+(
+    input  wire                       clk,
+    input  wire                       rst,
+
+    /*
+     * AXI4-Stream input (PCAP records)
+     */
+    input  wire [DATA_WIDTH-1:0]      s_axis_tdata,
+    input  wire                       s_axis_tvalid,
+    output wire                       s_axis_tready,
+    input  wire                       s_axis_tlast,
+    input  wire [USER_WIDTH-1:0]      s_axis_tuser,
+    input  wire [KEEP_WIDTH-1:0]      s_axis_tkeep,
+
+    /*
+     * AXI4-Stream output (accepted PCAP records)
+     */
+    output wire [DATA_WIDTH-1:0]      m_axis_tdata,
+    output wire                       m_axis_tvalid,
+    input  wire                       m_axis_tready,
+    output wire                       m_axis_tlast,
+    output wire [USER_WIDTH-1:0]      m_axis_tuser,
+    output wire [KEEP_WIDTH-1:0]      m_axis_tkeep,
+
+    /*
+     * Configuration
+     */
+    input  wire [31:0]                filter_ctrl,
+    input  wire [15:0]                filter_ethertype,
+    input  wire [11:0]                filter_vlan_id,
+    input  wire [47:0]                filter_dst_mac,
+    input  wire [47:0]                filter_src_mac,
+    input  wire [RULE_COUNT*16-1:0]   filter_rule_offset,
+    input  wire [RULE_COUNT*64-1:0]   filter_rule_mask,
+    input  wire [RULE_COUNT*64-1:0]   filter_rule_value,
+
+    /*
+     * Status
+     */
+    output wire                       drop_frame,
+    output wire [FRAME_LEN_WIDTH-1:0] drop_bytes
+);
+
+// length of the record header in bytes
+localparam HEADER_LEN = 16;
+// number of frame bytes looked at by the fixed criteria
+localparam CAPTURE_LEN = 18;
+
+localparam
+    CTRL_ENABLE = 0,
+    CTRL_INVERT = 1,
+    CTRL_ETHERTYPE = 2,
+    CTRL_DST_MAC = 3,
+    CTRL_SRC_MAC = 4,
+    CTRL_VLAN = 5,
+    CTRL_RULE = 16;
+
+localparam RULE_WIDTH = DATA_WIDTH < 64 ? DATA_WIDTH : 64;
+
+wire beat = s_axis_tvalid && s_axis_tready;
+
+// index of the current word within the record
+reg [15:0] word_reg = 16'd0;
+// record bytes received before the current word
+reg [FRAME_LEN_WIDTH-1:0] len_reg = {FRAME_LEN_WIDTH{1'b0}};
+// frame bytes 0 to CAPTURE_LEN-1 and whether they were received
+reg [CAPTURE_LEN*8-1:0] capture_reg = {CAPTURE_LEN*8{1'b0}};
+reg [CAPTURE_LEN-1:0] capture_valid_reg = {CAPTURE_LEN{1'b0}};
+reg [RULE_COUNT-1:0] rule_hit_reg = {RULE_COUNT{1'b0}};
+
+reg drop_frame_reg = 1'b0;
+reg [FRAME_LEN_WIDTH-1:0] drop_bytes_reg = {FRAME_LEN_WIDTH{1'b0}};
+
+assign drop_frame = drop_frame_reg;
+assign drop_bytes = drop_bytes_reg;
+
+// state including the current word
+reg [FRAME_LEN_WIDTH-1:0] len_next;
+reg [CAPTURE_LEN*8-1:0] capture_next;
+reg [CAPTURE_LEN-1:0] capture_valid_next;
+reg [RULE_COUNT-1:0] rule_hit_next;
+
+reg [47:0] dst_mac;
+reg [47:0] src_mac;
+reg [15:0] outer_ethertype;
+reg [15:0] ethertype;
+reg [11:0] vlan_id;
+reg vlan_tagged;
+reg match;
+reg drop;
+
+reg [RULE_WIDTH-1:0] rule_mask;
+reg [RULE_WIDTH-1:0] rule_value;
+reg [KEEP_WIDTH-1:0] rule_bytes;
+reg [16:0] rule_word;
+
+integer i, k, r;
+
+always @* begin
+    len_next = len_reg;
+    capture_next = capture_reg;
+    capture_valid_next = capture_valid_reg;
+    rule_hit_next = rule_hit_reg;
+
+    for (i = 0; i < KEEP_WIDTH; i = i + 1) begin
+        len_next = len_next + s_axis_tkeep[i];
+    end
+
+    for (k = 0; k < CAPTURE_LEN; k = k + 1) begin
+        if (word_reg == (HEADER_LEN+k)/KEEP_WIDTH && s_axis_tkeep[(HEADER_LEN+k)%KEEP_WIDTH]) begin
+            capture_next[k*8 +: 8] = s_axis_tdata[((HEADER_LEN+k)%KEEP_WIDTH)*8 +: 8];
+            capture_valid_next[k] = 1'b1;
+        end
+    end
+
+    for (r = 0; r < RULE_COUNT; r = r + 1) begin
+        rule_mask = filter_rule_mask[r*64 +: RULE_WIDTH];
+        rule_value = filter_rule_value[r*64 +: RULE_WIDTH];
+        rule_word = (HEADER_LEN + filter_rule_offset[r*16 +: 16]) / KEEP_WIDTH;
+
+        rule_bytes = {KEEP_WIDTH{1'b0}};
+        for (i = 0; i < RULE_WIDTH/8; i = i + 1) begin
+            rule_bytes[i] = |rule_mask[i*8 +: 8];
+        end
+
+        if (word_reg == rule_word && ((s_axis_tdata[RULE_WIDTH-1:0] ^ rule_value) & rule_mask) == 0 &&
+                (rule_bytes & ~s_axis_tkeep) == 0) begin
+            rule_hit_next[r] = 1'b1;
+        end
+    end
+
+    for (k = 0; k < 6; k = k + 1) begin
+        dst_mac[47-8*k -: 8] = capture_next[8*k +: 8];
+        src_mac[47-8*k -: 8] = capture_next[8*(k+6) +: 8];
+    end
+
+    outer_ethertype = {capture_next[12*8 +: 8], capture_next[13*8 +: 8]};
+    vlan_tagged = capture_valid_next[13] && (outer_ethertype == 16'h8100 || outer_ethertype == 16'h88a8);
+    vlan_id = {capture_next[14*8 +: 4], capture_next[15*8 +: 8]};
+    ethertype = vlan_tagged ? {capture_next[16*8 +: 8], capture_next[17*8 +: 8]} : outer_ethertype;
+
+    match = 1'b1;
+
+    if (filter_ctrl[CTRL_DST_MAC] && !(capture_valid_next[5] && dst_mac == filter_dst_mac)) begin
+        match = 1'b0;
+    end
+
+    if (filter_ctrl[CTRL_SRC_MAC] && !(capture_valid_next[11] && src_mac == filter_src_mac)) begin
+        match = 1'b0;
+    end
+
+    if (filter_ctrl[CTRL_ETHERTYPE] && !((vlan_tagged ? capture_valid_next[17] : capture_valid_next[13]) &&
+            ethertype == filter_ethertype)) begin
+        match = 1'b0;
+    end
+
+    if (filter_ctrl[CTRL_VLAN] && !(vlan_tagged && capture_valid_next[15] && vlan_id == filter_vlan_id)) begin
+        match = 1'b0;
+    end
+
+    if ((filter_ctrl[CTRL_RULE +: RULE_COUNT] & ~rule_hit_next) != 0) begin
+        match = 1'b0;
+    end
+
+    drop = filter_ctrl[CTRL_ENABLE] && (match == filter_ctrl[CTRL_INVERT]);
+end
+
+always @(posedge clk) begin
+    drop_frame_reg <= 1'b0;
+
+    if (beat) begin
+        if (s_axis_tlast) begin
+            word_reg <= 16'd0;
+            len_reg <= {FRAME_LEN_WIDTH{1'b0}};
+            capture_valid_reg <= {CAPTURE_LEN{1'b0}};
+            rule_hit_reg <= {RULE_COUNT{1'b0}};
+
+            drop_frame_reg <= drop;
+            drop_bytes_reg <= len_next - HEADER_LEN;
+        end else begin
+            word_reg <= word_reg + 1;
+            len_reg <= len_next;
+            capture_reg <= capture_next;
+            capture_valid_reg <= capture_valid_next;
+            rule_hit_reg <= rule_hit_next;
+        end
+    end
+
+    if (rst) begin
+        word_reg <= 16'd0;
+        len_reg <= {FRAME_LEN_WIDTH{1'b0}};
+        capture_valid_reg <= {CAPTURE_LEN{1'b0}};
+        rule_hit_reg <= {RULE_COUNT{1'b0}};
+        drop_frame_reg <= 1'b0;
+    end
+end
+
+wire [USER_WIDTH:0] fifo_tuser;
+
+assign m_axis_tuser = fifo_tuser[USER_WIDTH-1:0];
+
+// the extra tuser bit marks records to be dropped by the FIFO
+axis_fifo # (
+    .DATA_WIDTH(DATA_WIDTH),
+    .KEEP_ENABLE(1),
+    .KEEP_WIDTH(KEEP_WIDTH),
+    .LAST_ENABLE(1),
+    .ID_ENABLE(0),
+    .ID_WIDTH(1),
+    .DEST_ENABLE(0),
+    .DEST_WIDTH(1),
+    .USER_ENABLE(1),
+    .USER_WIDTH(USER_WIDTH+1),
+    .DEPTH(FIFO_DEPTH),
+    .FRAME_FIFO(1),
+    .USER_BAD_FRAME_VALUE({1'b1, {USER_WIDTH{1'b0}}}),
+    .USER_BAD_FRAME_MASK({1'b1, {USER_WIDTH{1'b0}}}),
+    .DROP_BAD_FRAME(1),
+    .DROP_WHEN_FULL(0)
+)
+filter_fifo (
+    .clk(clk),
+    .rst(rst),
+
+    // AXI input
+    .s_axis_tdata(s_axis_tdata),
+    .s_axis_tkeep(s_axis_tkeep),
+    .s_axis_tvalid(s_axis_tvalid),
+    .s_axis_tready(s_axis_tready),
+    .s_axis_tlast(s_axis_tlast),
+    .s_axis_tid(1'b0),
+    .s_axis_tdest(1'b0),
+    .s_axis_tuser({s_axis_tlast && drop, s_axis_tuser}),
+    // AXI output
+    .m_axis_tdata(m_axis_tdata),
+    .m_axis_tkeep(m_axis_tkeep),
+    .m_axis_tvalid(m_axis_tvalid),
+    .m_axis_tready(m_axis_tready),
+    .m_axis_tlast(m_axis_tlast),
+    .m_axis_tid(),
+    .m_axis_tdest(),
+    .m_axis_tuser(fifo_tuser),
+    // Status
+    .status_overflow(),
+    .status_bad_frame(),
+    .status_good_frame()
+);
+
+endmodule
+
+`resetall
@@ -0,0 +1,471 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * Frame FIFO for several AXI streams sharing one block RAM
+ *
+ * The RAM is split into pages of PAGE_SIZE bytes, which are handed to the
+ * ports on demand. The frames of a port are stored back to back in its pages,
+ * a page returns to the pool once its last word was read. A frame is dropped
+ * if its port needs a new page and none is left. The pages it already took
+ * are returned and the port continues after its last stored frame, so only
+ * complete frames are passed on, like in a frame FIFO with DROP_WHEN_FULL.
+ *
+ * MIN_PAGES pages are reserved for every port, the other ports cannot take
+ * them. MAX_PAGES limits the pages of a port, with MIN_PAGES = MAX_PAGES =
+ * DEPTH/PAGE_SIZE/PORTS the buffer behaves like a separate FIFO per port.
+ *
+ * Writes and reads are arbitrated round robin between the ports, one word
+ * per clock cycle each.
+ */
+module axis_shared_fifo #
+(
+    // Number of ports sharing the buffer
+    parameter PORTS = 2,
+    // Width of AXI stream interfaces in bits
+    parameter DATA_WIDTH = 64,
+    // tkeep signal width (words per cycle)
+    parameter KEEP_WIDTH = ((DATA_WIDTH+7)/8),
+    // Width of AXI stream tuser signal
+    parameter USER_WIDTH = 1,
+    // size of the buffer in bytes
+    parameter DEPTH = 12*2**10,
+    // size of a page in bytes
+    parameter PAGE_SIZE = 256,
+    // pages reserved for every port
+    parameter MIN_PAGES = 0,
+    // maximum number of pages of a port, 0 for no limit
+    parameter MAX_PAGES = 0
+)
+(
+    input  wire                                      clk,
+    input  wire                                      rst,
+
+    /*
+     * AXI4-Stream inputs, one per port
+     */
+    input  wire [PORTS*DATA_WIDTH-1:0]               s_axis_tdata,
+    input  wire [PORTS*KEEP_WIDTH-1:0]               s_axis_tkeep,
+    input  wire [PORTS-1:0]                          s_axis_tvalid,
+    output wire [PORTS-1:0]                          s_axis_tready,
+    input  wire [PORTS-1:0]                          s_axis_tlast,
+    input  wire [PORTS*USER_WIDTH-1:0]               s_axis_tuser,
+
+    /*
+     * AXI4-Stream outputs, one per port
+     */
+    output wire [PORTS*DATA_WIDTH-1:0]               m_axis_tdata,
+    output wire [PORTS*KEEP_WIDTH-1:0]               m_axis_tkeep,
+    output wire [PORTS-1:0]                          m_axis_tvalid,
+    input  wire [PORTS-1:0]                          m_axis_tready,
+    output wire [PORTS-1:0]                          m_axis_tlast,
+    output wire [PORTS*USER_WIDTH-1:0]               m_axis_tuser,
+
+    /*
+     * Status
+     */
+    // a frame was dropped because its port ran out of pages
+    output wire [PORTS-1:0]                          status_overflow,
+    // a frame was stored
+    output wire [PORTS-1:0]                          status_good_frame,
+    // pages held by each port
+    output wire [PORTS*($clog2(DEPTH/PAGE_SIZE)+1)-1:0] status_pages
+);
+
+localparam PAGE_COUNT = DEPTH/PAGE_SIZE;
+localparam PAGE_WORDS = PAGE_SIZE/KEEP_WIDTH;
+
+localparam PAGE_WIDTH = PAGE_COUNT > 1 ? $clog2(PAGE_COUNT) : 1;
+localparam OFFSET_WIDTH = $clog2(PAGE_WORDS);
+// number of pages, 0 to PAGE_COUNT
+localparam COUNT_WIDTH = $clog2(PAGE_COUNT) + 1;
+// number of words, 0 to PAGE_COUNT*PAGE_WORDS
+localparam WORDS_WIDTH = $clog2(PAGE_COUNT*PAGE_WORDS) + 1;
+localparam PORT_WIDTH = PORTS > 1 ? $clog2(PORTS) : 1;
+
+// a word in the RAM holds tdata, tkeep, tlast and tuser
+localparam WORD_WIDTH = DATA_WIDTH + KEEP_WIDTH + 1 + USER_WIDTH;
+localparam KEEP_OFFSET = DATA_WIDTH;
+localparam LAST_OFFSET = KEEP_OFFSET + KEEP_WIDTH;
+localparam USER_OFFSET = LAST_OFFSET + 1;
+
+// parameter assertions
+initial begin
+    if (PAGE_WORDS < 2 || 2**OFFSET_WIDTH != PAGE_WORDS) begin
+        $error("Error: PAGE_SIZE must be a power of two of at least two words (instance %m)");
+        $finish;
+    end
+
+    if (PAGE_COUNT * PAGE_SIZE != DEPTH) begin
+        $error("Error: DEPTH must be a multiple of PAGE_SIZE (instance %m)");
+        $finish;
+    end
+
+    if (PORTS * MIN_PAGES > PAGE_COUNT) begin
+        $error("Error: the reserved pages exceed the buffer (instance %m)");
+        $finish;
+    end
+
+    if (MAX_PAGES != 0 && MAX_PAGES < MIN_PAGES) begin
+        $error("Error: MAX_PAGES must not be smaller than MIN_PAGES (instance %m)");
+        $finish;
+    end
+end
+
+reg [WORD_WIDTH-1:0] mem[PAGE_COUNT*PAGE_WORDS-1:0];
+
+// pages of every port in the order they are filled, a ring of PAGE_COUNT
+// entries per port
+reg [PAGE_WIDTH-1:0] page_queue[PORTS*PAGE_COUNT-1:0];
+
+reg [PAGE_COUNT-1:0] free_map_reg = {PAGE_COUNT{1'b1}};
+
+// queue entry of the page being read and the one the next page is put into
+reg [PAGE_WIDTH-1:0] head_reg[PORTS-1:0];
+reg [PAGE_WIDTH-1:0] tail_reg[PORTS-1:0];
+reg [COUNT_WIDTH-1:0] pages_reg[PORTS-1:0];
+
+// write position, an offset of PAGE_WORDS requires a new page
+reg [PAGE_WIDTH-1:0] wr_page_reg[PORTS-1:0];
+reg [OFFSET_WIDTH:0] wr_offset_reg[PORTS-1:0];
+
+// write position after the last stored frame
+reg [PAGE_WIDTH-1:0] commit_tail_reg[PORTS-1:0];
+reg [PAGE_WIDTH-1:0] commit_page_reg[PORTS-1:0];
+reg [OFFSET_WIDTH:0] commit_offset_reg[PORTS-1:0];
+
+// pages taken and words written by the current frame
+reg [PAGE_COUNT-1:0] frame_pages_reg[PORTS-1:0];
+reg [COUNT_WIDTH-1:0] frame_page_count_reg[PORTS-1:0];
+reg [WORDS_WIDTH-1:0] frame_words_reg[PORTS-1:0];
+
+// rest of a dropped frame is discarded
+reg [PORTS-1:0] drop_reg = {PORTS{1'b0}};
+
+// words of stored frames, which were not read yet
+reg [WORDS_WIDTH-1:0] words_reg[PORTS-1:0];
+reg [OFFSET_WIDTH-1:0] rd_offset_reg[PORTS-1:0];
+
+reg [PORT_WIDTH-1:0] wr_last_port_reg = 0;
+reg [PORT_WIDTH-1:0] rd_last_port_reg = 0;
+
+reg [WORD_WIDTH-1:0] rd_data_reg = {WORD_WIDTH{1'b0}};
+reg rd_data_valid_reg = 1'b0;
+reg [PORT_WIDTH-1:0] rd_data_port_reg = 0;
+
+// two word output buffer per port
+reg [WORD_WIDTH-1:0] out_mem[2*PORTS-1:0];
+reg [1:0] out_count_reg[PORTS-1:0];
+reg [PORTS-1:0] out_wr_ptr_reg = {PORTS{1'b0}};
+reg [PORTS-1:0] out_rd_ptr_reg = {PORTS{1'b0}};
+
+reg [PORTS-1:0] status_overflow_reg = {PORTS{1'b0}};
+reg [PORTS-1:0] status_good_frame_reg = {PORTS{1'b0}};
+
+assign status_overflow = status_overflow_reg;
+assign status_good_frame = status_good_frame_reg;
+
+wire [PORTS-1:0] out_pop = m_axis_tvalid & m_axis_tready;
+
+integer i, j, f, wr_i, wr_k, rd_i, rd_k;
+
+// pages in use and pages still reserved for ports below MIN_PAGES
+reg [COUNT_WIDTH-1:0] pages_total;
+reg [COUNT_WIDTH-1:0] reserved_total;
+
+always @* begin
+    pages_total = 0;
+    reserved_total = 0;
+
+    for (j = 0; j < PORTS; j = j + 1) begin
+        pages_total = pages_total + pages_reg[j];
+        if (pages_reg[j] < MIN_PAGES) begin
+            reserved_total = reserved_total + (MIN_PAGES - pages_reg[j]);
+        end
+    end
+end
+
+wire [COUNT_WIDTH-1:0] free_count = PAGE_COUNT - pages_total;
+
+// lowest free page
+reg [PAGE_WIDTH-1:0] free_page;
+
+always @* begin
+    free_page = 0;
+
+    for (f = PAGE_COUNT-1; f >= 0; f = f - 1) begin
+        if (free_map_reg[f]) begin
+            free_page = f;
+        end
+    end
+end
+
+/*
+ * Write arbitration, the port after the last granted one goes first
+ */
+reg wr_valid;
+reg [PORT_WIDTH-1:0] wr_port;
+
+always @* begin
+    wr_valid = 1'b0;
+    wr_port = 0;
+
+    for (wr_i = PORTS; wr_i > 0; wr_i = wr_i - 1) begin
+        wr_k = wr_last_port_reg + wr_i;
+        if (wr_k >= PORTS) begin
+            wr_k = wr_k - PORTS;
+        end
+
+        if (s_axis_tvalid[wr_k] && !drop_reg[wr_k]) begin
+            wr_valid = 1'b1;
+            wr_port = wr_k;
+        end
+    end
+end
+
+wire [COUNT_WIDTH-1:0] wr_pages = pages_reg[wr_port];
+wire [COUNT_WIDTH-1:0] wr_reserved = wr_pages < MIN_PAGES ? MIN_PAGES - wr_pages : 0;
+
+// a port takes a page if it stays within its limit and the pages reserved
+// for the other ports remain free
+wire wr_page_available = free_count > reserved_total - wr_reserved &&
+    (MAX_PAGES == 0 || wr_pages < MAX_PAGES);
+
+wire wr_need_page = wr_offset_reg[wr_port] == PAGE_WORDS;
+wire wr_drop = wr_valid && wr_need_page && !wr_page_available;
+wire wr_en = wr_valid && !wr_drop;
+wire wr_alloc = wr_en && wr_need_page;
+wire wr_last = s_axis_tlast[wr_port];
+
+wire [PAGE_WIDTH-1:0] wr_page = wr_need_page ? free_page : wr_page_reg[wr_port];
+wire [OFFSET_WIDTH-1:0] wr_offset = wr_need_page ? 0 : wr_offset_reg[wr_port][OFFSET_WIDTH-1:0];
+
+wire [PAGE_WIDTH-1:0] wr_tail = tail_reg[wr_port];
+wire [PAGE_WIDTH-1:0] wr_tail_next = wr_tail == PAGE_COUNT-1 ? 0 : wr_tail + 1;
+
+wire [WORD_WIDTH-1:0] wr_data = {
+    s_axis_tuser[wr_port*USER_WIDTH +: USER_WIDTH],
+    s_axis_tlast[wr_port],
+    s_axis_tkeep[wr_port*KEEP_WIDTH +: KEEP_WIDTH],
+    s_axis_tdata[wr_port*DATA_WIDTH +: DATA_WIDTH]
+};
+
+/*
+ * Read arbitration
+ *
+ * A port is read if it holds words of stored frames and its output buffer
+ * has room for the word once the one in flight arrived.
+ */
+reg rd_valid;
+reg [PORT_WIDTH-1:0] rd_port;
+
+always @* begin
+    rd_valid = 1'b0;
+    rd_port = 0;
+
+    for (rd_i = PORTS; rd_i > 0; rd_i = rd_i - 1) begin
+        rd_k = rd_last_port_reg + rd_i;
+        if (rd_k >= PORTS) begin
+            rd_k = rd_k - PORTS;
+        end
+
+        if (words_reg[rd_k] != 0 &&
+                out_count_reg[rd_k] + (rd_data_valid_reg && rd_data_port_reg == rd_k) - out_pop[rd_k] < 2) begin
+            rd_valid = 1'b1;
+            rd_port = rd_k;
+        end
+    end
+end
+
+wire [PAGE_WIDTH-1:0] rd_head = head_reg[rd_port];
+wire [PAGE_WIDTH-1:0] rd_head_next = rd_head == PAGE_COUNT-1 ? 0 : rd_head + 1;
+wire [PAGE_WIDTH-1:0] rd_page = page_queue[rd_port*PAGE_COUNT + rd_head];
+wire [OFFSET_WIDTH-1:0] rd_offset = rd_offset_reg[rd_port];
+
+// the last word of a page was read
+wire rd_free = rd_valid && rd_offset == PAGE_WORDS-1;
+
+// memory
+always @(posedge clk) begin
+    if (wr_en) begin
+        mem[{wr_page, wr_offset}] <= wr_data;
+    end
+
+    if (rd_valid) begin
+        rd_data_reg <= mem[{rd_page, rd_offset}];
+    end
+end
+
+always @(posedge clk) begin
+    status_overflow_reg <= {PORTS{1'b0}};
+    status_good_frame_reg <= {PORTS{1'b0}};
+
+    rd_data_valid_reg <= rd_valid;
+
+    // discard the rest of a dropped frame
+    for (i = 0; i < PORTS; i = i + 1) begin
+        if (drop_reg[i] && s_axis_tvalid[i] && s_axis_tlast[i]) begin
+            drop_reg[i] <= 1'b0;
+        end
+    end
+
+    if (wr_valid) begin
+        wr_last_port_reg <= wr_port;
+    end
+
+    if (wr_drop) begin
+        // return the pages of the frame
+        free_map_reg <= free_map_reg | frame_pages_reg[wr_port];
+
+        tail_reg[wr_port] <= commit_tail_reg[wr_port];
+        wr_page_reg[wr_port] <= commit_page_reg[wr_port];
+        wr_offset_reg[wr_port] <= commit_offset_reg[wr_port];
+
+        frame_pages_reg[wr_port] <= {PAGE_COUNT{1'b0}};
+        frame_page_count_reg[wr_port] <= 0;
+        frame_words_reg[wr_port] <= 0;
+
+        drop_reg[wr_port] <= !wr_last;
+        status_overflow_reg[wr_port] <= 1'b1;
+    end
+
+    if (wr_alloc) begin
+        free_map_reg[free_page] <= 1'b0;
+        page_queue[wr_port*PAGE_COUNT + wr_tail] <= free_page;
+        tail_reg[wr_port] <= wr_tail_next;
+    end
+
+    if (wr_en) begin
+        wr_page_reg[wr_port] <= wr_page;
+        wr_offset_reg[wr_port] <= wr_offset + 1;
+
+        if (wr_last) begin
+            commit_tail_reg[wr_port] <= wr_need_page ? wr_tail_next : wr_tail;
+            commit_page_reg[wr_port] <= wr_page;
+            commit_offset_reg[wr_port] <= wr_offset + 1;
+
+            frame_pages_reg[wr_port] <= {PAGE_COUNT{1'b0}};
+            frame_page_count_reg[wr_port] <= 0;
+            frame_words_reg[wr_port] <= 0;
+
+            status_good_frame_reg[wr_port] <= 1'b1;
+        end else begin
+            if (wr_need_page) begin
+                frame_pages_reg[wr_port] <= frame_pages_reg[wr_port] | ({{(PAGE_COUNT-1){1'b0}}, 1'b1} << free_page);
+                frame_page_count_reg[wr_port] <= frame_page_count_reg[wr_port] + 1;
+            end
+            frame_words_reg[wr_port] <= frame_words_reg[wr_port] + 1;
+        end
+    end
+
+    if (rd_valid) begin
+        rd_last_port_reg <= rd_port;
+        rd_data_port_reg <= rd_port;
+        rd_offset_reg[rd_port] <= rd_offset + 1;
+
+        if (rd_free) begin
+            free_map_reg[rd_page] <= 1'b1;
+            head_reg[rd_port] <= rd_head_next;
+        end
+    end
+
+    for (i = 0; i < PORTS; i = i + 1) begin
+        pages_reg[i] <= pages_reg[i]
+            + (wr_alloc && wr_port == i)
+            - (wr_drop && wr_port == i ? frame_page_count_reg[i] : 0)
+            - (rd_free && rd_port == i);
+
+        words_reg[i] <= words_reg[i]
+            + (wr_en && wr_last && wr_port == i ? frame_words_reg[i] + 1 : 0)
+            - (rd_valid && rd_port == i);
+
+        if (rd_data_valid_reg && rd_data_port_reg == i) begin
+            out_mem[i*2 + out_wr_ptr_reg[i]] <= rd_data_reg;
+            out_wr_ptr_reg[i] <= !out_wr_ptr_reg[i];
+        end
+
+        if (out_pop[i]) begin
+            out_rd_ptr_reg[i] <= !out_rd_ptr_reg[i];
+        end
+
+        out_count_reg[i] <= out_count_reg[i] + (rd_data_valid_reg && rd_data_port_reg == i) - out_pop[i];
+    end
+
+    if (rst) begin
+        free_map_reg <= {PAGE_COUNT{1'b1}};
+        drop_reg <= {PORTS{1'b0}};
+        wr_last_port_reg <= 0;
+        rd_last_port_reg <= 0;
+        rd_data_valid_reg <= 1'b0;
+        out_wr_ptr_reg <= {PORTS{1'b0}};
+        out_rd_ptr_reg <= {PORTS{1'b0}};
+        status_overflow_reg <= {PORTS{1'b0}};
+        status_good_frame_reg <= {PORTS{1'b0}};
+
+        for (i = 0; i < PORTS; i = i + 1) begin
+            head_reg[i] <= 0;
+            tail_reg[i] <= 0;
+            pages_reg[i] <= 0;
+            wr_page_reg[i] <= 0;
+            wr_offset_reg[i] <= PAGE_WORDS;
+            commit_tail_reg[i] <= 0;
+            commit_page_reg[i] <= 0;
+            commit_offset_reg[i] <= PAGE_WORDS;
+            frame_pages_reg[i] <= {PAGE_COUNT{1'b0}};
+            frame_page_count_reg[i] <= 0;
+            frame_words_reg[i] <= 0;
+            words_reg[i] <= 0;
+            rd_offset_reg[i] <= 0;
+            out_count_reg[i] <= 0;
+        end
+    end
+end
+
+generate
+
+genvar p;
+
+for (p = 0; p < PORTS; p = p + 1) begin : port
+
+    wire [WORD_WIDTH-1:0] out_word = out_mem[p*2 + out_rd_ptr_reg[p]];
+
+    assign s_axis_tready[p] = drop_reg[p] || (wr_valid && wr_port == p);
+
+    assign m_axis_tdata[p*DATA_WIDTH +: DATA_WIDTH] = out_word[DATA_WIDTH-1:0];
+    assign m_axis_tkeep[p*KEEP_WIDTH +: KEEP_WIDTH] = out_word[KEEP_OFFSET +: KEEP_WIDTH];
+    assign m_axis_tlast[p] = out_word[LAST_OFFSET];
+    assign m_axis_tuser[p*USER_WIDTH +: USER_WIDTH] = out_word[USER_OFFSET +: USER_WIDTH];
+    assign m_axis_tvalid[p] = out_count_reg[p] != 0;
+
+    assign status_pages[p*COUNT_WIDTH +: COUNT_WIDTH] = pages_reg[p];
+
+end
+
+endgenerate
+
+endmodule
+
+`resetall
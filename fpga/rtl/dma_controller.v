@@ -50,6 +50,8 @@ module dma_controller #
     parameter AXI_ID_WIDTH = 8,
     // Maximum AXI burst length to generate
     parameter AXI_MAX_BURST_LEN = 8,
+    // Maximum number of outstanding AXI write bursts
+    parameter AXI_MAX_OUTSTANDING = 16,
     // Width of AXI address bus in bits
     parameter AXI_ADDR_WIDTH = 32,
     // Width of AXI stream interfaces in bits
@@ -65,7 +67,13 @@ module dma_controller #
     // Width of tag field
     parameter TAG_WIDTH = 8,
     // Width of data packets
-    parameter LEN_WIDTH = 16
+    parameter LEN_WIDTH = 16,
+    // Maximum length of a single record (PCAP header and frame) in packed mode
+    parameter PACKED_RECORD_LEN = 2**(LEN_WIDTH-1),
+    // Period of clk in ns, used for the interrupt coalescing timeout
+    parameter CLK_PERIOD_NS = 7,
+    // Fetch the next descriptor while a frame is written
+    parameter DESC_PREFETCH = 1
 )
 (
     input  wire                            clk,
@@ -163,6 +171,8 @@ parameter BRAM_ADDR_WIDTH = $clog2((2**AXIL_DESC_ADDR_WIDTH)/BRAM_WORD_SIZE);
 
 wire [AXI_ADDR_WIDTH-1:0] csr_axi_dma_addr;
 wire csr_enable;
+wire csr_pack_enable;
+wire [31:0] csr_pack_timeout;
 wire csr_soft_reset;
 wire csr_soft_reset_done = csr_soft_reset_done_reg;
 wire set_interrupt = set_interrupt_reg;
@@ -173,7 +183,8 @@ axil_dma_ctrl_regs # (
     .AXIL_DATA_WIDTH(AXIL_DATA_WIDTH),
     .AXIL_ADDR_WIDTH(AXIL_ADDR_WIDTH),
     .LEN_WIDTH(LEN_WIDTH),
-    .AXI_ADDR_WIDTH(AXI_ADDR_WIDTH)
+    .AXI_ADDR_WIDTH(AXI_ADDR_WIDTH),
+    .CLK_PERIOD_NS(CLK_PERIOD_NS)
 )
 axil_dma_ctrl_regs_inst (
     .clk(clk),
@@ -206,6 +217,8 @@ axil_dma_ctrl_regs_inst (
 
     .axi_dma_addr(csr_axi_dma_addr),
     .enable(csr_enable),
+    .pack_enable(csr_pack_enable),
+    .pack_timeout(csr_pack_timeout),
     .soft_reset(csr_soft_reset),
     .soft_reset_done(csr_soft_reset_done),
     .status_busy(status_busy),
@@ -296,13 +309,15 @@ axi_dma_wr #
 (
     .AXI_DATA_WIDTH(AXI_DATA_WIDTH),
     .AXI_ADDR_WIDTH(AXI_ADDR_WIDTH),
-    .AXI_MAX_BURST_LEN(8),
+    .AXI_ID_WIDTH(AXI_ID_WIDTH),
+    .AXI_MAX_BURST_LEN(AXI_MAX_BURST_LEN),
+    .AXI_MAX_OUTSTANDING(AXI_MAX_OUTSTANDING),
     .AXIS_LAST_ENABLE(1),
     .AXIS_DATA_WIDTH(AXIS_DATA_WIDTH),
     .LEN_WIDTH(LEN_WIDTH),
     .AXIS_USER_WIDTH(AXIS_USER_WIDTH),
     .ENABLE_SG(0),
-    .ENABLE_UNALIGNED(0)
+    .ENABLE_UNALIGNED(1)
 )
 axi_dma_wr_inst (
     .clk(clk),
@@ -311,7 +326,7 @@ axi_dma_wr_inst (
     /*
      * AXI write descriptor input
      */
-    .s_axis_write_desc_addr({axis_write_desc_addr[AXI_ADDR_WIDTH-1:LEN_WIDTH-1], {LEN_WIDTH-1{1'b0}}}),
+    .s_axis_write_desc_addr(axis_write_desc_addr),
     .s_axis_write_desc_len(axis_write_desc_len),
     .s_axis_write_desc_tag(),
     .s_axis_write_desc_valid(axis_write_desc_valid),
@@ -371,7 +386,7 @@ axi_dma_wr_inst (
 );
 
 wire bram_we = bram_we_reg;
-wire [BRAM_ADDR_WIDTH-1:0] bram_addr = bram_addr_reg;
+wire [BRAM_ADDR_WIDTH-1:0] bram_addr = bram_addr_reg + bram_prefetch_reg;
 wire [BRAM_DATA_WIDTH-1:0] bram_di;
 wire bram_en = bram_en_reg;
 wire [BRAM_DATA_WIDTH-1:0] bram_do = axis_desc_pipe_tdata;
@@ -424,10 +439,14 @@ localparam DESC_WIDTH = DESC_WORDS_WIDTH * DESC_WORDS;
 localparam DESC_LENGTH = DESC_WIDTH / 8;
 localparam RD_LENGTH_WIDTH = $clog2(DESC_LENGTH) + 1;
 
+// Width of the buffer length field used in the descriptors, limits the size
+// of a buffer in packed mode to 16 MiB
+localparam DESC_LEN_WIDTH = 24;
+
 dma_desc_regs # (
     .AXI_ADDR_WIDTH(AXI_ADDR_WIDTH),
     .AXIS_DATA_WIDTH(128),
-    .LEN_WIDTH(LEN_WIDTH),
+    .LEN_WIDTH(DESC_LEN_WIDTH),
     .DESC_WORDS(DESC_WORDS),
     .DESC_WORD_WIDTH(DESC_WORDS_WIDTH)
 )
@@ -435,8 +454,8 @@ dma_desc_regs_inst (
     .clk(clk),
     .rst(rst),
 
-    .data_in(bram_do),
-    .data_in_valid(bram_valid),
+    .data_in(desc_next_load ? desc_next_reg : bram_do),
+    .data_in_valid(bram_valid || desc_next_load),
 
     .data_out(bram_di),
 
@@ -449,24 +468,79 @@ dma_desc_regs_inst (
 );
 
 wire [AXI_ADDR_WIDTH-1:0] dma_write_desc_addr;
-wire [LEN_WIDTH-1:0] dma_write_desc_length;
+wire [DESC_LEN_WIDTH-1:0] dma_write_desc_length;
 wire dma_write_desc_empty;
 
-wire [LEN_WIDTH-1:0] axis_desc_mod_len = axis_desc_mod_len_reg;
+wire [DESC_LEN_WIDTH-1:0] axis_desc_mod_len = axis_desc_mod_len_reg;
 wire axis_desc_mod_valid = axis_desc_mod_valid_reg;
 
 reg [AXI_ADDR_WIDTH-1:0] axis_write_desc_addr_reg = {AXI_ADDR_WIDTH{1'b0}};
 reg [LEN_WIDTH-1:0] axis_write_desc_len_reg = {LEN_WIDTH{1'b0}};
 reg axis_write_desc_valid_reg = 1'b0;
 
-reg [LEN_WIDTH-1:0] axis_desc_mod_len_reg = {LEN_WIDTH{1'b0}};
+reg [DESC_LEN_WIDTH-1:0] axis_desc_mod_len_reg = {DESC_LEN_WIDTH{1'b0}};
 reg axis_desc_mod_valid_reg = 1'b0;
 
+/*
+ * Packed mode: records are written back to back into the buffer of the
+ * current descriptor. The descriptor stays open until the remaining space
+ * cannot hold another record of PACKED_RECORD_LEN bytes, the timeout expired
+ * or the DMA was disabled. The length written back to the descriptor is the
+ * number of bytes filled.
+ *
+ * The next record is started as soon as the data of the previous one was
+ * accepted by the AXI WR interface; its length is counted on the stream. The
+ * write responses are only awaited before the buffer is handed over, so the
+ * latency of the memory is hidden up to AXI_MAX_OUTSTANDING bursts.
+ */
+reg pack_open_reg = 1'b0;
+reg [DESC_LEN_WIDTH-1:0] pack_fill_reg = {DESC_LEN_WIDTH{1'b0}};
+reg [31:0] pack_timer_reg = 32'b0;
+
+reg [DESC_LEN_WIDTH-1:0] rec_bytes_reg = {DESC_LEN_WIDTH{1'b0}};
+reg [$clog2(AXI_MAX_OUTSTANDING):0] outstanding_reg = 0;
+reg [$clog2(AXIS_KEEP_WIDTH):0] beat_bytes;
+integer i;
+
+always @* begin
+    beat_bytes = 0;
+    for (i = 0; i < AXIS_KEEP_WIDTH; i = i + 1) begin
+        beat_bytes = beat_bytes + s_axis_tkeep[i];
+    end
+end
+
+wire [DESC_LEN_WIDTH-1:0] rec_len = rec_bytes_reg < axis_write_desc_len_reg ? rec_bytes_reg : axis_write_desc_len_reg;
+wire [DESC_LEN_WIDTH-1:0] pack_fill_next = pack_fill_reg + rec_len;
+wire [DESC_LEN_WIDTH-1:0] pack_space = dma_write_desc_length - pack_fill_reg;
+wire pack_timeout = pack_timer_reg >= csr_pack_timeout;
+wire pack_full = pack_space < PACKED_RECORD_LEN;
+
 reg bram_we_reg = 1'b0;
 reg [BRAM_ADDR_WIDTH-1:0] bram_addr_reg = {BRAM_ADDR_WIDTH{1'b0}};
 reg bram_en_reg = 1'b0;
 reg bram_valid_reg = 1'b0;
 
+/*
+ * Descriptor prefetch: while a frame is written, the descriptor following
+ * the current one is read into desc_next_reg. If the hardware owns it (empty
+ * flag set), the software does not modify it until it is handed over, so it
+ * stays valid until the DMA is disabled or reset. When the current descriptor
+ * is closed, the write of the next frame is issued from desc_next_reg in
+ * UPDATE_DESC_STATE, i.e. it overlaps the write back of the current
+ * descriptor, and the registers of dma_desc_regs are loaded in
+ * INCR_DESC_STATE instead of reading the descriptor RAM again.
+ */
+reg bram_prefetch_reg = 1'b0;
+reg desc_next_capture_reg = 1'b0;
+reg desc_next_read_reg = 1'b0;
+reg desc_next_valid_reg = 1'b0;
+reg desc_next_issued_reg = 1'b0;
+reg desc_loaded_reg = 1'b0;
+reg [BRAM_DATA_WIDTH-1:0] desc_next_reg = {BRAM_DATA_WIDTH{1'b0}};
+
+wire [AXI_ADDR_WIDTH-1:0] desc_next_addr = desc_next_reg[AXI_ADDR_WIDTH-1:0];
+wire [DESC_LEN_WIDTH-1:0] desc_next_length = desc_next_reg[64 +: DESC_LEN_WIDTH];
+
 reg set_interrupt_reg = 1'b0;
 reg csr_soft_reset_done_reg = 1'b0;
 
@@ -481,11 +555,24 @@ localparam [2:0]
     UPDATE_DESC_STATE = 3'd6,
     INCR_DESC_STATE = 3'd7;
 
+wire desc_next_load = state_reg == INCR_DESC_STATE && desc_next_valid_reg;
+
 always @(posedge clk) begin
     if (rst) begin
         state_reg <= IDLE_STATE;
         bram_en_reg <= 1'b0;
         bram_addr_reg <= 0;
+        bram_prefetch_reg <= 1'b0;
+        desc_next_capture_reg <= 1'b0;
+        desc_next_read_reg <= 1'b0;
+        desc_next_valid_reg <= 1'b0;
+        desc_next_issued_reg <= 1'b0;
+        desc_loaded_reg <= 1'b0;
+        pack_open_reg <= 1'b0;
+        pack_fill_reg <= 0;
+        pack_timer_reg <= 0;
+        rec_bytes_reg <= 0;
+        outstanding_reg <= 0;
     end else begin
         state_reg <= state_reg;
         axis_desc_mod_valid_reg <= 1'b0;
@@ -503,14 +590,54 @@ always @(posedge clk) begin
         axis_write_desc_len_reg <= axis_write_desc_len_reg;
         axis_write_desc_valid_reg <= axis_write_desc_valid_reg;
 
+        // Bytes of the record of the last write descriptor
+        if (axis_write_desc_valid && axis_write_desc_ready) begin
+            rec_bytes_reg <= 0;
+        end else if (s_axis_tvalid && s_axis_tready) begin
+            rec_bytes_reg <= rec_bytes_reg + beat_bytes;
+        end
+
+        // Records without a write response
+        if (axis_write_desc_valid && axis_write_desc_ready && !axis_write_desc_status_valid) begin
+            outstanding_reg <= outstanding_reg + 1;
+        end else if (!(axis_write_desc_valid && axis_write_desc_ready) && axis_write_desc_status_valid) begin
+            outstanding_reg <= outstanding_reg - 1;
+        end
+
+        pack_open_reg <= pack_open_reg;
+        pack_fill_reg <= pack_fill_reg;
+        pack_timer_reg <= pack_open_reg ? pack_timer_reg + 1 : 0;
+
+        bram_prefetch_reg <= 1'b0;
+        desc_next_capture_reg <= bram_prefetch_reg;
+
+        if (desc_next_capture_reg) begin
+            // Only a descriptor owned by the hardware is kept
+            desc_next_reg <= bram_do;
+            desc_next_valid_reg <= bram_do[96];
+        end
+
         case (state_reg)
             IDLE_STATE: begin
                 // Wait until there is some data pending
                 if (csr_soft_reset) begin
                     bram_addr_reg <= 0;
+                    pack_open_reg <= 1'b0;
+                    pack_fill_reg <= 0;
                     csr_soft_reset_done_reg <= 1'b1;
+                end else if (pack_open_reg && (!csr_enable || !csr_pack_enable || pack_timeout || pack_full)) begin
+                    // Close the buffer once all records were written
+                    if (outstanding_reg == 0) begin
+                        axis_desc_mod_len_reg <= pack_fill_reg;
+                        axis_desc_mod_valid_reg <= 1'b1;
+
+                        state_reg <= UPDATE_DESC_STATE;
+                    end
                 end else if (csr_enable) begin
-                    if (s_axis_tvalid) begin
+                    if (s_axis_tvalid && (pack_open_reg || desc_loaded_reg)) begin
+                        // Descriptor is still held in the registers
+                        state_reg <= WRITE_DESC_PREPARE_STATE;
+                    end else if (s_axis_tvalid) begin
                         bram_en_reg <= 1'b1;
                         bram_we_reg <= 1'b0;
 
@@ -532,8 +659,13 @@ always @(posedge clk) begin
                 if (csr_enable && !csr_soft_reset) begin
                     if (dma_write_desc_empty) begin
                         // Prepare the write descriptor
-                        axis_write_desc_addr_reg <= dma_write_desc_addr;
-                        axis_write_desc_len_reg <= dma_write_desc_length;
+                        if (csr_pack_enable) begin
+                            axis_write_desc_addr_reg <= dma_write_desc_addr + pack_fill_reg;
+                            axis_write_desc_len_reg <= pack_space < PACKED_RECORD_LEN ? pack_space : PACKED_RECORD_LEN;
+                        end else begin
+                            axis_write_desc_addr_reg <= {dma_write_desc_addr[AXI_ADDR_WIDTH-1:LEN_WIDTH-1], {LEN_WIDTH-1{1'b0}}};
+                            axis_write_desc_len_reg <= dma_write_desc_length;
+                        end
                         axis_write_desc_valid_reg <= 1'b1;
 
                         state_reg <= AWAIT_WRITE_DESC_ACK_STATE;
@@ -557,8 +689,25 @@ always @(posedge clk) begin
                 end
             end
             WRITE_DATA_STATE: begin
-                // wait until the AXI WR interface returned the transmitted length
-                if (axis_write_desc_status_valid) begin
+                if (DESC_PREFETCH && !desc_next_read_reg && !axis_write_desc_status_valid) begin
+                    // Read the next descriptor while the data is written
+                    bram_en_reg <= 1'b1;
+                    bram_we_reg <= 1'b0;
+                    bram_prefetch_reg <= 1'b1;
+                    desc_next_read_reg <= 1'b1;
+                end
+
+                if (csr_pack_enable) begin
+                    // wait until the AXI WR interface accepted the whole record
+                    if (axis_write_desc_ready && !axis_write_desc_valid_reg) begin
+                        pack_fill_reg <= pack_fill_next;
+                        pack_timer_reg <= 0;
+                        pack_open_reg <= 1'b1;
+
+                        state_reg <= IDLE_STATE;
+                    end
+                end else if (axis_write_desc_status_valid) begin
+                    // wait until the AXI WR interface returned the transmitted length
                     axis_desc_mod_len_reg <= axis_write_desc_status_len;
                     axis_desc_mod_valid_reg <= 1'b1;
 
@@ -571,28 +720,68 @@ always @(posedge clk) begin
 
                 set_interrupt_reg <= 1'b1;
 
+                if (desc_next_valid_reg && csr_enable && !csr_soft_reset && s_axis_tvalid) begin
+                    // Start the next frame with the prefetched descriptor
+                    if (csr_pack_enable) begin
+                        axis_write_desc_addr_reg <= desc_next_addr;
+                        axis_write_desc_len_reg <= desc_next_length < PACKED_RECORD_LEN ? desc_next_length : PACKED_RECORD_LEN;
+                    end else begin
+                        axis_write_desc_addr_reg <= {desc_next_addr[AXI_ADDR_WIDTH-1:LEN_WIDTH-1], {LEN_WIDTH-1{1'b0}}};
+                        axis_write_desc_len_reg <= desc_next_length;
+                    end
+                    axis_write_desc_valid_reg <= 1'b1;
+                    desc_next_issued_reg <= 1'b1;
+                end
+
                 state_reg <= INCR_DESC_STATE;
             end
             INCR_DESC_STATE: begin
                 bram_we_reg <= 1'b0;
                 bram_en_reg <= 1'b0;
 
-                if (csr_enable && !csr_soft_reset) begin
+                pack_open_reg <= 1'b0;
+                pack_fill_reg <= 0;
+
+                // The prefetched descriptor is loaded into the registers
+                desc_loaded_reg <= desc_next_valid_reg;
+                desc_next_read_reg <= 1'b0;
+                desc_next_valid_reg <= 1'b0;
+                desc_next_issued_reg <= 1'b0;
+
+                // The descriptor was handed over to the software, also when
+                // a packed buffer got closed because the DMA was disabled
+                if (!csr_soft_reset || desc_next_issued_reg) begin
                     bram_addr_reg <= bram_addr_reg + 1;
+                end
 
-                    if (s_axis_tvalid) begin
-                        bram_en_reg <= 1'b1;
-                        bram_we_reg <= 1'b0;
+                if (desc_next_issued_reg) begin
+                    // The next frame is already on its way
+                    if (axis_write_desc_ready) begin
+                        axis_write_desc_valid_reg <= 1'b0;
 
-                        state_reg <= DESC_RECV_STATE;
+                        state_reg <= WRITE_DATA_STATE;
                     end else begin
-                        state_reg <= IDLE_STATE;
+                        state_reg <= AWAIT_WRITE_DESC_ACK_STATE;
                     end
+                end else if (desc_next_valid_reg && csr_enable && !csr_soft_reset && s_axis_tvalid) begin
+                    state_reg <= WRITE_DESC_PREPARE_STATE;
+                end else if (csr_enable && !csr_soft_reset && s_axis_tvalid) begin
+                    bram_en_reg <= 1'b1;
+                    bram_we_reg <= 1'b0;
+
+                    state_reg <= DESC_RECV_STATE;
                 end else begin
                     state_reg <= IDLE_STATE;
                 end
             end
         endcase
+
+        if (!csr_enable || csr_soft_reset) begin
+            // The software may rewrite the descriptors
+            desc_next_read_reg <= 1'b0;
+            desc_next_valid_reg <= 1'b0;
+            desc_loaded_reg <= 1'b0;
+        end
     end
 end
 
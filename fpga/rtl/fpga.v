@@ -47,12 +47,27 @@ module fpga #
     parameter AXIL_MDIO_ADDR_WIDTH = 8,
     parameter AXIL_MDIO_STRB_WIDTH = (AXIL_MDIO_DATA_WIDTH/8),
 
+    parameter AXIL_FILTER_DATA_WIDTH = 32,
+    parameter AXIL_FILTER_ADDR_WIDTH = 10,
+    parameter AXIL_FILTER_STRB_WIDTH = (AXIL_FILTER_DATA_WIDTH/8),
+
+    parameter AXIL_CLOCK_DATA_WIDTH = 32,
+    parameter AXIL_CLOCK_ADDR_WIDTH = 8,
+    parameter AXIL_CLOCK_STRB_WIDTH = (AXIL_CLOCK_DATA_WIDTH/8),
+
     // AXI interface configuration (DMA)
-    parameter AXI_DMA_MAX_BURST_LEN = 8,
+    parameter AXI_DMA_MAX_BURST_LEN = 16,
+    // write acceptance of the HP ports
+    parameter AXI_DMA_MAX_OUTSTANDING = 8,
     parameter AXI_ID_WIDTH = 8,
     parameter AXI_ADDR_WIDTH = 32,
     parameter AXI_DATA_WIDTH = 64,
-    parameter AXI_STRB_WIDTH = (AXI_DATA_WIDTH/8)
+    parameter AXI_STRB_WIDTH = (AXI_DATA_WIDTH/8),
+
+    // Separate DMA channel per port (second channel on HP1)
+    parameter DMA_PER_PORT = 0,
+    // Receive buffer shared between the ports
+    parameter SHARED_BUFFER = 0
 )
 (
     /*
@@ -90,7 +105,13 @@ module fpga #
     input  wire        phy2_pme_n,
 
     output wire        phy2_mdc,
-    inout  wire        phy2_mdio
+    inout  wire        phy2_mdio,
+
+    /*
+     * Time synchronization line (PMOD JA)
+     */
+    input  wire        sync_in,
+    output wire        sync_out
 );
 
 
@@ -102,6 +123,7 @@ wire zynq_pl_reset;
 
 // Interrupts
 wire dma_irq;
+wire dma2_irq;
 
 // AXI lite DMA connections
 wire [AXIL_DMA_ADDR_WIDTH-1:0] axil_dma_awaddr;
@@ -145,6 +167,48 @@ wire [1:0]                          axil_dma_desc_rresp;
 wire                                axil_dma_desc_rvalid;
 wire                                axil_dma_desc_rready;
 
+// AXI lite DMA 2 connections
+wire [AXIL_DMA_ADDR_WIDTH-1:0] axil_dma2_awaddr;
+wire [2:0]                     axil_dma2_awprot;
+wire                           axil_dma2_awvalid;
+wire                           axil_dma2_awready;
+wire [AXIL_DMA_DATA_WIDTH-1:0] axil_dma2_wdata;
+wire [AXIL_DMA_STRB_WIDTH-1:0] axil_dma2_wstrb;
+wire                           axil_dma2_wvalid;
+wire                           axil_dma2_wready;
+wire [1:0]                     axil_dma2_bresp;
+wire                           axil_dma2_bvalid;
+wire                           axil_dma2_bready;
+wire [AXIL_DMA_ADDR_WIDTH-1:0] axil_dma2_araddr;
+wire [2:0]                     axil_dma2_arprot;
+wire                           axil_dma2_arvalid;
+wire                           axil_dma2_arready;
+wire [AXIL_DMA_DATA_WIDTH-1:0] axil_dma2_rdata;
+wire [1:0]                     axil_dma2_rresp;
+wire                           axil_dma2_rvalid;
+wire                           axil_dma2_rready;
+
+// AXI lite DMA 2 descriptor connections
+wire [AXIL_DMA_DESC_ADDR_WIDTH-1:0] axil_dma2_desc_awaddr;
+wire [2:0]                          axil_dma2_desc_awprot;
+wire                                axil_dma2_desc_awvalid;
+wire                                axil_dma2_desc_awready;
+wire [AXIL_DMA_DESC_DATA_WIDTH-1:0] axil_dma2_desc_wdata;
+wire [AXIL_DMA_DESC_STRB_WIDTH-1:0] axil_dma2_desc_wstrb;
+wire                                axil_dma2_desc_wvalid;
+wire                                axil_dma2_desc_wready;
+wire [1:0]                          axil_dma2_desc_bresp;
+wire                                axil_dma2_desc_bvalid;
+wire                                axil_dma2_desc_bready;
+wire [AXIL_DMA_DESC_ADDR_WIDTH-1:0] axil_dma2_desc_araddr;
+wire [2:0]                          axil_dma2_desc_arprot;
+wire                                axil_dma2_desc_arvalid;
+wire                                axil_dma2_desc_arready;
+wire [AXIL_DMA_DESC_DATA_WIDTH-1:0] axil_dma2_desc_rdata;
+wire [1:0]                          axil_dma2_desc_rresp;
+wire                                axil_dma2_desc_rvalid;
+wire                                axil_dma2_desc_rready;
+
 // AXI lite MAC connections
 wire [AXIL_MAC_ADDR_WIDTH-1:0] axil_mac_awaddr;
 wire [2:0]                     axil_mac_awprot;
@@ -187,6 +251,46 @@ wire [1:0]                      axil_mdio_rresp;
 wire                            axil_mdio_rvalid;
 wire                            axil_mdio_rready;
 
+wire [AXIL_FILTER_ADDR_WIDTH-1:0] axil_filter_awaddr;
+wire [2:0]                        axil_filter_awprot;
+wire                              axil_filter_awvalid;
+wire                              axil_filter_awready;
+wire [AXIL_FILTER_DATA_WIDTH-1:0] axil_filter_wdata;
+wire [AXIL_FILTER_STRB_WIDTH-1:0] axil_filter_wstrb;
+wire                              axil_filter_wvalid;
+wire                              axil_filter_wready;
+wire [1:0]                        axil_filter_bresp;
+wire                              axil_filter_bvalid;
+wire                              axil_filter_bready;
+wire [AXIL_FILTER_ADDR_WIDTH-1:0] axil_filter_araddr;
+wire [2:0]                        axil_filter_arprot;
+wire                              axil_filter_arvalid;
+wire                              axil_filter_arready;
+wire [AXIL_FILTER_DATA_WIDTH-1:0] axil_filter_rdata;
+wire [1:0]                        axil_filter_rresp;
+wire                              axil_filter_rvalid;
+wire                              axil_filter_rready;
+
+wire [AXIL_CLOCK_ADDR_WIDTH-1:0]  axil_clock_awaddr;
+wire [2:0]                        axil_clock_awprot;
+wire                              axil_clock_awvalid;
+wire                              axil_clock_awready;
+wire [AXIL_CLOCK_DATA_WIDTH-1:0]  axil_clock_wdata;
+wire [AXIL_CLOCK_STRB_WIDTH-1:0]  axil_clock_wstrb;
+wire                              axil_clock_wvalid;
+wire                              axil_clock_wready;
+wire [1:0]                        axil_clock_bresp;
+wire                              axil_clock_bvalid;
+wire                              axil_clock_bready;
+wire [AXIL_CLOCK_ADDR_WIDTH-1:0]  axil_clock_araddr;
+wire [2:0]                        axil_clock_arprot;
+wire                              axil_clock_arvalid;
+wire                              axil_clock_arready;
+wire [AXIL_CLOCK_DATA_WIDTH-1:0]  axil_clock_rdata;
+wire [1:0]                        axil_clock_rresp;
+wire                              axil_clock_rvalid;
+wire                              axil_clock_rready;
+
 // Zynq AXI DMA interface
 wire [AXI_ID_WIDTH-1:0]   axi_awid;
 wire [AXI_ADDR_WIDTH-1:0] axi_awaddr;
@@ -224,6 +328,43 @@ wire                      axi_rlast;
 wire                      axi_rvalid;
 wire                      axi_rready;
 
+// Zynq AXI DMA interface, second channel
+wire [AXI_ID_WIDTH-1:0]   axi2_awid;
+wire [AXI_ADDR_WIDTH-1:0] axi2_awaddr;
+wire [7:0]                axi2_awlen;
+wire [2:0]                axi2_awsize;
+wire [1:0]                axi2_awburst;
+wire                      axi2_awlock;
+wire [3:0]                axi2_awcache;
+wire [2:0]                axi2_awprot;
+wire                      axi2_awvalid;
+wire                      axi2_awready;
+wire [AXI_DATA_WIDTH-1:0] axi2_wdata;
+wire [AXI_STRB_WIDTH-1:0] axi2_wstrb;
+wire                      axi2_wlast;
+wire                      axi2_wvalid;
+wire                      axi2_wready;
+wire [AXI_ID_WIDTH-1:0]   axi2_bid;
+wire [1:0]                axi2_bresp;
+wire                      axi2_bvalid;
+wire                      axi2_bready;
+wire [AXI_ID_WIDTH-1:0]   axi2_arid;
+wire [AXI_ADDR_WIDTH-1:0] axi2_araddr;
+wire [7:0]                axi2_arlen;
+wire [2:0]                axi2_arsize;
+wire [1:0]                axi2_arburst;
+wire                      axi2_arlock;
+wire [3:0]                axi2_arcache;
+wire [2:0]                axi2_arprot;
+wire                      axi2_arvalid;
+wire                      axi2_arready;
+wire [AXI_ID_WIDTH-1:0]   axi2_rid;
+wire [AXI_DATA_WIDTH-1:0] axi2_rdata;
+wire [1:0]                axi2_rresp;
+wire                      axi2_rlast;
+wire                      axi2_rvalid;
+wire                      axi2_rready;
+
 zynq_ps zynq_ps_inst (
     .fclk_clk0(axi_clk),
     .fclk_clk1(counter_clk),
@@ -231,6 +372,7 @@ zynq_ps zynq_ps_inst (
     .fclk_reset1(counter_rst),
 
     .dma_irq(dma_irq),
+    .dma2_irq(dma2_irq),
 
     .m_axil_mdio_araddr(axil_mdio_araddr),
     .m_axil_mdio_arprot(axil_mdio_arprot),
@@ -252,6 +394,46 @@ zynq_ps zynq_ps_inst (
     .m_axil_mdio_wstrb(axil_mdio_wstrb),
     .m_axil_mdio_wvalid(axil_mdio_wvalid),
 
+    .m_axil_filter_araddr(axil_filter_araddr),
+    .m_axil_filter_arprot(axil_filter_arprot),
+    .m_axil_filter_arready(axil_filter_arready),
+    .m_axil_filter_arvalid(axil_filter_arvalid),
+    .m_axil_filter_awaddr(axil_filter_awaddr),
+    .m_axil_filter_awprot(axil_filter_awprot),
+    .m_axil_filter_awready(axil_filter_awready),
+    .m_axil_filter_awvalid(axil_filter_awvalid),
+    .m_axil_filter_bready(axil_filter_bready),
+    .m_axil_filter_bresp(axil_filter_bresp),
+    .m_axil_filter_bvalid(axil_filter_bvalid),
+    .m_axil_filter_rdata(axil_filter_rdata),
+    .m_axil_filter_rready(axil_filter_rready),
+    .m_axil_filter_rresp(axil_filter_rresp),
+    .m_axil_filter_rvalid(axil_filter_rvalid),
+    .m_axil_filter_wdata(axil_filter_wdata),
+    .m_axil_filter_wready(axil_filter_wready),
+    .m_axil_filter_wstrb(axil_filter_wstrb),
+    .m_axil_filter_wvalid(axil_filter_wvalid),
+
+    .m_axil_clock_araddr(axil_clock_araddr),
+    .m_axil_clock_arprot(axil_clock_arprot),
+    .m_axil_clock_arready(axil_clock_arready),
+    .m_axil_clock_arvalid(axil_clock_arvalid),
+    .m_axil_clock_awaddr(axil_clock_awaddr),
+    .m_axil_clock_awprot(axil_clock_awprot),
+    .m_axil_clock_awready(axil_clock_awready),
+    .m_axil_clock_awvalid(axil_clock_awvalid),
+    .m_axil_clock_bready(axil_clock_bready),
+    .m_axil_clock_bresp(axil_clock_bresp),
+    .m_axil_clock_bvalid(axil_clock_bvalid),
+    .m_axil_clock_rdata(axil_clock_rdata),
+    .m_axil_clock_rready(axil_clock_rready),
+    .m_axil_clock_rresp(axil_clock_rresp),
+    .m_axil_clock_rvalid(axil_clock_rvalid),
+    .m_axil_clock_wdata(axil_clock_wdata),
+    .m_axil_clock_wready(axil_clock_wready),
+    .m_axil_clock_wstrb(axil_clock_wstrb),
+    .m_axil_clock_wvalid(axil_clock_wvalid),
+
     .m_axil_dma_araddr(axil_dma_araddr),
     .m_axil_dma_arprot(axil_dma_arprot),
     .m_axil_dma_arready(axil_dma_arready),
@@ -292,6 +474,46 @@ zynq_ps zynq_ps_inst (
     .m_axil_dma_desc_wstrb(axil_dma_desc_wstrb),
     .m_axil_dma_desc_wvalid(axil_dma_desc_wvalid),
 
+    .m_axil_dma2_araddr(axil_dma2_araddr),
+    .m_axil_dma2_arprot(axil_dma2_arprot),
+    .m_axil_dma2_arready(axil_dma2_arready),
+    .m_axil_dma2_arvalid(axil_dma2_arvalid),
+    .m_axil_dma2_awaddr(axil_dma2_awaddr),
+    .m_axil_dma2_awprot(axil_dma2_awprot),
+    .m_axil_dma2_awready(axil_dma2_awready),
+    .m_axil_dma2_awvalid(axil_dma2_awvalid),
+    .m_axil_dma2_bready(axil_dma2_bready),
+    .m_axil_dma2_bresp(axil_dma2_bresp),
+    .m_axil_dma2_bvalid(axil_dma2_bvalid),
+    .m_axil_dma2_rdata(axil_dma2_rdata),
+    .m_axil_dma2_rready(axil_dma2_rready),
+    .m_axil_dma2_rresp(axil_dma2_rresp),
+    .m_axil_dma2_rvalid(axil_dma2_rvalid),
+    .m_axil_dma2_wdata(axil_dma2_wdata),
+    .m_axil_dma2_wready(axil_dma2_wready),
+    .m_axil_dma2_wstrb(axil_dma2_wstrb),
+    .m_axil_dma2_wvalid(axil_dma2_wvalid),
+
+    .m_axil_dma2_desc_araddr(axil_dma2_desc_araddr),
+    .m_axil_dma2_desc_arprot(axil_dma2_desc_arprot),
+    .m_axil_dma2_desc_arready(axil_dma2_desc_arready),
+    .m_axil_dma2_desc_arvalid(axil_dma2_desc_arvalid),
+    .m_axil_dma2_desc_awaddr(axil_dma2_desc_awaddr),
+    .m_axil_dma2_desc_awprot(axil_dma2_desc_awprot),
+    .m_axil_dma2_desc_awready(axil_dma2_desc_awready),
+    .m_axil_dma2_desc_awvalid(axil_dma2_desc_awvalid),
+    .m_axil_dma2_desc_bready(axil_dma2_desc_bready),
+    .m_axil_dma2_desc_bresp(axil_dma2_desc_bresp),
+    .m_axil_dma2_desc_bvalid(axil_dma2_desc_bvalid),
+    .m_axil_dma2_desc_rdata(axil_dma2_desc_rdata),
+    .m_axil_dma2_desc_rready(axil_dma2_desc_rready),
+    .m_axil_dma2_desc_rresp(axil_dma2_desc_rresp),
+    .m_axil_dma2_desc_rvalid(axil_dma2_desc_rvalid),
+    .m_axil_dma2_desc_wdata(axil_dma2_desc_wdata),
+    .m_axil_dma2_desc_wready(axil_dma2_desc_wready),
+    .m_axil_dma2_desc_wstrb(axil_dma2_desc_wstrb),
+    .m_axil_dma2_desc_wvalid(axil_dma2_desc_wvalid),
+
     .m_axil_mac_araddr(axil_mac_araddr),
     .m_axil_mac_arprot(axil_mac_arprot),
     .m_axil_mac_arready(axil_mac_arready),
@@ -348,7 +570,45 @@ zynq_ps zynq_ps_inst (
     .s_axi_dma_wlast(axi_wlast),
     .s_axi_dma_wready(axi_wready),
     .s_axi_dma_wstrb(axi_wstrb),
-    .s_axi_dma_wvalid(axi_wvalid)
+    .s_axi_dma_wvalid(axi_wvalid),
+
+    .s_axi_dma2_araddr(axi2_araddr),
+    .s_axi_dma2_arburst(axi2_arburst),
+    .s_axi_dma2_arcache(axi2_arcache),
+    .s_axi_dma2_arid(axi2_arid),
+    .s_axi_dma2_arlen(axi2_arlen),
+    .s_axi_dma2_arlock(axi2_arlock),
+    .s_axi_dma2_arprot({3'b0}),
+    .s_axi_dma2_arqos({4{1'b0}}),
+    .s_axi_dma2_arready(axi2_arready),
+    .s_axi_dma2_arsize(axi2_arsize),
+    .s_axi_dma2_arvalid(axi2_arvalid),
+    .s_axi_dma2_awaddr(axi2_awaddr),
+    .s_axi_dma2_awburst(axi2_awburst),
+    .s_axi_dma2_awcache(axi2_awcache),
+    .s_axi_dma2_awid(axi2_awid),
+    .s_axi_dma2_awlen(axi2_awlen),
+    .s_axi_dma2_awlock(axi2_awlock),
+    .s_axi_dma2_awprot(3'b000),
+    .s_axi_dma2_awqos({4{1'b0}}),
+    .s_axi_dma2_awready(axi2_awready),
+    .s_axi_dma2_awsize(axi2_awsize),
+    .s_axi_dma2_awvalid(axi2_awvalid),
+    .s_axi_dma2_bid(axi2_bid),
+    .s_axi_dma2_bready(axi2_bready),
+    .s_axi_dma2_bresp(axi2_bresp),
+    .s_axi_dma2_bvalid(axi2_bvalid),
+    .s_axi_dma2_rdata(axi2_rdata),
+    .s_axi_dma2_rid(axi2_rid),
+    .s_axi_dma2_rlast(axi2_rlast),
+    .s_axi_dma2_rready(axi2_rready),
+    .s_axi_dma2_rresp(axi2_rresp),
+    .s_axi_dma2_rvalid(axi2_rvalid),
+    .s_axi_dma2_wdata(axi2_wdata),
+    .s_axi_dma2_wlast(axi2_wlast),
+    .s_axi_dma2_wready(axi2_wready),
+    .s_axi_dma2_wstrb(axi2_wstrb),
+    .s_axi_dma2_wvalid(axi2_wvalid)
 );
 
 wire axi_clk;
@@ -373,11 +633,18 @@ fpga_core # (
     .AXIL_DMA_DESC_ADDR_WIDTH(AXIL_DMA_DESC_ADDR_WIDTH),
     .AXIL_MDIO_DATA_WIDTH(AXIL_MDIO_DATA_WIDTH),
     .AXIL_MDIO_ADDR_WIDTH(AXIL_MDIO_ADDR_WIDTH),
+    .AXIL_FILTER_DATA_WIDTH(AXIL_FILTER_DATA_WIDTH),
+    .AXIL_FILTER_ADDR_WIDTH(AXIL_FILTER_ADDR_WIDTH),
+    .AXIL_CLOCK_DATA_WIDTH(AXIL_CLOCK_DATA_WIDTH),
+    .AXIL_CLOCK_ADDR_WIDTH(AXIL_CLOCK_ADDR_WIDTH),
 
     .AXI_DATA_WIDTH(AXI_DATA_WIDTH),
     .AXI_ADDR_WIDTH(AXI_ADDR_WIDTH),
     .AXI_ID_WIDTH(AXI_ID_WIDTH),
-    .AXI_MAX_BURST_LEN(AXI_DMA_MAX_BURST_LEN)
+    .AXI_MAX_BURST_LEN(AXI_DMA_MAX_BURST_LEN),
+    .AXI_MAX_OUTSTANDING(AXI_DMA_MAX_OUTSTANDING),
+    .DMA_PER_PORT(DMA_PER_PORT),
+    .SHARED_BUFFER(SHARED_BUFFER)
 )
 fpga_core_inst (
     .axi_clk(axi_clk),
@@ -423,6 +690,43 @@ fpga_core_inst (
     .m_axi_rready(axi_rready),
     .dma_irq(dma_irq),
 
+    .m_axi2_awid(axi2_awid),
+    .m_axi2_awaddr(axi2_awaddr),
+    .m_axi2_awlen(axi2_awlen),
+    .m_axi2_awsize(axi2_awsize),
+    .m_axi2_awburst(axi2_awburst),
+    .m_axi2_awlock(axi2_awlock),
+    .m_axi2_awcache(axi2_awcache),
+    .m_axi2_awprot(axi2_awprot),
+    .m_axi2_awvalid(axi2_awvalid),
+    .m_axi2_awready(axi2_awready),
+    .m_axi2_wdata(axi2_wdata),
+    .m_axi2_wstrb(axi2_wstrb),
+    .m_axi2_wlast(axi2_wlast),
+    .m_axi2_wvalid(axi2_wvalid),
+    .m_axi2_wready(axi2_wready),
+    .m_axi2_bid(axi2_bid),
+    .m_axi2_bresp(axi2_bresp),
+    .m_axi2_bvalid(axi2_bvalid),
+    .m_axi2_bready(axi2_bready),
+    .m_axi2_arid(axi2_arid),
+    .m_axi2_araddr(axi2_araddr),
+    .m_axi2_arlen(axi2_arlen),
+    .m_axi2_arsize(axi2_arsize),
+    .m_axi2_arburst(axi2_arburst),
+    .m_axi2_arlock(axi2_arlock),
+    .m_axi2_arcache(axi2_arcache),
+    .m_axi2_arprot(axi2_arprot),
+    .m_axi2_arvalid(axi2_arvalid),
+    .m_axi2_arready(axi2_arready),
+    .m_axi2_rid(axi2_rid),
+    .m_axi2_rdata(axi2_rdata),
+    .m_axi2_rresp(axi2_rresp),
+    .m_axi2_rlast(axi2_rlast),
+    .m_axi2_rvalid(axi2_rvalid),
+    .m_axi2_rready(axi2_rready),
+    .dma2_irq(dma2_irq),
+
     .s_axil_mac_awaddr(axil_mac_awaddr),
     .s_axil_mac_awprot(axil_mac_awprot),
     .s_axil_mac_awvalid(axil_mac_awvalid),
@@ -483,6 +787,46 @@ fpga_core_inst (
     .s_axil_dma_desc_rvalid(axil_dma_desc_rvalid),
     .s_axil_dma_desc_rready(axil_dma_desc_rready),
 
+    .s_axil_dma2_awaddr(axil_dma2_awaddr),
+    .s_axil_dma2_awprot(axil_dma2_awprot),
+    .s_axil_dma2_awvalid(axil_dma2_awvalid),
+    .s_axil_dma2_awready(axil_dma2_awready),
+    .s_axil_dma2_wdata(axil_dma2_wdata),
+    .s_axil_dma2_wstrb(axil_dma2_wstrb),
+    .s_axil_dma2_wvalid(axil_dma2_wvalid),
+    .s_axil_dma2_wready(axil_dma2_wready),
+    .s_axil_dma2_bresp(axil_dma2_bresp),
+    .s_axil_dma2_bvalid(axil_dma2_bvalid),
+    .s_axil_dma2_bready(axil_dma2_bready),
+    .s_axil_dma2_araddr(axil_dma2_araddr),
+    .s_axil_dma2_arprot(axil_dma2_arprot),
+    .s_axil_dma2_arvalid(axil_dma2_arvalid),
+    .s_axil_dma2_arready(axil_dma2_arready),
+    .s_axil_dma2_rdata(axil_dma2_rdata),
+    .s_axil_dma2_rresp(axil_dma2_rresp),
+    .s_axil_dma2_rvalid(axil_dma2_rvalid),
+    .s_axil_dma2_rready(axil_dma2_rready),
+
+    .s_axil_dma2_desc_awaddr(axil_dma2_desc_awaddr),
+    .s_axil_dma2_desc_awprot(axil_dma2_desc_awprot),
+    .s_axil_dma2_desc_awvalid(axil_dma2_desc_awvalid),
+    .s_axil_dma2_desc_awready(axil_dma2_desc_awready),
+    .s_axil_dma2_desc_wdata(axil_dma2_desc_wdata),
+    .s_axil_dma2_desc_wstrb(axil_dma2_desc_wstrb),
+    .s_axil_dma2_desc_wvalid(axil_dma2_desc_wvalid),
+    .s_axil_dma2_desc_wready(axil_dma2_desc_wready),
+    .s_axil_dma2_desc_bresp(axil_dma2_desc_bresp),
+    .s_axil_dma2_desc_bvalid(axil_dma2_desc_bvalid),
+    .s_axil_dma2_desc_bready(axil_dma2_desc_bready),
+    .s_axil_dma2_desc_araddr(axil_dma2_desc_araddr),
+    .s_axil_dma2_desc_arprot(axil_dma2_desc_arprot),
+    .s_axil_dma2_desc_arvalid(axil_dma2_desc_arvalid),
+    .s_axil_dma2_desc_arready(axil_dma2_desc_arready),
+    .s_axil_dma2_desc_rdata(axil_dma2_desc_rdata),
+    .s_axil_dma2_desc_rresp(axil_dma2_desc_rresp),
+    .s_axil_dma2_desc_rvalid(axil_dma2_desc_rvalid),
+    .s_axil_dma2_desc_rready(axil_dma2_desc_rready),
+
     .s_axil_mdio_araddr(axil_mdio_araddr),
     .s_axil_mdio_arprot(axil_mdio_arprot),
     .s_axil_mdio_arready(axil_mdio_arready),
@@ -503,6 +847,46 @@ fpga_core_inst (
     .s_axil_mdio_wstrb(axil_mdio_wstrb),
     .s_axil_mdio_wvalid(axil_mdio_wvalid),
 
+    .s_axil_filter_araddr(axil_filter_araddr),
+    .s_axil_filter_arprot(axil_filter_arprot),
+    .s_axil_filter_arready(axil_filter_arready),
+    .s_axil_filter_arvalid(axil_filter_arvalid),
+    .s_axil_filter_awaddr(axil_filter_awaddr),
+    .s_axil_filter_awprot(axil_filter_awprot),
+    .s_axil_filter_awready(axil_filter_awready),
+    .s_axil_filter_awvalid(axil_filter_awvalid),
+    .s_axil_filter_bready(axil_filter_bready),
+    .s_axil_filter_bresp(axil_filter_bresp),
+    .s_axil_filter_bvalid(axil_filter_bvalid),
+    .s_axil_filter_rdata(axil_filter_rdata),
+    .s_axil_filter_rready(axil_filter_rready),
+    .s_axil_filter_rresp(axil_filter_rresp),
+    .s_axil_filter_rvalid(axil_filter_rvalid),
+    .s_axil_filter_wdata(axil_filter_wdata),
+    .s_axil_filter_wready(axil_filter_wready),
+    .s_axil_filter_wstrb(axil_filter_wstrb),
+    .s_axil_filter_wvalid(axil_filter_wvalid),
+
+    .s_axil_clock_araddr(axil_clock_araddr),
+    .s_axil_clock_arprot(axil_clock_arprot),
+    .s_axil_clock_arready(axil_clock_arready),
+    .s_axil_clock_arvalid(axil_clock_arvalid),
+    .s_axil_clock_awaddr(axil_clock_awaddr),
+    .s_axil_clock_awprot(axil_clock_awprot),
+    .s_axil_clock_awready(axil_clock_awready),
+    .s_axil_clock_awvalid(axil_clock_awvalid),
+    .s_axil_clock_bready(axil_clock_bready),
+    .s_axil_clock_bresp(axil_clock_bresp),
+    .s_axil_clock_bvalid(axil_clock_bvalid),
+    .s_axil_clock_rdata(axil_clock_rdata),
+    .s_axil_clock_rready(axil_clock_rready),
+    .s_axil_clock_rresp(axil_clock_rresp),
+    .s_axil_clock_rvalid(axil_clock_rvalid),
+    .s_axil_clock_wdata(axil_clock_wdata),
+    .s_axil_clock_wready(axil_clock_wready),
+    .s_axil_clock_wstrb(axil_clock_wstrb),
+    .s_axil_clock_wvalid(axil_clock_wvalid),
+
     .phy1_rgmii_rx_clk(phy1_rgmii_rx_clk),
     .phy1_rgmii_rxd(phy1_rgmii_rxd),
     .phy1_rgmii_rx_ctl(phy1_rgmii_rx_ctl),
@@ -527,7 +911,10 @@ fpga_core_inst (
     .phy2_pme_n(phy2_pme_n),
 
     .phy2_mdc(phy2_mdc),
-    .phy2_mdio(phy2_mdio)
+    .phy2_mdio(phy2_mdio),
+
+    .sync_in(sync_in),
+    .sync_out(sync_out)
 );
 
 
@@ -41,7 +41,6 @@ module fpga_core #
     parameter CLOCK_INPUT_STYLE = "BUFR",
     // Use 90 degree clock for RGMII transmit ("TRUE", "FALSE")
     parameter USE_CLK90 = "FALSE",
-    // Width of AXI data bus in bits
 
     // AXI lite interface configuration (control)
     parameter AXIL_DMA_DATA_WIDTH = 32,
@@ -61,7 +60,16 @@ module fpga_core #
     parameter AXIL_MDIO_STRB_WIDTH = (AXIL_MDIO_DATA_WIDTH/8),
     parameter MDIO_CLK_PRESCALE = 26,
 
-    parameter AXI_DATA_WIDTH = 32,
+    parameter AXIL_FILTER_DATA_WIDTH = 32,
+    parameter AXIL_FILTER_ADDR_WIDTH = 10,
+    parameter AXIL_FILTER_STRB_WIDTH = (AXIL_FILTER_DATA_WIDTH/8),
+
+    parameter AXIL_CLOCK_DATA_WIDTH = 32,
+    parameter AXIL_CLOCK_ADDR_WIDTH = 8,
+    parameter AXIL_CLOCK_STRB_WIDTH = (AXIL_CLOCK_DATA_WIDTH/8),
+
+    // Width of AXI data bus in bits (the records are made of 64 bit words)
+    parameter AXI_DATA_WIDTH = 64,
     // Width of AXI address bus in bits
     parameter AXI_ADDR_WIDTH = 32,
     // Width of AXI wstrb (width of data bus in words)
@@ -70,8 +78,18 @@ module fpga_core #
     parameter AXI_ID_WIDTH = 8,
     // Width of AXI DEST signal
     parameter AXI_DEST_WIDTH = 8,
-    // Maximum AXI burst length to generate
-    parameter AXI_MAX_BURST_LEN = 256
+    // Maximum AXI burst length to generate (at most 16 on the AXI3 HP ports)
+    parameter AXI_MAX_BURST_LEN = 16,
+    // Maximum number of outstanding AXI write bursts of a DMA controller
+    parameter AXI_MAX_OUTSTANDING = 16,
+
+    // Give each port its own DMA controller, descriptor ring and IRQ on the
+    // second AXI master, instead of arbitrating both ports into a single one
+    parameter DMA_PER_PORT = 0,
+
+    // Hand the receive buffer to the ports page by page on demand, instead of
+    // splitting it into a fixed FIFO per port
+    parameter SHARED_BUFFER = 0
 )
 (
     input wire                                 axi_clk,
@@ -121,6 +139,47 @@ module fpga_core #
 
     output wire                                dma_irq,
 
+    /*
+     * AXI master interface (second DMA channel, port 2)
+     */
+    output wire [AXI_ID_WIDTH-1:0]             m_axi2_awid,
+    output wire [AXI_ADDR_WIDTH-1:0]           m_axi2_awaddr,
+    output wire [7:0]                          m_axi2_awlen,
+    output wire [2:0]                          m_axi2_awsize,
+    output wire [1:0]                          m_axi2_awburst,
+    output wire                                m_axi2_awlock,
+    output wire [3:0]                          m_axi2_awcache,
+    output wire [2:0]                          m_axi2_awprot,
+    output wire                                m_axi2_awvalid,
+    input  wire                                m_axi2_awready,
+    output wire [AXI_DATA_WIDTH-1:0]           m_axi2_wdata,
+    output wire [AXI_STRB_WIDTH-1:0]           m_axi2_wstrb,
+    output wire                                m_axi2_wlast,
+    output wire                                m_axi2_wvalid,
+    input  wire                                m_axi2_wready,
+    input  wire [AXI_ID_WIDTH-1:0]             m_axi2_bid,
+    input  wire [1:0]                          m_axi2_bresp,
+    input  wire                                m_axi2_bvalid,
+    output wire                                m_axi2_bready,
+    output wire [AXI_ID_WIDTH-1:0]             m_axi2_arid,
+    output wire [AXI_ADDR_WIDTH-1:0]           m_axi2_araddr,
+    output wire [7:0]                          m_axi2_arlen,
+    output wire [2:0]                          m_axi2_arsize,
+    output wire [1:0]                          m_axi2_arburst,
+    output wire                                m_axi2_arlock,
+    output wire [3:0]                          m_axi2_arcache,
+    output wire [2:0]                          m_axi2_arprot,
+    output wire                                m_axi2_arvalid,
+    input  wire                                m_axi2_arready,
+    input  wire [AXI_ID_WIDTH-1:0]             m_axi2_rid,
+    input  wire [AXI_DATA_WIDTH-1:0]           m_axi2_rdata,
+    input  wire [1:0]                          m_axi2_rresp,
+    input  wire                                m_axi2_rlast,
+    input  wire                                m_axi2_rvalid,
+    output wire                                m_axi2_rready,
+
+    output wire                                dma2_irq,
+
     /*
      * AXI lite slave interface
      */
@@ -166,6 +225,48 @@ module fpga_core #
     output wire                                s_axil_dma_desc_rvalid,
     input  wire                                s_axil_dma_desc_rready,
 
+    input  wire [AXIL_DMA_ADDR_WIDTH-1:0]      s_axil_dma2_awaddr,
+    input  wire [2:0]                          s_axil_dma2_awprot,
+    input  wire                                s_axil_dma2_awvalid,
+    output wire                                s_axil_dma2_awready,
+    input  wire [AXIL_DMA_DATA_WIDTH-1:0]      s_axil_dma2_wdata,
+    input  wire [3:0]                          s_axil_dma2_wstrb,
+    input  wire                                s_axil_dma2_wvalid,
+    output wire                                s_axil_dma2_wready,
+    output wire [1:0]                          s_axil_dma2_bresp,
+    output wire                                s_axil_dma2_bvalid,
+    input  wire                                s_axil_dma2_bready,
+
+    input  wire [AXIL_DMA_ADDR_WIDTH-1:0]      s_axil_dma2_araddr,
+    input  wire [2:0]                          s_axil_dma2_arprot,
+    input  wire                                s_axil_dma2_arvalid,
+    output wire                                s_axil_dma2_arready,
+    output wire [AXIL_DMA_DATA_WIDTH-1:0]      s_axil_dma2_rdata,
+    output wire [1:0]                          s_axil_dma2_rresp,
+    output wire                                s_axil_dma2_rvalid,
+    input  wire                                s_axil_dma2_rready,
+
+    input  wire [AXIL_DMA_DESC_ADDR_WIDTH-1:0] s_axil_dma2_desc_awaddr,
+    input  wire [2:0]                          s_axil_dma2_desc_awprot,
+    input  wire                                s_axil_dma2_desc_awvalid,
+    output wire                                s_axil_dma2_desc_awready,
+    input  wire [AXIL_DMA_DESC_DATA_WIDTH-1:0] s_axil_dma2_desc_wdata,
+    input  wire [3:0]                          s_axil_dma2_desc_wstrb,
+    input  wire                                s_axil_dma2_desc_wvalid,
+    output wire                                s_axil_dma2_desc_wready,
+    output wire [1:0]                          s_axil_dma2_desc_bresp,
+    output wire                                s_axil_dma2_desc_bvalid,
+    input  wire                                s_axil_dma2_desc_bready,
+
+    input  wire [AXIL_DMA_DESC_ADDR_WIDTH-1:0] s_axil_dma2_desc_araddr,
+    input  wire [2:0]                          s_axil_dma2_desc_arprot,
+    input  wire                                s_axil_dma2_desc_arvalid,
+    output wire                                s_axil_dma2_desc_arready,
+    output wire [AXIL_DMA_DESC_DATA_WIDTH-1:0] s_axil_dma2_desc_rdata,
+    output wire [1:0]                          s_axil_dma2_desc_rresp,
+    output wire                                s_axil_dma2_desc_rvalid,
+    input  wire                                s_axil_dma2_desc_rready,
+
     input  wire [AXIL_MAC_ADDR_WIDTH-1:0]      s_axil_mac_awaddr,
     input  wire [2:0]                          s_axil_mac_awprot,
     input  wire                                s_axil_mac_awvalid,
@@ -209,6 +310,48 @@ module fpga_core #
     output wire                                s_axil_mdio_rvalid,
     input  wire                                s_axil_mdio_rready,
 
+    input  wire [AXIL_FILTER_ADDR_WIDTH-1:0]   s_axil_filter_awaddr,
+    input  wire [2:0]                          s_axil_filter_awprot,
+    input  wire                                s_axil_filter_awvalid,
+    output wire                                s_axil_filter_awready,
+    input  wire [AXIL_FILTER_DATA_WIDTH-1:0]   s_axil_filter_wdata,
+    input  wire [3:0]                          s_axil_filter_wstrb,
+    input  wire                                s_axil_filter_wvalid,
+    output wire                                s_axil_filter_wready,
+    output wire [1:0]                          s_axil_filter_bresp,
+    output wire                                s_axil_filter_bvalid,
+    input  wire                                s_axil_filter_bready,
+
+    input  wire [AXIL_FILTER_ADDR_WIDTH-1:0]   s_axil_filter_araddr,
+    input  wire [2:0]                          s_axil_filter_arprot,
+    input  wire                                s_axil_filter_arvalid,
+    output wire                                s_axil_filter_arready,
+    output wire [AXIL_FILTER_DATA_WIDTH-1:0]   s_axil_filter_rdata,
+    output wire [1:0]                          s_axil_filter_rresp,
+    output wire                                s_axil_filter_rvalid,
+    input  wire                                s_axil_filter_rready,
+
+    input  wire [AXIL_CLOCK_ADDR_WIDTH-1:0]    s_axil_clock_awaddr,
+    input  wire [2:0]                          s_axil_clock_awprot,
+    input  wire                                s_axil_clock_awvalid,
+    output wire                                s_axil_clock_awready,
+    input  wire [AXIL_CLOCK_DATA_WIDTH-1:0]    s_axil_clock_wdata,
+    input  wire [3:0]                          s_axil_clock_wstrb,
+    input  wire                                s_axil_clock_wvalid,
+    output wire                                s_axil_clock_wready,
+    output wire [1:0]                          s_axil_clock_bresp,
+    output wire                                s_axil_clock_bvalid,
+    input  wire                                s_axil_clock_bready,
+
+    input  wire [AXIL_CLOCK_ADDR_WIDTH-1:0]    s_axil_clock_araddr,
+    input  wire [2:0]                          s_axil_clock_arprot,
+    input  wire                                s_axil_clock_arvalid,
+    output wire                                s_axil_clock_arready,
+    output wire [AXIL_CLOCK_DATA_WIDTH-1:0]    s_axil_clock_rdata,
+    output wire [1:0]                          s_axil_clock_rresp,
+    output wire                                s_axil_clock_rvalid,
+    input  wire                                s_axil_clock_rready,
+
     /*
      * Ethernet PORT 1: 1000BASE-T RGMII
      */
@@ -239,7 +382,13 @@ module fpga_core #
     input  wire                                phy2_pme_n,
 
     output wire                                phy2_mdc,
-    inout  wire                                phy2_mdio
+    inout  wire                                phy2_mdio,
+
+    /*
+     * Time synchronization line
+     */
+    input  wire                                sync_in,
+    output wire                                sync_out
 );
 
 localparam LENGTH_WIDTH = 12;
@@ -247,6 +396,16 @@ localparam LENGTH_WIDTH = 12;
 localparam AXIS_DATA_WIDTH = 8;
 localparam AXIS_USER_WIDTH = 1;
 
+localparam FILTER_RULE_COUNT = 4;
+
+// With the shared buffer, the FIFO of each MAC only bridges the clock domains
+// and the rest of the same BRAM budget is shared between the ports
+localparam MAC_FIFO_DEPTH = SHARED_BUFFER ? 2**11 : 2**13;
+localparam SHARED_BUFFER_DEPTH = 2*2**13 - 2*MAC_FIFO_DEPTH;
+localparam SHARED_BUFFER_PAGE_SIZE = 256;
+// room for a maximum sized frame per port, whatever the other one receives
+localparam SHARED_BUFFER_MIN_PAGES = 8;
+
 wire [AXI_DATA_WIDTH-1:0] axis_tdata, axis1_tdata, axis2_tdata;
 wire axis_tvalid, axis1_tvalid, axis2_tvalid;
 wire axis_tlast, axis1_tlast, axis2_tlast;
@@ -254,16 +413,48 @@ wire [AXI_STRB_WIDTH-1:0] axis_tkeep, axis1_tkeep, axis2_tkeep;
 wire [AXIS_USER_WIDTH-1:0] axis_tuser, axis1_tuser, axis2_tuser;
 wire axis_tready, axis1_tready, axis2_tready;
 
+// records of the MACs in front of the shared buffer
+wire [AXI_DATA_WIDTH-1:0] rx1_axis_tdata, rx2_axis_tdata;
+wire rx1_axis_tvalid, rx2_axis_tvalid;
+wire rx1_axis_tlast, rx2_axis_tlast;
+wire [AXI_STRB_WIDTH-1:0] rx1_axis_tkeep, rx2_axis_tkeep;
+wire [AXIS_USER_WIDTH-1:0] rx1_axis_tuser, rx2_axis_tuser;
+wire rx1_axis_tready, rx2_axis_tready;
+
 wire [31:0] ts_nsec_gray;
 wire [31:0] ts_sec_gray;
 
 wire ctrl_mac_enable;
 wire ctrl_mii_select;
+wire [15:0] ctrl_mac1_snaplen, ctrl_mac2_snaplen;
+
+wire [31:0] clock_set_sec, clock_set_nsec, clock_rate_ppb;
+wire clock_load_req, clock_load_ack, clock_rate_req, clock_rate_ack;
+wire clock_sync_enable, clock_sync_locked, clock_sync_toggle;
+wire [31:0] clock_sync_offset, clock_sync_freq;
 
 pcap_clock
 pcap_clk_inst (
     .clk(counter_clk),
     .rst(counter_rst),
+
+    .set_sec(clock_set_sec),
+    .set_nsec(clock_set_nsec),
+    .load_req(clock_load_req),
+    .load_ack(clock_load_ack),
+
+    .rate_ppb(clock_rate_ppb),
+    .rate_req(clock_rate_req),
+    .rate_ack(clock_rate_ack),
+
+    .sync_in(sync_in),
+    .sync_out(sync_out),
+    .sync_enable(clock_sync_enable),
+    .sync_locked(clock_sync_locked),
+    .sync_offset(clock_sync_offset),
+    .sync_freq(clock_sync_freq),
+    .sync_toggle(clock_sync_toggle),
+
     .nsec(ts_nsec_gray),
     .sec(ts_sec_gray)
 );
@@ -271,17 +462,32 @@ pcap_clk_inst (
 wire status_busy1, status_busy2;
 
 wire fifo1_overflow, fifo2_overflow;
+wire [$clog2(MAC_FIFO_DEPTH):0] fifo1_occupancy, fifo2_occupancy;
 wire fifo1_bad_frame, fifo2_bad_frame;
 wire fifo1_good_frame, fifo2_good_frame;
 wire mac1_start_frame, mac2_start_frame;
 wire mac1_bad_frame, mac2_bad_frame;
 wire mac1_bad_fcs, mac2_bad_fcs;
 
+wire [31:0] filter1_ctrl, filter2_ctrl;
+wire [15:0] filter1_ethertype, filter2_ethertype;
+wire [11:0] filter1_vlan_id, filter2_vlan_id;
+wire [47:0] filter1_dst_mac, filter2_dst_mac;
+wire [47:0] filter1_src_mac, filter2_src_mac;
+wire [FILTER_RULE_COUNT*16-1:0] filter1_rule_offset, filter2_rule_offset;
+wire [FILTER_RULE_COUNT*64-1:0] filter1_rule_mask, filter2_rule_mask;
+wire [FILTER_RULE_COUNT*64-1:0] filter1_rule_value, filter2_rule_value;
+wire filter1_drop_frame, filter2_drop_frame;
+wire [LENGTH_WIDTH-1:0] filter1_drop_bytes, filter2_drop_bytes;
+
 rgmii_pcap #
 (
     .AXIS_DATA_WIDTH(AXIS_DATA_WIDTH),
     .AXIS_USER_WIDTH(AXIS_USER_WIDTH),
     .FRAME_LEN_WIDTH(LENGTH_WIDTH),
+    .FILTER_RULE_COUNT(FILTER_RULE_COUNT),
+    .PORT(0),
+    .FIFO_DEPTH(MAC_FIFO_DEPTH),
     .AXI_DATA_WIDTH(AXI_DATA_WIDTH),
     .TARGET(TARGET),
     .IODDR_STYLE(IODDR_STYLE),
@@ -298,14 +504,15 @@ rgmii1_pcap_inst (
     .rgmii_rxd(phy1_rgmii_rxd),
     .rgmii_rx_ctl(phy1_rgmii_rx_ctl),
 
-    .m_axis_tdata(axis1_tdata),
-    .m_axis_tvalid(axis1_tvalid),
-    .m_axis_tlast(axis1_tlast),
-    .m_axis_tuser(axis1_tuser),
-    .m_axis_tkeep(axis1_tkeep),
-    .m_axis_tready(axis1_tready),
+    .m_axis_tdata(rx1_axis_tdata),
+    .m_axis_tvalid(rx1_axis_tvalid),
+    .m_axis_tlast(rx1_axis_tlast),
+    .m_axis_tuser(rx1_axis_tuser),
+    .m_axis_tkeep(rx1_axis_tkeep),
+    .m_axis_tready(rx1_axis_tready),
 
     .fifo_overflow(fifo1_overflow),
+    .fifo_occupancy(fifo1_occupancy),
     .fifo_bad_frame(fifo1_bad_frame),
     .fifo_good_frame(fifo1_good_frame),
     .start_packet(mac1_start_frame),
@@ -318,7 +525,20 @@ rgmii1_pcap_inst (
     .busy(status_busy1),
 
     .enable(ctrl_mac_enable),
-    .mii_select(ctrl_mii_select)
+    .mii_select(ctrl_mii_select),
+    .snaplen(ctrl_mac1_snaplen),
+
+    .filter_ctrl(filter1_ctrl),
+    .filter_ethertype(filter1_ethertype),
+    .filter_vlan_id(filter1_vlan_id),
+    .filter_dst_mac(filter1_dst_mac),
+    .filter_src_mac(filter1_src_mac),
+    .filter_rule_offset(filter1_rule_offset),
+    .filter_rule_mask(filter1_rule_mask),
+    .filter_rule_value(filter1_rule_value),
+
+    .filter_drop_frame(filter1_drop_frame),
+    .filter_drop_bytes(filter1_drop_bytes)
 );
 
 rgmii_pcap #
@@ -326,6 +546,9 @@ rgmii_pcap #
     .AXIS_DATA_WIDTH(AXIS_DATA_WIDTH),
     .AXIS_USER_WIDTH(AXIS_USER_WIDTH),
     .FRAME_LEN_WIDTH(LENGTH_WIDTH),
+    .FILTER_RULE_COUNT(FILTER_RULE_COUNT),
+    .PORT(1),
+    .FIFO_DEPTH(MAC_FIFO_DEPTH),
     .AXI_DATA_WIDTH(AXI_DATA_WIDTH),
     .TARGET(TARGET),
     .IODDR_STYLE(IODDR_STYLE),
@@ -342,14 +565,15 @@ rgmii2_pcap_inst (
     .rgmii_rxd(phy2_rgmii_rxd),
     .rgmii_rx_ctl(phy2_rgmii_rx_ctl),
 
-    .m_axis_tdata(axis2_tdata),
-    .m_axis_tvalid(axis2_tvalid),
-    .m_axis_tlast(axis2_tlast),
-    .m_axis_tuser(axis2_tuser),
-    .m_axis_tkeep(axis2_tkeep),
-    .m_axis_tready(axis2_tready),
+    .m_axis_tdata(rx2_axis_tdata),
+    .m_axis_tvalid(rx2_axis_tvalid),
+    .m_axis_tlast(rx2_axis_tlast),
+    .m_axis_tuser(rx2_axis_tuser),
+    .m_axis_tkeep(rx2_axis_tkeep),
+    .m_axis_tready(rx2_axis_tready),
 
     .fifo_overflow(fifo2_overflow),
+    .fifo_occupancy(fifo2_occupancy),
     .fifo_bad_frame(fifo2_bad_frame),
     .fifo_good_frame(fifo2_good_frame),
     .start_packet(mac2_start_frame),
@@ -362,48 +586,310 @@ rgmii2_pcap_inst (
     .busy(status_busy2),
 
     .enable(ctrl_mac_enable),
-    .mii_select(ctrl_mii_select)
+    .mii_select(ctrl_mii_select),
+    .snaplen(ctrl_mac2_snaplen),
+
+    .filter_ctrl(filter2_ctrl),
+    .filter_ethertype(filter2_ethertype),
+    .filter_vlan_id(filter2_vlan_id),
+    .filter_dst_mac(filter2_dst_mac),
+    .filter_src_mac(filter2_src_mac),
+    .filter_rule_offset(filter2_rule_offset),
+    .filter_rule_mask(filter2_rule_mask),
+    .filter_rule_value(filter2_rule_value),
+
+    .filter_drop_frame(filter2_drop_frame),
+    .filter_drop_bytes(filter2_drop_bytes)
 );
 
-axis_arb_mux #
-(
-    .S_COUNT(2),
-    .DATA_WIDTH(AXI_DATA_WIDTH),
-    .KEEP_ENABLE(1),
-    .USER_WIDTH(AXIS_USER_WIDTH),
-    .ID_ENABLE(0),
-    .S_ID_WIDTH(AXI_ID_WIDTH),
-    .DEST_ENABLE(0),
-    .DEST_WIDTH(AXI_DEST_WIDTH),
-    .USER_ENABLE(0),
-    .LAST_ENABLE(1),
-    .ARB_TYPE_ROUND_ROBIN(1),
-    .ARB_LSB_HIGH_PRIORITY(0)
-)
-axis_arb_mux_inst (
-    .clk(axi_clk),
-    .rst(axi_rst),
-
-    .s_axis_tdata({axis2_tdata, axis1_tdata}),
-    .s_axis_tvalid({axis2_tvalid, axis1_tvalid}),
-    .s_axis_tready({axis2_tready, axis1_tready}),
-    .s_axis_tlast({axis2_tlast, axis1_tlast}),
-    .s_axis_tkeep({axis2_tkeep, axis1_tkeep}),
-    .s_axis_tuser({axis2_tuser, axis1_tuser}),
-    .s_axis_tid({{AXI_ID_WIDTH{1'b0}}, {AXI_ID_WIDTH{1'b0}}}),
-    .s_axis_tdest({{AXI_DEST_WIDTH{1'b0}}, {AXI_DEST_WIDTH{1'b0}}}),
-
-    .m_axis_tdata(axis_tdata),
-    .m_axis_tvalid(axis_tvalid),
-    .m_axis_tready(axis_tready),
-    .m_axis_tlast(axis_tlast),
-    .m_axis_tkeep(axis_tkeep),
-    .m_axis_tuser(axis_tuser)
-);
+wire buffer1_overflow, buffer2_overflow;
+
+generate
+
+if (SHARED_BUFFER) begin : shared_buffer
+
+    axis_shared_fifo #
+    (
+        .PORTS(2),
+        .DATA_WIDTH(AXI_DATA_WIDTH),
+        .KEEP_WIDTH(AXI_STRB_WIDTH),
+        .USER_WIDTH(AXIS_USER_WIDTH),
+        .DEPTH(SHARED_BUFFER_DEPTH),
+        .PAGE_SIZE(SHARED_BUFFER_PAGE_SIZE),
+        .MIN_PAGES(SHARED_BUFFER_MIN_PAGES),
+        .MAX_PAGES(0)
+    )
+    axis_shared_fifo_inst (
+        .clk(axi_clk),
+        .rst(axi_rst),
+
+        .s_axis_tdata({rx2_axis_tdata, rx1_axis_tdata}),
+        .s_axis_tkeep({rx2_axis_tkeep, rx1_axis_tkeep}),
+        .s_axis_tvalid({rx2_axis_tvalid, rx1_axis_tvalid}),
+        .s_axis_tready({rx2_axis_tready, rx1_axis_tready}),
+        .s_axis_tlast({rx2_axis_tlast, rx1_axis_tlast}),
+        .s_axis_tuser({rx2_axis_tuser, rx1_axis_tuser}),
+
+        .m_axis_tdata({axis2_tdata, axis1_tdata}),
+        .m_axis_tkeep({axis2_tkeep, axis1_tkeep}),
+        .m_axis_tvalid({axis2_tvalid, axis1_tvalid}),
+        .m_axis_tready({axis2_tready, axis1_tready}),
+        .m_axis_tlast({axis2_tlast, axis1_tlast}),
+        .m_axis_tuser({axis2_tuser, axis1_tuser}),
+
+        .status_overflow({buffer2_overflow, buffer1_overflow}),
+        .status_good_frame(),
+        .status_pages()
+    );
+
+end else begin : static_buffer
+
+    assign axis1_tdata = rx1_axis_tdata;
+    assign axis1_tvalid = rx1_axis_tvalid;
+    assign axis1_tlast = rx1_axis_tlast;
+    assign axis1_tkeep = rx1_axis_tkeep;
+    assign axis1_tuser = rx1_axis_tuser;
+    assign rx1_axis_tready = axis1_tready;
+
+    assign axis2_tdata = rx2_axis_tdata;
+    assign axis2_tvalid = rx2_axis_tvalid;
+    assign axis2_tlast = rx2_axis_tlast;
+    assign axis2_tkeep = rx2_axis_tkeep;
+    assign axis2_tuser = rx2_axis_tuser;
+    assign rx2_axis_tready = axis2_tready;
+
+    assign buffer1_overflow = 1'b0;
+    assign buffer2_overflow = 1'b0;
+
+end
+
+if (DMA_PER_PORT) begin : dma_per_port
+
+    // port 1 is written by dma_controller_inst, port 2 by its own controller
+    assign axis_tdata = axis1_tdata;
+    assign axis_tvalid = axis1_tvalid;
+    assign axis_tlast = axis1_tlast;
+    assign axis_tkeep = axis1_tkeep;
+    assign axis_tuser = axis1_tuser;
+    assign axis1_tready = axis_tready;
+
+    dma_controller # (
+        .AXI_DATA_WIDTH(AXI_DATA_WIDTH),
+        .AXI_MAX_BURST_LEN(AXI_MAX_BURST_LEN),
+        .AXI_MAX_OUTSTANDING(AXI_MAX_OUTSTANDING),
+        .AXI_ADDR_WIDTH(AXI_ADDR_WIDTH),
+        .AXI_ID_WIDTH(AXI_ID_WIDTH),
+        .AXIS_DATA_WIDTH(AXI_DATA_WIDTH),
+        .AXIS_LAST_ENABLE(1),
+        .AXIS_USER_ENABLE(1),
+        .AXIS_USER_WIDTH(AXIS_USER_WIDTH),
+        .AXIL_DATA_WIDTH(AXIL_DMA_DATA_WIDTH),
+        .AXIL_ADDR_WIDTH(AXIL_DMA_ADDR_WIDTH),
+        .AXIL_DESC_DATA_WIDTH(AXIL_DMA_DESC_DATA_WIDTH),
+        .AXIL_DESC_ADDR_WIDTH(AXIL_DMA_DESC_ADDR_WIDTH),
+        .LEN_WIDTH(LENGTH_WIDTH),
+        .TAG_WIDTH(8)
+    )
+    dma2_controller_inst (
+        .clk(axi_clk),
+        .rst(axi_rst),
+
+        .s_axis_tdata(axis2_tdata),
+        .s_axis_tvalid(axis2_tvalid),
+        .s_axis_tlast(axis2_tlast),
+        .s_axis_tuser(axis2_tuser),
+        .s_axis_tkeep(axis2_tkeep),
+        .s_axis_tready(axis2_tready),
+
+        .s_axil_awaddr(s_axil_dma2_awaddr),
+        .s_axil_awprot(s_axil_dma2_awprot),
+        .s_axil_awvalid(s_axil_dma2_awvalid),
+        .s_axil_awready(s_axil_dma2_awready),
+        .s_axil_wdata(s_axil_dma2_wdata),
+        .s_axil_wstrb(s_axil_dma2_wstrb),
+        .s_axil_wvalid(s_axil_dma2_wvalid),
+        .s_axil_wready(s_axil_dma2_wready),
+        .s_axil_bresp(s_axil_dma2_bresp),
+        .s_axil_bvalid(s_axil_dma2_bvalid),
+        .s_axil_bready(s_axil_dma2_bready),
+
+        .s_axil_araddr(s_axil_dma2_araddr),
+        .s_axil_arprot(s_axil_dma2_arprot),
+        .s_axil_arvalid(s_axil_dma2_arvalid),
+        .s_axil_arready(s_axil_dma2_arready),
+        .s_axil_rdata(s_axil_dma2_rdata),
+        .s_axil_rresp(s_axil_dma2_rresp),
+        .s_axil_rvalid(s_axil_dma2_rvalid),
+        .s_axil_rready(s_axil_dma2_rready),
+
+        .s_axil_desc_awaddr(s_axil_dma2_desc_awaddr),
+        .s_axil_desc_awprot(s_axil_dma2_desc_awprot),
+        .s_axil_desc_awvalid(s_axil_dma2_desc_awvalid),
+        .s_axil_desc_awready(s_axil_dma2_desc_awready),
+        .s_axil_desc_wdata(s_axil_dma2_desc_wdata),
+        .s_axil_desc_wstrb(s_axil_dma2_desc_wstrb),
+        .s_axil_desc_wvalid(s_axil_dma2_desc_wvalid),
+        .s_axil_desc_wready(s_axil_dma2_desc_wready),
+        .s_axil_desc_bresp(s_axil_dma2_desc_bresp),
+        .s_axil_desc_bvalid(s_axil_dma2_desc_bvalid),
+        .s_axil_desc_bready(s_axil_dma2_desc_bready),
+
+        .s_axil_desc_araddr(s_axil_dma2_desc_araddr),
+        .s_axil_desc_arprot(s_axil_dma2_desc_arprot),
+        .s_axil_desc_arvalid(s_axil_dma2_desc_arvalid),
+        .s_axil_desc_arready(s_axil_dma2_desc_arready),
+        .s_axil_desc_rdata(s_axil_dma2_desc_rdata),
+        .s_axil_desc_rresp(s_axil_dma2_desc_rresp),
+        .s_axil_desc_rvalid(s_axil_dma2_desc_rvalid),
+        .s_axil_desc_rready(s_axil_dma2_desc_rready),
+
+        .irq(dma2_irq),
+
+        .m_axi_awid(m_axi2_awid),
+        .m_axi_awaddr(m_axi2_awaddr),
+        .m_axi_awlen(m_axi2_awlen),
+        .m_axi_awsize(m_axi2_awsize),
+        .m_axi_awburst(m_axi2_awburst),
+        .m_axi_awlock(m_axi2_awlock),
+        .m_axi_awcache(m_axi2_awcache),
+        .m_axi_awprot(m_axi2_awprot),
+        .m_axi_awvalid(m_axi2_awvalid),
+        .m_axi_awready(m_axi2_awready),
+        .m_axi_wdata(m_axi2_wdata),
+        .m_axi_wstrb(m_axi2_wstrb),
+        .m_axi_wlast(m_axi2_wlast),
+        .m_axi_wvalid(m_axi2_wvalid),
+        .m_axi_wready(m_axi2_wready),
+        .m_axi_bid(m_axi2_bid),
+        .m_axi_bresp(m_axi2_bresp),
+        .m_axi_bvalid(m_axi2_bvalid),
+        .m_axi_bready(m_axi2_bready)
+    );
+
+end else begin : dma_shared
+
+    axis_arb_mux #
+    (
+        .S_COUNT(2),
+        .DATA_WIDTH(AXI_DATA_WIDTH),
+        .KEEP_ENABLE(1),
+        .USER_WIDTH(AXIS_USER_WIDTH),
+        .ID_ENABLE(0),
+        .S_ID_WIDTH(AXI_ID_WIDTH),
+        .DEST_ENABLE(0),
+        .DEST_WIDTH(AXI_DEST_WIDTH),
+        .USER_ENABLE(0),
+        .LAST_ENABLE(1),
+        .ARB_TYPE_ROUND_ROBIN(1),
+        .ARB_LSB_HIGH_PRIORITY(0)
+    )
+    axis_arb_mux_inst (
+        .clk(axi_clk),
+        .rst(axi_rst),
+
+        .s_axis_tdata({axis2_tdata, axis1_tdata}),
+        .s_axis_tvalid({axis2_tvalid, axis1_tvalid}),
+        .s_axis_tready({axis2_tready, axis1_tready}),
+        .s_axis_tlast({axis2_tlast, axis1_tlast}),
+        .s_axis_tkeep({axis2_tkeep, axis1_tkeep}),
+        .s_axis_tuser({axis2_tuser, axis1_tuser}),
+        .s_axis_tid({{AXI_ID_WIDTH{1'b0}}, {AXI_ID_WIDTH{1'b0}}}),
+        .s_axis_tdest({{AXI_DEST_WIDTH{1'b0}}, {AXI_DEST_WIDTH{1'b0}}}),
+
+        .m_axis_tdata(axis_tdata),
+        .m_axis_tvalid(axis_tvalid),
+        .m_axis_tready(axis_tready),
+        .m_axis_tlast(axis_tlast),
+        .m_axis_tkeep(axis_tkeep),
+        .m_axis_tuser(axis_tuser)
+    );
+
+    // without the second channel, its register spaces answer with DECERR
+    axil_decerr #
+    (
+        .DATA_WIDTH(AXIL_DMA_DATA_WIDTH),
+        .ADDR_WIDTH(AXIL_DMA_ADDR_WIDTH)
+    )
+    axil_dma2_decerr_inst (
+        .clk(axi_clk),
+        .rst(axi_rst),
+
+        .s_axil_awaddr(s_axil_dma2_awaddr),
+        .s_axil_awprot(s_axil_dma2_awprot),
+        .s_axil_awvalid(s_axil_dma2_awvalid),
+        .s_axil_awready(s_axil_dma2_awready),
+        .s_axil_wdata(s_axil_dma2_wdata),
+        .s_axil_wstrb(s_axil_dma2_wstrb),
+        .s_axil_wvalid(s_axil_dma2_wvalid),
+        .s_axil_wready(s_axil_dma2_wready),
+        .s_axil_bresp(s_axil_dma2_bresp),
+        .s_axil_bvalid(s_axil_dma2_bvalid),
+        .s_axil_bready(s_axil_dma2_bready),
+        .s_axil_araddr(s_axil_dma2_araddr),
+        .s_axil_arprot(s_axil_dma2_arprot),
+        .s_axil_arvalid(s_axil_dma2_arvalid),
+        .s_axil_arready(s_axil_dma2_arready),
+        .s_axil_rdata(s_axil_dma2_rdata),
+        .s_axil_rresp(s_axil_dma2_rresp),
+        .s_axil_rvalid(s_axil_dma2_rvalid),
+        .s_axil_rready(s_axil_dma2_rready)
+    );
+
+    axil_decerr #
+    (
+        .DATA_WIDTH(AXIL_DMA_DESC_DATA_WIDTH),
+        .ADDR_WIDTH(AXIL_DMA_DESC_ADDR_WIDTH)
+    )
+    axil_dma2_desc_decerr_inst (
+        .clk(axi_clk),
+        .rst(axi_rst),
+
+        .s_axil_awaddr(s_axil_dma2_desc_awaddr),
+        .s_axil_awprot(s_axil_dma2_desc_awprot),
+        .s_axil_awvalid(s_axil_dma2_desc_awvalid),
+        .s_axil_awready(s_axil_dma2_desc_awready),
+        .s_axil_wdata(s_axil_dma2_desc_wdata),
+        .s_axil_wstrb(s_axil_dma2_desc_wstrb),
+        .s_axil_wvalid(s_axil_dma2_desc_wvalid),
+        .s_axil_wready(s_axil_dma2_desc_wready),
+        .s_axil_bresp(s_axil_dma2_desc_bresp),
+        .s_axil_bvalid(s_axil_dma2_desc_bvalid),
+        .s_axil_bready(s_axil_dma2_desc_bready),
+        .s_axil_araddr(s_axil_dma2_desc_araddr),
+        .s_axil_arprot(s_axil_dma2_desc_arprot),
+        .s_axil_arvalid(s_axil_dma2_desc_arvalid),
+        .s_axil_arready(s_axil_dma2_desc_arready),
+        .s_axil_rdata(s_axil_dma2_desc_rdata),
+        .s_axil_rresp(s_axil_dma2_desc_rresp),
+        .s_axil_rvalid(s_axil_dma2_desc_rvalid),
+        .s_axil_rready(s_axil_dma2_desc_rready)
+    );
+
+    assign m_axi2_awid = {AXI_ID_WIDTH{1'b0}};
+    assign m_axi2_awaddr = {AXI_ADDR_WIDTH{1'b0}};
+    assign m_axi2_awlen = 8'd0;
+    assign m_axi2_awsize = 3'd0;
+    assign m_axi2_awburst = 2'b01;
+    assign m_axi2_awlock = 1'b0;
+    assign m_axi2_awcache = 4'd0;
+    assign m_axi2_awprot = 3'd0;
+    assign m_axi2_awvalid = 1'b0;
+    assign m_axi2_wdata = {AXI_DATA_WIDTH{1'b0}};
+    assign m_axi2_wstrb = {AXI_STRB_WIDTH{1'b0}};
+    assign m_axi2_wlast = 1'b0;
+    assign m_axi2_wvalid = 1'b0;
+    assign m_axi2_bready = 1'b1;
+
+    assign dma2_irq = 1'b0;
+
+end
+
+endgenerate
 
 dma_controller # (
     .AXI_DATA_WIDTH(AXI_DATA_WIDTH),
     .AXI_MAX_BURST_LEN(AXI_MAX_BURST_LEN),
+    .AXI_MAX_OUTSTANDING(AXI_MAX_OUTSTANDING),
     .AXI_ADDR_WIDTH(AXI_ADDR_WIDTH),
     .AXI_ID_WIDTH(AXI_ID_WIDTH),
     .AXIS_DATA_WIDTH(AXI_DATA_WIDTH),
@@ -529,13 +1015,14 @@ axil_mdio_controller (
     .mdio({phy2_mdio, phy1_mdio})
 );
 
-wire status_buffers_empty = !(axis1_tvalid || axis2_tvalid || axis_tvalid);
+wire status_buffers_empty = !(rx1_axis_tvalid || rx2_axis_tvalid || axis1_tvalid || axis2_tvalid || axis_tvalid);
 wire status_busy = status_busy1 || status_busy2;
 
 axil_mac_ctrl_regs #
 (
     .AXIL_DATA_WIDTH(AXIL_MAC_DATA_WIDTH),
-    .AXIL_ADDR_WIDTH(AXIL_MAC_ADDR_WIDTH)
+    .AXIL_ADDR_WIDTH(AXIL_MAC_ADDR_WIDTH),
+    .FIFO_DEPTH(MAC_FIFO_DEPTH)
 )
 axil_mac_controller (
     .clk(axi_clk),
@@ -567,20 +1054,122 @@ axil_mac_controller (
     .mac1_bad_fcs(mac1_bad_fcs),
     .fifo1_bad_frame(fifo1_bad_frame),
     .fifo1_good_frame(fifo1_good_frame),
-    .fifo1_overflow(fifo1_overflow),
+    // drops of the shared buffer count as overflows of the MAC FIFO
+    .fifo1_overflow(fifo1_overflow || buffer1_overflow),
+    .fifo1_occupancy(fifo1_occupancy),
 
     .mac2_start_frame(mac2_start_frame),
     .mac2_bad_frame(mac2_bad_frame),
     .mac2_bad_fcs(mac2_bad_fcs),
     .fifo2_bad_frame(fifo2_bad_frame),
     .fifo2_good_frame(fifo2_good_frame),
-    .fifo2_overflow(fifo2_overflow),
+    .fifo2_overflow(fifo2_overflow || buffer2_overflow),
+    .fifo2_occupancy(fifo2_occupancy),
 
     .status_buffers_empty(status_buffers_empty),
     .status_busy(status_busy),
 
     .ctrl_enable(ctrl_mac_enable),
-    .ctrl_mii_select(ctrl_mii_select)
+    .ctrl_mii_select(ctrl_mii_select),
+    .ctrl_mac1_snaplen(ctrl_mac1_snaplen),
+    .ctrl_mac2_snaplen(ctrl_mac2_snaplen)
+);
+
+axil_filter_regs #
+(
+    .AXIL_DATA_WIDTH(AXIL_FILTER_DATA_WIDTH),
+    .AXIL_ADDR_WIDTH(AXIL_FILTER_ADDR_WIDTH),
+    .PORT_COUNT(2),
+    .RULE_COUNT(FILTER_RULE_COUNT),
+    .FRAME_LEN_WIDTH(LENGTH_WIDTH)
+)
+axil_filter_controller (
+    .clk(axi_clk),
+    .rst(axi_rst),
+
+    .s_axil_awaddr(s_axil_filter_awaddr),
+    .s_axil_awprot(s_axil_filter_awprot),
+    .s_axil_awvalid(s_axil_filter_awvalid),
+    .s_axil_awready(s_axil_filter_awready),
+    .s_axil_wdata(s_axil_filter_wdata),
+    .s_axil_wstrb(s_axil_filter_wstrb),
+    .s_axil_wvalid(s_axil_filter_wvalid),
+    .s_axil_wready(s_axil_filter_wready),
+    .s_axil_bresp(s_axil_filter_bresp),
+    .s_axil_bvalid(s_axil_filter_bvalid),
+    .s_axil_bready(s_axil_filter_bready),
+
+    .s_axil_araddr(s_axil_filter_araddr),
+    .s_axil_arprot(s_axil_filter_arprot),
+    .s_axil_arvalid(s_axil_filter_arvalid),
+    .s_axil_arready(s_axil_filter_arready),
+    .s_axil_rdata(s_axil_filter_rdata),
+    .s_axil_rresp(s_axil_filter_rresp),
+    .s_axil_rvalid(s_axil_filter_rvalid),
+    .s_axil_rready(s_axil_filter_rready),
+
+    .drop_frame({filter2_drop_frame, filter1_drop_frame}),
+    .drop_bytes({filter2_drop_bytes, filter1_drop_bytes}),
+
+    .filter_ctrl({filter2_ctrl, filter1_ctrl}),
+    .filter_ethertype({filter2_ethertype, filter1_ethertype}),
+    .filter_vlan_id({filter2_vlan_id, filter1_vlan_id}),
+    .filter_dst_mac({filter2_dst_mac, filter1_dst_mac}),
+    .filter_src_mac({filter2_src_mac, filter1_src_mac}),
+    .filter_rule_offset({filter2_rule_offset, filter1_rule_offset}),
+    .filter_rule_mask({filter2_rule_mask, filter1_rule_mask}),
+    .filter_rule_value({filter2_rule_value, filter1_rule_value})
+);
+
+axil_clock_regs #
+(
+    .AXIL_DATA_WIDTH(AXIL_CLOCK_DATA_WIDTH),
+    .AXIL_ADDR_WIDTH(AXIL_CLOCK_ADDR_WIDTH)
+)
+axil_clock_controller (
+    .clk(axi_clk),
+    .rst(axi_rst),
+
+    .s_axil_awaddr(s_axil_clock_awaddr),
+    .s_axil_awprot(s_axil_clock_awprot),
+    .s_axil_awvalid(s_axil_clock_awvalid),
+    .s_axil_awready(s_axil_clock_awready),
+    .s_axil_wdata(s_axil_clock_wdata),
+    .s_axil_wstrb(s_axil_clock_wstrb),
+    .s_axil_wvalid(s_axil_clock_wvalid),
+    .s_axil_wready(s_axil_clock_wready),
+    .s_axil_bresp(s_axil_clock_bresp),
+    .s_axil_bvalid(s_axil_clock_bvalid),
+    .s_axil_bready(s_axil_clock_bready),
+
+    .s_axil_araddr(s_axil_clock_araddr),
+    .s_axil_arprot(s_axil_clock_arprot),
+    .s_axil_arvalid(s_axil_clock_arvalid),
+    .s_axil_arready(s_axil_clock_arready),
+    .s_axil_rdata(s_axil_clock_rdata),
+    .s_axil_rresp(s_axil_clock_rresp),
+    .s_axil_rvalid(s_axil_clock_rvalid),
+    .s_axil_rready(s_axil_clock_rready),
+
+    .counter_clk(counter_clk),
+
+    .set_sec(clock_set_sec),
+    .set_nsec(clock_set_nsec),
+    .load_req(clock_load_req),
+    .load_ack(clock_load_ack),
+
+    .rate_ppb(clock_rate_ppb),
+    .rate_req(clock_rate_req),
+    .rate_ack(clock_rate_ack),
+
+    .sync_enable(clock_sync_enable),
+    .sync_locked(clock_sync_locked),
+    .sync_offset(clock_sync_offset),
+    .sync_freq(clock_sync_freq),
+    .sync_toggle(clock_sync_toggle),
+
+    .ts_nsec_gray(ts_nsec_gray),
+    .ts_sec_gray(ts_sec_gray)
 );
 
 phy_bridge #(
@@ -26,45 +26,281 @@ with aRTS. If not, see <https://www.gnu.org/licenses/>.
 `default_nettype none
 
 /*
- * PCAP Gray Code Timestamp generator with 8ns precision; 
- * two values:
- * - nanoseconds
- * - and a second
+ * PCAP timestamp generator with 8ns precision
+ *
+ * Counts the ticks of clk within a second and the seconds, both output as
+ * gray code for the crossing into the receive clocks.
+ *
+ * Loading: set_sec and set_nsec are taken over together when load_req
+ * toggles, load_ack follows load_req once they were loaded. The values have
+ * to be stable while load_req != load_ack. set_nsec is in nanoseconds and
+ * rounded down to a tick.
+ *
+ * Rate trim: rate_ppb is a signed adjustment of the rate in parts per
+ * billion, taken over when rate_req toggles (acknowledged by rate_ack). The
+ * fractional ticks are accumulated and inserted by counting two ticks in a
+ * cycle (faster) or none (slower), so nsec stays monotonic and changes by
+ * at most two ticks per cycle. A sample of the gray code taken during such
+ * a double step is off by at most one tick.
+ *
+ * Synchronization: the time is sent on sync_out (see pcap_sync). With
+ * sync_enable, the clock follows the time received on sync_in: an offset
+ * above SYNC_STEP_TICKS or a different second is stepped, smaller offsets
+ * are slewed out over the next seconds and integrated into a frequency
+ * correction, which adds to rate_ppb. sync_locked is set once a step left
+ * an offset below SYNC_STEP_TICKS, i.e. the drift of a second, and cleared
+ * by the next step or when the line is lost; the frequency correction is
+ * kept then. The results of each measurement are output on sync_offset
+ * (ticks) and sync_freq (ppb) when sync_toggle toggles.
  */
-module pcap_clock
+module pcap_clock #
+(
+    // Nanoseconds per cycle of clk
+    parameter NSEC_PER_TICK = 8,
+    // Cycles of clk per second
+    parameter TICKS_PER_SEC = 1000000000/NSEC_PER_TICK,
+    // Seconds after reset
+    parameter RESET_SEC = 32'h80000000,
+    // Latency of the sync line in ticks
+    parameter SYNC_LATENCY = 3,
+    // Offset of the sync line stepped instead of slewed
+    parameter SYNC_STEP_TICKS = TICKS_PER_SEC/1000,
+    // Gain of the phase correction (2**-SYNC_PHASE_SHIFT)
+    parameter SYNC_PHASE_SHIFT = 1,
+    // Gain of the frequency correction (2**-SYNC_FREQ_SHIFT)
+    parameter SYNC_FREQ_SHIFT = 3
+)
 (
     input  wire        clk,
     input  wire        rst,
 
+    /*
+     * Time base
+     */
+    input  wire [31:0] set_sec,
+    input  wire [31:0] set_nsec,
+    input  wire        load_req,
+    output wire        load_ack,
+
+    input  wire [31:0] rate_ppb,
+    input  wire        rate_req,
+    output wire        rate_ack,
+
+    /*
+     * Synchronization between units
+     */
+    input  wire        sync_in,
+    output wire        sync_out,
+    input  wire        sync_enable,
+
+    output wire        sync_locked,
+    output wire [31:0] sync_offset,
+    output wire [31:0] sync_freq,
+    output wire        sync_toggle,
+
+    /*
+     * Gray coded time
+     */
     output wire [31:0] nsec,
     output wire [31:0] sec
 );
 
+localparam signed [31:0] PPB = 1000000000;
+localparam signed [33:0] PPB_PER_TICK = PPB / TICKS_PER_SEC;
 
-localparam RESET_VALUE = 32'b00000000000000010001110001100000;
+initial begin
+    if (NSEC_PER_TICK != 2**$clog2(NSEC_PER_TICK)) begin
+        $error("Error: NSEC_PER_TICK must be a power of two (instance %m)");
+        $finish;
+    end
 
-gray_code_counter # (
-    .WIDTH(32),
-    .RESET_VALUE(RESET_VALUE)
-) gray_nsec_inst (
-    .clk(clk),
-    .rst(rst),
-    .enable(1'b1),
-    .cnt(nsec)
-);
+    if (NSEC_PER_TICK * TICKS_PER_SEC > 1000000000) begin
+        $error("Error: A second must not exceed 1e9 ns (instance %m)");
+        $finish;
+    end
+end
+
+// the requests of the register clock domain, not reset so that a reset
+// does not take them as a new request
+reg [2:0] load_req_sync_reg = 3'b0;
+reg [2:0] rate_req_sync_reg = 3'b0;
+reg [1:0] sync_enable_sync_reg = 2'b0;
 
-wire sec_en = nsec == RESET_VALUE;
+assign load_ack = load_req_sync_reg[2];
+assign rate_ack = rate_req_sync_reg[2];
 
-gray_code_counter # (
-    .WIDTH(32),
-    .RESET_VALUE(32'h80000000) 
-) pcap_clk_inst (
+wire load = load_req_sync_reg[2] != load_req_sync_reg[1];
+wire rate_load = rate_req_sync_reg[2] != rate_req_sync_reg[1];
+wire sync_en = sync_enable_sync_reg[1];
+
+reg [31:0] ticks_reg = 32'd0;
+reg [31:0] sec_reg = RESET_SEC;
+reg sec_start_reg = 1'b0;
+reg signed [31:0] rate_reg = 32'sd0;
+reg signed [31:0] rate_total_reg = 32'sd0;
+reg signed [31:0] frac_reg = 32'sd0;
+
+reg signed [31:0] sync_phase_reg = 32'sd0;
+reg signed [31:0] sync_freq_reg = 32'sd0;
+reg signed [31:0] sync_offset_reg = 32'sd0;
+reg sync_locked_reg = 1'b0;
+reg sync_toggle_reg = 1'b0;
+
+reg [31:0] nsec_gray_reg = 32'd0;
+reg [31:0] sec_gray_reg = RESET_SEC ^ (RESET_SEC >> 1);
+
+assign nsec = nsec_gray_reg;
+assign sec = sec_gray_reg;
+
+assign sync_locked = sync_locked_reg;
+assign sync_offset = sync_offset_reg;
+assign sync_freq = sync_freq_reg;
+assign sync_toggle = sync_toggle_reg;
+
+wire meas_valid, meas_active;
+wire signed [31:0] meas_offset;
+wire [31:0] meas_sec_delta;
+
+pcap_sync #(
+    .TICKS_PER_SEC(TICKS_PER_SEC),
+    .SYNC_LATENCY(SYNC_LATENCY)
+)
+pcap_sync_inst (
     .clk(clk),
     .rst(rst),
-    .enable(sec_en),
-    .cnt(sec)
+
+    .ticks(ticks_reg),
+    .sec(sec_reg),
+    .sec_start(sec_start_reg),
+
+    .sync_in(sync_in),
+    .sync_out(sync_out),
+
+    .meas_valid(meas_valid),
+    .meas_offset(meas_offset),
+    .meas_sec_delta(meas_sec_delta),
+    .meas_active(meas_active)
 );
 
+/* Rate trim
+ * frac_reg holds the fraction of a tick in parts per billion and stays
+ * within +-PPB, so frac_next fits as rate_total_reg is limited to +-PPB
+ * as well. */
+wire signed [31:0] frac_next = frac_reg + rate_total_reg;
+wire step_fast = frac_next >= PPB;
+wire step_slow = frac_next <= -PPB;
+
+wire [31:0] ticks_next = ticks_reg + (step_fast ? 2 : step_slow ? 0 : 1);
+wire ticks_wrap = ticks_next >= TICKS_PER_SEC;
+
+wire signed [33:0] rate_sum = rate_reg + sync_freq_reg + sync_phase_reg;
+
+/* Synchronization
+ * A step moves the time by the offset and the difference of the seconds.
+ * A slew corrects a part of the offset within the next second, the
+ * frequency correction integrates a smaller part. The measurement arrives
+ * half a second after the marker, so a full correction would overshoot. */
+wire signed [33:0] meas_offset_ppb = meas_offset * PPB_PER_TICK;
+wire meas_step = meas_sec_delta != 0 || !sync_locked_reg ||
+    meas_offset > SYNC_STEP_TICKS || meas_offset < -SYNC_STEP_TICKS;
+
+wire signed [32:0] step_ticks = $signed({1'b0, ticks_next}) - meas_offset;
+wire [31:0] step_sec = sec_reg + ticks_wrap + meas_sec_delta;
+
+always @(posedge clk) begin
+    load_req_sync_reg <= {load_req_sync_reg[1:0], load_req};
+    rate_req_sync_reg <= {rate_req_sync_reg[1:0], rate_req};
+    sync_enable_sync_reg <= {sync_enable_sync_reg[0], sync_enable};
+
+    if (step_fast) begin
+        frac_reg <= frac_next - PPB;
+    end else if (step_slow) begin
+        frac_reg <= frac_next + PPB;
+    end else begin
+        frac_reg <= frac_next;
+    end
+
+    sec_start_reg <= ticks_wrap;
+    if (ticks_wrap) begin
+        ticks_reg <= ticks_next - TICKS_PER_SEC;
+        sec_reg <= sec_reg + 1;
+    end else begin
+        ticks_reg <= ticks_next;
+    end
+
+    if (rate_sum >= PPB) begin
+        rate_total_reg <= PPB - 1;
+    end else if (rate_sum <= -PPB) begin
+        rate_total_reg <= -PPB + 1;
+    end else begin
+        rate_total_reg <= rate_sum;
+    end
+
+    if (meas_valid) begin
+        sync_offset_reg <= meas_offset;
+        sync_toggle_reg <= !sync_toggle_reg;
+    end
+
+    if (!sync_en || !meas_active) begin
+        sync_locked_reg <= 1'b0;
+        sync_phase_reg <= 32'sd0;
+        if (!sync_en) begin
+            sync_freq_reg <= 32'sd0;
+        end
+    end else if (meas_valid) begin
+        if (meas_step) begin
+            // the offset measured after a step is the drift of a second
+            sync_locked_reg <= !sync_locked_reg && meas_sec_delta == 0 &&
+                meas_offset <= SYNC_STEP_TICKS && meas_offset >= -SYNC_STEP_TICKS;
+            sync_phase_reg <= 32'sd0;
+            sec_start_reg <= 1'b0;
+
+            if (step_ticks < 0) begin
+                ticks_reg <= step_ticks + TICKS_PER_SEC;
+                sec_reg <= step_sec - 1;
+            end else if (step_ticks >= TICKS_PER_SEC) begin
+                ticks_reg <= step_ticks - TICKS_PER_SEC;
+                sec_reg <= step_sec + 1;
+            end else begin
+                ticks_reg <= step_ticks;
+                sec_reg <= step_sec;
+            end
+        end else begin
+            sync_phase_reg <= -(meas_offset_ppb >>> SYNC_PHASE_SHIFT);
+            sync_freq_reg <= sync_freq_reg - (meas_offset_ppb >>> SYNC_FREQ_SHIFT);
+        end
+    end
+
+    if (load) begin
+        ticks_reg <= set_nsec >> $clog2(NSEC_PER_TICK);
+        sec_reg <= set_sec;
+        sec_start_reg <= 1'b0;
+    end
+
+    if (rate_load) begin
+        rate_reg <= rate_ppb;
+        frac_reg <= 32'sd0;
+    end
+
+    nsec_gray_reg <= ticks_reg ^ (ticks_reg >> 1);
+    sec_gray_reg <= sec_reg ^ (sec_reg >> 1);
+
+    if (rst) begin
+        ticks_reg <= 32'd0;
+        sec_reg <= RESET_SEC;
+        sec_start_reg <= 1'b0;
+        rate_reg <= 32'sd0;
+        rate_total_reg <= 32'sd0;
+        frac_reg <= 32'sd0;
+        sync_phase_reg <= 32'sd0;
+        sync_freq_reg <= 32'sd0;
+        sync_offset_reg <= 32'sd0;
+        sync_locked_reg <= 1'b0;
+        nsec_gray_reg <= 32'd0;
+        sec_gray_reg <= RESET_SEC ^ (RESET_SEC >> 1);
+    end
+end
+
 endmodule
 
 `resetall
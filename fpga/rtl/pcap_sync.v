@@ -0,0 +1,233 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * Time synchronization line of pcap_clock
+ *
+ * Every unit sends its time on sync_out, one frame per second of 64 slots of
+ * TICKS_PER_SEC/64 cycles, each starting with a rising edge:
+ * - slot 0 starts with the second and holds a marker pulse (8/10 slot)
+ * - slots 1 to 32 hold the seconds, MSB first, as pulses of 5/10 slot (1)
+ *   or 2/10 slot (0)
+ * - the remaining slots are low
+ *
+ * A unit receiving such a line on sync_in takes its own time at the rising
+ * edge of the marker. Once the seconds were received, meas_valid reports the
+ * offset of the own clock in ticks (ahead is positive, corrected by
+ * SYNC_LATENCY) and the difference of the seconds to the sender.
+ * meas_active drops if no frame arrived for two seconds.
+ */
+module pcap_sync #
+(
+    // Cycles of clk per second
+    parameter TICKS_PER_SEC = 125000000,
+    // Ticks from the start of a second of the sender to the capture of the
+    // marker edge by the receiver, both running at the same rate
+    parameter SYNC_LATENCY = 3
+)
+(
+    input  wire        clk,
+    input  wire        rst,
+
+    /*
+     * Own time
+     */
+    input  wire [31:0] ticks,
+    input  wire [31:0] sec,
+    input  wire        sec_start,
+
+    /*
+     * Synchronization line
+     */
+    input  wire        sync_in,
+    output wire        sync_out,
+
+    /*
+     * Measurement
+     */
+    output wire        meas_valid,
+    output wire [31:0] meas_offset,
+    output wire [31:0] meas_sec_delta,
+    output wire        meas_active
+);
+
+localparam SLOTS = 64;
+localparam SLOT_TICKS = TICKS_PER_SEC / SLOTS;
+localparam MARK_WIDTH = SLOT_TICKS * 8 / 10;
+localparam ONE_WIDTH = SLOT_TICKS * 5 / 10;
+localparam ZERO_WIDTH = SLOT_TICKS * 2 / 10;
+
+// pulse widths telling marker, 1 and 0 apart
+localparam MARK_MIN = (MARK_WIDTH + ONE_WIDTH) / 2;
+localparam ONE_MIN = (ONE_WIDTH + ZERO_WIDTH) / 2;
+
+localparam CNT_WIDTH = $clog2(2*TICKS_PER_SEC+1);
+
+initial begin
+    if (ZERO_WIDTH < 2) begin
+        $error("Error: TICKS_PER_SEC too small for the sync frame (instance %m)");
+        $finish;
+    end
+end
+
+/* Sender
+ * The frame restarts with every second of the own clock. */
+reg [6:0] tx_slot_reg = SLOTS;
+reg [CNT_WIDTH-1:0] tx_cnt_reg = 0;
+reg [31:0] tx_shift_reg = 32'd0;
+reg sync_out_reg = 1'b0;
+
+assign sync_out = sync_out_reg;
+
+always @(posedge clk) begin
+    if (sec_start) begin
+        tx_slot_reg <= 0;
+        tx_cnt_reg <= 0;
+        tx_shift_reg <= sec;
+    end else if (tx_slot_reg < SLOTS) begin
+        if (tx_cnt_reg == SLOT_TICKS-1) begin
+            tx_cnt_reg <= 0;
+            tx_slot_reg <= tx_slot_reg + 1;
+            if (tx_slot_reg != 0) begin
+                tx_shift_reg <= tx_shift_reg << 1;
+            end
+        end else begin
+            tx_cnt_reg <= tx_cnt_reg + 1;
+        end
+    end
+
+    if (tx_slot_reg == 0) begin
+        sync_out_reg <= tx_cnt_reg < MARK_WIDTH;
+    end else if (tx_slot_reg <= 32) begin
+        sync_out_reg <= tx_cnt_reg < (tx_shift_reg[31] ? ONE_WIDTH : ZERO_WIDTH);
+    end else begin
+        sync_out_reg <= 1'b0;
+    end
+
+    if (rst) begin
+        tx_slot_reg <= SLOTS;
+        tx_cnt_reg <= 0;
+        sync_out_reg <= 1'b0;
+    end
+end
+
+/* Receiver
+ * Pulses are classified by their width when they end, the own time is
+ * taken at their rising edge. */
+reg [2:0] sync_in_reg = 3'b0;
+
+wire rx_rise = sync_in_reg[1] && !sync_in_reg[2];
+wire rx_fall = !sync_in_reg[1] && sync_in_reg[2];
+
+reg [CNT_WIDTH-1:0] rx_width_reg = 0;
+reg [31:0] rx_rise_ticks_reg = 32'd0;
+reg [31:0] rx_rise_sec_reg = 32'd0;
+
+reg rx_frame_reg = 1'b0;
+reg [5:0] rx_bit_cnt_reg = 6'd0;
+reg [31:0] rx_shift_reg = 32'd0;
+reg rx_done_reg = 1'b0;
+reg [31:0] edge_ticks_reg = 32'd0;
+reg [31:0] edge_sec_reg = 32'd0;
+
+reg meas_valid_reg = 1'b0;
+reg [31:0] meas_offset_reg = 32'd0;
+reg [31:0] meas_sec_delta_reg = 32'd0;
+reg meas_active_reg = 1'b0;
+reg [CNT_WIDTH-1:0] idle_cnt_reg = 0;
+
+assign meas_valid = meas_valid_reg;
+assign meas_offset = meas_offset_reg;
+assign meas_sec_delta = meas_sec_delta_reg;
+assign meas_active = meas_active_reg;
+
+// an edge late in the own second belongs to the next one
+wire edge_late = edge_ticks_reg >= TICKS_PER_SEC/2 + SYNC_LATENCY;
+
+always @(posedge clk) begin
+    sync_in_reg <= {sync_in_reg[1:0], sync_in};
+    meas_valid_reg <= 1'b0;
+    rx_done_reg <= 1'b0;
+
+    if (sync_in_reg[1] && rx_width_reg != {CNT_WIDTH{1'b1}}) begin
+        rx_width_reg <= rx_width_reg + 1;
+    end
+
+    if (rx_rise) begin
+        rx_width_reg <= 1;
+        rx_rise_ticks_reg <= ticks;
+        rx_rise_sec_reg <= sec;
+    end
+
+    if (rx_fall) begin
+        if (rx_width_reg >= MARK_MIN) begin
+            rx_frame_reg <= 1'b1;
+            rx_bit_cnt_reg <= 6'd0;
+            edge_ticks_reg <= rx_rise_ticks_reg;
+            edge_sec_reg <= rx_rise_sec_reg;
+        end else if (rx_frame_reg) begin
+            rx_shift_reg <= {rx_shift_reg[30:0], rx_width_reg >= ONE_MIN};
+            rx_bit_cnt_reg <= rx_bit_cnt_reg + 1;
+            if (rx_bit_cnt_reg == 31) begin
+                rx_frame_reg <= 1'b0;
+                rx_done_reg <= 1'b1;
+            end
+        end
+    end
+
+    if (rx_done_reg) begin
+        meas_valid_reg <= 1'b1;
+        if (edge_late) begin
+            meas_offset_reg <= edge_ticks_reg - SYNC_LATENCY - TICKS_PER_SEC;
+            meas_sec_delta_reg <= rx_shift_reg - (edge_sec_reg + 1);
+        end else begin
+            meas_offset_reg <= edge_ticks_reg - SYNC_LATENCY;
+            meas_sec_delta_reg <= rx_shift_reg - edge_sec_reg;
+        end
+    end
+
+    if (meas_valid_reg) begin
+        idle_cnt_reg <= 0;
+        meas_active_reg <= 1'b1;
+    end else if (idle_cnt_reg == 2*TICKS_PER_SEC) begin
+        meas_active_reg <= 1'b0;
+    end else begin
+        idle_cnt_reg <= idle_cnt_reg + 1;
+    end
+
+    if (rst) begin
+        rx_width_reg <= 0;
+        rx_frame_reg <= 1'b0;
+        rx_done_reg <= 1'b0;
+        meas_valid_reg <= 1'b0;
+        meas_active_reg <= 1'b0;
+        idle_cnt_reg <= 0;
+    end
+end
+
+endmodule
+
+`resetall
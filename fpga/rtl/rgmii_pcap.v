@@ -27,6 +27,19 @@ with aRTS. If not, see <https://www.gnu.org/licenses/>.
 
 /*
  * RGMII Stream to PCAP Stream converter
+ *
+ * Every frame becomes a record with a 16 byte header (ts_sec, ts_nsec,
+ * incl_len, orig_len) in front of it. The upper 16 bits of orig_len hold the
+ * port in bits [31:28] and a 12 bit sequence number counting the records of
+ * this port in bits [27:16], so that the records of the ports can be told
+ * apart after they were merged and a record lost behind this module shows up
+ * as a gap.
+ *
+ * Frames dropped by the RX FIFO are reported by a loss marker record in
+ * front of the next record: a 64 byte broadcast frame from 02:00:00:00:00:PORT
+ * with EtherType 0x88b6, carrying "aRTS", the type 1, the port and the number
+ * of dropped frames and bytes (big endian), timestamped with the first
+ * dropped frame. Markers bypass the capture filter.
  */
 module rgmii_pcap #
 (
@@ -42,6 +55,10 @@ module rgmii_pcap #
     parameter KEEP_WIDTH = ((AXI_DATA_WIDTH+7)/8),
     // width of frame length counter
     parameter FRAME_LEN_WIDTH = 16,
+    // number of offset/mask/value rules of the capture filter
+    parameter FILTER_RULE_COUNT = 4,
+    // port number in the record headers and loss markers
+    parameter PORT = 0,
     // target ("SIM", "GENERIC", "XILINX", "ALTERA")
     parameter TARGET = "GENERIC",
     // IODDR style ("IODDR", "IODDR2")
@@ -79,6 +96,8 @@ module rgmii_pcap #
     output wire                       fifo_overflow,
     output wire                       fifo_bad_frame,
     output wire                       fifo_good_frame,
+    // bytes stored in the RX FIFO, in the axi_clk domain
+    output wire [$clog2(FIFO_DEPTH):0] fifo_occupancy,
     output wire                       start_packet,
     output wire                       bad_frame,
     output wire                       bad_fcs,
@@ -89,13 +108,49 @@ module rgmii_pcap #
     output wire                       busy,
 
     input  wire                       enable,
-    input  wire                       mii_select
+    input  wire                       mii_select,
+
+    // maximum number of captured bytes per frame, 0 captures whole frames
+    input  wire [15:0]                snaplen,
+
+    /*
+     * Capture filter
+     */
+    input  wire [31:0]                      filter_ctrl,
+    input  wire [15:0]                      filter_ethertype,
+    input  wire [11:0]                      filter_vlan_id,
+    input  wire [47:0]                      filter_dst_mac,
+    input  wire [47:0]                      filter_src_mac,
+    input  wire [FILTER_RULE_COUNT*16-1:0]  filter_rule_offset,
+    input  wire [FILTER_RULE_COUNT*64-1:0]  filter_rule_mask,
+    input  wire [FILTER_RULE_COUNT*64-1:0]  filter_rule_value,
+
+    output wire                             filter_drop_frame,
+    output wire [FRAME_LEN_WIDTH-1:0]       filter_drop_bytes
 );
 
 // depth of internal FIFO in words
 localparam FIFO_WORD_DEPTH = FIFO_DEPTH/KEEP_WIDTH;
 // TODO: fix s_overflow of ASYNC FIFO
 
+// bus width assertions
+initial begin
+    if (AXI_DATA_WIDTH != 64) begin
+        $error("Error: records are built from 64 bit words, AXI_DATA_WIDTH must be 64 (instance %m)");
+        $finish;
+    end
+
+    if (FRAME_LEN_WIDTH > 16) begin
+        $error("Error: port and sequence number take the upper half of orig_len, FRAME_LEN_WIDTH must not exceed 16 (instance %m)");
+        $finish;
+    end
+
+    if (PORT > 15) begin
+        $error("Error: the record header holds 4 bits of the port, PORT must not exceed 15 (instance %m)");
+        $finish;
+    end
+end
+
 
 wire rx_clk;
 wire rx_rst;
@@ -108,7 +163,7 @@ wire [AXIS_USER_WIDTH-1:0] rx_axis_tuser;
 
 wire [AXI_DATA_WIDTH-1:0] m_axis_packet_tdata;
 wire m_axis_packet_tvalid;
-wire m_axis_packet_tready_final = m_axis_packet_tready_reg && m_axis_packet_tready;
+wire m_axis_packet_tready_final;
 reg m_axis_packet_tready_reg;
 wire m_axis_packet_tready;
 wire m_axis_packet_tlast;
@@ -233,6 +288,125 @@ rx_data_fifo (
     .m_status_good_frame(fifo_good_frame)
 );
 
+/*
+ * RX FIFO occupancy
+ *
+ * The FIFO stores AXI_DATA_WIDTH words after the width conversion. The words
+ * written by the MAC (including those of frames the FIFO drops) and the words
+ * of dropped frames are counted in rx_clk, cross to axi_clk as gray codes and
+ * are compared with the words read. The words of a dropped frame are only
+ * known at its end and are counted down one per cycle to keep the gray code
+ * valid, so the occupancy briefly lags behind after an overflow.
+ */
+localparam FIFO_WORD_BEATS = AXI_DATA_WIDTH/AXIS_DATA_WIDTH;
+localparam FIFO_COUNT_WIDTH = $clog2(FIFO_WORD_DEPTH) + 2;
+
+reg [$clog2(FIFO_WORD_BEATS)-1:0] fifo_beat_reg = 0;
+reg [FIFO_COUNT_WIDTH-1:0] fifo_frame_words_reg = 0, fifo_last_frame_words_reg = 0;
+reg [FIFO_COUNT_WIDTH-1:0] fifo_drop_pending_reg = 0;
+reg [FIFO_COUNT_WIDTH-1:0] fifo_wr_count_reg = 0, fifo_drop_count_reg = 0;
+reg [FIFO_COUNT_WIDTH-1:0] fifo_wr_count_gray_reg = 0, fifo_drop_count_gray_reg = 0;
+
+wire fifo_word_done = rx_axis_tvalid && (rx_axis_tlast || fifo_beat_reg == FIFO_WORD_BEATS-1);
+
+always @(posedge rx_clk) begin
+    if (rx_rst) begin
+        fifo_beat_reg <= 0;
+        fifo_frame_words_reg <= 0;
+        fifo_last_frame_words_reg <= 0;
+        fifo_drop_pending_reg <= 0;
+        fifo_wr_count_reg <= 0;
+        fifo_drop_count_reg <= 0;
+        fifo_wr_count_gray_reg <= 0;
+        fifo_drop_count_gray_reg <= 0;
+    end else begin
+        if (rx_axis_tvalid) begin
+            fifo_beat_reg <= rx_axis_tlast ? 0 : fifo_beat_reg + 1;
+        end
+
+        if (fifo_word_done) begin
+            fifo_wr_count_reg <= fifo_wr_count_reg + 1;
+            fifo_frame_words_reg <= rx_axis_tlast ? 0 : fifo_frame_words_reg + 1;
+        end
+
+        if (rx_axis_tvalid && rx_axis_tlast) begin
+            fifo_last_frame_words_reg <= fifo_frame_words_reg + 1;
+        end
+
+        // the overflow status follows the last word of the dropped frame
+        fifo_drop_pending_reg <= fifo_drop_pending_reg
+            + (s_overflow ? fifo_last_frame_words_reg : 0)
+            - (fifo_drop_pending_reg != 0);
+        fifo_drop_count_reg <= fifo_drop_count_reg + (fifo_drop_pending_reg != 0);
+
+        fifo_wr_count_gray_reg <= fifo_wr_count_reg ^ (fifo_wr_count_reg >> 1);
+        fifo_drop_count_gray_reg <= fifo_drop_count_reg ^ (fifo_drop_count_reg >> 1);
+    end
+end
+
+wire [FIFO_COUNT_WIDTH-1:0] fifo_wr_count_gray_sync, fifo_drop_count_gray_sync;
+wire [FIFO_COUNT_WIDTH-1:0] fifo_wr_count_sync, fifo_drop_count_sync;
+
+word_cdc # (
+    .DATA_WIDTH(2*FIFO_COUNT_WIDTH),
+    .DEPTH(2)
+)
+fifo_count_cdc (
+    .input_clk(rx_clk),
+    .output_clk(axi_clk),
+    .rst(1'b0),
+
+    .input_data({fifo_drop_count_gray_reg, fifo_wr_count_gray_reg}),
+    .output_data({fifo_drop_count_gray_sync, fifo_wr_count_gray_sync})
+);
+
+gray2bin # (
+    .WIDTH(FIFO_COUNT_WIDTH)
+)
+gray2bin_fifo_wr_count (
+    .clk(axi_clk),
+    .rst(axi_rst),
+
+    .gray(fifo_wr_count_gray_sync),
+    .bin(fifo_wr_count_sync)
+);
+
+gray2bin # (
+    .WIDTH(FIFO_COUNT_WIDTH)
+)
+gray2bin_fifo_drop_count (
+    .clk(axi_clk),
+    .rst(axi_rst),
+
+    .gray(fifo_drop_count_gray_sync),
+    .bin(fifo_drop_count_sync)
+);
+
+reg [FIFO_COUNT_WIDTH-1:0] fifo_rd_count_reg = 0;
+reg [$clog2(FIFO_DEPTH):0] fifo_occupancy_reg = 0;
+
+wire [FIFO_COUNT_WIDTH-1:0] fifo_word_count = fifo_wr_count_sync - fifo_drop_count_sync - fifo_rd_count_reg;
+
+assign fifo_occupancy = fifo_occupancy_reg;
+
+always @(posedge axi_clk) begin
+    if (axi_rst) begin
+        fifo_rd_count_reg <= 0;
+        fifo_occupancy_reg <= 0;
+    end else begin
+        fifo_rd_count_reg <= fifo_rd_count_reg + (m_axis_packet_tvalid && m_axis_packet_tready_final);
+
+        // the synchronized counts lag behind, do not report a negative occupancy
+        if (fifo_word_count[FIFO_COUNT_WIDTH-1]) begin
+            fifo_occupancy_reg <= 0;
+        end else if (fifo_word_count > FIFO_WORD_DEPTH) begin
+            fifo_occupancy_reg <= FIFO_DEPTH;
+        end else begin
+            fifo_occupancy_reg <= fifo_word_count * KEEP_WIDTH;
+        end
+    end
+end
+
 wire [31:0] ts_nsec_gray_rx;
 wire [31:0] ts_sec_gray_rx;
 wire [31:0] ts_nsec_rx;
@@ -474,35 +648,177 @@ frame_len_fifo (
     .m_status_good_frame()
 );
 
-localparam STATE_WIDTH = 2;
+/*
+ * Loss accounting
+ *
+ * Frames dropped by the RX FIFO are counted along with their bytes and the
+ * timestamp of the first one, and are passed to axi_clk by the loss FIFO.
+ * Every entry is tagged with the number of frames stored before the loss, so
+ * that its marker is placed at the position of the loss in the stream. While
+ * the loss FIFO is full, further losses are added to the pending entry.
+ */
+localparam LOSS_WIDTH = 16+32+32+64;
+
+reg [15:0] rx_frame_count_reg = 16'd0;
+reg [15:0] loss_tag_reg = 16'd0;
+reg [31:0] loss_frames_reg = 32'd0;
+reg [31:0] loss_bytes_reg = 32'd0;
+reg [63:0] loss_ts_reg = 64'd0;
+
+wire s_axis_loss_tready;
+wire s_axis_loss_tvalid = loss_frames_reg != 0 && !s_overflow;
+
+wire [LOSS_WIDTH-1:0] m_axis_loss_tdata;
+wire m_axis_loss_tvalid;
+reg m_axis_loss_tready_reg = 1'b0;
+
+always @(posedge rx_clk) begin
+    if (s_good_frame) begin
+        rx_frame_count_reg <= rx_frame_count_reg + 1;
+    end
+
+    if (s_axis_loss_tvalid && s_axis_loss_tready) begin
+        loss_frames_reg <= 32'd0;
+        loss_bytes_reg <= 32'd0;
+    end
+
+    if (s_overflow) begin
+        if (loss_frames_reg == 0) begin
+            loss_tag_reg <= rx_frame_count_reg;
+            loss_ts_reg <= axis_timestamp_tdata;
+        end
+
+        loss_frames_reg <= loss_frames_reg + 1;
+        loss_bytes_reg <= loss_bytes_reg + frame_len_piped;
+    end
+
+    if (rx_rst) begin
+        rx_frame_count_reg <= 16'd0;
+        loss_frames_reg <= 32'd0;
+        loss_bytes_reg <= 32'd0;
+    end
+end
+
+axis_async_fifo # (
+    .DATA_WIDTH(LOSS_WIDTH),
+    .USER_ENABLE(0),
+    .USER_WIDTH(1),
+    .LAST_ENABLE(0),
+    .DEST_ENABLE(0),
+    .DEST_WIDTH(1),
+    .ID_ENABLE(0),
+    .ID_WIDTH(1),
+    .DEPTH(16),
+    .KEEP_ENABLE(0),
+    .FRAME_FIFO(0)
+)
+loss_fifo (
+    // AXI input
+    .s_clk(rx_clk),
+    .s_rst(rx_rst),
+    .s_axis_tdata({loss_tag_reg, loss_frames_reg, loss_bytes_reg, loss_ts_reg}),
+    .s_axis_tkeep({LOSS_WIDTH/8{1'b1}}),
+    .s_axis_tvalid(s_axis_loss_tvalid),
+    .s_axis_tready(s_axis_loss_tready),
+    .s_axis_tlast(1'b0),
+    .s_axis_tid(1'b0),
+    .s_axis_tdest(1'b0),
+    .s_axis_tuser(1'b0),
+    // AXI output
+    .m_clk(axi_clk),
+    .m_rst(axi_rst),
+    .m_axis_tdata(m_axis_loss_tdata),
+    .m_axis_tkeep(),
+    .m_axis_tvalid(m_axis_loss_tvalid),
+    .m_axis_tready(m_axis_loss_tready_reg),
+    .m_axis_tlast(),
+    .m_axis_tid(),
+    .m_axis_tdest(),
+    .m_axis_tuser(),
+    // Status
+    .s_status_overflow(),
+    .s_status_bad_frame(),
+    .s_status_good_frame(),
+    .m_status_overflow(),
+    .m_status_bad_frame(),
+    .m_status_good_frame()
+);
+
+// frames started in axi_clk, a loss is due once all frames before it started
+reg [15:0] frame_count_reg = 16'd0;
+wire [15:0] loss_lag = frame_count_reg - m_axis_loss_tdata[LOSS_WIDTH-1 -: 16];
+wire loss_ready = m_axis_loss_tvalid && !loss_lag[15];
+
+// PCAP records in front of the capture filter
+wire [AXI_DATA_WIDTH-1:0] pcap_axis_tdata;
+wire pcap_axis_tvalid;
+wire pcap_axis_tready;
+wire pcap_axis_tlast;
+wire [KEEP_WIDTH-1:0] pcap_axis_tkeep;
+wire [AXIS_USER_WIDTH-1:0] pcap_axis_tuser;
+
+localparam STATE_WIDTH = 3;
 localparam [STATE_WIDTH-1:0]
-    IDLE_STATE = 2'd0,
-    PREPARE_STATE = 2'd1,
-    TRANSMISSION_STATE = 2'd2,
-    FINISH_STATE = 2'd3;
+    IDLE_STATE = 3'd0,
+    PREPARE_STATE = 3'd1,
+    TRANSMISSION_STATE = 3'd2,
+    FINISH_STATE = 3'd3,
+    MARKER_STATE = 3'd4;
 reg [STATE_WIDTH-1:0] state_reg = IDLE_STATE;
 
+// snap length of the current frame, fixed at its start
+reg [15:0] snaplen_reg = 16'd0;
+// the record left the prepend pipeline
+reg record_done_reg = 1'b0;
+
+// loss reported by the current marker
+reg [63:0] marker_ts_reg = 64'd0;
+reg [31:0] marker_frames_reg = 32'd0;
+reg [31:0] marker_bytes_reg = 32'd0;
+
+wire m_axis_packet_tvalid_int = m_axis_packet_tready_reg ? m_axis_packet_tvalid : 1'b0;
+wire packet_end = m_axis_packet_tvalid_int && m_axis_packet_tready_final && m_axis_packet_tlast;
+wire record_end = pcap_axis_tvalid && pcap_axis_tready && pcap_axis_tlast;
+wire frame_ready = m_axis_packet_tvalid && m_axis_timestamp_tvalid && m_axis_frame_len_tvalid;
+wire marker_end;
 
 always @(posedge axi_clk) begin
     if (axi_rst) begin
         m_axis_packet_tready_reg <= 1'b0;
         m_axis_frame_len_tready_reg <= 1'b0;
         m_axis_timestamp_tready_reg <= 1'b0;
+        m_axis_loss_tready_reg <= 1'b0;
+        record_done_reg <= 1'b0;
+        frame_count_reg <= 16'd0;
 
         state_reg = IDLE_STATE;
     end else begin
         m_axis_packet_tready_reg <= m_axis_packet_tready_reg;
         m_axis_frame_len_tready_reg <= m_axis_frame_len_tready_reg;
         m_axis_timestamp_tready_reg <= m_axis_timestamp_tready_reg;
+        m_axis_loss_tready_reg <= 1'b0;
 
         state_reg <= state_reg;
 
+        // a truncated record ends before its frame was read from the FIFO
+        if (record_end) begin
+            record_done_reg <= 1'b1;
+        end
+
         case (state_reg)
             IDLE_STATE: begin
-                if (m_axis_packet_tvalid && m_axis_timestamp_tvalid && m_axis_frame_len_tvalid) begin
+                if (loss_ready) begin
+                    m_axis_loss_tready_reg <= 1'b1;
+                    {marker_frames_reg, marker_bytes_reg, marker_ts_reg} <= m_axis_loss_tdata[LOSS_WIDTH-17:0];
+
+                    state_reg <= MARKER_STATE;
+                end else if (frame_ready) begin
                     m_axis_packet_tready_reg <= 1'b0;
                     m_axis_frame_len_tready_reg <= 1'b1;
                     m_axis_timestamp_tready_reg <= 1'b1;
+                    snaplen_reg <= snaplen;
+                    record_done_reg <= 1'b0;
+                    frame_count_reg <= frame_count_reg + 1;
 
                     state_reg <= TRANSMISSION_STATE;
                 end
@@ -512,18 +828,26 @@ always @(posedge axi_clk) begin
                 m_axis_timestamp_tready_reg <= 1'b0;
                 m_axis_packet_tready_reg <= 1'b1;
 
-                if (m_axis_packet_tlast && m_axis_tready) begin
+                if (packet_end) begin
                     state_reg <= FINISH_STATE;
                     m_axis_packet_tready_reg <= 1'b0;
                 end
             end
             FINISH_STATE: begin
                 // wait till AXI Stream prepending pipeline is cleared
-                if (m_axis_tlast && m_axis_tready) begin
-                    if (m_axis_packet_tvalid && m_axis_timestamp_tvalid && m_axis_frame_len_tvalid) begin
+                if (record_done_reg || record_end) begin
+                    if (loss_ready) begin
+                        m_axis_loss_tready_reg <= 1'b1;
+                        {marker_frames_reg, marker_bytes_reg, marker_ts_reg} <= m_axis_loss_tdata[LOSS_WIDTH-17:0];
+
+                        state_reg <= MARKER_STATE;
+                    end else if (frame_ready) begin
                         m_axis_packet_tready_reg <= 1'b0;
                         m_axis_frame_len_tready_reg <= 1'b1;
                         m_axis_timestamp_tready_reg <= 1'b1;
+                        snaplen_reg <= snaplen;
+                        record_done_reg <= 1'b0;
+                        frame_count_reg <= frame_count_reg + 1;
 
                         state_reg <= TRANSMISSION_STATE;
                     end else begin
@@ -531,13 +855,59 @@ always @(posedge axi_clk) begin
                     end
                 end
             end
+            MARKER_STATE: begin
+                // the marker is sent behind the records held by the filter
+                if (marker_end) begin
+                    state_reg <= IDLE_STATE;
+                end
+            end
         endcase
     end
 end
 
 wire [31:0] frame_len_prepend_value = {{(32-FRAME_LEN_WIDTH){1'b0}}, m_axis_frame_len_tdata};
 
-wire m_axis_packet_tvalid_int = m_axis_packet_tready_reg ? m_axis_packet_tvalid : 1'b0;
+// incl_len is limited by the snap length, orig_len is always the frame length
+wire snap_frame = snaplen_reg != 0 && snaplen_reg < frame_len_prepend_value;
+wire [31:0] incl_len_prepend_value = snap_frame ? {16'b0, snaplen_reg} : frame_len_prepend_value;
+
+// Truncation of frames to the snap length: words up to the snap length are
+// passed on, the word reaching it becomes the last one and the rest of the
+// frame is read from the FIFO and discarded
+reg [15:0] snap_count_reg = 16'd0;
+
+wire snap_enable = snaplen_reg != 0;
+wire snap_discard = snap_enable && snap_count_reg >= snaplen_reg;
+wire snap_last = snap_enable && snap_count_reg + KEEP_WIDTH >= snaplen_reg;
+
+reg [KEEP_WIDTH-1:0] snap_tkeep;
+
+integer i;
+
+always @* begin
+    for (i = 0; i < KEEP_WIDTH; i = i + 1) begin
+        snap_tkeep[i] = m_axis_packet_tkeep[i] && (!snap_enable || snap_count_reg + i < snaplen_reg);
+    end
+end
+
+wire snap_axis_tvalid = m_axis_packet_tvalid_int && !snap_discard;
+wire snap_axis_tlast = m_axis_packet_tlast || snap_last;
+
+assign m_axis_packet_tready_final = m_axis_packet_tready_reg && (snap_discard || m_axis_packet_tready);
+
+always @(posedge axi_clk) begin
+    if (m_axis_packet_tvalid_int && m_axis_packet_tready_final) begin
+        if (m_axis_packet_tlast) begin
+            snap_count_reg <= 16'd0;
+        end else if (!snap_discard) begin
+            snap_count_reg <= snap_count_reg + KEEP_WIDTH;
+        end
+    end
+
+    if (axi_rst) begin
+        snap_count_reg <= 16'd0;
+    end
+end
 wire [AXI_DATA_WIDTH-1:0] m_axis_tdata_int;
 wire m_axis_tvalid_int;
 wire m_axis_tready_int;
@@ -561,11 +931,11 @@ axis_frame_len_prepend (
      * AXI4-Stream input
      */
     .s_axis_tdata(m_axis_packet_tdata),
-    .s_axis_tvalid(m_axis_packet_tvalid_int),
+    .s_axis_tvalid(snap_axis_tvalid),
     .s_axis_tready(m_axis_packet_tready),
-    .s_axis_tlast(m_axis_packet_tlast),
+    .s_axis_tlast(snap_axis_tlast),
     .s_axis_tuser(m_axis_packet_tuser),
-    .s_axis_tkeep(m_axis_packet_tkeep),
+    .s_axis_tkeep(snap_tkeep),
 
     /*
      * AXI4-Stream output
@@ -577,7 +947,7 @@ axis_frame_len_prepend (
     .m_axis_tuser(m_axis_tuser_int),
     .m_axis_tkeep(m_axis_tkeep_int),
 
-    .prepend_value({frame_len_prepend_value, frame_len_prepend_value}),
+    .prepend_value({frame_len_prepend_value, incl_len_prepend_value}),
 
     .start_packet(m_axis_frame_len_tready_reg)
 );
@@ -607,18 +977,163 @@ axis_ts_prepend (
     /*
      * AXI4-Stream output
      */
-    .m_axis_tdata(m_axis_tdata),
-    .m_axis_tvalid(m_axis_tvalid),
-    .m_axis_tready(m_axis_tready),
-    .m_axis_tlast(m_axis_tlast),
-    .m_axis_tuser(m_axis_tuser),
-    .m_axis_tkeep(m_axis_tkeep),
+    .m_axis_tdata(pcap_axis_tdata),
+    .m_axis_tvalid(pcap_axis_tvalid),
+    .m_axis_tready(pcap_axis_tready),
+    .m_axis_tlast(pcap_axis_tlast),
+    .m_axis_tuser(pcap_axis_tuser),
+    .m_axis_tkeep(pcap_axis_tkeep),
 
     .prepend_value(m_axis_timestamp_tdata),
 
     .start_packet(m_axis_timestamp_tready_reg)
 );
 
+// records accepted by the capture filter
+wire [AXI_DATA_WIDTH-1:0] filt_axis_tdata;
+wire filt_axis_tvalid;
+wire filt_axis_tready;
+wire filt_axis_tlast;
+wire [KEEP_WIDTH-1:0] filt_axis_tkeep;
+wire [AXIS_USER_WIDTH-1:0] filt_axis_tuser;
+
+// drop unwanted records before they compete for the DMA
+axis_pcap_filter #
+(
+    .DATA_WIDTH(AXI_DATA_WIDTH),
+    .KEEP_WIDTH(KEEP_WIDTH),
+    .USER_WIDTH(AXIS_USER_WIDTH),
+    .RULE_COUNT(FILTER_RULE_COUNT),
+    .FRAME_LEN_WIDTH(FRAME_LEN_WIDTH)
+)
+axis_pcap_filter_inst (
+    .clk(axi_clk),
+    .rst(axi_rst),
+
+    /*
+     * AXI4-Stream input
+     */
+    .s_axis_tdata(pcap_axis_tdata),
+    .s_axis_tvalid(pcap_axis_tvalid),
+    .s_axis_tready(pcap_axis_tready),
+    .s_axis_tlast(pcap_axis_tlast),
+    .s_axis_tuser(pcap_axis_tuser),
+    .s_axis_tkeep(pcap_axis_tkeep),
+
+    /*
+     * AXI4-Stream output
+     */
+    .m_axis_tdata(filt_axis_tdata),
+    .m_axis_tvalid(filt_axis_tvalid),
+    .m_axis_tready(filt_axis_tready),
+    .m_axis_tlast(filt_axis_tlast),
+    .m_axis_tuser(filt_axis_tuser),
+    .m_axis_tkeep(filt_axis_tkeep),
+
+    .filter_ctrl(filter_ctrl),
+    .filter_ethertype(filter_ethertype),
+    .filter_vlan_id(filter_vlan_id),
+    .filter_dst_mac(filter_dst_mac),
+    .filter_src_mac(filter_src_mac),
+    .filter_rule_offset(filter_rule_offset),
+    .filter_rule_mask(filter_rule_mask),
+    .filter_rule_value(filter_rule_value),
+
+    .drop_frame(filter_drop_frame),
+    .drop_bytes(filter_drop_bytes)
+);
+
+/*
+ * Loss markers and sequence numbers
+ *
+ * A marker is only inserted once the filter holds no record, so it keeps its
+ * place behind the records received before the loss.
+ */
+localparam MARKER_WORDS = (16+64)/8;
+localparam [7:0] PORT_ID = PORT;
+
+reg [7:0] filter_records_reg = 8'd0;
+reg marker_active_reg = 1'b0;
+reg [3:0] marker_word_reg = 4'd0;
+reg [63:0] marker_word;
+
+always @* begin
+    case (marker_word_reg)
+        4'd0: marker_word = marker_ts_reg;
+        // incl_len and orig_len
+        4'd1: marker_word = {32'd64, 32'd64};
+        // destination and source MAC
+        4'd2: marker_word = {8'h00, 8'h02, 48'hffffffffffff};
+        // source MAC, EtherType and magic
+        4'd3: marker_word = {8'h52, 8'h61, 8'hb6, 8'h88, PORT_ID, 24'd0};
+        // magic, type, port and dropped frames
+        4'd4: marker_word = {marker_frames_reg[7:0], marker_frames_reg[15:8], marker_frames_reg[23:16],
+                marker_frames_reg[31:24], PORT_ID, 8'h01, 8'h53, 8'h54};
+        // dropped bytes
+        4'd5: marker_word = {32'd0, marker_bytes_reg[7:0], marker_bytes_reg[15:8], marker_bytes_reg[23:16],
+                marker_bytes_reg[31:24]};
+        default: marker_word = 64'd0;
+    endcase
+end
+
+wire [AXI_DATA_WIDTH-1:0] seq_axis_tdata = marker_active_reg ? marker_word : filt_axis_tdata;
+wire seq_axis_tvalid = marker_active_reg || filt_axis_tvalid;
+wire seq_axis_tlast = marker_active_reg ? marker_word_reg == MARKER_WORDS-1 : filt_axis_tlast;
+
+assign filt_axis_tready = m_axis_tready && !marker_active_reg;
+assign marker_end = marker_active_reg && m_axis_tready && marker_word_reg == MARKER_WORDS-1;
+
+always @(posedge axi_clk) begin
+    filter_records_reg <= filter_records_reg + record_end
+        - (filt_axis_tvalid && filt_axis_tready && filt_axis_tlast) - filter_drop_frame;
+
+    if (marker_active_reg) begin
+        if (m_axis_tready) begin
+            marker_word_reg <= marker_word_reg + 1;
+            if (marker_end) begin
+                marker_active_reg <= 1'b0;
+            end
+        end
+    end else if (state_reg == MARKER_STATE && filter_records_reg == 0 && !m_axis_loss_tready_reg) begin
+        marker_active_reg <= 1'b1;
+        marker_word_reg <= 4'd0;
+    end
+
+    if (axi_rst) begin
+        filter_records_reg <= 8'd0;
+        marker_active_reg <= 1'b0;
+        marker_word_reg <= 4'd0;
+    end
+end
+
+// the upper half of orig_len in the second word holds port and sequence number
+reg [11:0] seq_reg = 12'd0;
+reg seq_header_reg = 1'b0;
+reg seq_first_reg = 1'b1;
+
+assign m_axis_tdata = seq_header_reg ? {PORT_ID[3:0], seq_reg, seq_axis_tdata[47:0]} : seq_axis_tdata;
+assign m_axis_tvalid = seq_axis_tvalid;
+assign m_axis_tlast = seq_axis_tlast;
+assign m_axis_tkeep = marker_active_reg ? {KEEP_WIDTH{1'b1}} : filt_axis_tkeep;
+assign m_axis_tuser = marker_active_reg ? {AXIS_USER_WIDTH{1'b0}} : filt_axis_tuser;
+
+always @(posedge axi_clk) begin
+    if (m_axis_tvalid && m_axis_tready) begin
+        seq_first_reg <= m_axis_tlast;
+        seq_header_reg <= seq_first_reg && !m_axis_tlast;
+
+        if (m_axis_tlast) begin
+            seq_reg <= seq_reg + 1;
+        end
+    end
+
+    if (axi_rst) begin
+        seq_reg <= 12'd0;
+        seq_header_reg <= 1'b0;
+        seq_first_reg <= 1'b1;
+    end
+end
+
 wire [63:0] axis_timestamp_tdata_ext = {axis_timestamp_tdata[63:1], dropped_reg};
 
 reg dropped_reg = 0;
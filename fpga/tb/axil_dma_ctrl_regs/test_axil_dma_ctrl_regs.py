@@ -28,9 +28,22 @@ import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, FallingEdge
 from cocotb.regression import TestFactory
+from cocotb.utils import get_sim_time
 
 from cocotbext.axi import AxiLiteMaster, AxiLiteBus
 
+CLK_PERIOD_NS = 8
+
+DMA_CTRL_ID = 0x08
+DMA_STATUS_ID = 0x0c
+DMA_PACKET_COUNT_ID = 0x14
+DMA_IRQ_COALESCE_COUNT_ID = 0x1c
+DMA_IRQ_COALESCE_TIME_ID = 0x20
+
+DMA_CTRL_ENABLE = 0x1
+DMA_CTRL_IRQ = 0x4
+DMA_STATUS_IRQ = 0x2
+
 
 class TB:
     def __init__(self, dut):
@@ -39,7 +52,7 @@ class TB:
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
 
-        cocotb.start_soon(Clock(dut.clk, 8, units="ns").start())
+        cocotb.start_soon(Clock(dut.clk, CLK_PERIOD_NS, units="ns").start())
 
         self.axil_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil"), dut.clk, dut.rst)
 
@@ -54,6 +67,105 @@ class TB:
         await RisingEdge(self.dut.clk)
         await RisingEdge(self.dut.clk)
 
+    async def write_reg(self, addr, value):
+        await self.axil_master.write(addr, value.to_bytes(4, byteorder='little'))
+
+    async def read_reg(self, addr):
+        rresp = await self.axil_master.read(addr, 4)
+        return int.from_bytes(rresp.data, byteorder='little')
+
+    async def complete_descriptors(self, count):
+        for _ in range(count):
+            self.dut.set_interrupt.value = 1
+            await RisingEdge(self.dut.clk)
+        self.dut.set_interrupt.value = 0
+
+    async def clear_interrupt(self):
+        await self.write_reg(DMA_STATUS_ID, DMA_STATUS_IRQ)
+        await RisingEdge(self.dut.clk)
+        assert not self.dut.irq.value, "Interrupt should be cleared"
+
+    async def setup_coalescing(self, count, time_ns):
+        self.dut.set_interrupt.setimmediatevalue(0)
+        self.dut.soft_reset_done.setimmediatevalue(0)
+        self.dut.status_busy.setimmediatevalue(0)
+
+        await self.reset()
+
+        await self.write_reg(DMA_IRQ_COALESCE_COUNT_ID, count)
+        await self.write_reg(DMA_IRQ_COALESCE_TIME_ID, time_ns)
+        assert await self.read_reg(DMA_IRQ_COALESCE_COUNT_ID) == count
+        assert await self.read_reg(DMA_IRQ_COALESCE_TIME_ID) == time_ns
+
+        await self.write_reg(DMA_CTRL_ID, DMA_CTRL_ENABLE | DMA_CTRL_IRQ)
+
+
+async def run_test_coalesce_count(dut, threshold=8):
+    tb = TB(dut)
+
+    await tb.setup_coalescing(threshold, 0)
+
+    for _ in range(3):
+        # one descriptor short of the threshold, no interrupt regardless of the time
+        await tb.complete_descriptors(threshold-1)
+        for _ in range(1000):
+            await RisingEdge(dut.clk)
+            assert not dut.irq.value, "Interrupt raised before the packet threshold was reached"
+
+        await tb.complete_descriptors(1)
+        await RisingEdge(dut.clk)
+        assert dut.irq.value, "Interrupt not raised at the packet threshold"
+
+        # descriptors completed while pending are reported by the pending interrupt
+        await tb.complete_descriptors(threshold-1)
+        await tb.clear_interrupt()
+
+        for _ in range(100):
+            await RisingEdge(dut.clk)
+            assert not dut.irq.value, "Descriptors completed while pending raised another interrupt"
+
+    assert await tb.read_reg(DMA_PACKET_COUNT_ID) == 3*(2*threshold-1)
+
+    # a threshold of 1 restores an interrupt per descriptor
+    await tb.write_reg(DMA_IRQ_COALESCE_COUNT_ID, 1)
+    await tb.complete_descriptors(1)
+    await RisingEdge(dut.clk)
+    assert dut.irq.value, "Interrupt not raised for a single descriptor"
+
+
+async def run_test_coalesce_time(dut, time_ns=800):
+    tb = TB(dut)
+
+    await tb.setup_coalescing(0xffffffff, time_ns)
+
+    # no descriptor, no interrupt
+    for _ in range(2*time_ns//CLK_PERIOD_NS):
+        await RisingEdge(dut.clk)
+        assert not dut.irq.value, "Interrupt raised without a completed descriptor"
+
+    for count in [1, 5]:
+        start = get_sim_time("ns")
+        await tb.complete_descriptors(count)
+
+        while not dut.irq.value:
+            await RisingEdge(dut.clk)
+            assert get_sim_time("ns") - start <= time_ns + 4*CLK_PERIOD_NS, "Interrupt not raised after the timeout"
+
+        elapsed = get_sim_time("ns") - start
+        tb.log.info("Interrupt raised %d ns after the first of %d descriptors", elapsed, count)
+        assert elapsed >= time_ns, "Interrupt raised before the timeout"
+
+        await tb.clear_interrupt()
+
+    # the count threshold still applies with a timeout
+    await tb.write_reg(DMA_IRQ_COALESCE_COUNT_ID, 4)
+    start = get_sim_time("ns")
+    await tb.complete_descriptors(4)
+    await RisingEdge(dut.clk)
+    assert dut.irq.value, "Interrupt not raised at the packet threshold"
+    assert get_sim_time("ns") - start < time_ns
+
+
 async def run_test_interrupt(dut):
     tb = TB(dut)
 
@@ -200,5 +312,7 @@ async def run_test(dut):
 
 
 if cocotb.SIM_NAME:
-    factory = TestFactory([run_test_interrupt, run_test])
-    factory.generate_tests()
\ No newline at end of file
+    # a factory takes a single test function
+    for test in [run_test_interrupt, run_test, run_test_coalesce_count, run_test_coalesce_time]:
+        factory = TestFactory(test)
+        factory.generate_tests()
\ No newline at end of file
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import itertools
+import logging
+import math
+import os
+import random
+
+import cocotb_test.simulator
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, ClockCycles
+from cocotb.regression import TestFactory
+
+from cocotbext.axi import AxiStreamBus, AxiStreamSource, AxiStreamSink, AxiStreamFrame
+
+PORTS = 2
+
+# asymmetric traffic: bursts of large frames on port 0 at line rate (a word
+# every 8 cycles at 8 bit/cycle), a trickle of small frames on port 1, both
+# drained at half the line rate
+BURST_COUNT = 3
+BURST_FRAMES = 10
+BURST_FRAME_LEN = 1518
+BURST_GAP = 20000
+TRICKLE_FRAME_LEN = 64
+TRICKLE_GAP = 512
+LINE_RATE_PAUSE = [1]*7 + [0]
+DRAIN_PAUSE = [1]*15 + [0]
+
+
+class TB:
+    def __init__(self, dut):
+        self.dut = dut
+
+        self.log = logging.getLogger("cocotb.tb")
+        self.log.setLevel(logging.DEBUG)
+
+        self.page_count = int(os.getenv("PARAM_DEPTH")) // int(os.getenv("PARAM_PAGE_SIZE"))
+        self.page_size = int(os.getenv("PARAM_PAGE_SIZE"))
+        self.min_pages = int(os.getenv("PARAM_MIN_PAGES"))
+        self.max_pages = int(os.getenv("PARAM_MAX_PAGES"))
+        # width of a page count in status_pages, $clog2(PAGE_COUNT) + 1
+        self.count_width = math.ceil(math.log2(self.page_count)) + 1
+
+        cocotb.start_soon(Clock(dut.clk, 8, units="ns").start())
+
+        self.sources = [AxiStreamSource(AxiStreamBus.from_prefix(dut, f"s{k:02d}_axis"), dut.clk, dut.rst)
+                for k in range(PORTS)]
+        self.sinks = [AxiStreamSink(AxiStreamBus.from_prefix(dut, f"m{k:02d}_axis"), dut.clk, dut.rst)
+                for k in range(PORTS)]
+
+        self.drops = [0]*PORTS
+        self.stored = [0]*PORTS
+        self.peak_pages = [0]*PORTS
+
+        cocotb.start_soon(self.monitor_status())
+
+    def set_idle_generator(self, generator=None):
+        if generator:
+            for source in self.sources:
+                source.set_pause_generator(generator())
+
+    def set_backpressure_generator(self, generator=None):
+        if generator:
+            for sink in self.sinks:
+                sink.set_pause_generator(generator())
+
+    def port_limit(self, port):
+        """Pages a port can take while the other ports are empty"""
+        limit = self.page_count - (PORTS-1)*self.min_pages
+        if self.max_pages:
+            limit = min(limit, self.max_pages)
+        return limit
+
+    async def monitor_status(self):
+        mask = (1 << self.count_width) - 1
+        while True:
+            await RisingEdge(self.dut.clk)
+            if not self.dut.status_overflow.value.is_resolvable:
+                continue
+            overflow = self.dut.status_overflow.value.integer
+            good_frame = self.dut.status_good_frame.value.integer
+            pages = self.dut.status_pages.value.integer
+            for k in range(PORTS):
+                self.drops[k] += (overflow >> k) & 1
+                self.stored[k] += (good_frame >> k) & 1
+                self.peak_pages[k] = max(self.peak_pages[k], (pages >> (k*self.count_width)) & mask)
+
+    async def reset(self):
+        self.dut.rst.setimmediatevalue(0)
+        await RisingEdge(self.dut.clk)
+        await RisingEdge(self.dut.clk)
+        self.dut.rst.value = 1
+        await RisingEdge(self.dut.clk)
+        await RisingEdge(self.dut.clk)
+        self.dut.rst.value = 0
+        await RisingEdge(self.dut.clk)
+        await RisingEdge(self.dut.clk)
+
+        self.drops = [0]*PORTS
+        self.stored = [0]*PORTS
+        self.peak_pages = [0]*PORTS
+
+    async def recv_all(self, sent, timeout=200000):
+        """Receive the frames which were not dropped, in order"""
+        for _ in range(timeout):
+            if all(self.sinks[k].count() + self.drops[k] >= len(sent[k]) for k in range(PORTS)):
+                break
+            await RisingEdge(self.dut.clk)
+
+        received = []
+        for k in range(PORTS):
+            frames = []
+            while not self.sinks[k].empty():
+                frames.append(self.sinks[k].recv_nowait())
+            received.append(frames)
+        return received
+
+    def check_frames(self, sent, received):
+        for k in range(PORTS):
+            # the stored frames leave in order, a dropped frame is lost as a whole
+            remaining = iter(sent[k])
+            for frame in received[k]:
+                assert any(frame.tdata == data for data in remaining), \
+                    f"port {k}: frame not sent or out of order"
+
+            assert len(received[k]) + self.drops[k] == len(sent[k]), \
+                f"port {k}: {len(sent[k])} frames sent, {len(received[k])} received, {self.drops[k]} dropped"
+            assert self.stored[k] == len(received[k])
+
+
+async def run_test(dut, idle_inserter=None, backpressure_inserter=None):
+    tb = TB(dut)
+
+    tb.set_idle_generator(idle_inserter)
+    tb.set_backpressure_generator(backpressure_inserter)
+
+    await tb.reset()
+
+    rand = random.Random(14)
+    sent = [[bytearray(rand.getrandbits(8) for _ in range(rand.randint(1, 600))) for _ in range(64)]
+            for _ in range(PORTS)]
+
+    for k in range(PORTS):
+        for data in sent[k]:
+            await tb.sources[k].send(AxiStreamFrame(data))
+
+    for source in tb.sources:
+        await source.wait()
+
+    received = await tb.recv_all(sent)
+    tb.check_frames(sent, received)
+
+    tb.log.info("drops %s, peak pages %s", tb.drops, tb.peak_pages)
+
+    # all pages are returned once the frames were read, except the one the
+    # last frame ends in
+    await ClockCycles(dut.clk, 10)
+    assert all(tb.dut.status_pages.value.integer >> (k*tb.count_width) & ((1 << tb.count_width) - 1) <= 1
+            for k in range(PORTS))
+
+
+async def run_burst_test(dut):
+    """Asymmetric bursty traffic, results are appended to SHARED_RESULTS"""
+    tb = TB(dut)
+
+    tb.sources[0].set_pause_generator(itertools.cycle(LINE_RATE_PAUSE))
+    for sink in tb.sinks:
+        sink.set_pause_generator(itertools.cycle(DRAIN_PAUSE))
+
+    await tb.reset()
+
+    sent = [[], []]
+
+    async def bursts():
+        for burst in range(BURST_COUNT):
+            for n in range(BURST_FRAMES):
+                data = bytearray([burst, n]) + bytearray(itertools.islice(
+                        itertools.cycle(range(256)), BURST_FRAME_LEN-2))
+                sent[0].append(data)
+                await tb.sources[0].send(AxiStreamFrame(data))
+            await tb.sources[0].wait()
+            await ClockCycles(dut.clk, BURST_GAP)
+
+    async def trickle(count):
+        for n in range(count):
+            data = n.to_bytes(2, 'little') + bytearray(TRICKLE_FRAME_LEN-2)
+            sent[1].append(data)
+            await tb.sources[1].send(AxiStreamFrame(data))
+            await ClockCycles(dut.clk, TRICKLE_GAP)
+
+    burst_cycles = BURST_FRAMES * BURST_FRAME_LEN * len(LINE_RATE_PAUSE) // 8 + BURST_GAP
+    burst_task = cocotb.start_soon(bursts())
+    trickle_task = cocotb.start_soon(trickle(BURST_COUNT * burst_cycles // TRICKLE_GAP))
+
+    await burst_task
+    await trickle_task
+
+    received = await tb.recv_all(sent)
+    tb.check_frames(sent, received)
+
+    # words piling up during a burst, as the drain takes half of them
+    words = BURST_FRAMES * math.ceil(BURST_FRAME_LEN / 8)
+    stored = words * (1 - len(LINE_RATE_PAUSE) / len(DRAIN_PAUSE)) * 8
+    needed = math.ceil(stored / tb.page_size) + 1
+
+    tb.log.info("min pages %d, max pages %d: port 0 dropped %d of %d frames (peak %d pages, limit %d), "
+            "port 1 dropped %d of %d", tb.min_pages, tb.max_pages, tb.drops[0], len(sent[0]),
+            tb.peak_pages[0], tb.port_limit(0), tb.drops[1], len(sent[1]))
+
+    results = os.getenv("SHARED_RESULTS")
+    if results:
+        with open(results, "a") as f:
+            f.write(f"{tb.page_count},{tb.min_pages},{tb.max_pages},{len(sent[0])},{tb.drops[0]},"
+                    f"{len(sent[1])},{tb.drops[1]},{tb.peak_pages[0]}\n")
+
+    # a burst fitting into the pages a port can reach is not dropped, one
+    # exceeding a static share is
+    if tb.port_limit(0) >= needed + 2:
+        assert tb.drops[0] == 0
+    elif tb.port_limit(0) < needed - 2:
+        assert tb.drops[0] > 0
+
+    # the reserved pages protect the other port from the burst
+    if tb.min_pages:
+        assert tb.drops[1] == 0
+
+
+def cycle_pause():
+    return itertools.cycle([1, 1, 1, 0])
+
+
+if cocotb.SIM_NAME:
+    factory = TestFactory(run_test)
+    factory.add_option("idle_inserter", [None, cycle_pause])
+    factory.add_option("backpressure_inserter", [None, cycle_pause])
+    factory.generate_tests()
+
+    factory = TestFactory(run_burst_test)
+    factory.generate_tests()
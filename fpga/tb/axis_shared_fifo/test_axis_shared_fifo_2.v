@@ -0,0 +1,112 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * axis_shared_fifo with two ports split into separate AXI stream buses
+ */
+module test_axis_shared_fifo_2 #
+(
+    parameter DATA_WIDTH = 64,
+    parameter KEEP_WIDTH = ((DATA_WIDTH+7)/8),
+    parameter USER_WIDTH = 1,
+    parameter DEPTH = 12*2**10,
+    parameter PAGE_SIZE = 256,
+    parameter MIN_PAGES = 0,
+    parameter MAX_PAGES = 0
+)
+(
+    input  wire                       clk,
+    input  wire                       rst,
+
+    input  wire [DATA_WIDTH-1:0]      s00_axis_tdata,
+    input  wire [KEEP_WIDTH-1:0]      s00_axis_tkeep,
+    input  wire                       s00_axis_tvalid,
+    output wire                       s00_axis_tready,
+    input  wire                       s00_axis_tlast,
+    input  wire [USER_WIDTH-1:0]      s00_axis_tuser,
+
+    input  wire [DATA_WIDTH-1:0]      s01_axis_tdata,
+    input  wire [KEEP_WIDTH-1:0]      s01_axis_tkeep,
+    input  wire                       s01_axis_tvalid,
+    output wire                       s01_axis_tready,
+    input  wire                       s01_axis_tlast,
+    input  wire [USER_WIDTH-1:0]      s01_axis_tuser,
+
+    output wire [DATA_WIDTH-1:0]      m00_axis_tdata,
+    output wire [KEEP_WIDTH-1:0]      m00_axis_tkeep,
+    output wire                       m00_axis_tvalid,
+    input  wire                       m00_axis_tready,
+    output wire                       m00_axis_tlast,
+    output wire [USER_WIDTH-1:0]      m00_axis_tuser,
+
+    output wire [DATA_WIDTH-1:0]      m01_axis_tdata,
+    output wire [KEEP_WIDTH-1:0]      m01_axis_tkeep,
+    output wire                       m01_axis_tvalid,
+    input  wire                       m01_axis_tready,
+    output wire                       m01_axis_tlast,
+    output wire [USER_WIDTH-1:0]      m01_axis_tuser,
+
+    output wire [1:0]                 status_overflow,
+    output wire [1:0]                 status_good_frame,
+    output wire [2*($clog2(DEPTH/PAGE_SIZE)+1)-1:0] status_pages
+);
+
+axis_shared_fifo #(
+    .PORTS(2),
+    .DATA_WIDTH(DATA_WIDTH),
+    .KEEP_WIDTH(KEEP_WIDTH),
+    .USER_WIDTH(USER_WIDTH),
+    .DEPTH(DEPTH),
+    .PAGE_SIZE(PAGE_SIZE),
+    .MIN_PAGES(MIN_PAGES),
+    .MAX_PAGES(MAX_PAGES)
+)
+axis_shared_fifo_inst (
+    .clk(clk),
+    .rst(rst),
+
+    .s_axis_tdata({s01_axis_tdata, s00_axis_tdata}),
+    .s_axis_tkeep({s01_axis_tkeep, s00_axis_tkeep}),
+    .s_axis_tvalid({s01_axis_tvalid, s00_axis_tvalid}),
+    .s_axis_tready({s01_axis_tready, s00_axis_tready}),
+    .s_axis_tlast({s01_axis_tlast, s00_axis_tlast}),
+    .s_axis_tuser({s01_axis_tuser, s00_axis_tuser}),
+
+    .m_axis_tdata({m01_axis_tdata, m00_axis_tdata}),
+    .m_axis_tkeep({m01_axis_tkeep, m00_axis_tkeep}),
+    .m_axis_tvalid({m01_axis_tvalid, m00_axis_tvalid}),
+    .m_axis_tready({m01_axis_tready, m00_axis_tready}),
+    .m_axis_tlast({m01_axis_tlast, m00_axis_tlast}),
+    .m_axis_tuser({m01_axis_tuser, m00_axis_tuser}),
+
+    .status_overflow(status_overflow),
+    .status_good_frame(status_good_frame),
+    .status_pages(status_pages)
+);
+
+endmodule
+
+`resetall
@@ -27,6 +27,7 @@ import cocotb_test.simulator
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, FallingEdge
+from cocotb.utils import get_sim_time
 from cocotb.regression import TestFactory
 from cocotb.result import SimTimeoutError
 
@@ -42,10 +43,47 @@ DMA_ADR_ID = 0
 DMA_LENGTH_ID = 4
 DMA_CTRL_ID = 8
 DMA_STATUS_ID = 12
+DMA_PACKET_COUNT_ID = 20
+DMA_PACK_TIMEOUT_ID = 24
+
+DMA_CTRL_ENABLE = 0x1
+DMA_CTRL_SOFT_RESET = 0x2
+DMA_CTRL_IRQ_ENABLE = 0x4
+DMA_CTRL_PACKED = 0x8
+
+PACKED_BUFFER_SIZE = 16*1024
+PACKED_RECORD_LEN = 2048
 
 PERIOD = 7
 PERIOD_UNITS = 'ns'
 
+class DelayedBChannel:
+    """Delays the write responses of an AxiRamWrite by a number of cycles
+
+    Unlike a pause generator, the responses are pipelined, so the latency does
+    not limit the rate of the responses.
+    """
+
+    def __init__(self, channel, clock, latency=0):
+        self.channel = channel
+        self.clock = clock
+        self.latency = latency
+
+    async def send(self, b):
+        cocotb.start_soon(self._send(b, self.latency))
+
+    def send_nowait(self, b):
+        cocotb.start_soon(self._send(b, self.latency))
+
+    async def _send(self, b, latency):
+        for _ in range(latency):
+            await RisingEdge(self.clock)
+        await self.channel.send(b)
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+
 class TB:
     def __init__(self, dut):
         self.dut = dut
@@ -100,6 +138,21 @@ class TB:
 
             await self.axil_desc_master.write(DESC_SIZE*i, dma_desc)
 
+    async def write_packed_descriptor_ring(self, count):
+        for i in range(count):
+            dma_desc = (BUFFER_ADDR + i*PACKED_BUFFER_SIZE).to_bytes(8, byteorder='little')
+            dma_desc += (PACKED_BUFFER_SIZE).to_bytes(4, byteorder='little')
+            dma_desc += (0x1).to_bytes(4, byteorder='little')
+
+            await self.axil_desc_master.write(DESC_SIZE*i, dma_desc)
+
+    async def wait_packet_count(self, count, timeout):
+        for _ in range(timeout):
+            await RisingEdge(self.dut.clk)
+            if self.dut.axil_dma_ctrl_regs_inst.packet_count_reg.value.integer >= count:
+                return True
+        return False
+
 
 async def run_incr_test(dut, idle_inserter=None, backpressure_inserter=None):
     tb = TB(dut)
@@ -207,6 +260,202 @@ async def run_soft_reset_test(dut, idle_inserter=None, backpressure_inserter=Non
 
 
 
+async def run_packed_test(dut, idle_inserter=None, backpressure_inserter=None):
+    tb = TB(dut)
+
+    await tb.reset()
+
+    tb.set_idle_generator(idle_inserter)
+    tb.set_backpressure_generator(backpressure_inserter)
+
+    buffer_count = 4
+    await tb.write_packed_descriptor_ring(buffer_count)
+    tb.axi_ram.write(BUFFER_ADDR, b"\xaa" * (buffer_count*PACKED_BUFFER_SIZE))
+
+    await tb.axil_master.write_dword(DMA_PACK_TIMEOUT_ID, 1000)
+    await tb.axil_master.write_dword(DMA_CTRL_ID, DMA_CTRL_ENABLE | DMA_CTRL_PACKED)
+
+    # odd lengths check that records are written back to back
+    payloads = [incrementing_payload(60 + (i % 8)) for i in range(800)]
+    stream = b"".join(payloads)
+
+    for payload in payloads:
+        await tb.axis_source.send(payload)
+
+    # all buffers but the last one are closed because they are full, the last
+    # one is closed by the timeout
+    assert await tb.wait_packet_count(buffer_count, 100000), "Buffers were not closed"
+
+    offset = 0
+    for i in range(buffer_count):
+        descriptor_addr = DESC_SIZE*i
+        descriptor_length = await tb.axil_desc_master.read_dword(descriptor_addr + 8)
+        descriptor_empty = await tb.axil_desc_master.read_byte(descriptor_addr + 12)
+
+        assert not (descriptor_empty & 0x1), "Empty flag is still set"
+        if i < buffer_count-1:
+            assert descriptor_length > PACKED_BUFFER_SIZE - PACKED_RECORD_LEN, "Buffer was closed too early"
+        assert descriptor_length <= PACKED_BUFFER_SIZE, "Buffer overflow"
+
+        tb.log.info("Buffer %d filled with %d bytes (%.1f %%)", i, descriptor_length,
+                100.0 * descriptor_length / PACKED_BUFFER_SIZE)
+
+        ram_content = tb.axi_ram.read(BUFFER_ADDR + i*PACKED_BUFFER_SIZE, descriptor_length)
+        assert ram_content == stream[offset:offset+descriptor_length], f"Buffer {i} differs"
+        offset += descriptor_length
+
+    assert offset == len(stream), "Not all records were written"
+
+    await RisingEdge(dut.clk)
+    await RisingEdge(dut.clk)
+
+async def run_small_frame_throughput_test(dut):
+    tb = TB(dut)
+
+    await tb.reset()
+
+    frame_count = 250
+    payloads = [incrementing_payload(64)] * frame_count
+    cycles = {}
+
+    for mode in ["single", "packed"]:
+        await tb.axil_master.write_dword(DMA_CTRL_ID, DMA_CTRL_SOFT_RESET)
+        await tb.axil_master.write_dword(DMA_PACKET_COUNT_ID, 0)
+
+        if mode == "packed":
+            await tb.write_packed_descriptor_ring(2)
+            await tb.axil_master.write_dword(DMA_PACK_TIMEOUT_ID, 200)
+            ctrl = DMA_CTRL_ENABLE | DMA_CTRL_PACKED
+        else:
+            await tb.write_descriptor_ring()
+            ctrl = DMA_CTRL_ENABLE
+
+        await tb.axil_master.write_dword(DMA_CTRL_ID, ctrl)
+
+        start = get_sim_time('ns')
+        for payload in payloads:
+            await tb.axis_source.send(payload)
+        await tb.axis_source.wait()
+
+        # the last packed buffer is closed by the timeout
+        expected = 2 if mode == "packed" else frame_count
+        assert await tb.wait_packet_count(expected, 100000), f"DMA did not finish in {mode} mode"
+
+        cycles[mode] = (get_sim_time('ns') - start) / PERIOD
+        tb.log.info("%s mode: %d frames of 64 bytes in %d cycles (%.2f cycles/frame, %.1f Mframes/s)",
+                mode, frame_count, cycles[mode], cycles[mode] / frame_count,
+                frame_count / (cycles[mode] * PERIOD) * 1e3)
+
+    assert cycles["packed"] < cycles["single"], "Packed mode is not faster than a buffer per frame"
+
+
+async def run_cycles_per_frame_test(dut, frame_count=1000):
+    """Cycles per 64 byte frame with a buffer per frame, results appended as CSV
+
+    The descriptors are returned like the driver does, but only every 64
+    frames, so the ring runs full now and then and the DMA has to wait for a
+    descriptor owned by the software.
+    """
+    tb = TB(dut)
+
+    await tb.reset()
+    await tb.write_descriptor_ring()
+
+    prefetch = int(os.getenv("PARAM_DESC_PREFETCH", "1"))
+    payload = incrementing_payload(64)
+    done = []
+
+    async def monitor_status():
+        while True:
+            await RisingEdge(dut.clk)
+            if dut.axis_write_desc_status_valid.value:
+                done.append(get_sim_time('ns'))
+
+    async def consume_descriptors():
+        i = 0
+        while True:
+            await cocotb.triggers.Timer(64 * 16 * PERIOD, 'ns')
+            while True:
+                descriptor_addr = DESC_SIZE*(i % 256)
+                descriptor_flags = await tb.axil_desc_master.read_dword(descriptor_addr + 12)
+                if descriptor_flags & 0x1:
+                    break
+                descriptor_length = await tb.axil_desc_master.read_dword(descriptor_addr + 8)
+                assert descriptor_length == len(payload), f"Unexpected length {descriptor_length} of frame {i}"
+
+                await tb.axil_desc_master.write_dword(descriptor_addr + 8, 2048)
+                await tb.axil_desc_master.write_dword(descriptor_addr + 12, descriptor_flags | 0x1)
+                i += 1
+
+    cocotb.start_soon(monitor_status())
+    cocotb.start_soon(consume_descriptors())
+
+    await tb.axil_master.write_dword(DMA_CTRL_ID, DMA_CTRL_ENABLE)
+
+    for _ in range(frame_count):
+        await tb.axis_source.send(payload)
+    await tb.axis_source.wait()
+
+    assert await tb.wait_packet_count(frame_count, 100000), "DMA did not finish"
+
+    # the first ring is written without waiting for the software
+    cycles = (done[255] - done[0]) / PERIOD / 255
+    cycles_total = (done[-1] - done[0]) / PERIOD / (frame_count - 1)
+    tb.log.info("descriptor prefetch %d: %.2f cycles/frame on a filled ring, %.2f cycles/frame overall",
+            prefetch, cycles, cycles_total)
+
+    results = os.getenv("CYCLES_RESULTS")
+    if results:
+        with open(results, "a") as f:
+            f.write(f"{prefetch},{frame_count},{cycles:.2f},{cycles_total:.2f}\n")
+
+
+async def run_b_latency_test(dut, latencies=(0, 16, 32, 64)):
+    """Packed throughput of 64 byte frames with latency on the B channel"""
+    tb = TB(dut)
+
+    await tb.reset()
+
+    b_channel = DelayedBChannel(tb.axi_ram.b_channel, dut.clk)
+    tb.axi_ram.b_channel = b_channel
+
+    outstanding = int(os.getenv("PARAM_AXI_MAX_OUTSTANDING", "16"))
+    frame_count = 400
+    payloads = [incrementing_payload(64)] * frame_count
+    throughput = {}
+
+    for latency in latencies:
+        b_channel.latency = latency
+
+        await tb.axil_master.write_dword(DMA_CTRL_ID, DMA_CTRL_SOFT_RESET)
+        await tb.axil_master.write_dword(DMA_PACKET_COUNT_ID, 0)
+        await tb.write_packed_descriptor_ring(2)
+        await tb.axil_master.write_dword(DMA_PACK_TIMEOUT_ID, 200)
+        await tb.axil_master.write_dword(DMA_CTRL_ID, DMA_CTRL_ENABLE | DMA_CTRL_PACKED)
+
+        # the stream is only accepted as fast as the bursts complete
+        start = get_sim_time('ns')
+        for payload in payloads:
+            await tb.axis_source.send(payload)
+        await tb.axis_source.wait()
+        elapsed = get_sim_time('ns') - start
+
+        assert await tb.wait_packet_count(2, 100000), f"DMA did not finish with a latency of {latency} cycles"
+
+        throughput[latency] = frame_count * 64 / elapsed * 1e3
+        tb.log.info("B latency %d cycles, %d outstanding bursts: %.1f MB/s",
+                latency, outstanding, throughput[latency])
+
+        results = os.getenv("B_LATENCY_RESULTS")
+        if results:
+            with open(results, "a") as f:
+                f.write(f"{outstanding},{latency},{throughput[latency]:.1f}\n")
+
+    for latency in latencies:
+        assert throughput[latency] > 0.9 * throughput[latencies[0]], \
+            f"Throughput drops with a B latency of {latency} cycles"
+
+
 def incrementing_payload(length):
     return bytearray(itertools.islice(itertools.cycle(range(256)), length))
 
@@ -214,8 +463,17 @@ def cycle_pause():
     return itertools.cycle([1, 1, 1, 0])
 
 if cocotb.SIM_NAME:
-    for test in [run_soft_reset_test, run_incr_test]:
+    for test in [run_soft_reset_test, run_incr_test, run_packed_test]:
         factory = TestFactory(test)
         factory.add_option("idle_inserter", [None, cycle_pause])
         factory.add_option("backpressure_inserter", [None, cycle_pause])
-        factory.generate_tests()
\ No newline at end of file
+        factory.generate_tests()
+
+    factory = TestFactory(run_small_frame_throughput_test)
+    factory.generate_tests()
+
+    factory = TestFactory(run_cycles_per_frame_test)
+    factory.generate_tests()
+
+    factory = TestFactory(run_b_latency_test)
+    factory.generate_tests()
@@ -20,6 +20,7 @@ with aRTS. If not, see <https://www.gnu.org/licenses/>.
 
 from cgi import test
 import itertools
+import json
 import logging
 import os
 import random
@@ -32,6 +33,7 @@ from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, Event, Timer
 from cocotb.regression import TestFactory
 from cocotb.result import SimTimeoutError
+from cocotb.utils import get_sim_time, get_time_from_sim_steps
 
 from cocotbext.axi import AxiWriteBus, AxiRamWrite, AxiLiteMaster, AxiLiteBus
 from cocotbext.eth import GmiiFrame, RgmiiSource
@@ -44,9 +46,26 @@ DMA_ADR_ID = 0
 DMA_LENGTH_ID = 4
 DMA_CTRL_ID = 8
 DMA_STATUS_ID = 12
+DMA_PACK_TIMEOUT_ID = 24
+
+DMA_CTRL_ENABLE = 0x1
+DMA_CTRL_PACKED = 0x8
 
 MAC_CTRL_ID = 0
 MAC_STATUS_ID = 4
+MAC_FIFO_GOOD_FRAME_ID = [0x50, 0x70]
+MAC_FIFO_OVERFLOW_ID = [0x54, 0x74]
+MAC_FIFO_BAD_FRAME_ID = [0x4c, 0x6c]
+MAC_FIFO_HIGH_WATER_ID = [0x80, 0xc0]
+MAC_FIFO_HIST_ID = [0xa0, 0xe0]
+MAC_FIFO_HIST_BUCKETS = 8
+
+PACKED_BUFFER_SIZE = 16*1024
+
+MARKER_ETHERTYPE = 0x88b6
+
+# frame length including FCS and weight
+IMIX = [(64, 7), (594, 4), (1518, 1)]
 
 AXI_PERIOD = 6
 PERIOD_UNITS = 'ns'
@@ -56,7 +75,7 @@ DESC_RAM_SIZE = 2**DESC_ADDR_WIDTH
 DESC_COUNT = int(DESC_RAM_SIZE/DESC_SIZE)
 
 class TB(object):
-    def __init__(self, dut):
+    def __init__(self, dut, ram_size=2**20):
         self.dut = dut
 
         self.log = logging.getLogger("cocotb.tb")
@@ -72,12 +91,34 @@ class TB(object):
         self.rgmii2_source = RgmiiSource(dut.phy2_rgmii_rxd, dut.phy2_rgmii_rx_ctl, dut.phy2_rgmii_rx_clk, dut.axi_rst)
 
         # AXI interface
-        self.axi_ram = AxiRamWrite(AxiWriteBus.from_prefix(dut, "m_axi"), dut.axi_clk, dut.axi_rst, size=2**20)
+        self.axi_ram = AxiRamWrite(AxiWriteBus.from_prefix(dut, "m_axi"), dut.axi_clk, dut.axi_rst, size=ram_size)
 
         # AXI Lite Master
         self.axil_mac_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil_mac"), dut.axi_clk, dut.axi_rst)
         self.axil_dma_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil_dma"), dut.axi_clk, dut.axi_rst)
         self.axil_desc_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil_dma_desc"), dut.axi_clk, dut.axi_rst)
+        self.axil_filter_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil_filter"), dut.axi_clk, dut.axi_rst)
+        self.axil_clock_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil_clock"), dut.axi_clk, dut.axi_rst)
+
+        dut.sync_in.setimmediatevalue(0)
+
+        # second DMA channel, only wired up with DMA_PER_PORT
+        self.per_port = int(os.getenv("PARAM_DMA_PER_PORT", "0"))
+        self.shared_buffer = int(os.getenv("PARAM_SHARED_BUFFER", "0"))
+        self.channels = [(self.axi_ram, self.axil_dma_master, self.axil_desc_master, dut.dma_controller_inst)]
+        if self.per_port:
+            self.axi_ram2 = AxiRamWrite(AxiWriteBus.from_prefix(dut, "m_axi2"), dut.axi_clk, dut.axi_rst, size=ram_size)
+            self.axil_dma2_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil_dma2"), dut.axi_clk, dut.axi_rst)
+            self.axil_desc2_master = AxiLiteMaster(AxiLiteBus.from_prefix(dut, "s_axil_dma2_desc"), dut.axi_clk, dut.axi_rst)
+            self.channels.append((self.axi_ram2, self.axil_dma2_master, self.axil_desc2_master,
+                                  dut.dma_per_port.dma2_controller_inst))
+
+        # AXI write statistics
+        self.write_bytes = 0
+        self.write_bursts = 0
+        self.write_busy_cycles = 0
+        self.write_start = None
+        self.write_end = None
 
     def set_idle_generator(self, generator=None):
         if generator:
@@ -86,7 +127,8 @@ class TB(object):
 
     def set_backpressure_generator(self, generator=None):
         if generator:
-            self.axi_ram.w_channel.set_pause_generator(generator())
+            for axi_ram, _, _, _ in self.channels:
+                axi_ram.w_channel.set_pause_generator(generator())
 
     async def cycle_reset(self):
         self.dut.axi_rst.setimmediatevalue(0)
@@ -102,15 +144,50 @@ class TB(object):
         await RisingEdge(self.dut.axi_clk)
         await RisingEdge(self.dut.axi_clk)
 
-    async def write_descriptor_ring(self):
-        r = range(0, 512*1024, 2048)
+    async def monitor_axi_write(self, prefix="m_axi"):
+        """Count the bytes and bursts accepted by the AXI RAM
+
+        A cycle is busy while a burst is requested, in flight or waiting for its
+        write response. The bytes per busy cycle are what the write path could
+        sustain if the MACs were never idle.
+        """
+        outstanding = 0
+
+        def sig(name):
+            return getattr(self.dut, f"{prefix}_{name}")
+
+        while True:
+            await RisingEdge(self.dut.axi_clk)
+
+            awvalid = sig("awvalid").value
+            wvalid = sig("wvalid").value
+
+            if outstanding or awvalid or wvalid:
+                self.write_busy_cycles += 1
+
+            if awvalid and sig("awready").value:
+                self.write_bursts += 1
+                outstanding += 1
+
+            if wvalid and sig("wready").value:
+                self.write_bytes += bin(sig("wstrb").value.integer).count("1")
+                self.write_end = get_sim_time(PERIOD_UNITS)
+                if self.write_start is None:
+                    self.write_start = self.write_end
+
+            if sig("bvalid").value and sig("bready").value:
+                outstanding -= 1
+
+    async def write_descriptor_ring(self, buffer_len=2048, desc_master=None):
+        desc_master = desc_master or self.axil_desc_master
+        r = range(0, DESC_COUNT*buffer_len, buffer_len)
         r = random.sample(r, DESC_COUNT)
 
         for i in range(DESC_COUNT):
             offset = r[i]
 
             dma_desc_addr_raw = offset
-            dma_desc_length_raw = 2048
+            dma_desc_length_raw = buffer_len
             dma_desc_flags_raw = 0x1 # set empty flag
 
             dma_desc_addr_big = (dma_desc_addr_raw).to_bytes(8, byteorder='little')
@@ -119,7 +196,7 @@ class TB(object):
 
             dma_desc = dma_desc_addr_big + dma_desc_length_big + dma_desc_flags_big
 
-            await self.axil_desc_master.write(DESC_SIZE*i, dma_desc)
+            await desc_master.write(DESC_SIZE*i, dma_desc)
 
 
 async def run_test_continuous(dut):
@@ -199,14 +276,285 @@ async def run_test_continuous(dut):
             i = 0 if i == DESC_COUNT-1 else i+1
 
 
+async def run_test_throughput(dut, frame_len=64, frame_count=64, backpressure_inserter=None):
+    tb = TB(dut)
+
+    await tb.cycle_reset()
+    await tb.write_descriptor_ring()
+
+    tb.set_backpressure_generator(backpressure_inserter)
+    cocotb.start_soon(tb.monitor_axi_write())
+
+    burst_len = int(os.getenv("PARAM_AXI_MAX_BURST_LEN", "0"))
+    record_len = 16 + frame_len + 4
+
+    await tb.axil_dma_master.write_dword(DMA_ADR_ID, DESC_RING_ADDR)
+    await tb.axil_dma_master.write_dword(DMA_CTRL_ID, 0x1) # enable DMA
+    await tb.axil_mac_master.write_dword(MAC_CTRL_ID, 0x1) # enable MAC
+
+    test_frame = GmiiFrame.from_payload(incrementing_payload(frame_len))
+    for _ in range(frame_count):
+        tb.rgmii1_source.send_nowait(test_frame)
+        tb.rgmii2_source.send_nowait(test_frame)
+
+    # both MACs receive back to back, so every descriptor of the ring is used once
+    last_desc = 2*frame_count - 1
+    assert last_desc < DESC_COUNT
+
+    for _ in range(1000):
+        await Timer(10, "us")
+        dma_desc_flags = await tb.axil_desc_master.read_dword((DESC_SIZE*last_desc) + 12)
+        if not dma_desc_flags & 0x1:
+            break
+    else:
+        assert False, "DMA did not complete all records"
+
+    for i in range(2*frame_count):
+        dma_desc_len = await tb.axil_desc_master.read_dword((DESC_SIZE*i) + 8)
+        assert dma_desc_len == record_len, f"Unexpected length {dma_desc_len} at descriptor {i}"
+
+    assert tb.write_bytes >= 2*frame_count*record_len
+
+    elapsed = tb.write_end - tb.write_start
+    # both ports at gigabit line rate: preamble, SFD and IFG add 20 bytes to each frame
+    line_rate = 2 * 125 * (frame_len + 4) / (frame_len + 4 + 20)
+    sustained = tb.write_bytes / elapsed * 1e3
+    capacity = tb.write_bytes / (tb.write_busy_cycles * AXI_PERIOD) * 1e3
+
+    tb.log.info("burst length %d, frame length %d, backpressure %s: %d bytes in %d bursts "
+        "(%.1f beats/burst), %.1f MB/s sustained (line rate %.1f MB/s), %.1f MB/s while busy",
+        burst_len, frame_len, backpressure_inserter is not None, tb.write_bytes, tb.write_bursts,
+        tb.write_bytes / (tb.write_bursts * len(dut.m_axi_wstrb)), sustained, line_rate, capacity)
+
+    results = os.getenv("THROUGHPUT_RESULTS")
+    if results:
+        with open(results, "a") as f:
+            f.write(f"{burst_len},{frame_len},{int(backpressure_inserter is not None)},"
+                f"{tb.write_bytes},{tb.write_bursts},{sustained:.1f},{capacity:.1f}\n")
+
+
+def stress_frame(port, seq, length):
+    """Frame of length bytes (including FCS) tagged with its port and sequence number"""
+    header = b"\xff" * 6 + bytes([0x02, 0, 0, 0, 0, port]) + b"\x88\xb5"
+    tag = seq.to_bytes(4, byteorder='little')
+    return header + tag + incrementing_payload(length - 4 - len(header) - len(tag))
+
+
+def parse_stress_record(data):
+    """Returns the incl_len, port and sequence number of a stress_frame record"""
+    incl_len = int.from_bytes(data[8:12], byteorder='little')
+    port = data[16+11]
+    seq = int.from_bytes(data[16+14:16+18], byteorder='little')
+    return incl_len, port, seq
+
+
+def parse_marker(data):
+    """Returns the port and the number of lost frames of a loss marker record, None for other records"""
+    if int.from_bytes(data[16+12:16+14], byteorder='big') != MARKER_ETHERTYPE or data[16+14:16+18] != b"aRTS":
+        return None
+    return data[16+19], int.from_bytes(data[16+20:16+24], byteorder='big')
+
+
+async def run_test_stress(dut, traffic="64", backpressure=0.0):
+    """Both ports at line rate with minimum IFG, results are written as JSON
+
+    With DMA_PER_PORT every port is captured into the ring of its own channel.
+    """
+    frame_count = int(os.getenv("STRESS_FRAMES", "1000"))
+    backpressure = float(os.getenv("STRESS_BACKPRESSURE", backpressure))
+
+    tb = TB(dut, ram_size=DESC_COUNT*PACKED_BUFFER_SIZE)
+
+    await tb.cycle_reset()
+    for _, _, desc_master, _ in tb.channels:
+        await tb.write_descriptor_ring(PACKED_BUFFER_SIZE, desc_master)
+
+    if backpressure:
+        tb.set_backpressure_generator(lambda: random_pause(backpressure))
+    cocotb.start_soon(tb.monitor_axi_write())
+    if tb.per_port:
+        cocotb.start_soon(tb.monitor_axi_write("m_axi2"))
+
+    rand = random.Random(0)
+    sources = [tb.rgmii1_source, tb.rgmii2_source]
+    frames = [[], []]
+    for port in range(2):
+        for seq in range(frame_count):
+            if traffic == "imix":
+                length = rand.choices([l for l, _ in IMIX], [w for _, w in IMIX])[0]
+            else:
+                length = int(traffic)
+            frames[port].append(GmiiFrame.from_payload(stress_frame(port, seq, length), tx_complete=Event()))
+
+    captured = [[], []]
+    marked = [0, 0]
+    record_seq = [0, 0]
+    seq_gaps = [0, 0]
+    latency = []
+
+    async def consume_descriptors(channel):
+        # like the driver, hand every completed buffer back to the DMA
+        axi_ram, _, desc_master, _ = tb.channels[channel]
+        i = 0
+        while True:
+            dma_desc_flags = await desc_master.read_dword((DESC_SIZE*i) + 12)
+            if dma_desc_flags & 0x1:
+                await Timer(1, "us")
+                continue
+
+            dma_desc_addr = await desc_master.read_qword(DESC_SIZE*i)
+            dma_desc_len = await desc_master.read_dword((DESC_SIZE*i) + 8)
+            data = axi_ram.read(dma_desc_addr, dma_desc_len)
+
+            pos = 0
+            while pos < len(data):
+                marker = parse_marker(data[pos:])
+                if marker:
+                    incl_len = int.from_bytes(data[pos+8:pos+12], byteorder='little')
+                    port, lost = marker
+                    marked[port] += lost
+                else:
+                    incl_len, port, seq = parse_stress_record(data[pos:])
+                    assert not captured[port] or captured[port][-1] < seq, f"Record {seq} of port {port} reordered"
+                    assert incl_len == len(frames[port][seq].get_payload()) + 4, f"Record {seq} of port {port} has wrong length"
+                    captured[port].append(seq)
+                assert not tb.per_port or port == channel, f"Record of port {port} in ring {channel}"
+                assert data[pos+15] >> 4 == port, f"Record of port {port} has port {data[pos+15] >> 4} in its header"
+
+                # records lost behind the MAC leave a gap in the sequence numbers
+                header_seq = int.from_bytes(data[pos+14:pos+16], byteorder='little') & 0xfff
+                seq_gaps[port] += (header_seq - record_seq[port]) & 0xfff
+                record_seq[port] = (header_seq + 1) & 0xfff
+                pos += 16 + incl_len
+            assert pos == len(data), "Buffer does not end at a record boundary"
+
+            await desc_master.write_dword((DESC_SIZE*i) + 8, PACKED_BUFFER_SIZE)
+            await desc_master.write_dword((DESC_SIZE*i) + 12, dma_desc_flags | 0x1)
+
+            i = 0 if i == DESC_COUNT-1 else i+1
+
+    async def monitor_dma_latency(channel):
+        # time from the end of a frame on the wire until its record is written,
+        # several records can be in flight
+        axi_ram, _, _, dma = tb.channels[channel]
+        addrs = []
+        while True:
+            await RisingEdge(tb.dut.axi_clk)
+            if dma.axis_write_desc_status_valid.value:
+                now = get_sim_time()
+                data = axi_ram.read(addrs.pop(0), 16+24)
+                if parse_marker(data):
+                    continue
+                _, port, seq = parse_stress_record(data)
+                # the source sends a copy of the frame, the time is only set on it
+                sent = frames[port][seq].tx_complete.data
+                latency.append(get_time_from_sim_steps(now - sent.sim_time_end, "ns"))
+            if dma.axis_write_desc_valid.value and dma.axis_write_desc_ready.value:
+                addrs.append(dma.axis_write_desc_addr.value.integer)
+
+    for channel in range(len(tb.channels)):
+        cocotb.start_soon(consume_descriptors(channel))
+        cocotb.start_soon(monitor_dma_latency(channel))
+
+    for _, dma_master, _, _ in tb.channels:
+        await dma_master.write_dword(DMA_ADR_ID, DESC_RING_ADDR)
+        await dma_master.write_dword(DMA_PACK_TIMEOUT_ID, 1000)
+        await dma_master.write_dword(DMA_CTRL_ID, DMA_CTRL_ENABLE | DMA_CTRL_PACKED)
+    await tb.axil_mac_master.write_dword(MAC_CTRL_ID, 0x1) # enable MAC
+
+    start = get_sim_time(PERIOD_UNITS)
+    for port in range(2):
+        sources[port].ifg = 12
+        for frame in frames[port]:
+            sources[port].send_nowait(frame)
+
+    while not all(source.empty() for source in sources):
+        await Timer(10, "us")
+    end = get_sim_time(PERIOD_UNITS)
+
+    # wait until the last records were written and the buffers returned
+    while True:
+        count = sum(len(c) for c in captured)
+        await Timer(20, "us")
+        if count == sum(len(c) for c in captured) and tb.write_end < get_sim_time(PERIOD_UNITS) - 10000:
+            break
+
+    fifo_good_frame = [await tb.axil_mac_master.read_dword(reg) for reg in MAC_FIFO_GOOD_FRAME_ID]
+    fifo_overflow = [await tb.axil_mac_master.read_dword(reg) for reg in MAC_FIFO_OVERFLOW_ID]
+    fifo_bad_frame = [await tb.axil_mac_master.read_dword(reg) for reg in MAC_FIFO_BAD_FRAME_ID]
+    fifo_high_water = [await tb.axil_mac_master.read_dword(reg) for reg in MAC_FIFO_HIGH_WATER_ID]
+    fifo_hist = [[await tb.axil_mac_master.read_dword(reg + 4*i) for i in range(MAC_FIFO_HIST_BUCKETS)]
+                 for reg in MAC_FIFO_HIST_ID]
+
+    sent_bytes = [sum(len(f.get_payload()) + 4 for f in frames[port]) for port in range(2)]
+    captured_bytes = [sum(len(frames[port][seq].get_payload()) + 4 for seq in captured[port]) for port in range(2)]
+    latency.sort()
+
+    results = {
+        "traffic": traffic,
+        "backpressure": backpressure,
+        "axi_max_burst_len": int(os.getenv("PARAM_AXI_MAX_BURST_LEN", "0")),
+        "dma_per_port": tb.per_port,
+        "shared_buffer": tb.shared_buffer,
+        "frames_sent": [len(f) for f in frames],
+        "frames_captured": [len(c) for c in captured],
+        "frames_lost": [len(frames[port]) - len(captured[port]) for port in range(2)],
+        "frames_lost_marked": marked,
+        "records_lost_seq_gaps": seq_gaps,
+        "offered_mbps": sum(sent_bytes) / (end - start) * 1e3,
+        "captured_mbps": sum(captured_bytes) / (end - start) * 1e3,
+        "dma_mbps": tb.write_bytes / (tb.write_end - tb.write_start) * 1e3,
+        "fifo_depth_bytes": 2**11 if tb.shared_buffer else 2**13,
+        "fifo_high_water_bytes": fifo_high_water,
+        "fifo_occupancy_histogram": fifo_hist,
+        "fifo_good_frame": fifo_good_frame,
+        "fifo_overflow": fifo_overflow,
+        "fifo_bad_frame": fifo_bad_frame,
+        "dma_latency_ns": {
+            "min": latency[0],
+            "mean": sum(latency) / len(latency),
+            "p99": latency[int(len(latency) * 0.99)],
+            "max": latency[-1],
+        },
+    }
+
+    tb.log.info("stress results: %s", json.dumps(results))
+
+    with open(os.getenv("STRESS_RESULTS", "stress.jsonl"), "a") as f:
+        f.write(json.dumps(results) + "\n")
+
+    for port in range(2):
+        assert len(captured[port]) + fifo_overflow[port] == len(frames[port]), \
+            f"Port {port} lost frames without counting an overflow"
+        # without the shared buffer, frames are only dropped by the MAC FIFO
+        if not tb.shared_buffer:
+            assert marked[port] == fifo_overflow[port], f"Port {port} lost frames without a marker"
+            assert seq_gaps[port] == 0, f"Port {port} has gaps in the record sequence numbers"
+
+
 def incrementing_payload(length):
     return bytearray(itertools.islice(itertools.cycle(range(256)), length))
 
 def cycle_pause():
     return itertools.cycle((10 * [1]) + [0])
 
+def random_pause(probability):
+    rand = random.Random(1)
+    while True:
+        yield rand.random() < probability
+
 
 if cocotb.SIM_NAME:
     for test in [run_test_continuous]:
         factory = TestFactory(test)
         factory.generate_tests()
+
+    factory = TestFactory(run_test_throughput)
+    factory.add_option("frame_len", [64, 512, 1500])
+    factory.add_option("backpressure_inserter", [None, cycle_pause])
+    factory.generate_tests()
+
+    factory = TestFactory(run_test_stress)
+    factory.add_option("traffic", ["64", "imix"])
+    factory.add_option("backpressure", [0.0, 0.5])
+    factory.generate_tests()
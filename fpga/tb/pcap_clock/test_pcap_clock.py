@@ -18,7 +18,6 @@ You should have received a copy of the GNU General Public License along
 with aRTS. If not, see <https://www.gnu.org/licenses/>.
 """
 
-import itertools
 import logging
 import os
 
@@ -26,10 +25,19 @@ import cocotb_test.simulator
 
 import cocotb
 from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge, FallingEdge
+from cocotb.triggers import RisingEdge, ClockCycles
 from cocotb.regression import TestFactory
 
-CLOCK_PERIOD = 100_000_001
+PPB = 10**9
+
+
+def gray_decode(n):
+    m = n >> 1
+    while m:
+        n ^= m
+        m >>= 1
+    return n
+
 
 class TB:
     def __init__(self, dut):
@@ -38,6 +46,18 @@ class TB:
         self.log = logging.getLogger("cocotb.tb")
         self.log.setLevel(logging.DEBUG)
 
+        self.nsec_per_tick = int(os.getenv("PARAM_NSEC_PER_TICK"))
+        self.ticks_per_sec = int(os.getenv("PARAM_TICKS_PER_SEC"))
+        self.reset_sec = int(os.getenv("PARAM_RESET_SEC"))
+
+        dut.set_sec.setimmediatevalue(0)
+        dut.set_nsec.setimmediatevalue(0)
+        dut.load_req.setimmediatevalue(0)
+        dut.rate_ppb.setimmediatevalue(0)
+        dut.rate_req.setimmediatevalue(0)
+        dut.sync_in.setimmediatevalue(0)
+        dut.sync_enable.setimmediatevalue(0)
+
         cocotb.start_soon(Clock(dut.clk, 8, units="ns").start())
 
     async def reset(self):
@@ -51,32 +71,100 @@ class TB:
         await RisingEdge(self.dut.clk)
         await RisingEdge(self.dut.clk)
 
+    def ticks(self):
+        """Current time in ticks since second 0"""
+        sec = gray_decode(self.dut.sec.value.integer)
+        tick = gray_decode(self.dut.nsec.value.integer)
+        return sec * self.ticks_per_sec + tick
+
+    async def load(self, sec, nsec):
+        self.dut.set_sec.value = sec
+        self.dut.set_nsec.value = nsec
+        self.dut.load_req.value = not self.dut.load_req.value.integer
+        await RisingEdge(self.dut.clk)
+        while self.dut.load_ack.value != self.dut.load_req.value:
+            await RisingEdge(self.dut.clk)
+        # until the time on the gray code outputs follows the request
+        await ClockCycles(self.dut.clk, 3)
+
+    async def set_rate(self, ppb):
+        self.dut.rate_ppb.value = ppb & 0xffffffff
+        self.dut.rate_req.value = not self.dut.rate_req.value.integer
+        await RisingEdge(self.dut.clk)
+        while self.dut.rate_ack.value != self.dut.rate_req.value:
+            await RisingEdge(self.dut.clk)
+        # until the time on the gray code outputs follows the request
+        await ClockCycles(self.dut.clk, 3)
+
+
+async def run_test_count(dut):
+    """A tick per cycle, the seconds count when the ticks wrap"""
+    tb = TB(dut)
+
+    await tb.reset()
+
+    assert gray_decode(dut.sec.value.integer) == tb.reset_sec
+
+    start = tb.ticks()
+    for k in range(1, 2*tb.ticks_per_sec + 10):
+        await RisingEdge(dut.clk)
+        assert tb.ticks() == start + k
+        assert gray_decode(dut.nsec.value.integer) < tb.ticks_per_sec
 
-async def run_test(dut):
+    assert gray_decode(dut.sec.value.integer) >= tb.reset_sec + 2
 
+
+async def run_test_load(dut):
+    """Seconds and nanoseconds are loaded together"""
     tb = TB(dut)
 
-    clock = Clock(dut.clk, CLOCK_PERIOD, units="ns")  # Create a 8ns period clock on port clk
-    cocotb.start_soon(clock.start())  # Start the clock
+    await tb.reset()
+
+    for sec, nsec in [(1700000000, 123456784), (5, 0), (0xffffffff, 8)]:
+        nsec = min(nsec, (tb.ticks_per_sec-1)*tb.nsec_per_tick)
+        await tb.load(sec, nsec)
+
+        loaded = sec * tb.ticks_per_sec + nsec // tb.nsec_per_tick
+        assert 0 <= tb.ticks() - loaded <= 3, f"loaded {sec}.{nsec}, read {tb.ticks()}"
+
+        before = tb.ticks()
+        await ClockCycles(dut.clk, 100)
+        assert tb.ticks() - before == 100
+
+    # the set values have no effect without a load request
+    dut.set_sec.value = 7
+    dut.set_nsec.value = 0
+    await ClockCycles(dut.clk, 10)
+    assert gray_decode(dut.sec.value.integer) != 7
+
+
+async def run_test_rate(dut):
+    """The rate trim inserts or swallows ticks at the requested rate"""
+    tb = TB(dut)
 
     await tb.reset()
 
-    for _ in range(2):
-        await FallingEdge(dut.clk)
+    cycles = 20000
 
-    for _ in range(int(1_000_000_000 / CLOCK_PERIOD)):
-        await FallingEdge(dut.clk)
+    for ppb in [0, 1000000, -1000000, 250000000, -250000000, PPB-1, -(PPB-1)]:
+        await tb.set_rate(ppb)
 
-    assert dut.sec.value == 1
-    assert dut.nsec.value.integer == 200000012
+        prev = start = tb.ticks()
+        for _ in range(cycles):
+            await RisingEdge(dut.clk)
+            cur = tb.ticks()
+            # monotonic, at most two ticks at a time
+            assert 0 <= cur - prev <= 2
+            prev = cur
 
-    for _ in range(int(1_000_000_000 / CLOCK_PERIOD)):
-        await FallingEdge(dut.clk)
+        expected = cycles * (PPB + ppb) / PPB
+        tb.log.info("rate %d ppb: %d ticks in %d cycles (expected %.1f)", ppb, prev - start, cycles, expected)
+        assert abs((prev - start) - expected) <= 2
 
-    assert dut.sec.value == 2
-    assert dut.nsec.value.integer == 100000021
+    await tb.set_rate(0)
 
 
 if cocotb.SIM_NAME:
-    factory = TestFactory(run_test)
-    factory.generate_tests()
\ No newline at end of file
+    for test in [run_test_count, run_test_load, run_test_rate]:
+        factory = TestFactory(test)
+        factory.generate_tests()
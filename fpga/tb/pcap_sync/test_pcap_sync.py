@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+import random
+
+import cocotb_test.simulator
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, ClockCycles, Edge
+from cocotb.regression import TestFactory
+
+# clock of unit a, unit b runs skewed against it
+PERIOD_PS = 8000
+
+SETTLE_SEC = 20
+CHECK_SEC = 10
+# sampling the two clock domains at once is off by a tick, the remaining
+# offset of the loop adds a little
+MAX_OFFSET = 3
+
+
+def gray_decode(n):
+    m = n >> 1
+    while m:
+        n ^= m
+        m >>= 1
+    return n
+
+
+def signed32(n):
+    return n - (1 << 32) if n & (1 << 31) else n
+
+
+class TB:
+    def __init__(self, dut, skew_ppm):
+        self.dut = dut
+
+        self.log = logging.getLogger("cocotb.tb")
+        self.log.setLevel(logging.DEBUG)
+
+        self.nsec_per_tick = int(os.getenv("PARAM_NSEC_PER_TICK"))
+        self.ticks_per_sec = int(os.getenv("PARAM_TICKS_PER_SEC"))
+        self.step_ticks = int(os.getenv("PARAM_SYNC_STEP_TICKS"))
+
+        dut.a_set_sec.setimmediatevalue(0)
+        dut.a_set_nsec.setimmediatevalue(0)
+        dut.a_load_req.setimmediatevalue(0)
+        dut.b_sync_enable.setimmediatevalue(0)
+
+        b_period = PERIOD_PS * (10**6 + skew_ppm) // 10**6
+        cocotb.start_soon(Clock(dut.a_clk, PERIOD_PS, units="ps").start())
+        cocotb.start_soon(Clock(dut.b_clk, b_period, units="ps").start())
+
+        self.measurements = []
+        cocotb.start_soon(self.monitor_sync())
+
+    async def reset(self):
+        self.dut.a_rst.setimmediatevalue(0)
+        self.dut.b_rst.setimmediatevalue(0)
+        await ClockCycles(self.dut.a_clk, 2)
+        self.dut.a_rst.value = 1
+        self.dut.b_rst.value = 1
+        await ClockCycles(self.dut.a_clk, 4)
+        self.dut.a_rst.value = 0
+        self.dut.b_rst.value = 0
+        await ClockCycles(self.dut.a_clk, 2)
+
+    async def monitor_sync(self):
+        while True:
+            await Edge(self.dut.b_sync_toggle)
+            await RisingEdge(self.dut.b_clk)
+            offset = signed32(self.dut.b_sync_offset.value.integer)
+            freq = signed32(self.dut.b_sync_freq.value.integer)
+            locked = self.dut.b_sync_locked.value.integer
+            self.measurements.append((offset, freq, locked))
+            self.log.info("offset %d ticks, frequency %d ppb, locked %d", offset, freq, locked)
+
+    def ticks(self, unit):
+        """Current time of a unit in ticks since second 0"""
+        sec = gray_decode(getattr(self.dut, f"{unit}_sec").value.integer)
+        tick = gray_decode(getattr(self.dut, f"{unit}_nsec").value.integer)
+        return sec * self.ticks_per_sec + tick
+
+    def offset(self):
+        return self.ticks("b") - self.ticks("a")
+
+    async def load_a(self, sec, nsec):
+        self.dut.a_set_sec.value = sec
+        self.dut.a_set_nsec.value = nsec
+        self.dut.a_load_req.value = not self.dut.a_load_req.value.integer
+        await RisingEdge(self.dut.a_clk)
+        while self.dut.a_load_ack.value != self.dut.a_load_req.value:
+            await RisingEdge(self.dut.a_clk)
+        # until the time on the gray code outputs follows the request
+        await ClockCycles(self.dut.a_clk, 3)
+
+
+async def run_test_sync(dut, skew_ppm=10000):
+    """b takes over the time of a and keeps the offset bounded"""
+    tb = TB(dut, skew_ppm)
+
+    await tb.reset()
+
+    await tb.load_a(1700000000, 400*tb.nsec_per_tick)
+    assert abs(tb.offset()) > tb.ticks_per_sec
+
+    dut.b_sync_enable.value = 1
+
+    await ClockCycles(dut.a_clk, SETTLE_SEC*tb.ticks_per_sec)
+
+    assert dut.b_sync_locked.value.integer
+    assert gray_decode(dut.b_sec.value.integer) - gray_decode(dut.a_sec.value.integer) in (-1, 0, 1)
+
+    # the frequency correction converged on the skew, a longer period of b
+    # needs a higher rate
+    freq = signed32(dut.b_sync_freq.value.integer)
+    assert abs(freq - skew_ppm*1000) < abs(skew_ppm)*1000 // 10 + 10**6 // tb.ticks_per_sec
+
+    rand = random.Random(18)
+    offsets = []
+    for _ in range(CHECK_SEC*10):
+        await ClockCycles(dut.a_clk, tb.ticks_per_sec // 10 + rand.randrange(17))
+        offsets.append(tb.offset())
+
+    tb.log.info("offset of b after locking: %d to %d ticks", min(offsets), max(offsets))
+
+    assert dut.b_sync_locked.value.integer
+    assert all(abs(offset) <= MAX_OFFSET for offset in offsets)
+
+
+async def run_test_free(dut, skew_ppm=10000):
+    """Without synchronization b runs on its own clock"""
+    tb = TB(dut, skew_ppm)
+
+    await tb.reset()
+
+    start = tb.offset()
+    await ClockCycles(dut.a_clk, 5*tb.ticks_per_sec)
+
+    # b measures the line of a, but does not follow it
+    assert tb.measurements
+    assert not dut.b_sync_locked.value.integer
+    assert all(freq == 0 for _, freq, _ in tb.measurements)
+
+    # a period longer by 1 ppm makes b lose 1 ppm of the ticks of a
+    drift = -5*tb.ticks_per_sec*skew_ppm // 10**6
+    assert abs(tb.offset() - start - drift) <= 2
+
+
+if cocotb.SIM_NAME:
+    for test in [run_test_sync, run_test_free]:
+        factory = TestFactory(test)
+        factory.add_option("skew_ppm", [10000, -10000])
+        factory.generate_tests()
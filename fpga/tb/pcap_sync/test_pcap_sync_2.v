@@ -0,0 +1,126 @@
+/*
+
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+
+*/
+// Language: Verilog 2001
+
+`resetall
+`timescale 1ns / 1ps
+`default_nettype none
+
+/*
+ * Two pcap_clock instances, b following the sync line of a
+ */
+module test_pcap_sync_2 #
+(
+    parameter NSEC_PER_TICK = 8,
+    parameter TICKS_PER_SEC = 1000,
+    parameter RESET_SEC = 32'h80000000,
+    parameter SYNC_STEP_TICKS = 100
+)
+(
+    input  wire        a_clk,
+    input  wire        a_rst,
+    input  wire [31:0] a_set_sec,
+    input  wire [31:0] a_set_nsec,
+    input  wire        a_load_req,
+    output wire        a_load_ack,
+    output wire [31:0] a_nsec,
+    output wire [31:0] a_sec,
+
+    input  wire        b_clk,
+    input  wire        b_rst,
+    input  wire        b_sync_enable,
+    output wire        b_sync_locked,
+    output wire [31:0] b_sync_offset,
+    output wire [31:0] b_sync_freq,
+    output wire        b_sync_toggle,
+    output wire [31:0] b_nsec,
+    output wire [31:0] b_sec
+);
+
+wire sync_line;
+
+pcap_clock #(
+    .NSEC_PER_TICK(NSEC_PER_TICK),
+    .TICKS_PER_SEC(TICKS_PER_SEC),
+    .RESET_SEC(RESET_SEC),
+    .SYNC_STEP_TICKS(SYNC_STEP_TICKS)
+)
+a_inst (
+    .clk(a_clk),
+    .rst(a_rst),
+
+    .set_sec(a_set_sec),
+    .set_nsec(a_set_nsec),
+    .load_req(a_load_req),
+    .load_ack(a_load_ack),
+
+    .rate_ppb(32'd0),
+    .rate_req(1'b0),
+    .rate_ack(),
+
+    .sync_in(1'b0),
+    .sync_out(sync_line),
+    .sync_enable(1'b0),
+
+    .sync_locked(),
+    .sync_offset(),
+    .sync_freq(),
+    .sync_toggle(),
+
+    .nsec(a_nsec),
+    .sec(a_sec)
+);
+
+pcap_clock #(
+    .NSEC_PER_TICK(NSEC_PER_TICK),
+    .TICKS_PER_SEC(TICKS_PER_SEC),
+    .RESET_SEC(RESET_SEC),
+    .SYNC_STEP_TICKS(SYNC_STEP_TICKS)
+)
+b_inst (
+    .clk(b_clk),
+    .rst(b_rst),
+
+    .set_sec(32'd0),
+    .set_nsec(32'd0),
+    .load_req(1'b0),
+    .load_ack(),
+
+    .rate_ppb(32'd0),
+    .rate_req(1'b0),
+    .rate_ack(),
+
+    .sync_in(sync_line),
+    .sync_out(),
+    .sync_enable(b_sync_enable),
+
+    .sync_locked(b_sync_locked),
+    .sync_offset(b_sync_offset),
+    .sync_freq(b_sync_freq),
+    .sync_toggle(b_sync_toggle),
+
+    .nsec(b_nsec),
+    .sec(b_sec)
+);
+
+endmodule
+
+`resetall
@@ -34,6 +34,80 @@ from cocotbext.eth import GmiiFrame, RgmiiSource
 from cocotbext.axi import AxiStreamBus, AxiStreamSink
 
 
+FILTER_ENABLE = 1 << 0
+FILTER_INVERT = 1 << 1
+FILTER_ETHERTYPE = 1 << 2
+FILTER_DST_MAC = 1 << 3
+FILTER_SRC_MAC = 1 << 4
+FILTER_VLAN = 1 << 5
+FILTER_RULE = 1 << 16
+
+RULE_COUNT = 4
+RECORD_HEADER_LEN = 16
+WORD_LEN = 8
+FIFO_DEPTH = 2**13
+TICK_NS = 8 # resolution of the timestamps of pcap_clock
+
+MARKER_ETHERTYPE = 0x88b6
+MARKER_TYPE_LOSS = 1
+MARKER_LEN = 64
+
+
+class FilterConfig:
+    """Configuration of axis_pcap_filter and a reference model of it"""
+
+    def __init__(self, ctrl=0, ethertype=0, vlan_id=0, dst_mac=bytes(6), src_mac=bytes(6), rules=()):
+        self.ctrl = ctrl
+        self.ethertype = ethertype
+        self.vlan_id = vlan_id
+        self.dst_mac = dst_mac
+        self.src_mac = src_mac
+        self.rules = list(rules) + [(0, 0, 0)] * (RULE_COUNT - len(rules))
+
+    def rule_match(self, frame, offset, mask, value):
+        start = (RECORD_HEADER_LEN + offset) // WORD_LEN * WORD_LEN - RECORD_HEADER_LEN
+        for i in range(WORD_LEN):
+            byte_mask = (mask >> (8*i)) & 0xff
+            if not byte_mask:
+                continue
+            if start + i >= len(frame):
+                return False
+            if (frame[start + i] ^ (value >> (8*i))) & byte_mask:
+                return False
+        return True
+
+    def match(self, frame):
+        outer_type = int.from_bytes(frame[12:14], "big") if len(frame) >= 14 else None
+        tagged = outer_type in (0x8100, 0x88a8)
+
+        if tagged:
+            ethertype = int.from_bytes(frame[16:18], "big") if len(frame) >= 18 else None
+            vlan_id = int.from_bytes(frame[14:16], "big") & 0xfff if len(frame) >= 16 else None
+        else:
+            ethertype = outer_type
+            vlan_id = None
+
+        if self.ctrl & FILTER_DST_MAC and frame[0:6] != self.dst_mac:
+            return False
+        if self.ctrl & FILTER_SRC_MAC and frame[6:12] != self.src_mac:
+            return False
+        if self.ctrl & FILTER_ETHERTYPE and ethertype != self.ethertype:
+            return False
+        if self.ctrl & FILTER_VLAN and vlan_id != self.vlan_id:
+            return False
+
+        for n, rule in enumerate(self.rules):
+            if self.ctrl & (FILTER_RULE << n) and not self.rule_match(frame, *rule):
+                return False
+
+        return True
+
+    def accept(self, frame):
+        if not self.ctrl & FILTER_ENABLE:
+            return True
+        return self.match(frame) != bool(self.ctrl & FILTER_INVERT)
+
+
 class TB:
     def __init__(self, dut, speed=1000e6):
         self.dut = dut
@@ -49,6 +123,41 @@ class TB:
         cocotb.start_soon(Clock(dut.counter_clk, 8, units="ns").start())
 
         self.set_speed(speed)
+        self.set_filter(FilterConfig())
+        self.dut.snaplen.setimmediatevalue(0)
+
+        self.dropped_frames = 0
+        self.dropped_bytes = 0
+        cocotb.start_soon(self.monitor_drops())
+
+    def set_time(self, sec, nsec):
+        # the time arrives from pcap_clock in gray code, nsec in ticks
+        self.dut.ts_sec_gray.value = gray_encode(sec)
+        self.dut.ts_nsec_gray.value = gray_encode(nsec // TICK_NS)
+
+    def set_filter(self, config):
+        self.dut.filter_ctrl.setimmediatevalue(config.ctrl)
+        self.dut.filter_ethertype.setimmediatevalue(config.ethertype)
+        self.dut.filter_vlan_id.setimmediatevalue(config.vlan_id)
+        self.dut.filter_dst_mac.setimmediatevalue(int.from_bytes(config.dst_mac, "big"))
+        self.dut.filter_src_mac.setimmediatevalue(int.from_bytes(config.src_mac, "big"))
+
+        offsets, masks, values = 0, 0, 0
+        for n, (offset, mask, value) in enumerate(config.rules):
+            offsets |= offset << (16*n)
+            masks |= mask << (64*n)
+            values |= value << (64*n)
+
+        self.dut.filter_rule_offset.setimmediatevalue(offsets)
+        self.dut.filter_rule_mask.setimmediatevalue(masks)
+        self.dut.filter_rule_value.setimmediatevalue(values)
+
+    async def monitor_drops(self):
+        while True:
+            await RisingEdge(self.dut.axi_clk)
+            if self.dut.filter_drop_frame.value:
+                self.dropped_frames += 1
+                self.dropped_bytes += self.dut.filter_drop_bytes.value.integer
 
     def set_speed(self, speed):
         if speed == 10e6:
@@ -91,8 +200,7 @@ async def run_test_rx(dut, payload_lengths=None, payload_data=None, backpressure
     await tb.reset()
     tb.set_backpressure_generator(backpressure_inserter)
 
-    dut.ts_nsec.value = 1
-    dut.ts_sec.value = 2
+    tb.set_time(2, 8)
     dut.enable.value = 1
     dut.mii_select = 0 if speed == 1000e6 else 1
 
@@ -123,9 +231,11 @@ async def run_test_rx(dut, payload_lengths=None, payload_data=None, backpressure
         assert len(axis_data) == len(test_frame) + 16, f"Frame 1: {axis_data}\nFrame 2 {test_frame}"
         assert axis_data[16:] == test_frame
         assert int.from_bytes(axis_data[0:4], "little", signed=False) == 2
-        assert int.from_bytes(axis_data[4:8], "little", signed=False) == 1
+        assert int.from_bytes(axis_data[4:8], "little", signed=False) == 8
         assert int.from_bytes(axis_data[8:12], "little", signed=False) == len(test_frame)
-        assert int.from_bytes(axis_data[12:16], "little", signed=False) == len(test_frame)
+        assert int.from_bytes(axis_data[12:14], "little", signed=False) == len(test_frame)
+        assert record_port(axis_data) == 0
+        assert record_seq(axis_data) == i
 
     assert tb.axis_sink.empty()
 
@@ -140,8 +250,7 @@ async def run_test_bad_frame(dut, payload_data=None, backpressure_inserter=None,
     await tb.reset()
     tb.set_backpressure_generator(backpressure_inserter)
 
-    dut.ts_nsec.value = 400
-    dut.ts_sec.value = 2
+    tb.set_time(2, 400)
     dut.enable.value = 1
     dut.mii_select = 0 if speed == 1000e6 else 1
 
@@ -161,12 +270,270 @@ async def run_test_bad_frame(dut, payload_data=None, backpressure_inserter=None,
 
     assert len(axis_data) == len(frame.get_payload()) + 16, f"Frame 1: {axis_data}\nFrame 2 {frame.get_payload()}"
     assert axis_data[16:] == frame.get_payload()
-    assert int.from_bytes(axis_data[0:4], "little", signed=False) == 3
+    assert int.from_bytes(axis_data[0:4], "little", signed=False) == 2
     assert int.from_bytes(axis_data[4:8], "little", signed=False) == 400
     assert int.from_bytes(axis_data[8:12], "little", signed=False) == len(frame.get_payload())
-    assert int.from_bytes(axis_data[12:16], "little", signed=False) == len(frame.get_payload())
+    assert int.from_bytes(axis_data[12:14], "little", signed=False) == len(frame.get_payload())
+
+
+
+
+async def run_test_snaplen(dut, payload_lengths=None, payload_data=None, snaplen=64, backpressure_inserter=None,
+                           speed=1000e6, ifg=12):
+    tb = TB(dut, speed)
+
+    tb.rgmii_source.ifg = ifg
+
+    await tb.reset()
+    tb.set_backpressure_generator(backpressure_inserter)
+
+    tb.set_time(2, 8)
+    dut.enable.value = 1
+    dut.snaplen.value = snaplen
+    dut.mii_select = 0 if speed == 1000e6 else 1
+
+    for _ in range(100):
+        await RisingEdge(dut.rx_clk)
+
+    test_frames = [payload_data(x) for x in payload_lengths()]
+    gmii_frames = list()
+
+    for test_data in test_frames:
+        test_frame = GmiiFrame.from_payload(test_data, tx_complete=Event())
+        gmii_frames.append(test_frame)
+        await tb.rgmii_source.send(test_frame)
+
+    for gmii_frame, test_frame in zip(gmii_frames, test_frames):
+        await gmii_frame.tx_complete.wait()
+
+        axis_frame = await tb.axis_sink.recv()
+        axis_data = axis_frame.tdata
+        incl_len = min(len(test_frame), snaplen)
 
+        assert len(axis_data) == incl_len + 16
+        assert axis_data[16:] == test_frame[:incl_len]
+        assert int.from_bytes(axis_data[8:12], "little", signed=False) == incl_len
+        assert int.from_bytes(axis_data[12:14], "little", signed=False) == len(test_frame)
 
+    assert tb.axis_sink.empty()
+
+    await RisingEdge(dut.rgmii_rx_clk)
+    await RisingEdge(dut.rgmii_rx_clk)
+
+
+async def run_test_filter(dut, filter_config=None, backpressure_inserter=None, speed=1000e6, ifg=12):
+    tb = TB(dut, speed)
+    config = filter_config()
+
+    tb.rgmii_source.ifg = ifg
+
+    await tb.reset()
+    tb.set_backpressure_generator(backpressure_inserter)
+    tb.set_filter(config)
+
+    tb.set_time(2, 8)
+    dut.enable.value = 1
+    dut.mii_select = 0 if speed == 1000e6 else 1
+
+    for _ in range(100):
+        await RisingEdge(dut.rx_clk)
+
+    test_frames = mixed_traffic()
+    expected_frames = [f for f in test_frames if config.accept(f)]
+    dropped_frames = [f for f in test_frames if not config.accept(f)]
+
+    tb.log.info("%d of %d frames are expected to pass", len(expected_frames), len(test_frames))
+    assert expected_frames and dropped_frames, "traffic does not exercise the filter"
+
+    gmii_frames = list()
+
+    for test_data in test_frames:
+        test_frame = GmiiFrame.from_payload(test_data, tx_complete=Event())
+        gmii_frames.append(test_frame)
+        await tb.rgmii_source.send(test_frame)
+
+    for gmii_frame in gmii_frames:
+        await gmii_frame.tx_complete.wait()
+
+    for test_frame in expected_frames:
+        axis_frame = await tb.axis_sink.recv()
+        axis_data = axis_frame.tdata
+
+        assert axis_data[16:] == test_frame
+        assert int.from_bytes(axis_data[8:12], "little", signed=False) == len(test_frame)
+        assert int.from_bytes(axis_data[12:14], "little", signed=False) == len(test_frame)
+
+    for _ in range(1000):
+        await RisingEdge(dut.axi_clk)
+
+    assert tb.axis_sink.empty()
+    assert tb.dropped_frames == len(dropped_frames)
+    assert tb.dropped_bytes == sum(len(f) for f in dropped_frames)
+
+    await RisingEdge(dut.rgmii_rx_clk)
+    await RisingEdge(dut.rgmii_rx_clk)
+
+
+async def run_test_fifo_occupancy(dut, payload_data=None, frame_count=16):
+    """Fill the RX FIFO beyond overflow while the sink is stalled, then drain it"""
+    tb = TB(dut)
+
+    await tb.reset()
+
+    tb.set_time(2, 8)
+    dut.enable.value = 1
+    dut.mii_select = 0
+
+    high_water = 0
+
+    async def monitor_occupancy():
+        nonlocal high_water
+        while True:
+            await RisingEdge(dut.axi_clk)
+            high_water = max(high_water, dut.fifo_occupancy.value.integer)
+
+    cocotb.start_soon(monitor_occupancy())
+
+    for _ in range(100):
+        await RisingEdge(dut.rx_clk)
+
+    assert dut.fifo_occupancy.value.integer == 0
+
+    tb.axis_sink.pause = True
+
+    gmii_frames = list()
+    for _ in range(frame_count):
+        test_frame = GmiiFrame.from_payload(payload_data(1500), tx_complete=Event())
+        gmii_frames.append(test_frame)
+        await tb.rgmii_source.send(test_frame)
+
+    for gmii_frame in gmii_frames:
+        await gmii_frame.tx_complete.wait()
+
+    for _ in range(100):
+        await RisingEdge(dut.axi_clk)
+
+    occupancy = dut.fifo_occupancy.value.integer
+    tb.log.info("occupancy with stalled sink: %d bytes, high-water mark %d bytes", occupancy, high_water)
+    assert occupancy > FIFO_DEPTH - 1504, "frames were dropped before the FIFO was full"
+    assert high_water <= FIFO_DEPTH
+
+    tb.axis_sink.pause = False
+
+    received = 0
+    frame_len = 0
+    lost_frames = 0
+    lost_bytes = 0
+    records = 0
+    while True:
+        for _ in range(1000):
+            await RisingEdge(dut.axi_clk)
+        if tb.axis_sink.empty():
+            break
+        while not tb.axis_sink.empty():
+            axis_data = tb.axis_sink.recv_nowait().tdata
+            assert record_seq(axis_data) == records % 2**12, "sequence number gap"
+            records += 1
+
+            marker = parse_marker(axis_data)
+            if marker:
+                assert marker["port"] == 0
+                lost_frames += marker["frames"]
+                lost_bytes += marker["bytes"]
+            else:
+                received += 1
+                frame_len = int.from_bytes(axis_data[12:14], "little", signed=False)
+
+    tb.log.info("%d of %d frames passed the FIFO, markers report %d frames (%d bytes) lost",
+            received, frame_count, lost_frames, lost_bytes)
+    assert received < frame_count, "the FIFO did not overflow"
+    assert received + lost_frames == frame_count, "frames lost without a marker"
+    assert lost_bytes == lost_frames * frame_len
+    # the words of dropped frames must not stay in the occupancy
+    assert dut.fifo_occupancy.value.integer == 0
+
+    await RisingEdge(dut.rgmii_rx_clk)
+    await RisingEdge(dut.rgmii_rx_clk)
+
+
+def record_port(data):
+    """Port in bits [31:28] of orig_len"""
+    return data[15] >> 4
+
+
+def record_seq(data):
+    """Sequence number in bits [27:16] of orig_len"""
+    return int.from_bytes(data[14:16], "little") & 0xfff
+
+
+def parse_marker(data):
+    """Returns the fields of a loss marker record, None for other records"""
+    frame = data[RECORD_HEADER_LEN:]
+    if len(frame) < 44 or frame[12:14] != MARKER_ETHERTYPE.to_bytes(2, "big") or frame[14:18] != b"aRTS":
+        return None
+
+    assert int.from_bytes(data[8:12], "little") == MARKER_LEN
+    assert frame[0:6] == MAC_BROADCAST and frame[6:11] == bytes([0x02, 0, 0, 0, 0])
+    assert frame[18] == MARKER_TYPE_LOSS and frame[19] == frame[11]
+
+    return {
+        "port": frame[19],
+        "frames": int.from_bytes(frame[20:24], "big"),
+        "bytes": int.from_bytes(frame[24:28], "big"),
+    }
+
+
+MAC_A = bytes.fromhex("001122334455")
+MAC_B = bytes.fromhex("02aabbccddee")
+MAC_BROADCAST = bytes.fromhex("ffffffffffff")
+
+
+def ethernet_frame(dst, src, ethertype, payload, vlan=None, tpid=0x8100):
+    frame = dst + src
+    if vlan is not None:
+        frame += tpid.to_bytes(2, "big") + vlan.to_bytes(2, "big")
+    frame += ethertype.to_bytes(2, "big") + payload
+    return frame + bytes(max(0, 60 - len(frame)))
+
+
+def ipv4_payload(protocol, length):
+    header = bytes([0x45, 0, 0, 0, 0, 0, 0, 0, 64, protocol, 0, 0]) + bytes([10, 0, 0, 1, 10, 0, 0, 2])
+    return header + incrementing_payload(length)
+
+
+def mixed_traffic():
+    return [
+        ethernet_frame(MAC_B, MAC_A, 0x0800, ipv4_payload(17, 100)),
+        ethernet_frame(MAC_B, MAC_A, 0x0800, ipv4_payload(6, 40)),
+        ethernet_frame(MAC_BROADCAST, MAC_A, 0x0806, incrementing_payload(28)),
+        ethernet_frame(MAC_A, MAC_B, 0x0800, ipv4_payload(17, 1400), vlan=5),
+        ethernet_frame(MAC_A, MAC_B, 0x86dd, incrementing_payload(200), vlan=7),
+        ethernet_frame(MAC_B, MAC_A, 0x0800, ipv4_payload(6, 300), vlan=0x2005, tpid=0x88a8),
+        ethernet_frame(MAC_A, MAC_B, 0x86dd, incrementing_payload(64)),
+        ethernet_frame(MAC_B, MAC_A, 0x0800, ipv4_payload(17, 20)),
+    ] * 3
+
+
+def filter_ethertype():
+    return FilterConfig(ctrl=FILTER_ENABLE | FILTER_ETHERTYPE, ethertype=0x0800)
+
+
+def filter_dst_mac():
+    return FilterConfig(ctrl=FILTER_ENABLE | FILTER_DST_MAC, dst_mac=MAC_B)
+
+
+def filter_not_src_mac():
+    return FilterConfig(ctrl=FILTER_ENABLE | FILTER_INVERT | FILTER_SRC_MAC, src_mac=MAC_A)
+
+
+def filter_vlan():
+    return FilterConfig(ctrl=FILTER_ENABLE | FILTER_VLAN, vlan_id=5)
+
+
+def filter_udp():
+    # IPv4 protocol field of untagged frames is frame byte 23, lane 7 of its word
+    return FilterConfig(ctrl=FILTER_ENABLE | FILTER_ETHERTYPE | (FILTER_RULE << 2), ethertype=0x0800,
+                        rules=[(0, 0, 0), (0, 0, 0), (23, 0xff << 56, 17 << 56)])
 
 
 def size_list():
@@ -174,6 +541,11 @@ def size_list():
         [64, 128, 256, 512, 1024, 64, 64, 64, 1500, 64, 64, 64, 1500, 1500]
 
 
+# From https://rosettacode.org/wiki/Gray_code#Python:_on_integers
+def gray_encode(n):
+    return n ^ n >> 1
+
+
 def incrementing_payload(length):
     return bytearray(itertools.islice(itertools.cycle(range(256)), length))
 
@@ -189,6 +561,23 @@ if cocotb.SIM_NAME:
     factory.add_option("speed", [1000e6, 100e6, 10e6])
     factory.generate_tests()
 
+    factory = TestFactory(run_test_filter)
+    factory.add_option("filter_config", [filter_ethertype, filter_dst_mac, filter_not_src_mac,
+                                         filter_vlan, filter_udp])
+    factory.add_option("backpressure_inserter", [None, cycle_pause])
+    factory.generate_tests()
+
+    factory = TestFactory(run_test_fifo_occupancy)
+    factory.add_option("payload_data", [incrementing_payload])
+    factory.generate_tests()
+
+    factory = TestFactory(run_test_snaplen)
+    factory.add_option("payload_lengths", [size_list])
+    factory.add_option("payload_data", [incrementing_payload])
+    factory.add_option("snaplen", [64, 68, 100, 1514])
+    factory.add_option("backpressure_inserter", [None, cycle_pause])
+    factory.generate_tests()
+
     factory = TestFactory(run_test_rx)
     factory.add_option("payload_lengths", [size_list])
     factory.add_option("payload_data", [incrementing_payload])
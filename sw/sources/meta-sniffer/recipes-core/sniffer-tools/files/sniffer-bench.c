@@ -0,0 +1,211 @@
+// SPDX-License-Identifier: GPL-2.0-or-later
+/*
+ * Throughput of the CPU accesses to the capture ring of /dev/sniffer
+ *
+ * Compares the uncached (default) and the cached DMA buffers of the driver
+ * (module parameter "cached"), which is reported along with the results:
+ *
+ * -m: maps the ring and copies it completely, -p times, to a buffer of the
+ *     tool, like read() copies the records to userspace. Then reads the
+ *     first 16 bytes of every buffer, like the driver and the consumers
+ *     parse the record headers. Needs no traffic, as the content of the
+ *     buffers does not matter.
+ * -r: reads the device for -t seconds into a buffer of -b KiB and reports
+ *     the throughput along with the CPU time the process spent per MB,
+ *     which tells the cost of read() at a rate limited by the link.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#include <errno.h>
+#include <fcntl.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/resource.h>
+
+#include "sniffer_uapi.h"
+
+#define COPY_CHUNK (1 << 20)
+#define CACHED_PARAM "/sys/module/sniffer/parameters/cached"
+
+static void usage(const char *name)
+{
+	fprintf(stderr, "Usage: %s [-d device] -m [-p passes] | -r [-t seconds] [-b KiB]\n", name);
+}
+
+static double now(void)
+{
+	struct timespec ts;
+
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static double cpu_seconds(void)
+{
+	struct rusage ru;
+
+	getrusage(RUSAGE_SELF, &ru);
+	return ru.ru_utime.tv_sec + ru.ru_utime.tv_usec * 1e-6 +
+	       ru.ru_stime.tv_sec + ru.ru_stime.tv_usec * 1e-6;
+}
+
+static char cached_mode(void)
+{
+	FILE *f = fopen(CACHED_PARAM, "r");
+	int c = '?';
+
+	if (f) {
+		c = fgetc(f);
+		fclose(f);
+	}
+
+	return c == 'Y' || c == '1' ? 'Y' : c == 'N' || c == '0' ? 'N' : '?';
+}
+
+static int bench_mmap(int fd, unsigned int passes)
+{
+	struct sniffer_mmap_ctrl *ctrl;
+	static uint8_t copy[COPY_CHUNK];
+	size_t data_size, off, n;
+	uint32_t sum = 0, hdr[4];
+	unsigned int pass, i;
+	uint8_t *data;
+	double start, copy_s, parse_s;
+
+	ctrl = mmap(NULL, sysconf(_SC_PAGESIZE), PROT_READ, MAP_SHARED, fd, 0);
+	if (ctrl == MAP_FAILED) {
+		perror("mmap control area");
+		return 1;
+	}
+
+	data_size = (size_t) ctrl->buf_count << ctrl->buf_size_ld;
+	data = mmap(NULL, data_size, PROT_READ, MAP_SHARED, fd, ctrl->data_offset);
+	if (data == MAP_FAILED) {
+		perror("mmap DMA buffers");
+		return 1;
+	}
+
+	start = now();
+	for (pass = 0; pass < passes; pass++) {
+		for (off = 0; off < data_size; off += n) {
+			n = data_size - off < COPY_CHUNK ? data_size - off : COPY_CHUNK;
+			memcpy(copy, data + off, n);
+			sum += copy[n - 1];
+		}
+	}
+	copy_s = now() - start;
+
+	start = now();
+	for (pass = 0; pass < passes; pass++) {
+		for (i = 0; i < ctrl->buf_count; i++) {
+			memcpy(hdr, data + ((size_t) i << ctrl->buf_size_ld), sizeof(hdr));
+			sum += hdr[2];
+		}
+	}
+	parse_s = now() - start;
+
+	printf("cached=%c copy %.1f MB/s, record headers %.2f M/s (%u buffers of %u bytes, checksum %u)\n",
+	       cached_mode(), (double) data_size * passes / copy_s / 1e6,
+	       (double) ctrl->buf_count * passes / parse_s / 1e6,
+	       ctrl->buf_count, 1u << ctrl->buf_size_ld, sum);
+
+	munmap(data, data_size);
+	munmap(ctrl, sysconf(_SC_PAGESIZE));
+
+	return 0;
+}
+
+static int bench_read(int fd, double seconds, size_t bufsize)
+{
+	unsigned long long bytes = 0, calls = 0;
+	double start, elapsed, cpu;
+	uint8_t *buf;
+	ssize_t n;
+
+	buf = malloc(bufsize);
+	if (!buf) {
+		perror("malloc");
+		return 1;
+	}
+
+	cpu = cpu_seconds();
+	start = now();
+	while ((elapsed = now() - start) < seconds) {
+		n = read(fd, buf, bufsize);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			perror("read");
+			free(buf);
+			return 1;
+		}
+		bytes += n;
+		calls++;
+	}
+	cpu = cpu_seconds() - cpu;
+
+	printf("cached=%c read %.1f MB/s, %llu calls, CPU %.2f ms/MB (%.0f%% of the time)\n",
+	       cached_mode(), bytes / elapsed / 1e6, calls,
+	       bytes ? cpu * 1e3 / (bytes / 1e6) : 0.0, 100 * cpu / elapsed);
+
+	free(buf);
+
+	return 0;
+}
+
+int main(int argc, char *argv[])
+{
+	const char *device = "/dev/sniffer";
+	unsigned int passes = 4;
+	double seconds = 10;
+	size_t bufsize = 1 << 20;
+	int fd, opt, mode = 0, ret;
+
+	while ((opt = getopt(argc, argv, "d:mrp:t:b:h")) != -1) {
+		switch (opt) {
+		case 'd':
+			device = optarg;
+			break;
+		case 'm':
+		case 'r':
+			mode = opt;
+			break;
+		case 'p':
+			passes = strtoul(optarg, NULL, 0);
+			break;
+		case 't':
+			seconds = strtod(optarg, NULL);
+			break;
+		case 'b':
+			bufsize = strtoull(optarg, NULL, 0) << 10;
+			break;
+		default:
+			usage(argv[0]);
+			return 1;
+		}
+	}
+
+	if (!mode || !passes || !bufsize) {
+		usage(argv[0]);
+		return 1;
+	}
+
+	// mapping the ring refuses read() until the device is opened again
+	fd = open(device, mode == 'm' ? O_RDWR : O_RDONLY);
+	if (fd < 0) {
+		perror(device);
+		return 1;
+	}
+
+	ret = mode == 'm' ? bench_mmap(fd, passes) : bench_read(fd, seconds, bufsize);
+
+	close(fd);
+
+	return ret;
+}
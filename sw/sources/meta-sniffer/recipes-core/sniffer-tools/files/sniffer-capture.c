@@ -0,0 +1,572 @@
+// SPDX-License-Identifier: GPL-2.0-or-later
+/*
+ * Capture daemon of /dev/sniffer
+ *
+ * Reads the records in large batches into a queue in memory and writes them
+ * to PCAP files on a second thread, so a slow disk fills the queue instead
+ * of holding up read() until the capture ring overflows.
+ *
+ * The queue is a ring of write units (-w). Every file starts at a unit with
+ * its PCAP header, so all but the last write of a file are whole units at
+ * aligned offsets, which also allows O_DIRECT (-D). Data waiting longer than
+ * a second is written in advance and rewritten with its unit. Files are
+ * rotated at a record boundary after -s MiB or -t seconds, each one is
+ * preallocated with fallocate() and named <file>.<number> then. On exit, the
+ * high-water mark of the queue tells how much of it the capture needed.
+ * The reader waits in poll() with a timeout, so the time rotation happens
+ * on an idle link as well.
+ *
+ * Any file or pipe of records can be given as device, e.g. - for stdin.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <poll.h>
+#include <pthread.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+
+#include "sniffer_uapi.h"
+
+#define ALIGN 4096
+#define FILE_ENDS 64
+// the largest record a header can announce
+#define RECORD_MAX (SNIFFER_REC_HEADER_LEN + SNIFFER_REC_ORIG_LEN_MASK)
+#define FLUSH_INTERVAL_MS 1000
+#define IDLE_TIMEOUT_MS 1000
+
+typedef struct pcap_hdr_s {
+  uint32_t magic_number;   /* magic number */
+  uint16_t version_major;  /* major version number */
+  uint16_t version_minor;  /* minor version number */
+  int32_t  thiszone;       /* GMT to local correction */
+  uint32_t sigfigs;        /* accuracy of timestamps */
+  uint32_t snaplen;        /* max length of captured packets, in octets */
+  uint32_t network;        /* data link type */
+} pcap_hdr_t;
+
+static const pcap_hdr_t pcap_hdr = {0xa1b23c4d, 2, 4, -3600, 0, 2048, 1};
+
+/*
+ * Positions are counted in bytes since the start of the capture and taken
+ * modulo the size for the ring. [tail, head) holds data not yet written,
+ * the reader owns everything else. file_end holds the ends of the files
+ * handed over to the writer, the next file starts at the unit following
+ * each of them.
+ */
+struct queue {
+	uint8_t *buf;
+	size_t size;
+	size_t unit;
+
+	pthread_mutex_t lock;
+	pthread_cond_t data;
+	pthread_cond_t space;
+
+	uint64_t head;
+	uint64_t tail;
+	uint64_t file_end[FILE_ENDS];
+	unsigned int ends_head, ends_tail;
+	int done;
+
+	uint64_t high_water;
+	unsigned long long full_waits;
+};
+
+struct writer {
+	struct queue *q;
+	const char *path;
+	int rotate;
+	int direct;
+	int stream;
+	off_t prealloc;
+
+	unsigned int files;
+	unsigned long long bytes;
+	int error;
+};
+
+static volatile sig_atomic_t stop;
+
+static void handle_signal(int sig)
+{
+	stop = 1;
+}
+
+static void usage(const char *name)
+{
+	fprintf(stderr, "Usage: %s [-d device] -o file [-s MiB] [-t seconds] [-q MiB] [-w KiB] [-D]\n", name);
+}
+
+static uint64_t align_up(uint64_t pos, size_t unit)
+{
+	return (pos + unit - 1) / unit * unit;
+}
+
+static uint64_t align_down(uint64_t pos, size_t unit)
+{
+	return pos / unit * unit;
+}
+
+static void ring_put(struct queue *q, uint64_t pos, const void *src, size_t len)
+{
+	size_t i = pos % q->size;
+	size_t n = len < q->size - i ? len : q->size - i;
+
+	memcpy(q->buf + i, src, n);
+	memcpy(q->buf, (const uint8_t *) src + n, len - n);
+}
+
+static void ring_get(struct queue *q, uint64_t pos, void *dst, size_t len)
+{
+	size_t i = pos % q->size;
+	size_t n = len < q->size - i ? len : q->size - i;
+
+	memcpy(dst, q->buf + i, n);
+	memcpy((uint8_t *) dst + n, q->buf, len - n);
+}
+
+static double elapsed(const struct timespec *since)
+{
+	struct timespec now;
+
+	clock_gettime(CLOCK_MONOTONIC, &now);
+	return (now.tv_sec - since->tv_sec) + (now.tv_nsec - since->tv_nsec) * 1e-9;
+}
+
+/*
+ * Writer
+ */
+
+static int open_file(struct writer *w)
+{
+	char name[4096];
+	int flags = O_WRONLY | O_CREAT | O_TRUNC;
+	int fd;
+
+	// appended to in order, whatever it is
+	if (!strcmp(w->path, "-")) {
+		w->stream = 1;
+		return 1;
+	}
+
+	if (w->rotate)
+		snprintf(name, sizeof(name), "%s.%04u", w->path, w->files);
+	else
+		snprintf(name, sizeof(name), "%s", w->path);
+
+	fd = open(name, flags | (w->direct ? O_DIRECT : 0), 0644);
+	if (fd < 0 && w->direct && errno == EINVAL) {
+		// not supported by the file system
+		w->direct = 0;
+		fd = open(name, flags, 0644);
+	}
+	if (fd < 0) {
+		perror(name);
+		return -1;
+	}
+
+	// a FIFO can not be rewritten
+	w->stream = lseek(fd, 0, SEEK_CUR) < 0;
+	if (w->stream)
+		return fd;
+
+	// reserve the blocks at once, a failure only costs fragmentation
+	if (w->prealloc && fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, w->prealloc) &&
+	    errno != EOPNOTSUPP && errno != ENOSYS && errno != ENODEV && errno != ESPIPE)
+		perror("fallocate");
+
+	return fd;
+}
+
+static void close_file(struct writer *w, int fd, off_t len)
+{
+	// drop the preallocated blocks and the padding of O_DIRECT
+	if (!w->stream && ftruncate(fd, len))
+		perror("ftruncate");
+
+	if (fd != 1)
+		close(fd);
+
+	w->files++;
+	w->bytes += len;
+}
+
+/* write [start, end) of the queue to offset start - fstart of the file */
+static int write_range(struct writer *w, int fd, uint64_t fstart, uint64_t start, uint64_t end)
+{
+	struct queue *q = w->q;
+	size_t len = end - start;
+	ssize_t n;
+
+	// O_DIRECT takes whole blocks, the excess is truncated at the end
+	if (w->direct && !w->stream)
+		len = align_up(len, ALIGN);
+
+	while (len) {
+		if (w->stream)
+			n = write(fd, q->buf + start % q->size, len);
+		else
+			n = pwrite(fd, q->buf + start % q->size, len, start - fstart);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			perror("write");
+			return -1;
+		}
+
+		start += n;
+		len -= n;
+	}
+
+	return 0;
+}
+
+static void *writer_thread(void *arg)
+{
+	struct writer *w = arg;
+	struct queue *q = w->q;
+	struct timespec last_flush, deadline;
+	uint64_t fstart = 0, pos = 0, limit, start, end;
+	int fd, boundary, done;
+
+	fd = open_file(w);
+	if (fd < 0)
+		goto fail;
+	clock_gettime(CLOCK_MONOTONIC, &last_flush);
+
+	for (;;) {
+		pthread_mutex_lock(&q->lock);
+		for (;;) {
+			boundary = q->ends_tail != q->ends_head;
+			limit = boundary ? q->file_end[q->ends_tail % FILE_ENDS] : q->head;
+			done = q->done;
+
+			if (boundary || done || limit - align_down(pos, q->unit) >= q->unit)
+				break;
+			if (limit > pos && elapsed(&last_flush) * 1000 >= FLUSH_INTERVAL_MS)
+				break;
+
+			clock_gettime(CLOCK_REALTIME, &deadline);
+			deadline.tv_nsec += FLUSH_INTERVAL_MS % 1000 * 1000000;
+			deadline.tv_sec += FLUSH_INTERVAL_MS / 1000 + deadline.tv_nsec / 1000000000;
+			deadline.tv_nsec %= 1000000000;
+			pthread_cond_timedwait(&q->data, &q->lock, &deadline);
+		}
+		pthread_mutex_unlock(&q->lock);
+
+		// whole units, as far as they are contiguous in the ring; a
+		// stream continues where the last write ended instead
+		start = align_down(pos, q->unit);
+		end = align_down(limit, q->unit);
+		if (end > start) {
+			if (end - start > q->size - start % q->size)
+				end = start + q->size - start % q->size;
+			if (write_range(w, fd, fstart, w->stream ? pos : start, end))
+				goto fail;
+			pos = end;
+
+			pthread_mutex_lock(&q->lock);
+			q->tail = end;
+			pthread_cond_signal(&q->space);
+			pthread_mutex_unlock(&q->lock);
+			continue;
+		}
+
+		if (limit > pos) {
+			// the rest of the file or data waiting too long, rewritten
+			// with its unit once that is complete
+			if (write_range(w, fd, fstart, w->stream ? pos : start, limit))
+				goto fail;
+			pos = limit;
+			clock_gettime(CLOCK_MONOTONIC, &last_flush);
+		}
+
+		if (boundary) {
+			close_file(w, fd, limit - fstart);
+			fstart = pos = align_up(limit, q->unit);
+
+			pthread_mutex_lock(&q->lock);
+			q->ends_tail++;
+			q->tail = fstart;
+			pthread_cond_signal(&q->space);
+			pthread_mutex_unlock(&q->lock);
+
+			fd = open_file(w);
+			if (fd < 0)
+				goto fail;
+		} else if (done) {
+			close_file(w, fd, limit - fstart);
+			return NULL;
+		}
+	}
+
+fail:
+	pthread_mutex_lock(&q->lock);
+	w->error = 1;
+	q->done = 1;
+	pthread_cond_signal(&q->space);
+	pthread_mutex_unlock(&q->lock);
+	return NULL;
+}
+
+/*
+ * Reader
+ */
+
+/* wait until len bytes are free, returns the free bytes or 0 if the writer failed */
+static size_t wait_space(struct queue *q, size_t len)
+{
+	size_t space;
+
+	pthread_mutex_lock(&q->lock);
+	if (q->size - (q->head - q->tail) < len)
+		q->full_waits++;
+	while (!q->done && q->size - (q->head - q->tail) < len)
+		pthread_cond_wait(&q->space, &q->lock);
+	space = q->done ? 0 : q->size - (q->head - q->tail);
+	pthread_mutex_unlock(&q->lock);
+
+	return space;
+}
+
+/* read a batch into the queue, as much as fits up to the end of the ring */
+static ssize_t read_batch(struct queue *q, int fd, size_t space)
+{
+	size_t count = q->size - q->head % q->size;
+	ssize_t n;
+
+	n = read(fd, q->buf + q->head % q->size, count < space ? count : space);
+	if (n <= 0)
+		return n;
+
+	pthread_mutex_lock(&q->lock);
+	q->head += n;
+	if (q->head - q->tail > q->high_water)
+		q->high_water = q->head - q->tail;
+	pthread_cond_signal(&q->data);
+	pthread_mutex_unlock(&q->lock);
+
+	return n;
+}
+
+/* advance rec_end to the end of the last complete record */
+static int find_record_end(struct queue *q, uint64_t *rec_end)
+{
+	uint32_t incl_len;
+
+	while (q->head - *rec_end >= SNIFFER_REC_HEADER_LEN) {
+		ring_get(q, *rec_end + 8, &incl_len, sizeof(incl_len));
+		if (incl_len > RECORD_MAX - SNIFFER_REC_HEADER_LEN) {
+			fprintf(stderr, "Bogus record length %u\n", incl_len);
+			return -1;
+		}
+		if (q->head - *rec_end < SNIFFER_REC_HEADER_LEN + incl_len)
+			break;
+		*rec_end += SNIFFER_REC_HEADER_LEN + incl_len;
+	}
+
+	return 0;
+}
+
+/*
+ * Hand the records before rec_end over as a file and start the next one at
+ * the following unit, with the bytes of a partial record moved behind its
+ * header.
+ */
+static int start_file(struct queue *q, uint64_t *rec_end, int first)
+{
+	static uint8_t partial[RECORD_MAX];
+	uint64_t end = *rec_end, next;
+	size_t len = q->head - end;
+
+	if (!wait_space(q, q->unit + sizeof(pcap_hdr)))
+		return -1;
+
+	ring_get(q, end, partial, len);
+
+	pthread_mutex_lock(&q->lock);
+	while (!q->done && q->ends_head - q->ends_tail == FILE_ENDS)
+		pthread_cond_wait(&q->space, &q->lock);
+
+	next = first ? 0 : align_up(end, q->unit);
+	ring_put(q, next, &pcap_hdr, sizeof(pcap_hdr));
+	ring_put(q, next + sizeof(pcap_hdr), partial, len);
+
+	if (!first)
+		q->file_end[q->ends_head++ % FILE_ENDS] = end;
+	q->head = next + sizeof(pcap_hdr) + len;
+	pthread_cond_signal(&q->data);
+	pthread_mutex_unlock(&q->lock);
+
+	*rec_end = next + sizeof(pcap_hdr);
+	return 0;
+}
+
+int main(int argc, char *argv[])
+{
+	static struct queue q = {
+		.lock = PTHREAD_MUTEX_INITIALIZER,
+		.data = PTHREAD_COND_INITIALIZER,
+		.space = PTHREAD_COND_INITIALIZER,
+	};
+	static struct writer w;
+	const char *device = "/dev/sniffer";
+	unsigned long long rotate_size = 0, bytes = 0;
+	unsigned int rotate_time = 0;
+	size_t queue_size = 64 << 20, unit = 1 << 20, space;
+	struct timespec start, opened;
+	struct sigaction sa = {.sa_handler = handle_signal};
+	sigset_t sigs;
+	pthread_t thread;
+	uint64_t rec_end, file_start;
+	struct pollfd pfd = {.events = POLLIN};
+	double seconds;
+	ssize_t n;
+	int fd, opt, ret, err = 0;
+
+	while ((opt = getopt(argc, argv, "d:o:s:t:q:w:Dh")) != -1) {
+		switch (opt) {
+		case 'd':
+			device = optarg;
+			break;
+		case 'o':
+			w.path = optarg;
+			break;
+		case 's':
+			rotate_size = strtoull(optarg, NULL, 0) << 20;
+			break;
+		case 't':
+			rotate_time = strtoul(optarg, NULL, 0);
+			break;
+		case 'q':
+			queue_size = strtoull(optarg, NULL, 0) << 20;
+			break;
+		case 'w':
+			unit = strtoull(optarg, NULL, 0) << 10;
+			break;
+		case 'D':
+			w.direct = 1;
+			break;
+		default:
+			usage(argv[0]);
+			return 1;
+		}
+	}
+
+	if (!w.path || (!strcmp(w.path, "-") && (rotate_size || rotate_time))) {
+		usage(argv[0]);
+		return 1;
+	}
+
+	if (!unit || unit % ALIGN || queue_size % unit || queue_size < 4 * unit) {
+		usage(argv[0]);
+		fprintf(stderr, "The write unit has to be a multiple of 4 KiB, the queue at least four of them\n");
+		return 1;
+	}
+
+	w.q = &q;
+	w.rotate = rotate_size || rotate_time;
+	w.prealloc = rotate_size ? rotate_size + unit : 0;
+	q.size = queue_size;
+	q.unit = unit;
+
+	if (posix_memalign((void **) &q.buf, ALIGN, queue_size)) {
+		fprintf(stderr, "Unable to allocate a queue of %zu bytes\n", queue_size);
+		return 1;
+	}
+	// fault the queue in now rather than while capturing
+	memset(q.buf, 0, queue_size);
+
+	fd = strcmp(device, "-") ? open(device, O_RDONLY) : 0;
+	if (fd < 0) {
+		perror(device);
+		return 1;
+	}
+	pfd.fd = fd;
+
+	// stop with EINTR from read() instead of restarting it
+	sigaction(SIGINT, &sa, NULL);
+	sigaction(SIGTERM, &sa, NULL);
+
+	// the signals go to the reader
+	sigemptyset(&sigs);
+	sigaddset(&sigs, SIGINT);
+	sigaddset(&sigs, SIGTERM);
+	pthread_sigmask(SIG_BLOCK, &sigs, NULL);
+
+	rec_end = 0;
+	start_file(&q, &rec_end, 1);
+	file_start = 0;
+
+	if (pthread_create(&thread, NULL, writer_thread, &w)) {
+		fprintf(stderr, "Unable to start the writer\n");
+		return 1;
+	}
+	pthread_sigmask(SIG_UNBLOCK, &sigs, NULL);
+
+	clock_gettime(CLOCK_MONOTONIC, &start);
+	opened = start;
+
+	while (!stop) {
+		space = wait_space(&q, ALIGN);
+		if (!space)
+			break;
+
+		// wake up for the time rotation on an idle link as well
+		ret = poll(&pfd, 1, IDLE_TIMEOUT_MS);
+		n = ret > 0 ? read_batch(&q, fd, space) : ret;
+
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			perror(ret > 0 ? "read" : "poll");
+			err = 1;
+			break;
+		}
+		if (ret > 0 && !n)
+			break;
+
+		bytes += n;
+		if (find_record_end(&q, &rec_end)) {
+			err = 1;
+			break;
+		}
+
+		if ((rotate_size && rec_end - file_start >= rotate_size) ||
+		    (rotate_time && elapsed(&opened) >= rotate_time)) {
+			if (start_file(&q, &rec_end, 0))
+				break;
+			file_start = rec_end - sizeof(pcap_hdr);
+			clock_gettime(CLOCK_MONOTONIC, &opened);
+		}
+	}
+
+	seconds = elapsed(&start);
+
+	pthread_mutex_lock(&q.lock);
+	q.done = 1;
+	pthread_cond_signal(&q.data);
+	pthread_mutex_unlock(&q.lock);
+	pthread_join(thread, NULL);
+
+	fprintf(stderr, "%llu bytes read in %.1f s (%.1f MB/s), %llu bytes written to %u files\n",
+		bytes, seconds, bytes / seconds / 1e6, w.bytes, w.files);
+	fprintf(stderr, "queue high water %llu of %zu bytes (%.0f%%), %llu waits for space\n",
+		(unsigned long long) q.high_water, q.size, 100.0 * q.high_water / q.size, q.full_waits);
+
+	if (fd)
+		close(fd);
+	free(q.buf);
+
+	return err || w.error;
+}
@@ -0,0 +1,720 @@
+// SPDX-License-Identifier: GPL-2.0-or-later
+/*
+ * Compressing capture writer of /dev/sniffer
+ *
+ * Cyclic traffic, e.g. EtherCAT, repeats the same frames every cycle with
+ * only the process data and a few counters changed. The reader collects the
+ * records into blocks (-b KiB) of a queue (-n blocks), which are compressed
+ * by -j workers, by default one per core of the Zynq, and written in order:
+ *
+ * - delta: every record is XORed with the previous record of the same port
+ *   and length in the block, the timestamp is replaced by the difference to
+ *   that record. Unchanged bytes become zeros, the timestamps of a cycle
+ *   nearly constant. -R turns this off, for comparison.
+ * - LZ4: the block is compressed with LZ4 (acceleration -a), or stored if
+ *   it does not get smaller.
+ *
+ * Each block is compressed on its own, so the workers do not depend on each
+ * other. -x expands a compressed capture back to the PCAP file of `header`
+ * and /dev/sniffer, byte for byte.
+ *
+ * File format (little endian):
+ *
+ *   file header: "aRTZ", u16 version (1), u8 codec (1: LZ4),
+ *                u8 flags (1: delta), PCAP file header (24 bytes)
+ *   block:       u32 length of the records, u32 length of the data,
+ *                data (stored if both lengths are equal)
+ *
+ * Any file or pipe of records can be given as device, e.g. - for stdin. On
+ * exit, the compression ratio and the throughput are reported, along with
+ * the throughput per core of the workers.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <poll.h>
+#include <pthread.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+
+#include <lz4.h>
+
+#include "sniffer_uapi.h"
+
+// the largest record a header can announce
+#define RECORD_MAX (SNIFFER_REC_HEADER_LEN + SNIFFER_REC_ORIG_LEN_MASK)
+#define IDLE_TIMEOUT_MS 1000
+#define MAX_WORKERS 16
+// slots of the delta classes, direct mapped by port and length
+#define CLASS_BITS 8
+#define CLASSES (1 << CLASS_BITS)
+
+#define ARTZ_MAGIC "aRTZ"
+#define ARTZ_VERSION 1
+#define ARTZ_CODEC_LZ4 1
+#define ARTZ_FLAG_DELTA 0x1
+
+typedef struct pcap_hdr_s {
+  uint32_t magic_number;   /* magic number */
+  uint16_t version_major;  /* major version number */
+  uint16_t version_minor;  /* minor version number */
+  int32_t  thiszone;       /* GMT to local correction */
+  uint32_t sigfigs;        /* accuracy of timestamps */
+  uint32_t snaplen;        /* max length of captured packets, in octets */
+  uint32_t network;        /* data link type */
+} pcap_hdr_t;
+
+static const pcap_hdr_t pcap_hdr = {0xa1b23c4d, 2, 4, -3600, 0, 2048, 1};
+
+struct artz_hdr {
+	char magic[4];
+	uint16_t version;
+	uint8_t codec;
+	uint8_t flags;
+	pcap_hdr_t pcap;
+};
+
+struct block_hdr {
+	uint32_t raw_len;
+	uint32_t stored_len;
+};
+
+struct delta_ctx {
+	uint32_t key[CLASSES];
+	size_t prev[CLASSES];
+};
+
+struct slot {
+	uint8_t *raw;
+	uint8_t *delta;
+	uint8_t *out;
+	size_t len;
+};
+
+/*
+ * Blocks are numbered in the order they are read. [tail, head) are filled,
+ * of which [tail, next_work) are taken by the workers. A worker writes its
+ * block once all before it are written, i.e. it is the tail.
+ */
+struct queue {
+	struct slot *slots;
+	unsigned int count;
+	size_t block_size;
+	int delta;
+	int accel;
+	int out;
+
+	pthread_mutex_t lock;
+	pthread_cond_t filled;
+	pthread_cond_t written;
+
+	unsigned long long head;
+	unsigned long long next_work;
+	unsigned long long tail;
+	int done;
+	int error;
+
+	unsigned long long out_bytes;
+	unsigned long long full_waits;
+	double cpu_seconds;
+};
+
+static volatile sig_atomic_t stop;
+
+static void handle_signal(int sig)
+{
+	stop = 1;
+}
+
+static void usage(const char *name)
+{
+	fprintf(stderr, "Usage: %s [-d device] [-o file] [-b KiB] [-n blocks] [-j workers] [-a accel] [-R]\n"
+		"       %s -x [-d file] [-o file]\n", name, name);
+}
+
+static double elapsed(const struct timespec *since, clockid_t clock)
+{
+	struct timespec now;
+
+	clock_gettime(clock, &now);
+	return (now.tv_sec - since->tv_sec) + (now.tv_nsec - since->tv_nsec) * 1e-9;
+}
+
+static int write_all(int fd, const void *buf, size_t len)
+{
+	ssize_t n;
+
+	while (len) {
+		n = write(fd, buf, len);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			perror("write");
+			return -1;
+		}
+		buf = (const uint8_t *) buf + n;
+		len -= n;
+	}
+
+	return 0;
+}
+
+/* read up to len bytes, less only at the end of the file */
+static ssize_t read_all(int fd, void *buf, size_t len)
+{
+	size_t done = 0;
+	ssize_t n;
+
+	while (done < len) {
+		n = read(fd, (uint8_t *) buf + done, len - done);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			perror("read");
+			return -1;
+		}
+		if (!n)
+			break;
+		done += n;
+	}
+
+	return done;
+}
+
+/*
+ * Delta
+ */
+
+/* the class of a record by the port and length, which are never changed by the delta */
+static unsigned int record_class(const uint8_t *rec, uint32_t *key, uint32_t *incl_len)
+{
+	uint32_t orig_len;
+
+	memcpy(incl_len, rec + 8, sizeof(*incl_len));
+	memcpy(&orig_len, rec + 12, sizeof(orig_len));
+
+	*key = (orig_len >> SNIFFER_REC_PORT_SHIFT & SNIFFER_REC_PORT_MASK) << 16 | *incl_len;
+	return (*key * 2654435761u) >> (32 - CLASS_BITS);
+}
+
+static void delta_record(uint8_t *dst, const uint8_t *src, const uint8_t *prev, size_t len, int sign)
+{
+	uint32_t ts[2], prev_ts[2];
+	size_t i;
+
+	memcpy(ts, src, sizeof(ts));
+	memcpy(prev_ts, prev, sizeof(prev_ts));
+	ts[0] += sign * prev_ts[0];
+	ts[1] += sign * prev_ts[1];
+	memcpy(dst, ts, sizeof(ts));
+	memcpy(dst + 8, src + 8, SNIFFER_REC_HEADER_LEN - 8);
+
+	for (i = SNIFFER_REC_HEADER_LEN; i < len; i++)
+		dst[i] = src[i] ^ prev[i];
+}
+
+/* len bytes of complete records from src to their delta form in dst */
+static void delta_encode(uint8_t *dst, const uint8_t *src, size_t len)
+{
+	struct delta_ctx ctx;
+	uint32_t key, incl_len;
+	size_t off, rec_len;
+	unsigned int c;
+
+	memset(ctx.key, 0xff, sizeof(ctx.key));
+
+	for (off = 0; off < len; off += rec_len) {
+		c = record_class(src + off, &key, &incl_len);
+		rec_len = SNIFFER_REC_HEADER_LEN + incl_len;
+
+		if (ctx.key[c] == key)
+			delta_record(dst + off, src + off, src + ctx.prev[c], rec_len, -1);
+		else
+			memcpy(dst + off, src + off, rec_len);
+
+		ctx.key[c] = key;
+		ctx.prev[c] = off;
+	}
+}
+
+/* back from the delta form, fails if the records do not add up to len */
+static int delta_decode(uint8_t *dst, const uint8_t *src, size_t len)
+{
+	struct delta_ctx ctx;
+	uint32_t key, incl_len;
+	size_t off, rec_len;
+	unsigned int c;
+
+	memset(ctx.key, 0xff, sizeof(ctx.key));
+
+	for (off = 0; off < len; off += rec_len) {
+		if (len - off < SNIFFER_REC_HEADER_LEN)
+			return -1;
+		c = record_class(src + off, &key, &incl_len);
+		rec_len = SNIFFER_REC_HEADER_LEN + incl_len;
+		if (incl_len > SNIFFER_REC_ORIG_LEN_MASK || len - off < rec_len)
+			return -1;
+
+		if (ctx.key[c] == key)
+			delta_record(dst + off, src + off, dst + ctx.prev[c], rec_len, 1);
+		else
+			memcpy(dst + off, src + off, rec_len);
+
+		ctx.key[c] = key;
+		ctx.prev[c] = off;
+	}
+
+	return 0;
+}
+
+/*
+ * Workers
+ */
+
+static void *worker_thread(void *arg)
+{
+	struct queue *q = arg;
+	struct block_hdr bh;
+	struct timespec cpu_start;
+	unsigned long long seq;
+	struct slot *s;
+	const uint8_t *data;
+	int n;
+
+	for (;;) {
+		pthread_mutex_lock(&q->lock);
+		while (!q->error && !q->done && q->next_work == q->head)
+			pthread_cond_wait(&q->filled, &q->lock);
+		if (q->error || q->next_work == q->head) {
+			pthread_mutex_unlock(&q->lock);
+			return NULL;
+		}
+		seq = q->next_work++;
+		pthread_mutex_unlock(&q->lock);
+
+		s = &q->slots[seq % q->count];
+		clock_gettime(CLOCK_THREAD_CPUTIME_ID, &cpu_start);
+
+		if (q->delta)
+			delta_encode(s->delta, s->raw, s->len);
+		data = q->delta ? s->delta : s->raw;
+
+		n = LZ4_compress_fast((const char *) data, (char *) s->out, s->len,
+				      LZ4_compressBound(q->block_size), q->accel);
+		bh.raw_len = s->len;
+		bh.stored_len = n > 0 && (size_t) n < s->len ? (size_t) n : s->len;
+		if (bh.stored_len < s->len)
+			data = s->out;
+
+		pthread_mutex_lock(&q->lock);
+		q->cpu_seconds += elapsed(&cpu_start, CLOCK_THREAD_CPUTIME_ID);
+		while (!q->error && q->tail != seq)
+			pthread_cond_wait(&q->written, &q->lock);
+		if (q->error) {
+			pthread_mutex_unlock(&q->lock);
+			return NULL;
+		}
+		pthread_mutex_unlock(&q->lock);
+
+		// the turn of no other worker before the tail moves on
+		if (write_all(q->out, &bh, sizeof(bh)) || write_all(q->out, data, bh.stored_len)) {
+			pthread_mutex_lock(&q->lock);
+			q->error = 1;
+			pthread_cond_broadcast(&q->written);
+			pthread_cond_broadcast(&q->filled);
+			pthread_mutex_unlock(&q->lock);
+			return NULL;
+		}
+
+		pthread_mutex_lock(&q->lock);
+		q->out_bytes += sizeof(bh) + bh.stored_len;
+		q->tail++;
+		pthread_cond_broadcast(&q->written);
+		pthread_mutex_unlock(&q->lock);
+	}
+}
+
+/*
+ * Reader
+ */
+
+/* wait for a free block, returns NULL if the workers failed */
+static struct slot *wait_slot(struct queue *q)
+{
+	struct slot *s;
+
+	pthread_mutex_lock(&q->lock);
+	if (q->head - q->tail == q->count)
+		q->full_waits++;
+	while (!q->error && q->head - q->tail == q->count)
+		pthread_cond_wait(&q->written, &q->lock);
+	s = q->error ? NULL : &q->slots[q->head % q->count];
+	pthread_mutex_unlock(&q->lock);
+
+	return s;
+}
+
+static void hand_over(struct queue *q)
+{
+	pthread_mutex_lock(&q->lock);
+	q->head++;
+	pthread_cond_signal(&q->filled);
+	pthread_mutex_unlock(&q->lock);
+}
+
+/* advance rec_end over the complete records in [rec_end, len) */
+static int find_record_end(const uint8_t *buf, size_t len, size_t *rec_end)
+{
+	uint32_t incl_len;
+
+	while (len - *rec_end >= SNIFFER_REC_HEADER_LEN) {
+		memcpy(&incl_len, buf + *rec_end + 8, sizeof(incl_len));
+		if (incl_len > RECORD_MAX - SNIFFER_REC_HEADER_LEN) {
+			fprintf(stderr, "Bogus record length %u\n", incl_len);
+			return -1;
+		}
+		if (len - *rec_end < SNIFFER_REC_HEADER_LEN + incl_len)
+			break;
+		*rec_end += SNIFFER_REC_HEADER_LEN + incl_len;
+	}
+
+	return 0;
+}
+
+static int compress_capture(const char *device, int out, struct queue *q, unsigned int workers)
+{
+	static uint8_t partial[RECORD_MAX];
+	struct artz_hdr hdr = {ARTZ_MAGIC, ARTZ_VERSION, ARTZ_CODEC_LZ4, 0, pcap_hdr};
+	unsigned long long bytes = 0;
+	struct pollfd pfd = {.events = POLLIN};
+	pthread_t threads[MAX_WORKERS];
+	struct timespec start;
+	size_t len, rec_end, partial_len = 0;
+	double seconds;
+	sigset_t sigs;
+	struct slot *s;
+	unsigned int i;
+	int fd, ret, eof = 0, err = 0;
+	ssize_t n;
+
+	hdr.flags = q->delta ? ARTZ_FLAG_DELTA : 0;
+	q->out = out;
+
+	for (i = 0; i < q->count; i++) {
+		q->slots[i].raw = malloc(q->block_size);
+		q->slots[i].delta = malloc(q->block_size);
+		q->slots[i].out = malloc(LZ4_compressBound(q->block_size));
+		if (!q->slots[i].raw || !q->slots[i].delta || !q->slots[i].out) {
+			fprintf(stderr, "Unable to allocate %u blocks of %zu bytes\n", q->count, q->block_size);
+			return 1;
+		}
+	}
+
+	fd = strcmp(device, "-") ? open(device, O_RDONLY) : 0;
+	if (fd < 0) {
+		perror(device);
+		return 1;
+	}
+	pfd.fd = fd;
+
+	if (write_all(out, &hdr, sizeof(hdr)))
+		return 1;
+
+	// the signals go to the reader
+	sigemptyset(&sigs);
+	sigaddset(&sigs, SIGINT);
+	sigaddset(&sigs, SIGTERM);
+	pthread_sigmask(SIG_BLOCK, &sigs, NULL);
+	for (i = 0; i < workers; i++) {
+		if (pthread_create(&threads[i], NULL, worker_thread, q)) {
+			fprintf(stderr, "Unable to start the workers\n");
+			return 1;
+		}
+	}
+	pthread_sigmask(SIG_UNBLOCK, &sigs, NULL);
+
+	clock_gettime(CLOCK_MONOTONIC, &start);
+
+	while (!stop && !eof && !err) {
+		s = wait_slot(q);
+		if (!s)
+			break;
+
+		memcpy(s->raw, partial, partial_len);
+		len = partial_len;
+		rec_end = 0;
+		if (find_record_end(s->raw, len, &rec_end))
+			break;
+
+		// a block ends where the next record might not fit anymore
+		while (!stop && q->block_size - len >= RECORD_MAX) {
+			// hand over what there is on an idle link
+			ret = poll(&pfd, 1, IDLE_TIMEOUT_MS);
+			if (!ret && rec_end)
+				break;
+			n = ret > 0 ? read(fd, s->raw + len, q->block_size - len) : ret;
+
+			if (n < 0) {
+				if (errno == EINTR)
+					continue;
+				perror(ret > 0 ? "read" : "poll");
+				err = 1;
+				break;
+			}
+			if (ret > 0 && !n) {
+				eof = 1;
+				break;
+			}
+
+			len += n;
+			bytes += n;
+			if (find_record_end(s->raw, len, &rec_end)) {
+				err = 1;
+				break;
+			}
+		}
+
+		partial_len = len - rec_end;
+		memcpy(partial, s->raw + rec_end, partial_len);
+
+		s->len = rec_end;
+		if (rec_end)
+			hand_over(q);
+	}
+
+	pthread_mutex_lock(&q->lock);
+	q->done = 1;
+	pthread_cond_broadcast(&q->filled);
+	pthread_mutex_unlock(&q->lock);
+	for (i = 0; i < workers; i++)
+		pthread_join(threads[i], NULL);
+
+	seconds = elapsed(&start, CLOCK_MONOTONIC);
+	bytes -= partial_len;
+
+	fprintf(stderr, "%llu bytes read in %.2f s (%.1f MB/s), %llu blocks written, %llu bytes (ratio %.2f)\n",
+		bytes, seconds, bytes / seconds / 1e6, q->tail, q->out_bytes + sizeof(hdr),
+		(double) (bytes + sizeof(pcap_hdr)) / (q->out_bytes + sizeof(hdr)));
+	fprintf(stderr, "%u workers busy for %.2f s of CPU time (%.1f MB/s per core), %llu waits for a block\n",
+		workers, q->cpu_seconds, q->cpu_seconds ? bytes / q->cpu_seconds / 1e6 : 0.0, q->full_waits);
+	if (partial_len)
+		fprintf(stderr, "%zu bytes of a partial record at the end dropped\n", partial_len);
+
+	if (fd)
+		close(fd);
+	for (i = 0; i < q->count; i++) {
+		free(q->slots[i].raw);
+		free(q->slots[i].delta);
+		free(q->slots[i].out);
+	}
+
+	return err || q->error;
+}
+
+/*
+ * Expansion
+ */
+
+static int expand_capture(const char *path, int out)
+{
+	uint8_t *stored = NULL, *delta = NULL, *raw = NULL;
+	unsigned long long in_bytes, bytes, blocks = 0;
+	size_t size = 0;
+	struct artz_hdr hdr;
+	struct block_hdr bh;
+	struct timespec start;
+	double seconds;
+	int fd, err = 1;
+	ssize_t n;
+
+	fd = strcmp(path, "-") ? open(path, O_RDONLY) : 0;
+	if (fd < 0) {
+		perror(path);
+		return 1;
+	}
+
+	clock_gettime(CLOCK_MONOTONIC, &start);
+
+	n = read_all(fd, &hdr, sizeof(hdr));
+	if (n < 0)
+		goto out;
+	if (n != sizeof(hdr) || memcmp(hdr.magic, ARTZ_MAGIC, sizeof(hdr.magic)) ||
+	    hdr.version != ARTZ_VERSION || hdr.codec != ARTZ_CODEC_LZ4) {
+		fprintf(stderr, "%s: not a compressed capture of version %u\n", path, ARTZ_VERSION);
+		goto out;
+	}
+	if (write_all(out, &hdr.pcap, sizeof(hdr.pcap)))
+		goto out;
+	in_bytes = sizeof(hdr);
+	bytes = sizeof(hdr.pcap);
+
+	for (;;) {
+		n = read_all(fd, &bh, sizeof(bh));
+		if (n < 0)
+			goto out;
+		if (!n)
+			break;
+		if (n != sizeof(bh) || bh.raw_len > LZ4_MAX_INPUT_SIZE ||
+		    bh.stored_len > (uint32_t) LZ4_compressBound(bh.raw_len)) {
+			fprintf(stderr, "Bogus block header after %llu blocks\n", blocks);
+			goto out;
+		}
+
+		if (size < LZ4_compressBound(bh.raw_len)) {
+			size = LZ4_compressBound(bh.raw_len);
+			free(stored);
+			free(delta);
+			free(raw);
+			stored = malloc(size);
+			delta = malloc(size);
+			raw = malloc(size);
+			if (!stored || !delta || !raw) {
+				fprintf(stderr, "Unable to allocate a block of %zu bytes\n", size);
+				goto out;
+			}
+		}
+
+		n = read_all(fd, stored, bh.stored_len);
+		if (n < 0)
+			goto out;
+		if (n != bh.stored_len) {
+			fprintf(stderr, "Truncated block after %llu blocks\n", blocks);
+			goto out;
+		}
+
+		if (bh.stored_len == bh.raw_len)
+			memcpy(delta, stored, bh.raw_len);
+		else if (LZ4_decompress_safe((const char *) stored, (char *) delta, bh.stored_len,
+					     bh.raw_len) != bh.raw_len) {
+			fprintf(stderr, "Corrupt block after %llu blocks\n", blocks);
+			goto out;
+		}
+
+		if (!(hdr.flags & ARTZ_FLAG_DELTA))
+			memcpy(raw, delta, bh.raw_len);
+		else if (delta_decode(raw, delta, bh.raw_len)) {
+			fprintf(stderr, "Corrupt records in block %llu\n", blocks);
+			goto out;
+		}
+
+		if (write_all(out, raw, bh.raw_len))
+			goto out;
+
+		in_bytes += sizeof(bh) + bh.stored_len;
+		bytes += bh.raw_len;
+		blocks++;
+	}
+
+	seconds = elapsed(&start, CLOCK_MONOTONIC);
+	fprintf(stderr, "%llu bytes in %llu blocks expanded to %llu bytes in %.2f s (%.1f MB/s)\n",
+		in_bytes, blocks, bytes, seconds, bytes / seconds / 1e6);
+	err = 0;
+
+out:
+	if (fd)
+		close(fd);
+	free(stored);
+	free(delta);
+	free(raw);
+
+	return err;
+}
+
+int main(int argc, char *argv[])
+{
+	static struct queue q = {
+		.lock = PTHREAD_MUTEX_INITIALIZER,
+		.filled = PTHREAD_COND_INITIALIZER,
+		.written = PTHREAD_COND_INITIALIZER,
+		.count = 16,
+		.block_size = 256 << 10,
+		.delta = 1,
+		.accel = 1,
+	};
+	struct sigaction sa = {.sa_handler = handle_signal};
+	const char *device = NULL, *path = NULL;
+	unsigned int workers = 2;
+	int out = 1, opt, expand = 0, ret;
+
+	while ((opt = getopt(argc, argv, "d:o:b:n:j:a:Rxh")) != -1) {
+		switch (opt) {
+		case 'd':
+			device = optarg;
+			break;
+		case 'o':
+			path = optarg;
+			break;
+		case 'b':
+			q.block_size = strtoull(optarg, NULL, 0) << 10;
+			break;
+		case 'n':
+			q.count = strtoul(optarg, NULL, 0);
+			break;
+		case 'j':
+			workers = strtoul(optarg, NULL, 0);
+			break;
+		case 'a':
+			q.accel = strtol(optarg, NULL, 0);
+			break;
+		case 'R':
+			q.delta = 0;
+			break;
+		case 'x':
+			expand = 1;
+			break;
+		default:
+			usage(argv[0]);
+			return 1;
+		}
+	}
+
+	if (!workers || workers > MAX_WORKERS || q.count < workers || q.accel < 1) {
+		usage(argv[0]);
+		return 1;
+	}
+
+	// a block has to take the largest record twice, LZ4 at most 2 GB
+	if (q.block_size < 2 * RECORD_MAX || q.block_size > LZ4_MAX_INPUT_SIZE) {
+		usage(argv[0]);
+		fprintf(stderr, "The blocks have to be larger than 128 KiB and below 2 GB\n");
+		return 1;
+	}
+
+	if (path && strcmp(path, "-")) {
+		out = open(path, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+		if (out < 0) {
+			perror(path);
+			return 1;
+		}
+	}
+
+	if (expand)
+		return expand_capture(device ? device : "-", out);
+
+	q.slots = calloc(q.count, sizeof(*q.slots));
+	if (!q.slots) {
+		fprintf(stderr, "Unable to allocate %u blocks\n", q.count);
+		return 1;
+	}
+
+	// stop with EINTR from poll() instead of restarting it
+	sigaction(SIGINT, &sa, NULL);
+	sigaction(SIGTERM, &sa, NULL);
+
+	ret = compress_capture(device ? device : "/dev/sniffer", out, &q, workers);
+
+	if (out != 1)
+		close(out);
+	free(q.slots);
+
+	return ret;
+}
@@ -0,0 +1,309 @@
+// SPDX-License-Identifier: GPL-2.0-or-later
+/*
+ * Reference consumer of the memory mapped capture ring of /dev/sniffer
+ *
+ * Writes a PCAP file to stdout (or the file given with -o), taking the
+ * frames directly from the mapped DMA buffers. Only the record headers are
+ * copied, to clear port and sequence number in the upper half of orig_len.
+ * With -n, a pcapng file with an interface per port is written instead.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#include <errno.h>
+#include <fcntl.h>
+#include <poll.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/uio.h>
+
+#include "sniffer_uapi.h"
+#include "sniffer_pcapng.h"
+
+#define BATCH_SIZE 64
+#define BATCH_IOV 1024
+
+typedef struct pcap_hdr_s {
+  uint32_t magic_number;   /* magic number */
+  uint16_t version_major;  /* major version number */
+  uint16_t version_minor;  /* minor version number */
+  int32_t  thiszone;       /* GMT to local correction */
+  uint32_t sigfigs;        /* accuracy of timestamps */
+  uint32_t snaplen;        /* max length of captured packets, in octets */
+  uint32_t network;        /* data link type */
+} pcap_hdr_t;
+
+struct batch {
+	struct iovec iov[BATCH_IOV];
+	uint32_t hdr[BATCH_IOV / 2][4];
+	struct pcapng_epb epb[BATCH_IOV / 3];
+	int n;
+};
+
+static volatile sig_atomic_t stop;
+
+static void handle_signal(int sig)
+{
+	stop = 1;
+}
+
+static void usage(const char *name)
+{
+	fprintf(stderr, "Usage: %s [-d device] [-o file] [-c count] [-n]\n", name);
+}
+
+static int write_all(int fd, struct iovec *iov, int iovcnt)
+{
+	ssize_t n;
+
+	while (iovcnt > 0) {
+		n = writev(fd, iov, iovcnt);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			return -1;
+		}
+
+		while (iovcnt > 0 && (size_t) n >= iov->iov_len) {
+			n -= iov->iov_len;
+			iov++;
+			iovcnt--;
+		}
+
+		if (iovcnt > 0) {
+			iov->iov_base = (uint8_t *) iov->iov_base + n;
+			iov->iov_len -= n;
+		}
+	}
+
+	return 0;
+}
+
+static int batch_flush(int fd, struct batch *b)
+{
+	int ret = write_all(fd, b->iov, b->n);
+
+	b->n = 0;
+	return ret;
+}
+
+/*
+ * Queue the records of a buffer: a copy of the header with orig_len masked,
+ * followed by the frame in the mapped buffer
+ */
+static int batch_add_records(int fd, struct batch *b, uint8_t *buf, uint32_t len)
+{
+	uint32_t i = 0, incl_len;
+	uint32_t *hdr;
+
+	while (i + SNIFFER_REC_HEADER_LEN <= len) {
+		if (b->n + 2 > BATCH_IOV && batch_flush(fd, b))
+			return -1;
+
+		hdr = b->hdr[b->n / 2];
+		memcpy(hdr, buf + i, SNIFFER_REC_HEADER_LEN);
+		hdr[3] &= SNIFFER_REC_ORIG_LEN_MASK;
+
+		incl_len = hdr[2];
+		if (incl_len > len - i - SNIFFER_REC_HEADER_LEN) // never leave the buffer at a bogus header
+			incl_len = len - i - SNIFFER_REC_HEADER_LEN;
+
+		b->iov[b->n].iov_base = hdr;
+		b->iov[b->n].iov_len = SNIFFER_REC_HEADER_LEN;
+		b->iov[b->n + 1].iov_base = buf + i + SNIFFER_REC_HEADER_LEN;
+		b->iov[b->n + 1].iov_len = incl_len;
+		b->n += 2;
+
+		i += SNIFFER_REC_HEADER_LEN + incl_len;
+	}
+
+	return 0;
+}
+
+/*
+ * Queue the records of a buffer as Enhanced Packet Blocks: block header,
+ * frame in the mapped buffer, padding and options
+ */
+static int batch_add_blocks(int fd, struct batch *b, uint8_t *buf, uint32_t len)
+{
+	uint32_t i = 0, incl_len;
+	struct pcapng_epb *epb;
+
+	while (i + SNIFFER_REC_HEADER_LEN <= len) {
+		if (b->n + 3 > BATCH_IOV && batch_flush(fd, b))
+			return -1;
+
+		memcpy(&incl_len, buf + i + 8, sizeof(incl_len));
+		if (incl_len > len - i - SNIFFER_REC_HEADER_LEN) // never leave the buffer at a bogus header
+			incl_len = len - i - SNIFFER_REC_HEADER_LEN;
+
+		epb = &b->epb[b->n / 3];
+		pcapng_epb(epb, buf + i, incl_len);
+
+		b->iov[b->n].iov_base = epb->head;
+		b->iov[b->n].iov_len = sizeof(epb->head);
+		b->iov[b->n + 1].iov_base = buf + i + SNIFFER_REC_HEADER_LEN;
+		b->iov[b->n + 1].iov_len = incl_len;
+		b->iov[b->n + 2].iov_base = epb->tail;
+		b->iov[b->n + 2].iov_len = epb->tail_len;
+		b->n += 3;
+
+		i += SNIFFER_REC_HEADER_LEN + incl_len;
+	}
+
+	return 0;
+}
+
+static uint32_t buffer_length(struct sniffer_mmap_ctrl *ctrl, uint8_t *buf, uint32_t index)
+{
+	uint32_t incl_len;
+
+	if (ctrl->flags & SNIFFER_MMAP_FLAG_PACKED)
+		return ctrl->buf_len[index];
+
+	memcpy(&incl_len, buf + 8, sizeof(incl_len));
+	return incl_len + SNIFFER_REC_HEADER_LEN;
+}
+
+int main(int argc, char *argv[])
+{
+	pcap_hdr_t hdr = {0xa1b23c4d, 2, 4, -3600, 0, 2048, 1};
+	const char *device = "/dev/sniffer";
+	struct sniffer_mmap_ctrl *ctrl;
+	static struct batch batch;
+	uint8_t pcapng_hdr[PCAPNG_HEADER_MAX];
+	int (*add)(int, struct batch *, uint8_t *, uint32_t) = batch_add_records;
+	struct pollfd pfd = {.events = POLLIN};
+	unsigned long long buffers = 0, bytes = 0, limit = 0;
+	uint8_t *data;
+	size_t data_size;
+	uint32_t head, tail, mask;
+	int fd, out = 1;
+	int opt, n, err;
+
+	while ((opt = getopt(argc, argv, "d:o:c:nh")) != -1) {
+		switch (opt) {
+		case 'd':
+			device = optarg;
+			break;
+		case 'o':
+			out = open(optarg, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+			if (out < 0) {
+				perror(optarg);
+				return 1;
+			}
+			break;
+		case 'c':
+			limit = strtoull(optarg, NULL, 0);
+			break;
+		case 'n':
+			add = batch_add_blocks;
+			break;
+		default:
+			usage(argv[0]);
+			return 1;
+		}
+	}
+
+	fd = open(device, O_RDWR);
+	if (fd < 0) {
+		perror(device);
+		return 1;
+	}
+
+	ctrl = mmap(NULL, sysconf(_SC_PAGESIZE), PROT_READ, MAP_SHARED, fd, 0);
+	if (ctrl == MAP_FAILED) {
+		perror("mmap control area");
+		return 1;
+	}
+
+	if (ctrl->version != SNIFFER_MMAP_VERSION) {
+		fprintf(stderr, "Unsupported ring version %u\n", ctrl->version);
+		return 1;
+	}
+
+	// map the whole control area writable, the first page only told its size
+	n = ctrl->data_offset;
+	munmap(ctrl, sysconf(_SC_PAGESIZE));
+	ctrl = mmap(NULL, n, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+	if (ctrl == MAP_FAILED) {
+		perror("mmap control area");
+		return 1;
+	}
+
+	data_size = (size_t) ctrl->buf_count << ctrl->buf_size_ld;
+	data = mmap(NULL, data_size, PROT_READ, MAP_SHARED, fd, ctrl->data_offset);
+	if (data == MAP_FAILED) {
+		perror("mmap DMA buffers");
+		return 1;
+	}
+
+	signal(SIGINT, handle_signal);
+	signal(SIGTERM, handle_signal);
+
+	if (add == batch_add_blocks) {
+		n = pcapng_header(pcapng_hdr);
+		if (write(out, pcapng_hdr, n) != n) {
+			perror("write");
+			return 1;
+		}
+	} else if (write(out, &hdr, sizeof(hdr)) != sizeof(hdr)) {
+		perror("write");
+		return 1;
+	}
+
+	mask = ctrl->buf_count - 1;
+	pfd.fd = fd;
+	tail = __atomic_load_n(&ctrl->tail, __ATOMIC_RELAXED);
+
+	while (!stop && (!limit || buffers < limit)) {
+		head = __atomic_load_n(&ctrl->head, __ATOMIC_ACQUIRE);
+
+		if (head == tail) {
+			// sleep until the driver publishes a buffer
+			if (poll(&pfd, 1, -1) < 0 && errno != EINTR) {
+				perror("poll");
+				break;
+			}
+			continue;
+		}
+
+		// hand the frames over to the kernel without copying them
+		n = 0;
+		err = 0;
+		while (tail != head && n < BATCH_SIZE && (!limit || buffers < limit)) {
+			uint8_t *buf = data + ((size_t) tail << ctrl->buf_size_ld);
+			uint32_t len = buffer_length(ctrl, buf, tail);
+
+			err = add(out, &batch, buf, len);
+			if (err)
+				break;
+			bytes += len;
+
+			tail = (tail + 1) & mask;
+			buffers++;
+			n++;
+		}
+
+		if (err || batch_flush(out, &batch)) {
+			perror("write");
+			break;
+		}
+
+		// release the buffers only after they were written
+		__atomic_store_n(&ctrl->tail, tail, __ATOMIC_RELEASE);
+	}
+
+	fprintf(stderr, "%llu buffers, %llu bytes\n", buffers, bytes);
+
+	munmap(data, data_size);
+	munmap(ctrl, ctrl->data_offset);
+	close(fd);
+
+	return 0;
+}
@@ -0,0 +1,140 @@
+// SPDX-License-Identifier: GPL-2.0-or-later
+/*
+ * Reference consumer of splice() on /dev/sniffer
+ *
+ * Writes a PCAP file to stdout (or the file given with -o) like
+ * `header > file; cat /dev/sniffer >> file`, but moves the records with
+ * splice() from the device through a pipe into the file. The kernel copies
+ * them from the DMA buffers into the page cache directly, without the trip
+ * through a buffer in userspace.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#define PIPE_SIZE (1 << 20)
+
+typedef struct pcap_hdr_s {
+  uint32_t magic_number;   /* magic number */
+  uint16_t version_major;  /* major version number */
+  uint16_t version_minor;  /* minor version number */
+  int32_t  thiszone;       /* GMT to local correction */
+  uint32_t sigfigs;        /* accuracy of timestamps */
+  uint32_t snaplen;        /* max length of captured packets, in octets */
+  uint32_t network;        /* data link type */
+} pcap_hdr_t;
+
+static volatile sig_atomic_t stop;
+
+static void handle_signal(int sig)
+{
+	stop = 1;
+}
+
+static void usage(const char *name)
+{
+	fprintf(stderr, "Usage: %s [-d device] [-o file] [-c bytes]\n", name);
+}
+
+int main(int argc, char *argv[])
+{
+	pcap_hdr_t hdr = {0xa1b23c4d, 2, 4, -3600, 0, 2048, 1};
+	const char *device = "/dev/sniffer";
+	struct sigaction sa = {.sa_handler = handle_signal};
+	unsigned long long bytes = 0, limit = 0, calls = 0;
+	int fd, out = 1, pipefd[2], opt, err = 0;
+	ssize_t n, m;
+	size_t count;
+
+	while ((opt = getopt(argc, argv, "d:o:c:h")) != -1) {
+		switch (opt) {
+		case 'd':
+			device = optarg;
+			break;
+		case 'o':
+			out = open(optarg, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+			if (out < 0) {
+				perror(optarg);
+				return 1;
+			}
+			break;
+		case 'c':
+			limit = strtoull(optarg, NULL, 0);
+			break;
+		default:
+			usage(argv[0]);
+			return 1;
+		}
+	}
+
+	fd = open(device, O_RDONLY);
+	if (fd < 0) {
+		perror(device);
+		return 1;
+	}
+
+	if (pipe(pipefd)) {
+		perror("pipe");
+		return 1;
+	}
+	// fewer calls per MB, the default pipe takes 64 KiB
+	fcntl(pipefd[1], F_SETPIPE_SZ, PIPE_SIZE);
+
+	// stop with EINTR from splice() instead of restarting it
+	sigaction(SIGINT, &sa, NULL);
+	sigaction(SIGTERM, &sa, NULL);
+
+	if (write(out, &hdr, sizeof(hdr)) != sizeof(hdr)) {
+		perror("write");
+		return 1;
+	}
+
+	while (!stop && (!limit || bytes < limit)) {
+		count = limit && limit - bytes < PIPE_SIZE ? limit - bytes : PIPE_SIZE;
+
+		n = splice(fd, NULL, pipefd[1], NULL, count, SPLICE_F_MOVE | SPLICE_F_MORE);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			perror("splice from device");
+			err = 1;
+			break;
+		}
+		if (!n) // end of a file given as device
+			break;
+		calls++;
+
+		// drain the pipe completely, its pages hold back the DMA buffers
+		while (n > 0) {
+			m = splice(pipefd[0], NULL, out, NULL, n, SPLICE_F_MOVE | SPLICE_F_MORE);
+			if (m < 0) {
+				if (errno == EINTR)
+					continue;
+				perror("splice to file");
+				err = 1;
+				goto out;
+			}
+			n -= m;
+			bytes += m;
+		}
+	}
+
+out:
+	fprintf(stderr, "%llu bytes, %llu splice calls\n", bytes, calls);
+
+	close(pipefd[0]);
+	close(pipefd[1]);
+	close(fd);
+
+	return err;
+}
@@ -0,0 +1,409 @@
+// SPDX-License-Identifier: GPL-2.0-or-later
+/*
+ * PCAP over TCP server of /dev/sniffer
+ *
+ * Every client connecting to the port (-p, 57012 by default) receives a PCAP
+ * stream of the live capture, e.g. for Wireshark on a workstation:
+ *
+ *   wireshark -k -i TCP@<board>:57012
+ *
+ * The device is read by a single event loop into a ring in memory (-q MiB),
+ * which is shared by all clients: each of them only has its own position in
+ * it and starts at the next record boundary after its PCAP header. Client
+ * data is sent in batches of at least -b KiB, or after -f ms. A client
+ * falling behind by more than the ring is dropped, so a slow client never
+ * holds up the capture.
+ *
+ * Any file or pipe of records can be given as device, e.g. - for stdin. At
+ * its end, the clients get the rest of the ring and the server exits.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <poll.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+#include <arpa/inet.h>
+#include <netinet/in.h>
+#include <sys/socket.h>
+
+#include "sniffer_uapi.h"
+
+#define MAX_CLIENTS 16
+#define READ_MAX (1 << 20)
+// the largest record a header can announce
+#define RECORD_MAX (SNIFFER_REC_HEADER_LEN + SNIFFER_REC_ORIG_LEN_MASK)
+
+typedef struct pcap_hdr_s {
+  uint32_t magic_number;   /* magic number */
+  uint16_t version_major;  /* major version number */
+  uint16_t version_minor;  /* minor version number */
+  int32_t  thiszone;       /* GMT to local correction */
+  uint32_t sigfigs;        /* accuracy of timestamps */
+  uint32_t snaplen;        /* max length of captured packets, in octets */
+  uint32_t network;        /* data link type */
+} pcap_hdr_t;
+
+static const pcap_hdr_t pcap_hdr = {0xa1b23c4d, 2, 4, -3600, 0, 2048, 1};
+
+/*
+ * Positions are counted in bytes since the start of the capture and taken
+ * modulo the size for the ring.
+ */
+struct ring {
+	uint8_t *buf;
+	size_t size;
+	uint64_t head;
+	uint64_t rec_end;
+};
+
+struct client {
+	int fd;
+	char name[64];
+	size_t hdr_left;
+	uint64_t pos;
+	double last_send;
+	int blocked;
+	unsigned long long bytes;
+};
+
+static volatile sig_atomic_t stop;
+
+static void handle_signal(int sig)
+{
+	stop = 1;
+}
+
+static void usage(const char *name)
+{
+	fprintf(stderr, "Usage: %s [-d device] [-p port] [-q MiB] [-b KiB] [-f ms]\n", name);
+}
+
+static double now(void)
+{
+	struct timespec ts;
+
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static int listen_on(unsigned int port)
+{
+	struct sockaddr_in addr = {
+		.sin_family = AF_INET,
+		.sin_port = htons(port),
+		.sin_addr.s_addr = htonl(INADDR_ANY),
+	};
+	socklen_t len = sizeof(addr);
+	int fd, one = 1;
+
+	fd = socket(AF_INET, SOCK_STREAM | SOCK_NONBLOCK, 0);
+	if (fd < 0) {
+		perror("socket");
+		return -1;
+	}
+	setsockopt(fd, SOL_SOCKET, SO_REUSEADDR, &one, sizeof(one));
+
+	if (bind(fd, (struct sockaddr *) &addr, sizeof(addr)) || listen(fd, MAX_CLIENTS)) {
+		perror("bind");
+		close(fd);
+		return -1;
+	}
+
+	// port 0 picks a free one
+	getsockname(fd, (struct sockaddr *) &addr, &len);
+	fprintf(stderr, "Listening on port %u\n", ntohs(addr.sin_port));
+
+	return fd;
+}
+
+static void drop_client(struct client *c, const char *reason)
+{
+	fprintf(stderr, "%s: %s after %llu bytes\n", c->name, reason, c->bytes);
+	close(c->fd);
+	c->fd = -1;
+}
+
+static int accept_client(int lfd, struct client *clients, struct ring *r)
+{
+	struct sockaddr_in addr;
+	socklen_t len = sizeof(addr);
+	struct client *c = NULL;
+	int fd, i;
+
+	fd = accept4(lfd, (struct sockaddr *) &addr, &len, SOCK_NONBLOCK);
+	if (fd < 0)
+		return 0;
+
+	for (i = 0; i < MAX_CLIENTS; i++) {
+		if (clients[i].fd < 0) {
+			c = &clients[i];
+			break;
+		}
+	}
+	if (!c) {
+		close(fd);
+		return 0;
+	}
+
+	c->fd = fd;
+	snprintf(c->name, sizeof(c->name), "%s:%u", inet_ntoa(addr.sin_addr), ntohs(addr.sin_port));
+	c->hdr_left = sizeof(pcap_hdr);
+	c->pos = r->rec_end;
+	c->last_send = now();
+	c->blocked = 0;
+	c->bytes = 0;
+
+	fprintf(stderr, "%s: connected\n", c->name);
+
+	return 1;
+}
+
+/* send what the client has pending, returns -1 if it is gone */
+static int send_client(struct client *c, struct ring *r)
+{
+	struct iovec iov[3];
+	struct msghdr msg = {.msg_iov = iov};
+	size_t pending = r->head - c->pos, i = c->pos % r->size, n;
+	ssize_t sent;
+
+	if (c->hdr_left) {
+		iov[msg.msg_iovlen].iov_base = (uint8_t *) &pcap_hdr + sizeof(pcap_hdr) - c->hdr_left;
+		iov[msg.msg_iovlen++].iov_len = c->hdr_left;
+	}
+
+	// up to the end of the ring and from its start
+	n = pending < r->size - i ? pending : r->size - i;
+	if (n) {
+		iov[msg.msg_iovlen].iov_base = r->buf + i;
+		iov[msg.msg_iovlen++].iov_len = n;
+	}
+	if (pending > n) {
+		iov[msg.msg_iovlen].iov_base = r->buf;
+		iov[msg.msg_iovlen++].iov_len = pending - n;
+	}
+
+	sent = sendmsg(c->fd, &msg, MSG_NOSIGNAL | MSG_DONTWAIT);
+	if (sent < 0) {
+		if (errno == EAGAIN || errno == EWOULDBLOCK) {
+			c->blocked = 1;
+			return 0;
+		}
+		return -1;
+	}
+
+	c->bytes += sent;
+	n = (size_t) sent < c->hdr_left ? (size_t) sent : c->hdr_left;
+	c->hdr_left -= n;
+	c->pos += sent - n;
+	c->blocked = c->hdr_left || c->pos != r->head;
+	c->last_send = now();
+
+	return 0;
+}
+
+/* advance rec_end to the end of the last complete record */
+static int find_record_end(struct ring *r)
+{
+	uint32_t incl_len;
+	size_t i;
+
+	while (r->head - r->rec_end >= SNIFFER_REC_HEADER_LEN) {
+		i = (r->rec_end + 8) % r->size;
+		if (i + sizeof(incl_len) <= r->size) {
+			memcpy(&incl_len, r->buf + i, sizeof(incl_len));
+		} else {
+			memcpy(&incl_len, r->buf + i, r->size - i);
+			memcpy((uint8_t *) &incl_len + r->size - i, r->buf, sizeof(incl_len) - (r->size - i));
+		}
+
+		if (incl_len > RECORD_MAX - SNIFFER_REC_HEADER_LEN) {
+			fprintf(stderr, "Bogus record length %u\n", incl_len);
+			return -1;
+		}
+		if (r->head - r->rec_end < SNIFFER_REC_HEADER_LEN + incl_len)
+			break;
+		r->rec_end += SNIFFER_REC_HEADER_LEN + incl_len;
+	}
+
+	return 0;
+}
+
+int main(int argc, char *argv[])
+{
+	static struct client clients[MAX_CLIENTS];
+	struct pollfd pfd[2 + MAX_CLIENTS];
+	struct ring r = {.size = 16 << 20};
+	const char *device = "/dev/sniffer";
+	unsigned int port = 57012, flush_ms = 50;
+	unsigned long long served = 0, dropped = 0;
+	size_t batch = 64 << 10, count;
+	int fd, lfd, opt, i, n, active, eof = 0, err = 0;
+	uint8_t discard[256];
+	ssize_t len;
+	double t;
+
+	while ((opt = getopt(argc, argv, "d:p:q:b:f:h")) != -1) {
+		switch (opt) {
+		case 'd':
+			device = optarg;
+			break;
+		case 'p':
+			port = strtoul(optarg, NULL, 0);
+			break;
+		case 'q':
+			r.size = strtoull(optarg, NULL, 0) << 20;
+			break;
+		case 'b':
+			batch = strtoull(optarg, NULL, 0) << 10;
+			break;
+		case 'f':
+			flush_ms = strtoul(optarg, NULL, 0);
+			break;
+		default:
+			usage(argv[0]);
+			return 1;
+		}
+	}
+
+	if (r.size < 2 * READ_MAX) {
+		usage(argv[0]);
+		return 1;
+	}
+
+	r.buf = malloc(r.size);
+	if (!r.buf) {
+		fprintf(stderr, "Unable to allocate a ring of %zu bytes\n", r.size);
+		return 1;
+	}
+
+	fd = strcmp(device, "-") ? open(device, O_RDONLY | O_NONBLOCK) : 0;
+	if (fd < 0) {
+		perror(device);
+		return 1;
+	}
+
+	lfd = listen_on(port);
+	if (lfd < 0)
+		return 1;
+
+	for (i = 0; i < MAX_CLIENTS; i++)
+		clients[i].fd = -1;
+
+	signal(SIGINT, handle_signal);
+	signal(SIGTERM, handle_signal);
+
+	while (!stop) {
+		// at the end of the input, the clients get the rest of the ring
+		active = 0;
+		for (i = 0; i < MAX_CLIENTS; i++)
+			active += clients[i].fd >= 0;
+		if (eof && !active)
+			break;
+
+		pfd[0] = (struct pollfd) {.fd = eof ? -1 : fd, .events = POLLIN};
+		pfd[1] = (struct pollfd) {.fd = eof ? -1 : lfd, .events = POLLIN};
+		for (i = 0; i < MAX_CLIENTS; i++)
+			pfd[2 + i] = (struct pollfd) {
+				.fd = clients[i].fd,
+				.events = POLLIN | (clients[i].blocked ? POLLOUT : 0),
+			};
+
+		n = poll(pfd, 2 + MAX_CLIENTS, flush_ms);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			perror("poll");
+			err = 1;
+			break;
+		}
+
+		if (pfd[0].revents) {
+			count = r.size - r.head % r.size;
+			if (count > READ_MAX)
+				count = READ_MAX;
+
+			// make room first, a client may not hold up the capture
+			for (i = 0; i < MAX_CLIENTS; i++) {
+				if (clients[i].fd >= 0 && r.head + count - clients[i].pos > r.size) {
+					drop_client(&clients[i], "too slow, dropped");
+					dropped++;
+				}
+			}
+
+			len = read(fd, r.buf + r.head % r.size, count);
+			if (len < 0 && errno != EAGAIN && errno != EINTR) {
+				perror("read");
+				err = 1;
+				eof = 1;
+			} else if (!len) {
+				eof = 1;
+			} else if (len > 0) {
+				r.head += len;
+				if (find_record_end(&r)) {
+					err = 1;
+					eof = 1;
+				}
+			}
+		}
+
+		if (pfd[1].revents & POLLIN)
+			served += accept_client(lfd, clients, &r);
+
+		t = now();
+		for (i = 0; i < MAX_CLIENTS; i++) {
+			struct client *c = &clients[i];
+
+			if (c->fd < 0)
+				continue;
+
+			// clients only send to hang up
+			if (pfd[2 + i].revents & (POLLIN | POLLHUP | POLLERR)) {
+				len = recv(c->fd, discard, sizeof(discard), MSG_DONTWAIT);
+				if (!len || (len < 0 && errno != EAGAIN)) {
+					drop_client(c, "disconnected");
+					continue;
+				}
+			}
+
+			if (!c->hdr_left && c->pos == r.head) {
+				if (eof)
+					drop_client(c, "end of capture");
+				continue;
+			}
+
+			if (c->blocked && !(pfd[2 + i].revents & POLLOUT))
+				continue;
+
+			// batch small amounts until the flush interval passed
+			if (r.head - c->pos < batch && !eof && t - c->last_send < flush_ms * 1e-3)
+				continue;
+
+			if (send_client(c, &r))
+				drop_client(c, "send failed");
+		}
+	}
+
+	for (i = 0; i < MAX_CLIENTS; i++)
+		if (clients[i].fd >= 0)
+			drop_client(&clients[i], "closed");
+
+	fprintf(stderr, "%llu bytes read, %llu clients served, %llu dropped as too slow\n",
+		(unsigned long long) r.head, served, dropped);
+
+	close(lfd);
+	if (fd)
+		close(fd);
+	free(r.buf);
+
+	return err;
+}
@@ -0,0 +1,162 @@
+/* SPDX-License-Identifier: GPL-2.0-or-later */
+/*
+ * pcapng output of the records of /dev/sniffer
+ *
+ * The section header is followed by an Interface Description Block per port
+ * (if_name "mac1", "mac2", ..., nanosecond if_tsresol), so the interface ID
+ * of an Enhanced Packet Block is the port of its record. A loss marker
+ * additionally carries the dropped frames as epb_dropcount and a comment.
+ *
+ * Blocks are written in host byte order, which the byte-order magic of the
+ * section header tells the reader.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#ifndef _SNIFFER_PCAPNG_H
+#define _SNIFFER_PCAPNG_H
+
+#include <arpa/inet.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+
+#include "sniffer_uapi.h"
+
+#define PCAPNG_SHB 0x0a0d0d0a
+#define PCAPNG_IDB 0x00000001
+#define PCAPNG_EPB 0x00000006
+#define PCAPNG_BYTE_ORDER_MAGIC 0x1a2b3c4d
+
+#define PCAPNG_OPT_ENDOFOPT 0
+#define PCAPNG_OPT_COMMENT 1
+#define PCAPNG_OPT_IF_NAME 2
+#define PCAPNG_OPT_IF_TSRESOL 9
+#define PCAPNG_OPT_EPB_DROPCOUNT 4
+
+#define PCAPNG_LINKTYPE_ETHERNET 1
+
+/* section header and the Interface Description Blocks of all ports */
+#define PCAPNG_HEADER_MAX (28 + SNIFFER_PORT_COUNT * 40)
+/* padding, options and total length behind the packet data of an EPB */
+#define PCAPNG_EPB_TAIL_MAX 96
+
+struct pcapng_epb {
+	uint32_t head[7];
+	uint8_t tail[PCAPNG_EPB_TAIL_MAX];
+	uint32_t tail_len;
+};
+
+static inline size_t pcapng_put32(uint8_t *p, uint32_t value)
+{
+	memcpy(p, &value, sizeof(value));
+	return sizeof(value);
+}
+
+static inline size_t pcapng_put_option(uint8_t *p, uint16_t code, const void *value, uint16_t len)
+{
+	size_t padded = (len + 3) & ~3;
+
+	memcpy(p, &code, sizeof(code));
+	memcpy(p + 2, &len, sizeof(len));
+	memcpy(p + 4, value, len);
+	memset(p + 4 + len, 0, padded - len);
+
+	return 4 + padded;
+}
+
+/*
+ * pcapng_header - Section header and one Interface Description Block per port
+ *
+ * Fills buf (PCAPNG_HEADER_MAX bytes) and returns the number of bytes.
+ */
+static inline size_t pcapng_header(uint8_t *buf)
+{
+	uint16_t version[2] = {1, 0};
+	uint16_t linktype[2] = {PCAPNG_LINKTYPE_ETHERNET, 0};
+	uint8_t tsresol = 9;
+	int64_t section_len = -1;
+	char name[8];
+	size_t n = 0, start;
+	int port;
+
+	n += pcapng_put32(buf + n, PCAPNG_SHB);
+	n += pcapng_put32(buf + n, 28);
+	n += pcapng_put32(buf + n, PCAPNG_BYTE_ORDER_MAGIC);
+	memcpy(buf + n, version, sizeof(version));
+	n += sizeof(version);
+	memcpy(buf + n, &section_len, sizeof(section_len));
+	n += sizeof(section_len);
+	n += pcapng_put32(buf + n, 28);
+
+	for (port = 0; port < SNIFFER_PORT_COUNT; port++) {
+		start = n;
+		snprintf(name, sizeof(name), "mac%d", port + 1);
+
+		n += pcapng_put32(buf + n, PCAPNG_IDB);
+		n += 4; // total length, filled in below
+		memcpy(buf + n, linktype, sizeof(linktype));
+		n += sizeof(linktype);
+		n += pcapng_put32(buf + n, 0); // no snap length
+		n += pcapng_put_option(buf + n, PCAPNG_OPT_IF_NAME, name, strlen(name));
+		n += pcapng_put_option(buf + n, PCAPNG_OPT_IF_TSRESOL, &tsresol, sizeof(tsresol));
+		n += pcapng_put_option(buf + n, PCAPNG_OPT_ENDOFOPT, NULL, 0);
+		n += pcapng_put32(buf + n, n - start + 4);
+		pcapng_put32(buf + start + 4, n - start);
+	}
+
+	return n;
+}
+
+/*
+ * pcapng_epb - Enhanced Packet Block of a record
+ *
+ * The block consists of epb->head, the incl_len bytes of the frame behind the
+ * record header and epb->tail_len bytes of epb->tail. incl_len has to be
+ * limited to the bytes available by the caller.
+ */
+static inline void pcapng_epb(struct pcapng_epb *epb, const uint8_t *rec, uint32_t incl_len)
+{
+	const struct sniffer_marker *marker = (const void *) (rec + SNIFFER_REC_HEADER_LEN);
+	uint32_t hdr[4];
+	uint64_t ts, dropcount;
+	uint32_t frames, bytes;
+	char comment[64];
+	size_t n;
+
+	memcpy(hdr, rec, sizeof(hdr));
+	ts = hdr[0] * 1000000000ULL + hdr[1];
+
+	// pad the packet data to 32 bits
+	n = (4 - incl_len % 4) % 4;
+	memset(epb->tail, 0, n);
+
+	if (incl_len >= sizeof(*marker) && marker->ethertype == htons(SNIFFER_MARKER_ETHERTYPE) &&
+	    !memcmp(marker->magic, SNIFFER_MARKER_MAGIC, sizeof(marker->magic)) &&
+	    marker->type == SNIFFER_MARKER_TYPE_LOSS) {
+		frames = ntohl(marker->frames);
+		bytes = ntohl(marker->bytes);
+		dropcount = frames;
+
+		snprintf(comment, sizeof(comment), "aRTS: %u frames (%u bytes) dropped on mac%u",
+			 frames, bytes, marker->port + 1);
+		n += pcapng_put_option(epb->tail + n, PCAPNG_OPT_COMMENT, comment, strlen(comment));
+		n += pcapng_put_option(epb->tail + n, PCAPNG_OPT_EPB_DROPCOUNT, &dropcount, sizeof(dropcount));
+		n += pcapng_put_option(epb->tail + n, PCAPNG_OPT_ENDOFOPT, NULL, 0);
+	}
+
+	n += 4;
+	epb->tail_len = n;
+
+	epb->head[0] = PCAPNG_EPB;
+	epb->head[1] = sizeof(epb->head) + incl_len + n;
+	epb->head[2] = (hdr[3] >> SNIFFER_REC_PORT_SHIFT) & SNIFFER_REC_PORT_MASK;
+	epb->head[3] = ts >> 32;
+	epb->head[4] = ts;
+	epb->head[5] = incl_len;
+	epb->head[6] = hdr[3] & SNIFFER_REC_ORIG_LEN_MASK;
+
+	pcapng_put32(epb->tail + n - 4, epb->head[1]);
+}
+
+#endif /* _SNIFFER_PCAPNG_H */
@@ -13,18 +13,26 @@
 #include <linux/types.h>
 #include <linux/list.h>
 #include <linux/completion.h>
+#include <linux/dma-mapping.h>
+#include <linux/dma-direct.h>
 #include <linux/miscdevice.h>
 #include <linux/rwsem.h>
+#include <linux/workqueue.h>
+#include <linux/wait_bit.h>
 #include <asm/atomic.h>
 
+#include "sniffer_uapi.h"
+
 
 #define SNIFFER_MDIO_BUS_COUNT 2
+#define SNIFFER_DMA_CHANNEL_MAX 2
 
 #define DMA_DESC_SIZE sizeof(struct sniffer_dma_descriptor)
 #define DMA_DESC_RING_SIZE 256
 #define DMA_DESC_RING_MASK (DMA_DESC_RING_SIZE-1)
 #define DMA_BUF_SIZE_LD 11
 #define DMA_BUF_SIZE (1 << DMA_BUF_SIZE_LD)
+#define DMA_PACKED_BUF_SIZE_LD 16
 #define DMA_BUF_RING_SIZE ((256 * 1024 * 1024) / DMA_BUF_SIZE)
 #define DMA_BUF_RING_MASK ((256 * 1024 * 1024) / DMA_BUF_SIZE)
 
@@ -41,25 +49,35 @@ struct sniffer_pcap_buff {
 	unsigned int i;
 };
 
-struct sniffer_local {
-	struct net_device *ndev;
-	struct device *dev;
+/*
+ * One DMA controller with its descriptor ring, DMA buffers, IRQ and character
+ * device. Normally both ports share a single channel, in the per-port build of
+ * the FPGA each port has its own.
+ */
+struct sniffer_dma_channel {
+	struct sniffer_local *lp;
+	unsigned int index;
 
 	void __iomem *regs;
-
-	struct phylink *phylink[SNIFFER_MDIO_BUS_COUNT];
-	struct phy_device *phydev[SNIFFER_MDIO_BUS_COUNT];
-	struct phylink_config phylink_config;
-	void *mii_bus[SNIFFER_MDIO_BUS_COUNT];
-
 	struct mutex running;
-	bool powerdown:1;
-	unsigned int speed;
 
 	struct sniffer_dma_descriptor *dma_desc;
 	dma_addr_t dma_handle;
 	u8 *buf;
+	void *buf_cookie;
 	unsigned int buf_size;
+	unsigned int buf_size_ld;
+	bool packed;
+	bool cached;
+	u32 *buf_fill;
+
+	struct sniffer_mmap_ctrl *mmap_ctrl;
+	size_t mmap_ctrl_size;
+	bool mmapped;
+
+	// pipe buffers of splice() referring to each DMA buffer
+	atomic_t *splice_refs;
+	unsigned int release_tail;
 	void *dummy_buf;
 	dma_addr_t dummy_dma_handle;
 	unsigned int dma_count;
@@ -67,38 +85,86 @@ struct sniffer_local {
 	unsigned int desc_tail;
 	unsigned int data_tail, data_head;
 	unsigned int data_desc_head;
+	unsigned int desc_refilled;
+	spinlock_t refill_lock;
+	struct delayed_work refill_work;
+	spinlock_t ctrl_lock;
+	int irq;
 	int i;
+	unsigned int rec_left;
 
 	wait_queue_head_t queue;
-	//workqueue_head_t queue;
 
 	int rd_error;
 
+	char name[16];
 	struct miscdevice misc_dev;
 };
 
+struct sniffer_local {
+	struct net_device *ndev;
+	struct device *dev;
+
+	void __iomem *regs;
+	resource_size_t regs_size;
+
+	struct phylink *phylink[SNIFFER_MDIO_BUS_COUNT];
+	struct phy_device *phydev[SNIFFER_MDIO_BUS_COUNT];
+	struct phylink_config phylink_config;
+	void *mii_bus[SNIFFER_MDIO_BUS_COUNT];
+
+	// the MACs run as long as any channel is open
+	struct mutex mac_lock;
+	unsigned int mac_users;
+	bool powerdown:1;
+	unsigned int speed;
+
+	// serializes the accesses to the time base registers
+	struct mutex clock_lock;
+
+	struct sniffer_dma_channel chan[SNIFFER_DMA_CHANNEL_MAX];
+	unsigned int chan_count;
+};
+
 
 
 int sniffer_setup_phylink(struct sniffer_local *lp);
-int sniffer_setup_miscdevice(struct sniffer_local *lp);
+int sniffer_setup_miscdevice(struct sniffer_dma_channel *chan);
 int sniffer_setup_sysfs(struct sniffer_local *lp);
 int set_speed(struct sniffer_local *lp, unsigned int speed);
-int fill_dummy_dma_descriptor(struct sniffer_local *lp);
-int prepare_dma_descriptor_ring(struct sniffer_local *lp);
+int fill_dummy_dma_descriptor(struct sniffer_dma_channel *chan);
+int prepare_dma_descriptor_ring(struct sniffer_dma_channel *chan);
+void sniffer_update_dma_ctrl(struct sniffer_dma_channel *chan, u32 clear, u32 set);
 int sniffer_mdio_setup(struct sniffer_local *lp);
 void sniffer_mdio_teardown(struct sniffer_local *lp);
+int sniffer_clock_set_time(struct sniffer_local *lp, u32 sec, u32 nsec);
+void sniffer_clock_get_time(struct sniffer_local *lp, u32 *sec, u32 *nsec);
+int sniffer_clock_set_ppb(struct sniffer_local *lp, s32 ppb);
+s32 sniffer_clock_get_ppb(struct sniffer_local *lp);
+void sniffer_clock_set_sync(struct sniffer_local *lp, bool enable);
+bool sniffer_clock_get_sync(struct sniffer_local *lp, bool *locked);
+void sniffer_clock_get_sync_state(struct sniffer_local *lp, s32 *offset_ns, s32 *ppb);
 
 #define SNIFFER_DMA_OFFSET 0x0
+#define SNIFFER_DMA2_OFFSET 0x300
+#define SNIFFER_DMA_DESC_OFFSET 0x1000
+#define SNIFFER_DMA2_DESC_OFFSET 0x2000
 #define SNIFFER_MAC_OFFSET 0x100
 #define SNIFFER_MDIO1_OFFSET 0x200
 #define SNIFFER_MDIO2_OFFSET 0x204
+#define SNIFFER_FILTER_OFFSET 0x400
+#define SNIFFER_CLOCK_OFFSET 0x800
 
+// registers of a DMA channel, relative to its register block
 #define SNIFFER_DMA_ADR_OFFSET (SNIFFER_DMA_OFFSET + 0x0)
 #define SNIFFER_DMA_LEN_OFFSET (SNIFFER_DMA_OFFSET + 0x4)
 #define SNIFFER_DMA_CTRL_OFFSET (SNIFFER_DMA_OFFSET + 0x8)
 #define SNIFFER_DMA_STATUS_OFFSET (SNIFFER_DMA_OFFSET + 0xc)
 #define SNIFFER_DMA_IRQ_TIME_OFFSET (SNIFFER_DMA_OFFSET + 0x10)
 #define SNIFFER_DMA_PACKET_COUNT_OFFSET (SNIFFER_DMA_OFFSET + 0x14)
+#define SNIFFER_DMA_PACK_TIMEOUT_OFFSET (SNIFFER_DMA_OFFSET + 0x18)
+#define SNIFFER_DMA_IRQ_COALESCE_COUNT_OFFSET (SNIFFER_DMA_OFFSET + 0x1c)
+#define SNIFFER_DMA_IRQ_COALESCE_TIME_OFFSET (SNIFFER_DMA_OFFSET + 0x20)
 
 #define SNIFFER_DMA_STATUS_BUSY_OFFSET 0
 #define SNIFFER_DMA_STATUS_IRQ_OFFSET 1
@@ -108,10 +174,15 @@ void sniffer_mdio_teardown(struct sniffer_local *lp);
 #define SNIFFER_DMA_CTRL_ENABLE_OFFSET 0
 #define SNIFFER_DMA_CTRL_RESET_OFFSET 1
 #define SNIFFER_DMA_CTRL_IRQ_OFFSET 2
+#define SNIFFER_DMA_CTRL_PACKED_OFFSET 3
 
 #define SNIFFER_DMA_CTRL_ENABLE_MASK (0x1 << SNIFFER_DMA_CTRL_ENABLE_OFFSET)
 #define SNIFFER_DMA_CTRL_RESET_MASK (0x1 << SNIFFER_DMA_CTRL_RESET_OFFSET)
 #define SNIFFER_DMA_CTRL_IRQ_MASK (0x1 << SNIFFER_DMA_CTRL_IRQ_OFFSET)
+#define SNIFFER_DMA_CTRL_PACKED_MASK (0x1 << SNIFFER_DMA_CTRL_PACKED_OFFSET)
+
+// period of the AXI clock (FCLK0, 142.857 MHz)
+#define SNIFFER_AXI_CLK_PERIOD_NS 7
 
 
 #define SNIFFER_MAC_CTRL_OFFSET (SNIFFER_MAC_OFFSET + 0x00)
@@ -122,12 +193,22 @@ void sniffer_mdio_teardown(struct sniffer_local *lp);
 #define SNIFFER_MAC_FIFO1_BAD_FRAME_OFFSET (SNIFFER_MAC_OFFSET + 0x4c)
 #define SNIFFER_MAC_FIFO1_GOOD_FRAME_OFFSET (SNIFFER_MAC_OFFSET + 0x50)
 #define SNIFFER_MAC_FIFO1_OVERFLOW_OFFSET (SNIFFER_MAC_OFFSET + 0x54)
+#define SNIFFER_MAC_MAC1_SNAPLEN_OFFSET (SNIFFER_MAC_OFFSET + 0x58)
 #define SNIFFER_MAC_MAC2_START_FRAME_OFFSET (SNIFFER_MAC_OFFSET + 0x60)
 #define SNIFFER_MAC_MAC2_BAD_FRAME_OFFSET (SNIFFER_MAC_OFFSET + 0x64)
 #define SNIFFER_MAC_MAC2_BAD_FCS_OFFSET (SNIFFER_MAC_OFFSET + 0x68)
 #define SNIFFER_MAC_FIFO2_BAD_FRAME_OFFSET (SNIFFER_MAC_OFFSET + 0x6c)
 #define SNIFFER_MAC_FIFO2_GOOD_FRAME_OFFSET (SNIFFER_MAC_OFFSET + 0x70)
 #define SNIFFER_MAC_FIFO2_OVERFLOW_OFFSET (SNIFFER_MAC_OFFSET + 0x74)
+#define SNIFFER_MAC_MAC2_SNAPLEN_OFFSET (SNIFFER_MAC_OFFSET + 0x78)
+#define SNIFFER_MAC_FIFO1_HIGH_WATER_OFFSET (SNIFFER_MAC_OFFSET + 0x80)
+#define SNIFFER_MAC_FIFO1_HIST_OFFSET (SNIFFER_MAC_OFFSET + 0xa0)
+#define SNIFFER_MAC_FIFO2_HIGH_WATER_OFFSET (SNIFFER_MAC_OFFSET + 0xc0)
+#define SNIFFER_MAC_FIFO2_HIST_OFFSET (SNIFFER_MAC_OFFSET + 0xe0)
+
+// RX FIFO occupancy histogram, bucket i counts the cycles with
+// i/8 to (i+1)/8 of the FIFO filled
+#define SNIFFER_MAC_FIFO_HIST_BUCKETS 8
 
 #define SNIFFER_MAC_CTRL_ENABLE_OFFSET 0x0
 #define SNIFFER_MAC_CTRL_MII_OFFSET 0x1
@@ -141,6 +222,53 @@ void sniffer_mdio_teardown(struct sniffer_local *lp);
 #define SNIFFER_MAC_STATUS_BUSY_MASK (0x1 << SNIFFER_MAC_STATUS_BUSY_OFFSET)
 #define SNIFFER_MAC_STATUS_BUFFERS_EMPTY_MASK (0x1 << SNIFFER_MAC_STATUS_BUFFERS_EMPTY_OFFSET)
 
+// capture filter, one block of registers per port
+#define SNIFFER_FILTER_PORT_STRIDE 0x200
+#define SNIFFER_FILTER_RULE_STRIDE 0x20
+#define SNIFFER_FILTER_RULE_COUNT 4
+#define SNIFFER_FILTER_PORT_OFFSET(port) (SNIFFER_FILTER_OFFSET + (port) * SNIFFER_FILTER_PORT_STRIDE)
+#define SNIFFER_FILTER_CTRL_OFFSET(port) (SNIFFER_FILTER_PORT_OFFSET(port) + 0x00)
+#define SNIFFER_FILTER_ETHERTYPE_OFFSET(port) (SNIFFER_FILTER_PORT_OFFSET(port) + 0x04)
+#define SNIFFER_FILTER_VLAN_ID_OFFSET(port) (SNIFFER_FILTER_PORT_OFFSET(port) + 0x08)
+#define SNIFFER_FILTER_DST_MAC_OFFSET(port) (SNIFFER_FILTER_PORT_OFFSET(port) + 0x10)
+#define SNIFFER_FILTER_SRC_MAC_OFFSET(port) (SNIFFER_FILTER_PORT_OFFSET(port) + 0x18)
+#define SNIFFER_FILTER_DROPPED_FRAMES_OFFSET(port) (SNIFFER_FILTER_PORT_OFFSET(port) + 0x20)
+#define SNIFFER_FILTER_DROPPED_BYTES_OFFSET(port) (SNIFFER_FILTER_PORT_OFFSET(port) + 0x24)
+#define SNIFFER_FILTER_RULE_OFFSET(port, rule) \
+	(SNIFFER_FILTER_PORT_OFFSET(port) + 0x40 + (rule) * SNIFFER_FILTER_RULE_STRIDE)
+
+// registers of a MAC address and of a rule, relative to their base
+#define SNIFFER_FILTER_MAC_LO 0x00
+#define SNIFFER_FILTER_MAC_HI 0x04
+#define SNIFFER_FILTER_RULE_BYTE_OFFSET 0x00
+#define SNIFFER_FILTER_RULE_MASK_LO 0x04
+#define SNIFFER_FILTER_RULE_MASK_HI 0x08
+#define SNIFFER_FILTER_RULE_VALUE_LO 0x0c
+#define SNIFFER_FILTER_RULE_VALUE_HI 0x10
+
+#define SNIFFER_FILTER_CTRL_ENABLE_MASK (0x1 << 0)
+#define SNIFFER_FILTER_CTRL_INVERT_MASK (0x1 << 1)
+#define SNIFFER_FILTER_CTRL_ETHERTYPE_MASK (0x1 << 2)
+#define SNIFFER_FILTER_CTRL_DST_MAC_MASK (0x1 << 3)
+#define SNIFFER_FILTER_CTRL_SRC_MAC_MASK (0x1 << 4)
+#define SNIFFER_FILTER_CTRL_VLAN_MASK (0x1 << 5)
+#define SNIFFER_FILTER_CTRL_RULE_SHIFT 16
+
+// time base of the timestamps, see axil_clock_regs
+#define SNIFFER_CLOCK_CTRL_OFFSET (SNIFFER_CLOCK_OFFSET + 0x00)
+#define SNIFFER_CLOCK_SET_SEC_OFFSET (SNIFFER_CLOCK_OFFSET + 0x04)
+#define SNIFFER_CLOCK_SET_NSEC_OFFSET (SNIFFER_CLOCK_OFFSET + 0x08)
+#define SNIFFER_CLOCK_RATE_OFFSET (SNIFFER_CLOCK_OFFSET + 0x0c)
+#define SNIFFER_CLOCK_TIME_SEC_OFFSET (SNIFFER_CLOCK_OFFSET + 0x10)
+#define SNIFFER_CLOCK_TIME_NSEC_OFFSET (SNIFFER_CLOCK_OFFSET + 0x14)
+#define SNIFFER_CLOCK_SYNC_OFFSET_OFFSET (SNIFFER_CLOCK_OFFSET + 0x18)
+#define SNIFFER_CLOCK_SYNC_FREQ_OFFSET (SNIFFER_CLOCK_OFFSET + 0x1c)
+
+#define SNIFFER_CLOCK_CTRL_LOAD_MASK (0x1 << 0)
+#define SNIFFER_CLOCK_CTRL_RATE_MASK (0x1 << 1)
+#define SNIFFER_CLOCK_CTRL_SYNC_MASK (0x1 << 2)
+#define SNIFFER_CLOCK_CTRL_LOCKED_MASK (0x1 << 3)
+
 
 #define SNIFFER_MDIO_OP_WRITE 0x1
 #define SNIFFER_MDIO_OP_READ 0x2
@@ -182,9 +310,118 @@ static inline u32 sniffer_ior(void __iomem *regs)
 	return ioread32(regs);
 }
 
-static inline u32 sniffer_get_dma_count(struct sniffer_local *lp)
+static inline u8 *sniffer_get_buf(struct sniffer_dma_channel *chan, unsigned int index)
+{
+	return chan->buf + (index << chan->buf_size_ld);
+}
+
+/*
+ * sniffer_get_buf_page - Page holding byte off of the DMA buffers
+ *
+ * Taken from the bus address, as the coherent buffers are not in the linear
+ * mapping of the kernel.
+ */
+static inline struct page *sniffer_get_buf_page(struct sniffer_dma_channel *chan, size_t off)
+{
+	return pfn_to_page(PHYS_PFN(dma_to_phys(chan->lp->dev, chan->dma_handle + off)));
+}
+
+/*
+ * sniffer_sync_buf_for_cpu - Hand a buffer completed by the DMA to the CPU
+ *
+ * With cacheable buffers, the lines of the buffer are invalidated, the CPU
+ * may have fetched them while the DMA was writing. Only the len bytes filled
+ * by the DMA have to be synced. Pass the length read from the descriptor, not
+ * buf_fill, which is in the control area userspace can write to.
+ */
+static inline void sniffer_sync_buf_for_cpu(struct sniffer_dma_channel *chan, unsigned int index,
+					    u32 len)
+{
+	if (chan->cached)
+		dma_sync_single_for_cpu(chan->lp->dev,
+					chan->dma_handle + ((dma_addr_t) index << chan->buf_size_ld),
+					len, DMA_FROM_DEVICE);
+}
+
+/*
+ * sniffer_sync_buf_for_device - Hand a buffer released by the reader to the DMA
+ *
+ * Drops lines dirtied by read(), which clears bits of the record headers in
+ * place, before they can be written back over new records.
+ */
+static inline void sniffer_sync_buf_for_device(struct sniffer_dma_channel *chan, unsigned int index)
+{
+	if (chan->cached)
+		dma_sync_single_for_device(chan->lp->dev,
+					   chan->dma_handle + ((dma_addr_t) index << chan->buf_size_ld),
+					   1 << chan->buf_size_ld, DMA_FROM_DEVICE);
+}
+
+/*
+ * sniffer_get_buf_len - Number of valid bytes in a DMA buffer
+ *
+ * In packed mode the DMA wrote the fill level back to the descriptor, which
+ * was saved when the buffer was handed over. Otherwise, the buffer holds a
+ * single record whose length is taken from the PCAP record header.
+ */
+static inline u32 sniffer_get_buf_len(struct sniffer_dma_channel *chan, unsigned int index)
+{
+	u8 *payload;
+
+	if (chan->packed)
+		return READ_ONCE(chan->buf_fill[index]);
+
+	payload = sniffer_get_buf(chan, index);
+	return le32_to_cpup(((__le32 *) payload) + 2) + 16;
+}
+
+/*
+ * sniffer_get_data_tail - First buffer still owned by the reader
+ *
+ * Once the ring is memory mapped, userspace advances the tail in the
+ * control area instead of read().
+ */
+static inline unsigned int sniffer_get_data_tail(struct sniffer_dma_channel *chan)
+{
+	if (READ_ONCE(chan->mmapped))
+		return smp_load_acquire(&chan->mmap_ctrl->tail) & (chan->buf_size - 1);
+
+	return READ_ONCE(chan->data_tail);
+}
+
+/*
+ * sniffer_splice_busy - Whether a pipe still refers to a DMA buffer
+ *
+ * Pipe buffers of splice() outlive the file, so their pages may still be
+ * read after the device was closed.
+ */
+static inline bool sniffer_splice_busy(struct sniffer_dma_channel *chan)
+{
+	unsigned int i;
+
+	for (i = 0; i < chan->buf_size; i++)
+		if (atomic_read(&chan->splice_refs[i]))
+			return true;
+
+	return false;
+}
+
+/*
+ * sniffer_wait_splice_released - Wait until no pipe refers to a DMA buffer
+ *
+ * The last pipe buffer released wakes the waiter (sniffer_pipe_buf_release).
+ */
+static inline void sniffer_wait_splice_released(struct sniffer_dma_channel *chan)
+{
+	unsigned int i;
+
+	for (i = 0; i < chan->buf_size; i++)
+		wait_var_event(&chan->splice_refs[i], !atomic_read(&chan->splice_refs[i]));
+}
+
+static inline u32 sniffer_get_dma_count(struct sniffer_dma_channel *chan)
 {
-	void __iomem *reg_adr = lp->regs + SNIFFER_DMA_PACKET_COUNT_OFFSET;
+	void __iomem *reg_adr = chan->regs + SNIFFER_DMA_PACKET_COUNT_OFFSET;
 	u32 reg_content;
 
 	reg_content = sniffer_ior(reg_adr);
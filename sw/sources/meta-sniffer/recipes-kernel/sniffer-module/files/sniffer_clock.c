@@ -0,0 +1,115 @@
+// SPDX-License-Identifier: GPL-2.0-or-later
+/*
+ * Driver for the Real-Time Sniffer aRTS
+ *
+ * Time base of the timestamps
+ *
+ * The seconds and nanoseconds written to the SET registers are loaded into
+ * the clock of the FPGA together by the LOAD bit, the rate is trimmed in
+ * parts per billion. Both are handed over to the clock domain of the
+ * counter, the CTRL register shows the pending transfers.
+ *
+ * With the SYNC bit of CTRL, the clock follows the sync line of another
+ * board instead. The bit is kept by every write to CTRL.
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#include <linux/iopoll.h>
+#include <linux/time64.h>
+
+#include "sniffer.h"
+
+static int await_clock_transfer(struct sniffer_local *lp, u32 mask)
+{
+	void __iomem *reg_adr = lp->regs + SNIFFER_CLOCK_CTRL_OFFSET;
+	u32 reg_content;
+
+	return readx_poll_timeout(sniffer_ior, reg_adr, reg_content,
+			!(reg_content & mask), 1, 1000);
+}
+
+int sniffer_clock_set_time(struct sniffer_local *lp, u32 sec, u32 nsec)
+{
+	u32 ctrl;
+	int ret;
+
+	if (nsec >= NSEC_PER_SEC)
+		return -EINVAL;
+
+	mutex_lock(&lp->clock_lock);
+
+	ret = await_clock_transfer(lp, SNIFFER_CLOCK_CTRL_LOAD_MASK);
+	if (!ret) {
+		sniffer_iow(lp->regs + SNIFFER_CLOCK_SET_SEC_OFFSET, sec);
+		sniffer_iow(lp->regs + SNIFFER_CLOCK_SET_NSEC_OFFSET, nsec);
+		ctrl = sniffer_ior(lp->regs + SNIFFER_CLOCK_CTRL_OFFSET) & SNIFFER_CLOCK_CTRL_SYNC_MASK;
+		sniffer_iow(lp->regs + SNIFFER_CLOCK_CTRL_OFFSET, ctrl | SNIFFER_CLOCK_CTRL_LOAD_MASK);
+		ret = await_clock_transfer(lp, SNIFFER_CLOCK_CTRL_LOAD_MASK);
+	}
+
+	mutex_unlock(&lp->clock_lock);
+
+	if (ret)
+		dev_warn(lp->dev, "Loading the time base takes too long\n");
+	return ret;
+}
+
+void sniffer_clock_get_time(struct sniffer_local *lp, u32 *sec, u32 *nsec)
+{
+	mutex_lock(&lp->clock_lock);
+	// reading the seconds latches the nanoseconds
+	*sec = sniffer_ior(lp->regs + SNIFFER_CLOCK_TIME_SEC_OFFSET);
+	*nsec = sniffer_ior(lp->regs + SNIFFER_CLOCK_TIME_NSEC_OFFSET);
+	mutex_unlock(&lp->clock_lock);
+}
+
+int sniffer_clock_set_ppb(struct sniffer_local *lp, s32 ppb)
+{
+	int ret;
+
+	if (ppb <= -NSEC_PER_SEC || ppb >= NSEC_PER_SEC)
+		return -ERANGE;
+
+	mutex_lock(&lp->clock_lock);
+
+	ret = await_clock_transfer(lp, SNIFFER_CLOCK_CTRL_RATE_MASK);
+	if (!ret) {
+		sniffer_iow(lp->regs + SNIFFER_CLOCK_RATE_OFFSET, ppb);
+		ret = await_clock_transfer(lp, SNIFFER_CLOCK_CTRL_RATE_MASK);
+	}
+
+	mutex_unlock(&lp->clock_lock);
+
+	if (ret)
+		dev_warn(lp->dev, "Trimming the time base takes too long\n");
+	return ret;
+}
+
+s32 sniffer_clock_get_ppb(struct sniffer_local *lp)
+{
+	return sniffer_ior(lp->regs + SNIFFER_CLOCK_RATE_OFFSET);
+}
+
+void sniffer_clock_set_sync(struct sniffer_local *lp, bool enable)
+{
+	mutex_lock(&lp->clock_lock);
+	sniffer_iow(lp->regs + SNIFFER_CLOCK_CTRL_OFFSET, enable ? SNIFFER_CLOCK_CTRL_SYNC_MASK : 0);
+	mutex_unlock(&lp->clock_lock);
+}
+
+bool sniffer_clock_get_sync(struct sniffer_local *lp, bool *locked)
+{
+	u32 ctrl = sniffer_ior(lp->regs + SNIFFER_CLOCK_CTRL_OFFSET);
+
+	if (locked)
+		*locked = ctrl & SNIFFER_CLOCK_CTRL_LOCKED_MASK;
+	return ctrl & SNIFFER_CLOCK_CTRL_SYNC_MASK;
+}
+
+// results of the last measurement of the sync line, updated once a second
+void sniffer_clock_get_sync_state(struct sniffer_local *lp, s32 *offset_ns, s32 *ppb)
+{
+	*offset_ns = sniffer_ior(lp->regs + SNIFFER_CLOCK_SYNC_OFFSET_OFFSET);
+	*ppb = sniffer_ior(lp->regs + SNIFFER_CLOCK_SYNC_FREQ_OFFSET);
+}
@@ -6,6 +6,12 @@
  */
 
 #include <linux/fs.h>
+#include <linux/mm.h>
+#include <linux/poll.h>
+#include <linux/pipe_fs_i.h>
+#include <linux/splice.h>
+#include <linux/vmalloc.h>
+#include <linux/dma-mapping.h>
 #include <linux/circ_buf.h>
 
 #include "sniffer.h"
@@ -18,44 +24,63 @@ The PCAP header contains the size of the payload, i.e. put only the real payload
 char file.
 Afterwards, free the list entry as well as the PCAP record.
 
-After the
-
-
-
-Further possibilities:
-Use large buffers with timeouts. The timeout resets each time a packet arrives.
-Once the timeout is
-
-Problem with this approach: How to deal with oversized packets?
-Solution: Have a small backup buffer, capable of receiving all overflowing bytes.
-The size should be at least the size of a packet of max. size.
-
-
-
+Packed mode (module parameter "packed"):
+Use large buffers (64KB) with timeouts. The DMA writes the records back to back
+and hands the buffer over once the next record of max. size might not fit
+anymore or the timeout expired. The timeout resets each time a packet arrives.
+The number of bytes written is stored in the descriptor and saved in
+chan->buf_fill when the IRQ is handled. The reader treats the buffer as a plain
+byte stream of complete PCAP records.
+
+mmap:
+Instead of reading, the control area and the DMA buffers can be mapped into
+userspace (see sniffer_uapi.h). The reader then advances the tail pointer in
+the control area itself and read() is refused.
+
+splice:
+splice() from the device passes the pages of the DMA buffers to the pipe
+without copying them. A DMA buffer is only refilled once all pipe buffers
+referring to it were released (chan->splice_refs), so the pipe should be
+drained into a file. A socket may still send from the pages afterwards,
+when retransmitting. For the same reason, opening the device again fails with
+EBUSY and removing the driver waits while a pipe still holds buffers.
+
+Cached buffers (module parameter "cached"):
+The buffers are taken from the reserved CMA pool like the coherent ones, but
+without the uncached remapping of the Zynq, so the driver and a mapping of the
+ring use the cacheable linear mapping of the kernel. Each buffer is
+invalidated when the DMA hands it over and before it is given back to the DMA
+(sniffer_sync_buf_for_cpu/_for_device).
+
+Per-port channels:
+With a second interrupt in the device tree, each port has its own DMA channel
+with a separate ring and character device. The MACs are shared, they are
+enabled by the first open and disabled by the last close.
+
+poll:
+The device is readable once a buffer is owned by the reader, i.e. read()
+returns data or the mapped ring has a buffer in [tail, head). The waitqueue
+is the one read() sleeps on. With O_NONBLOCK, read() returns -EAGAIN
+instead of sleeping, so event loops can drive the device.
+
+Time base:
+The clock of the timestamps is loaded and trimmed with ioctl() on any of the
+devices (see sniffer_uapi.h) or the clock_time/clock_ppb sysfs attributes.
 */
 
-static void disable_dma(struct sniffer_local *lp)
+static void disable_dma(struct sniffer_dma_channel *chan)
 {
-	void __iomem *reg_adr;
-	u32 reg_content;
-
-	reg_adr = lp->regs + SNIFFER_DMA_CTRL_OFFSET;
-	reg_content = sniffer_ior(reg_adr);
-	sniffer_iow(reg_adr, reg_content & ~SNIFFER_DMA_CTRL_ENABLE_MASK);
+	sniffer_update_dma_ctrl(chan, SNIFFER_DMA_CTRL_ENABLE_MASK, 0);
 }
 
-static void enable_dma(struct sniffer_local *lp)
+static void enable_dma(struct sniffer_dma_channel *chan)
 {
-	void __iomem *reg_adr = lp->regs + SNIFFER_DMA_CTRL_OFFSET;
-	u32 reg_content;
-
-	reg_content = sniffer_ior(reg_adr);
-	sniffer_iow(reg_adr, reg_content | SNIFFER_DMA_CTRL_ENABLE_MASK);
+	sniffer_update_dma_ctrl(chan, 0, SNIFFER_DMA_CTRL_ENABLE_MASK);
 }
 
-static int await_reset_dma(struct sniffer_local *lp)
+static int await_reset_dma(struct sniffer_dma_channel *chan)
 {
-	void __iomem *reg_adr = lp->regs + SNIFFER_DMA_CTRL_OFFSET;
+	void __iomem *reg_adr = chan->regs + SNIFFER_DMA_CTRL_OFFSET;
 	u32 reg_content;
 
 	return readx_poll_timeout(sniffer_ior, reg_adr, reg_content,
@@ -63,13 +88,9 @@ static int await_reset_dma(struct sniffer_local *lp)
 			1, 20000);
 }
 
-static void reset_dma(struct sniffer_local *lp)
+static void reset_dma(struct sniffer_dma_channel *chan)
 {
-	void __iomem *reg_adr = lp->regs + SNIFFER_DMA_CTRL_OFFSET;
-	u32 reg_content;
-
-	reg_content = sniffer_ior(reg_adr);
-	sniffer_iow(reg_adr, reg_content | SNIFFER_DMA_CTRL_RESET_MASK);
+	sniffer_update_dma_ctrl(chan, 0, SNIFFER_DMA_CTRL_RESET_MASK);
 }
 
 static void disable_macs(struct sniffer_local *lp)
@@ -108,9 +129,9 @@ static void enable_macs(struct sniffer_local *lp)
 	sniffer_iow(reg_adr, reg_content | SNIFFER_MAC_CTRL_ENABLE_MASK);
 }
 
-static int await_dma_not_busy(struct sniffer_local *lp)
+static int await_dma_not_busy(struct sniffer_dma_channel *chan)
 {
-	void __iomem *reg_adr = lp->regs + SNIFFER_DMA_STATUS_OFFSET;
+	void __iomem *reg_adr = chan->regs + SNIFFER_DMA_STATUS_OFFSET;
 	u32 reg_content;
 	u32 mask = SNIFFER_DMA_STATUS_BUSY_MASK | SNIFFER_DMA_STATUS_IRQ_MASK;
 
@@ -118,80 +139,150 @@ static int await_dma_not_busy(struct sniffer_local *lp)
 			!(reg_content & mask), 1, 20000);
 }
 
-static int sniffer_open(struct inode *inode, struct file *file)
+/*
+ * start_macs - Enable the MACs for the first open channel
+ *
+ * The MACs are shared by all DMA channels, they are started when the first
+ * channel is opened and stopped when the last one is closed.
+ */
+static int start_macs(struct sniffer_local *lp)
 {
 	void __iomem *reg_adr;
-	struct sniffer_local *lp;
 	u32 reg_content;
-	int ret;
 	struct phy_device *phydev;
 	int i;
 
-	lp = container_of(file->private_data, struct sniffer_local, misc_dev);
+	mutex_lock(&lp->mac_lock);
 
-	if (!mutex_trylock(&lp->running)) {
-		dev_err(lp->dev, "Opening more than one device is illegal");
-		return -EBUSY;
+	if (lp->mac_users++) {
+		mutex_unlock(&lp->mac_lock);
+		return 0;
 	}
 
-	dev_dbg(lp->dev, "Starting...\n");
-
-	dev_dbg(lp->dev, "Preparing MAC status address...\n");
-	reg_adr = lp->regs + SNIFFER_MAC_STATUS_OFFSET;
 	dev_dbg(lp->dev, "Reading MAC status regs...\n");
+	reg_adr = lp->regs + SNIFFER_MAC_STATUS_OFFSET;
 	reg_content = sniffer_ior(reg_adr);
 
 	dev_dbg(lp->dev, "Read 0x%08x\n from address 0x%08x\n", reg_content, (u32) reg_adr);
 	dev_dbg(lp->dev, "Checking whether buffers are ready...\n");
 	if (!(reg_content & SNIFFER_MAC_STATUS_BUFFERS_EMPTY_MASK)) {
 		dev_warn(lp->dev, "Device not yet ready (buffers not empty)\n");
+		lp->mac_users--;
+		mutex_unlock(&lp->mac_lock);
 		return -EAGAIN;
 	}
 
-	dev_dbg(lp->dev, "Set running...\n");
+	dev_dbg(lp->dev, "Enabling MACs...\n");
+
+	reset_macs(lp);
+	enable_macs(lp);
+
+	if (lp->powerdown) {
+		dev_dbg(lp->dev, "Powering up PHYs...\n");
+		for (i = 0; i < SNIFFER_MDIO_BUS_COUNT; i++) {
+			phydev = lp->phydev[i];
+			phy_resume(phydev);
+		}
+	}
+
+	mutex_unlock(&lp->mac_lock);
+
+	return 0;
+}
+
+static int stop_macs(struct sniffer_local *lp)
+{
+	struct phy_device *phydev;
+	int ret = 0;
+	int i;
+
+	mutex_lock(&lp->mac_lock);
+
+	if (--lp->mac_users) {
+		mutex_unlock(&lp->mac_lock);
+		return 0;
+	}
+
+	disable_macs(lp);
+
+	ret = await_mac_not_busy(lp);
+	if (ret)
+		dev_warn(lp->dev, "MAC is still busy...\n");
+
+	for (i = 0; i < SNIFFER_MDIO_BUS_COUNT; i++) {
+		phydev = lp->phydev[i];
+		if (lp->powerdown) {
+			phy_suspend(phydev);
+		}
+	}
+
+	mutex_unlock(&lp->mac_lock);
+
+	return ret;
+}
+
+static int sniffer_open(struct inode *inode, struct file *file)
+{
+	struct sniffer_dma_channel *chan;
+	struct sniffer_local *lp;
+	int ret;
+
+	chan = container_of(file->private_data, struct sniffer_dma_channel, misc_dev);
+	lp = chan->lp;
+
+	if (!mutex_trylock(&chan->running)) {
+		dev_err(lp->dev, "Opening more than one device is illegal");
+		return -EBUSY;
+	}
+
+	// the ring is reset below, which would hand these buffers to the DMA
+	if (sniffer_splice_busy(chan)) {
+		dev_err(lp->dev, "%s: a pipe still holds buffers of the last splice()\n", chan->name);
+		mutex_unlock(&chan->running);
+		return -EBUSY;
+	}
+
+	dev_dbg(lp->dev, "Starting %s...\n", chan->name);
 
 	dev_dbg(lp->dev, "Disabling DMA...\n");
-	disable_dma(lp);
+	disable_dma(chan);
 
 	dev_dbg(lp->dev, "Waiting for DMA...\n");
-	ret = await_dma_not_busy(lp);
+	ret = await_dma_not_busy(chan);
 	if (ret) {
 		dev_err(lp->dev, "Waiting for DMA takes too long...\n");
-		mutex_unlock(&lp->running);
+		mutex_unlock(&chan->running);
 		return ret;
 	}
 
+	// the IRQ thread must not touch the descriptors anymore
+	synchronize_irq(chan->irq);
+
 	dev_dbg(lp->dev, "Reset DMA...");
-	reset_dma(lp);
+	reset_dma(chan);
 
 	dev_dbg(lp->dev, "Await resetting DMA...");
-	ret = await_reset_dma(lp);
+	ret = await_reset_dma(chan);
 	if (ret) {
 		dev_err(lp->dev, "Resetting DMA takes too long...\n");
-		mutex_unlock(&lp->running);
+		mutex_unlock(&chan->running);
 		return ret;
 	}
 
 	dev_dbg(lp->dev, "Preparing DMA...\n");
-	ret = prepare_dma_descriptor_ring(lp);
+	ret = prepare_dma_descriptor_ring(chan);
 	if (ret) {
-		mutex_unlock(&lp->running);
+		mutex_unlock(&chan->running);
 		return ret;
 	}
 
 	dev_dbg(lp->dev, "Enabling DMA...\n");
-	enable_dma(lp);
-	dev_dbg(lp->dev, "Enabling MACs...\n");
+	enable_dma(chan);
 
-	reset_macs(lp);
-	enable_macs(lp);
-
-	if (lp->powerdown) {
-		dev_dbg(lp->dev, "Powering up PHYs...\n");
-		for (i = 0; i < SNIFFER_MDIO_BUS_COUNT; i++) {
-			phydev = lp->phydev[i];
-			phy_resume(phydev);
-		}
+	ret = start_macs(lp);
+	if (ret) {
+		mutex_unlock(&chan->running);
+		return ret;
 	}
 
 	dev_dbg(lp->dev, "Successfully started sniffing!\n");
@@ -201,123 +292,369 @@ static int sniffer_open(struct inode *inode, struct file *file)
 
 static int sniffer_close(struct inode *inode, struct file *file)
 {
+	struct sniffer_dma_channel *chan;
 	struct sniffer_local *lp;
-	int i;
-	int ret;
-	struct phy_device *phydev;
+	int mac_ret, ret;
 
-	lp = container_of(file->private_data, struct sniffer_local, misc_dev);
+	chan = container_of(file->private_data, struct sniffer_dma_channel, misc_dev);
+	lp = chan->lp;
 
-	dev_info(lp->dev, "data_head=%u, data_tail=%u\n", lp->data_head, lp->data_tail);
+	dev_info(lp->dev, "%s: data_head=%u, data_tail=%u\n", chan->name,
+		 chan->data_head, chan->data_tail);
 
-	disable_macs(lp);
+	mac_ret = stop_macs(lp);
 
-	disable_dma(lp);
+	disable_dma(chan);
 
-	await_dma_not_busy(lp);
-	ret = fill_dummy_dma_descriptor(lp);
+	await_dma_not_busy(chan);
+	synchronize_irq(chan->irq);
+	cancel_delayed_work_sync(&chan->refill_work);
+	ret = fill_dummy_dma_descriptor(chan);
 	if (ret) {
 		dev_err(lp->dev, "Unable to fill dummy dma descriptor\n");
 		return ret;
 	}
 
-	enable_dma(lp);
+	enable_dma(chan);
 
-	ret = await_mac_not_busy(lp);
-	if (ret) {
-		dev_warn(lp->dev, "MAC is still busy...\n");
-		return ret;
-	}
+	mutex_unlock(&chan->running);
 
-	for (i = 0; i < SNIFFER_MDIO_BUS_COUNT; i++) {
-		phydev = lp->phydev[i];
-		if (lp->powerdown) {
-			phy_suspend(phydev);
-		}
-	}
+	return mac_ret;
+}
 
-	mutex_unlock(&lp->running);
+static unsigned int get_data_count(struct sniffer_dma_channel *chan)
+{
+	unsigned int head = smp_load_acquire(&chan->data_head);
+	unsigned int tail = chan->data_tail;
 
-	return 0;
+	return CIRC_CNT(head, tail, chan->buf_size);
 }
 
-static unsigned int get_data_count(struct sniffer_local *lp)
+static bool is_data_empty(struct sniffer_dma_channel *chan)
 {
-	unsigned int head = smp_load_acquire(&lp->data_head);
-	unsigned int tail = lp->data_tail;
+	return get_data_count(chan) == 0;
+}
 
-	return CIRC_CNT(head, tail, lp->buf_size);
+static bool is_data_available(struct sniffer_dma_channel *chan)
+{
+	return get_data_count(chan) >= 1;
 }
 
-static bool is_data_empty(struct sniffer_local *lp)
+/*
+ * is_mmap_data_available - Buffers in [tail, head) of the mapped ring
+ *
+ * Userspace advances the tail in the control area, data_tail is unused then.
+ */
+static bool is_mmap_data_available(struct sniffer_dma_channel *chan)
 {
-	return get_data_count(lp) == 0;
+	unsigned int head = smp_load_acquire(&chan->data_head);
+
+	return CIRC_CNT(head, sniffer_get_data_tail(chan), chan->buf_size) >= 1;
 }
 
-static bool is_data_available(struct sniffer_local *lp)
+/*
+ * get_records_span - Bytes of all complete records fitting into count
+ *
+ * Walks the record headers of the buffer starting at offset i, which has to
+ * be at a record boundary.
+ */
+static u32 get_records_span(u8 *payload, u32 length, u32 i, size_t count)
 {
-	return get_data_count(lp) >= 1;
+	u32 end = i;
+	u32 rec_end;
+
+	while (end < length) {
+		rec_end = end + 16 + le32_to_cpup(((__le32 *) (payload + end)) + 2);
+		if (rec_end > length) // never split a buffer at a bogus header
+			rec_end = length;
+
+		if (rec_end - i > count)
+			break;
+
+		end = rec_end;
+	}
+
+	return end - i;
+}
+
+/*
+ * clear_records_seq - Turn the record headers of a buffer into PCAP ones
+ *
+ * Clears port and sequence number in the upper half of orig_len, they are
+ * only passed on to consumers of the mapped ring.
+ */
+static void clear_records_seq(u8 *payload, u32 length)
+{
+	u32 i = 0;
+
+	while (i + SNIFFER_REC_HEADER_LEN <= length) {
+		payload[i + 14] = 0;
+		payload[i + 15] = 0;
+		i += SNIFFER_REC_HEADER_LEN + le32_to_cpup(((__le32 *) (payload + i)) + 2);
+	}
 }
 
 static ssize_t sniffer_read (struct file *filp, char __user *ubuf, size_t count, loff_t *off)
 {
 	int ret = 0;
-	unsigned int i = 0;
 
-	struct sniffer_local *lp;
-	unsigned int error_count, remaining_bytes;
-	u32 length;
+	struct sniffer_dma_channel *chan;
+	unsigned int error_count;
+	size_t copied = 0;
+	u32 length, n;
 	u8 *payload;
-	unsigned int data_ptr;
 
-	lp = container_of(filp->private_data, struct sniffer_local, misc_dev);
+	chan = container_of(filp->private_data, struct sniffer_dma_channel, misc_dev);
+
+	if (READ_ONCE(chan->mmapped))
+		return -EBUSY;
 
-	if (lp->rd_error) {
-		ret = lp->rd_error;
-		lp->rd_error = 0;
+	if (chan->rd_error) {
+		ret = chan->rd_error;
+		chan->rd_error = 0;
 		return ret;
 	}
 
-	if (!lp->i) { // the previous packet was read completely...
-		ret = wait_event_interruptible(lp->queue, is_data_available(lp));
+	if (!chan->i) { // the previous packet was read completely...
+		if ((filp->f_flags & O_NONBLOCK) && !is_data_available(chan))
+			return -EAGAIN;
+
+		ret = wait_event_interruptible(chan->queue, is_data_available(chan));
 
 		if (ret) // usually an interrupt occurred
 			return ret;
 	}
 
-	data_ptr = lp->data_tail << DMA_BUF_SIZE_LD;
-	payload = lp->buf + data_ptr;
-	length = le32_to_cpup(((__le32 *) payload) + 3);
-	length += 16; // add header length
-	remaining_bytes = length - lp->i;
-
-	// does the data completely fit into the buffer?
-	if (count < remaining_bytes) {
-		error_count = copy_to_user(ubuf, payload + lp->i, count);
-		lp->i = lp->i + count;
+	/*
+	 * Copy as many complete records as available and fitting into the user
+	 * buffer. Only if not even the first record fits, it is copied partially
+	 * and the remainder is returned by the following calls.
+	 */
+	while (copied < count && is_data_available(chan)) {
+		payload = sniffer_get_buf(chan, chan->data_tail);
+		length = sniffer_get_buf_len(chan, chan->data_tail);
+
+		if (!chan->i)
+			clear_records_seq(payload, length);
+
+		if (chan->rec_left) {
+			// finish the partially read record
+			n = min_t(size_t, chan->rec_left, count - copied);
+		} else {
+			n = get_records_span(payload, length, chan->i, count - copied);
+
+			if (!n) {
+				if (copied) // the next record does not fit anymore
+					break;
+
+				// not even a single record fits, copy it partially
+				chan->rec_left = min(length - chan->i, 16 +
+					le32_to_cpup(((__le32 *) (payload + chan->i)) + 2));
+				n = count;
+			}
+		}
 
+		error_count = copy_to_user(ubuf + copied, payload + chan->i, n);
 		if (error_count) {
-			lp->rd_error = EIO;
-			return count - error_count;
+			chan->rd_error = -EIO;
+			n -= error_count;
 		}
-	} else {
-		error_count = copy_to_user(ubuf, payload + lp->i, remaining_bytes);
-		count = remaining_bytes - error_count;
-		lp->i = 0;
 
-		if (error_count) {
-			lp->rd_error = EIO;
-			return count;
+		chan->i += n;
+		copied += n;
+		if (chan->rec_left)
+			chan->rec_left -= n;
+
+		if (chan->i >= length) {
+			chan->i = 0;
+			chan->rec_left = 0;
+
+			// release buffer
+			smp_store_release(&chan->data_tail,
+					  (chan->data_tail + 1) & (chan->buf_size - 1));
 		}
 
-		// release buffer
-		smp_store_release(&lp->data_tail,
-				  (lp->data_tail + 1) & (lp->buf_size - 1));
-		// TODO: run a workqueue in case the descriptor buffer is full
+		if (error_count || chan->rec_left)
+			break;
+	}
+
+	if (!copied && chan->rd_error) {
+		ret = chan->rd_error;
+		chan->rd_error = 0;
+		return ret;
 	}
 
+	return copied;
+}
+
+static void sniffer_pipe_buf_release(struct pipe_inode_info *pipe, struct pipe_buffer *buf)
+{
+	atomic_t *refs = (atomic_t *) buf->private;
 
-	return count;
+	put_page(buf->page);
+	if (atomic_dec_and_test(refs))
+		wake_up_var(refs);
+}
+
+static bool sniffer_pipe_buf_get(struct pipe_inode_info *pipe, struct pipe_buffer *buf)
+{
+	if (!generic_pipe_buf_get(pipe, buf))
+		return false;
+
+	atomic_inc((atomic_t *) buf->private);
+	return true;
+}
+
+/* pipe buffers referring to a DMA buffer, counted in chan->splice_refs */
+static const struct pipe_buf_operations sniffer_pipe_buf_ops = {
+	.release = sniffer_pipe_buf_release,
+	.get = sniffer_pipe_buf_get,
+};
+
+/*
+ * Like read(), but the bytes are not copied: the pipe buffers refer to the
+ * pages of the DMA buffers, each of them holding back its DMA buffer from
+ * being refilled until it is released. Records may be split between calls,
+ * the pipe carries a plain byte stream.
+ */
+static ssize_t sniffer_splice_read(struct file *filp, loff_t *ppos, struct pipe_inode_info *pipe,
+				   size_t len, unsigned int flags)
+{
+	struct sniffer_dma_channel *chan;
+	struct pipe_buffer buf;
+	size_t spliced = 0;
+	u32 length, n;
+	size_t off;
+	int ret = 0;
+
+	chan = container_of(filp->private_data, struct sniffer_dma_channel, misc_dev);
+
+	if (READ_ONCE(chan->mmapped))
+		return -EBUSY;
+
+	if (chan->rd_error) {
+		ret = chan->rd_error;
+		chan->rd_error = 0;
+		return ret;
+	}
+
+	if (!is_data_available(chan)) {
+		if ((filp->f_flags & O_NONBLOCK) || (flags & SPLICE_F_NONBLOCK))
+			return -EAGAIN;
+
+		ret = wait_event_interruptible(chan->queue, is_data_available(chan));
+		if (ret)
+			return ret;
+	}
+
+	while (spliced < len && is_data_available(chan) &&
+	       !pipe_full(pipe->head, pipe->tail, pipe->max_usage)) {
+		length = sniffer_get_buf_len(chan, chan->data_tail);
+
+		if (!chan->i)
+			clear_records_seq(sniffer_get_buf(chan, chan->data_tail), length);
+
+		// a pipe buffer ends at the end of its page
+		off = ((size_t) chan->data_tail << chan->buf_size_ld) + chan->i;
+		n = min_t(size_t, length - chan->i,
+			  min_t(size_t, len - spliced, PAGE_SIZE - offset_in_page(off)));
+
+		buf = (struct pipe_buffer) {
+			.page = sniffer_get_buf_page(chan, off),
+			.offset = offset_in_page(off),
+			.len = n,
+			.ops = &sniffer_pipe_buf_ops,
+			.private = (unsigned long) &chan->splice_refs[chan->data_tail],
+		};
+		get_page(buf.page);
+		atomic_inc(&chan->splice_refs[chan->data_tail]);
+
+		ret = add_to_pipe(pipe, &buf);
+		if (ret < 0)
+			break;
+
+		chan->i += n;
+		spliced += n;
+		chan->rec_left -= min(chan->rec_left, n);
+
+		if (chan->i >= length) {
+			chan->i = 0;
+			chan->rec_left = 0;
+
+			// the DMA gets it back once the pipe released it
+			smp_store_release(&chan->data_tail,
+					  (chan->data_tail + 1) & (chan->buf_size - 1));
+		}
+	}
+
+	return spliced ? spliced : ret;
+}
+
+static __poll_t sniffer_poll(struct file *filp, poll_table *wait)
+{
+	struct sniffer_dma_channel *chan;
+	bool available;
+
+	chan = container_of(filp->private_data, struct sniffer_dma_channel, misc_dev);
+
+	poll_wait(filp, &chan->queue, wait);
+
+	if (READ_ONCE(chan->mmapped))
+		available = is_mmap_data_available(chan);
+	else
+		available = chan->rd_error || is_data_available(chan);
+
+	return available ? EPOLLIN | EPOLLRDNORM : 0;
+}
+
+static int sniffer_mmap(struct file *filp, struct vm_area_struct *vma)
+{
+	struct sniffer_dma_channel *chan;
+	unsigned long size = vma->vm_end - vma->vm_start;
+	unsigned long data_pgoff;
+	int ret;
+
+	chan = container_of(filp->private_data, struct sniffer_dma_channel, misc_dev);
+	data_pgoff = chan->mmap_ctrl_size >> PAGE_SHIFT;
+
+	if (vma->vm_pgoff == 0) {
+		// control area
+		if (size > chan->mmap_ctrl_size)
+			return -EINVAL;
+
+		ret = remap_vmalloc_range(vma, chan->mmap_ctrl, 0);
+	} else if (vma->vm_pgoff >= data_pgoff) {
+		// DMA buffers
+		if (vma->vm_flags & VM_WRITE)
+			return -EPERM;
+
+		vma->vm_flags &= ~VM_MAYWRITE;
+		vma->vm_pgoff -= data_pgoff;
+		if (chan->cached) { // synced by the driver when handed over
+			if (vma->vm_pgoff + vma_pages(vma) >
+			    ((size_t) chan->buf_size << chan->buf_size_ld) >> PAGE_SHIFT)
+				return -EINVAL;
+
+			ret = remap_pfn_range(vma, vma->vm_start,
+					      page_to_pfn(virt_to_page(chan->buf)) + vma->vm_pgoff,
+					      size, vma->vm_page_prot);
+		} else
+			ret = dma_mmap_coherent(chan->lp->dev, vma, chan->buf, chan->dma_handle,
+						(size_t) chan->buf_size << chan->buf_size_ld);
+	} else {
+		return -EINVAL;
+	}
+
+	if (ret)
+		return ret;
+
+	// from now on, the tail is advanced by userspace
+	if (!chan->mmapped) {
+		WRITE_ONCE(chan->mmap_ctrl->tail, chan->data_tail);
+		smp_store_release(&chan->mmapped, true);
+	}
+
+	return 0;
 }
 
 static ssize_t sniffer_write (struct file *filp, const char __user *ubuf, size_t count, loff_t *off)
@@ -330,21 +667,64 @@ static loff_t sniffer_llseek (struct file *file, loff_t offset, int whence)
 	return -ENOSYS; // Function not implemented
 }
 
+static long sniffer_ioctl(struct file *file, unsigned int cmd, unsigned long arg)
+{
+	struct sniffer_dma_channel *chan = container_of(file->private_data, struct sniffer_dma_channel, misc_dev);
+	struct sniffer_local *lp = chan->lp;
+	void __user *argp = (void __user *) arg;
+	struct sniffer_time time;
+	s32 ppb;
+
+	switch (cmd) {
+	case SNIFFER_IOC_SET_TIME:
+		if (copy_from_user(&time, argp, sizeof(time)))
+			return -EFAULT;
+		return sniffer_clock_set_time(lp, time.sec, time.nsec);
+	case SNIFFER_IOC_GET_TIME:
+		sniffer_clock_get_time(lp, &time.sec, &time.nsec);
+		if (copy_to_user(argp, &time, sizeof(time)))
+			return -EFAULT;
+		return 0;
+	case SNIFFER_IOC_SET_PPB:
+		if (get_user(ppb, (s32 __user *) argp))
+			return -EFAULT;
+		return sniffer_clock_set_ppb(lp, ppb);
+	case SNIFFER_IOC_GET_PPB:
+		return put_user(sniffer_clock_get_ppb(lp), (s32 __user *) argp);
+	default:
+		return -ENOTTY;
+	}
+}
+
 const struct file_operations sniffer_fops = {
 	.owner = THIS_MODULE,
 	.open = sniffer_open,
 	.release = sniffer_close,
 	.read = sniffer_read,
+	.poll = sniffer_poll,
+	.splice_read = sniffer_splice_read,
+	.mmap = sniffer_mmap,
 	.write = sniffer_write,
 	.llseek = sniffer_llseek,
+	.unlocked_ioctl = sniffer_ioctl,
+	.compat_ioctl = compat_ptr_ioctl,
 };
 
 
-int sniffer_setup_miscdevice(struct sniffer_local *lp)
+/*
+ * A single channel is /dev/sniffer, with a channel per port the devices are
+ * named after the ports, /dev/sniffer1 and /dev/sniffer2.
+ */
+int sniffer_setup_miscdevice(struct sniffer_dma_channel *chan)
 {
-	lp->misc_dev.minor = MISC_DYNAMIC_MINOR;
-	lp->misc_dev.name = "sniffer";
-	lp->misc_dev.fops = &sniffer_fops;
-	lp->misc_dev.parent = lp->dev;
-	return misc_register(&lp->misc_dev);
+	if (chan->lp->chan_count > 1)
+		snprintf(chan->name, sizeof(chan->name), "sniffer%u", chan->index + 1);
+	else
+		strscpy(chan->name, "sniffer", sizeof(chan->name));
+
+	chan->misc_dev.minor = MISC_DYNAMIC_MINOR;
+	chan->misc_dev.name = chan->name;
+	chan->misc_dev.fops = &sniffer_fops;
+	chan->misc_dev.parent = chan->lp->dev;
+	return misc_register(&chan->misc_dev);
 }
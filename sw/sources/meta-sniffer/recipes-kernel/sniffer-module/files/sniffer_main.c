@@ -15,38 +15,69 @@
 #include <linux/of_reserved_mem.h>
 #include <linux/of_address.h>
 #include <linux/circ_buf.h>
+#include <linux/log2.h>
+#include <linux/moduleparam.h>
+#include <linux/vmalloc.h>
+#include <linux/delay.h>
+#include <linux/math64.h>
 
 #include "sniffer.h"
 
-static int setup_dummy_buf(struct sniffer_local *lp)
+static bool packed;
+module_param(packed, bool, 0444);
+MODULE_PARM_DESC(packed, "Pack multiple records into each DMA buffer");
+
+static bool cached;
+module_param(cached, bool, 0444);
+MODULE_PARM_DESC(cached,
+		 "Map the DMA buffers cacheable and sync each buffer handed over, instead of uncached");
+
+static unsigned int pack_timeout_us = 1000;
+module_param(pack_timeout_us, uint, 0644);
+MODULE_PARM_DESC(pack_timeout_us,
+		 "Time in us after which a partially filled DMA buffer is handed over (packed mode, at most 30 s)");
+
+static unsigned int poll_budget = 256;
+module_param(poll_budget, uint, 0644);
+MODULE_PARM_DESC(poll_budget,
+		 "Descriptors processed by the IRQ thread before it sleeps for poll_interval_us");
+
+static unsigned int poll_interval_us = 50;
+module_param(poll_interval_us, uint, 0644);
+MODULE_PARM_DESC(poll_interval_us,
+		 "Time in us the IRQ thread sleeps under load, with the interrupt masked");
+
+static void refill_work_handler(struct work_struct *work);
+
+static int setup_dummy_buf(struct sniffer_dma_channel *chan)
 {
-	lp->dummy_buf = kmalloc(DMA_BUF_SIZE, GFP_KERNEL);
-	lp->dummy_dma_handle = dma_map_single(lp->dev, lp->dummy_buf,
+	chan->dummy_buf = kmalloc(DMA_BUF_SIZE, GFP_KERNEL);
+	chan->dummy_dma_handle = dma_map_single(chan->lp->dev, chan->dummy_buf,
 			DMA_BUF_SIZE, DMA_FROM_DEVICE);
 
-	if (dma_mapping_error(lp->dev, lp->dma_handle)) {
-		dev_err(lp->dev, "Unable to map DMA");
+	if (dma_mapping_error(chan->lp->dev, chan->dma_handle)) {
+		dev_err(chan->lp->dev, "Unable to map DMA");
 		return -ENOMEM;
 	}
 
 	return 0;
 }
 
-int fill_dummy_dma_descriptor(struct sniffer_local *lp) {
+int fill_dummy_dma_descriptor(struct sniffer_dma_channel *chan) {
 	const unsigned int dma_desc_ring_size = DMA_DESC_RING_SIZE;
 	struct sniffer_dma_descriptor *dma_desc;
 	dma_addr_t dma_handle;
 	unsigned int i;
 	unsigned int ret;
 
-	ret = setup_dummy_buf(lp);
+	ret = setup_dummy_buf(chan);
 	if (ret) {
 		return ret;
 	}
 
 	for (i = 0; i < dma_desc_ring_size; i++) {
-		dma_desc = lp->dma_desc + i;
-		dma_desc->buf_addr = lp->dummy_dma_handle;
+		dma_desc = chan->dma_desc + i;
+		dma_desc->buf_addr = chan->dummy_dma_handle;
 		dma_desc->buf_len = DMA_BUF_SIZE;
 		dma_desc->flags = SNIFFER_DMA_DESC_FLAG_EMPTY;
 	}
@@ -55,30 +86,146 @@ int fill_dummy_dma_descriptor(struct sniffer_local *lp) {
 	return 0;
 }
 
-void init_descriptor_pointers(struct sniffer_local *lp) {
+void init_descriptor_pointers(struct sniffer_dma_channel *chan) {
 	int i;
 
-	lp->desc_tail = 0;
-	lp->data_tail = 0;
-	lp->data_head = 0;
-	lp->data_desc_head = 0;
-	lp->dma_count = 0;
+	chan->desc_tail = 0;
+	chan->data_tail = 0;
+	chan->data_head = 0;
+	chan->data_desc_head = 0;
+	chan->dma_count = 0;
+	chan->desc_refilled = 0;
+
+	chan->release_tail = 0;
+	chan->mmapped = false;
+	WRITE_ONCE(chan->mmap_ctrl->head, 0);
+	WRITE_ONCE(chan->mmap_ctrl->tail, 0);
 
-	lp->i = 0;
+	chan->i = 0;
+	chan->rec_left = 0;
 }
 
-static int sniffer_dma_setup(struct sniffer_local *lp)
+static const unsigned int sniffer_dma_offsets[SNIFFER_DMA_CHANNEL_MAX] = {
+	SNIFFER_DMA_OFFSET, SNIFFER_DMA2_OFFSET
+};
+
+static const unsigned int sniffer_dma_desc_offsets[SNIFFER_DMA_CHANNEL_MAX] = {
+	SNIFFER_DMA_DESC_OFFSET, SNIFFER_DMA2_DESC_OFFSET
+};
+
+static void sniffer_free_bufs(struct sniffer_dma_channel *chan)
+{
+	size_t size = (size_t) chan->buf_size << chan->buf_size_ld;
+
+	if (chan->cached)
+		dma_free_attrs(chan->lp->dev, size, chan->buf_cookie, chan->dma_handle,
+			       DMA_ATTR_NO_KERNEL_MAPPING);
+	else
+		dma_free_coherent(chan->lp->dev, size, chan->buf, chan->dma_handle);
+}
+
+/*
+ * Allocate the DMA buffers of a channel from the reserved memory, a CMA pool
+ * in the lowmem. Coherent buffers are remapped uncached on the Zynq, so every
+ * access of the reader goes to the DDR. Cached ones get no mapping of their
+ * own and are accessed through the cacheable linear mapping instead, which
+ * the driver syncs per buffer.
+ */
+static int sniffer_alloc_bufs(struct sniffer_dma_channel *chan)
 {
-	const u32 size = DMA_BUF_SIZE;
+	struct device *dev = chan->lp->dev;
+	size_t size = (size_t) chan->buf_size << chan->buf_size_ld;
+
+	if (!chan->cached) {
+		chan->buf = dma_alloc_coherent(dev, size, &chan->dma_handle, GFP_KERNEL);
+		return chan->buf ? 0 : -ENOMEM;
+	}
 
+	chan->buf_cookie = dma_alloc_attrs(dev, size, &chan->dma_handle, GFP_KERNEL,
+					   DMA_ATTR_NO_KERNEL_MAPPING);
+	if (!chan->buf_cookie)
+		return -ENOMEM;
+
+	if (PageHighMem(sniffer_get_buf_page(chan, size - 1))) {
+		dev_err(dev, "Reserved memory beyond the lowmem, cached buffers not possible\n");
+		sniffer_free_bufs(chan);
+		return -EINVAL;
+	}
+
+	chan->buf = page_address(sniffer_get_buf_page(chan, 0));
+
+	return 0;
+}
+
+/*
+ * Set up a DMA channel with its share of the reserved memory, which starts at
+ * the bus address start and spans size bytes.
+ */
+static int sniffer_dma_channel_setup(struct sniffer_dma_channel *chan,
+				     dma_addr_t start, resource_size_t size)
+{
+	struct sniffer_local *lp = chan->lp;
 	int ret;
-	int i;
-	struct device_node *np;
-	struct resource r;
 
-	init_waitqueue_head(&lp->queue);
+	mutex_init(&chan->running);
+	init_waitqueue_head(&chan->queue);
+	spin_lock_init(&chan->refill_lock);
+	spin_lock_init(&chan->ctrl_lock);
+	INIT_DELAYED_WORK(&chan->refill_work, refill_work_handler);
+
+	chan->regs = lp->regs + sniffer_dma_offsets[chan->index];
+	chan->dma_desc = lp->regs + sniffer_dma_desc_offsets[chan->index];
+
+	chan->packed = packed;
+	chan->buf_size_ld = packed ? DMA_PACKED_BUF_SIZE_LD : DMA_BUF_SIZE_LD;
+
+	// the ring pointers wrap with a mask
+	chan->buf_size = rounddown_pow_of_two(size >> chan->buf_size_ld);
+
+	chan->cached = cached;
+	chan->dma_handle = start;
+	ret = sniffer_alloc_bufs(chan);
+	if (ret)
+		return ret;
+
+	// control area of the mmap interface, also holds the fill levels
+	chan->mmap_ctrl_size = PAGE_ALIGN(struct_size(chan->mmap_ctrl, buf_len,
+					  chan->packed ? chan->buf_size : 0));
+	chan->mmap_ctrl = vmalloc_user(chan->mmap_ctrl_size);
+	if (!chan->mmap_ctrl)
+		return -ENOMEM;
+
+	chan->mmap_ctrl->version = SNIFFER_MMAP_VERSION;
+	chan->mmap_ctrl->flags = chan->packed ? SNIFFER_MMAP_FLAG_PACKED : 0;
+	chan->mmap_ctrl->buf_size_ld = chan->buf_size_ld;
+	chan->mmap_ctrl->buf_count = chan->buf_size;
+	chan->mmap_ctrl->data_offset = chan->mmap_ctrl_size;
+
+	if (chan->packed)
+		chan->buf_fill = chan->mmap_ctrl->buf_len;
+
+	chan->splice_refs = kvcalloc(chan->buf_size, sizeof(*chan->splice_refs), GFP_KERNEL);
+	if (!chan->splice_refs)
+		return -ENOMEM;
+
+	fill_dummy_dma_descriptor(chan);
+
+	sniffer_update_dma_ctrl(chan, ~0,
+		SNIFFER_DMA_CTRL_IRQ_MASK | SNIFFER_DMA_CTRL_ENABLE_MASK);
+
+	return 0;
+}
 
-	lp->dma_desc = lp->regs + 0x1000;
+/*
+ * The reserved memory is split evenly between the DMA channels.
+ */
+static int sniffer_dma_setup(struct sniffer_local *lp)
+{
+	int ret;
+	unsigned int i;
+	struct device_node *np;
+	struct resource r;
+	resource_size_t size;
 
 	ret = of_reserved_mem_device_init(lp->dev);
 	if (ret) {
@@ -103,125 +250,282 @@ static int sniffer_dma_setup(struct sniffer_local *lp)
 		return ret;
 	}
 
-	lp->dma_handle = r.start;
-	lp->buf = dma_alloc_coherent(lp->dev, resource_size(&r), &lp->dma_handle, GFP_KERNEL);
-	lp->buf_size = resource_size(&r) >> DMA_BUF_SIZE_LD;
-
-	fill_dummy_dma_descriptor(lp);
+	size = resource_size(&r) / lp->chan_count;
 
-	sniffer_iow(lp->regs + SNIFFER_DMA_CTRL_OFFSET,
-		SNIFFER_DMA_CTRL_IRQ_MASK | SNIFFER_DMA_CTRL_ENABLE_MASK);
+	for (i = 0; i < lp->chan_count; i++) {
+		ret = sniffer_dma_channel_setup(&lp->chan[i], r.start + i * size, size);
+		if (ret) {
+			dev_err(lp->dev, "Unable to setup DMA channel %u\n", i);
+			return ret;
+		}
+	}
 
 	return 0;
 }
 
+/*
+ * Read-modify-write of the DMA control register, which is shared by the
+ * file operations, the IRQ handler masking the interrupt and its thread
+ * unmasking it.
+ */
+void sniffer_update_dma_ctrl(struct sniffer_dma_channel *chan, u32 clear, u32 set)
+{
+	void __iomem *reg_adr = chan->regs + SNIFFER_DMA_CTRL_OFFSET;
+	unsigned long flags;
+	u32 reg_content;
+
+	spin_lock_irqsave(&chan->ctrl_lock, flags);
+
+	reg_content = sniffer_ior(reg_adr);
+	sniffer_iow(reg_adr, (reg_content & ~clear) | set);
+
+	spin_unlock_irqrestore(&chan->ctrl_lock, flags);
+}
+
 
-int prepare_dma_descriptor_ring(struct sniffer_local *lp)
+int prepare_dma_descriptor_ring(struct sniffer_dma_channel *chan)
 {
 	const unsigned int dma_desc_ring_size = DMA_DESC_RING_SIZE;
-	u32 size = DMA_BUF_SIZE;
+	u32 size = 1 << chan->buf_size_ld;
+	u32 ctrl = SNIFFER_DMA_CTRL_IRQ_MASK | SNIFFER_DMA_CTRL_ENABLE_MASK;
 	dma_addr_t dma_handle;
 	unsigned int i;
 	struct sniffer_dma_descriptor *dma_desc;
 
 
-	init_descriptor_pointers(lp);
+	init_descriptor_pointers(chan);
 
-	dma_handle = lp->dma_handle + (lp->data_head << DMA_BUF_SIZE_LD);
+	dma_handle = chan->dma_handle + (chan->data_head << chan->buf_size_ld);
 	for (i = 0; i < dma_desc_ring_size; i++) {
-		dma_desc = lp->dma_desc + i;
+		sniffer_sync_buf_for_device(chan, chan->data_desc_head);
+
+		dma_desc = chan->dma_desc + i;
 		dma_desc->buf_addr = dma_handle;
 		dma_desc->buf_len = size;
 		WRITE_ONCE(dma_desc->flags, SNIFFER_DMA_DESC_FLAG_EMPTY);
 
-		lp->data_desc_head++;
-		dma_handle = lp->dma_handle + (lp->data_desc_head << DMA_BUF_SIZE_LD);
+		chan->data_desc_head++;
+		dma_handle = chan->dma_handle + (chan->data_desc_head << chan->buf_size_ld);
 	}
 
-	lp->desc_tail = 0;
+	chan->desc_tail = 0;
 
-	sniffer_iow(lp->regs + SNIFFER_DMA_CTRL_OFFSET,
-		SNIFFER_DMA_CTRL_IRQ_MASK | SNIFFER_DMA_CTRL_ENABLE_MASK);
+	if (chan->packed) {
+		// in AXI cycles, saturated to the 32 bit register (about 30 s)
+		sniffer_iow(chan->regs + SNIFFER_DMA_PACK_TIMEOUT_OFFSET,
+			    min_t(u64, div_u64((u64) pack_timeout_us * NSEC_PER_USEC,
+					       SNIFFER_AXI_CLK_PERIOD_NS), U32_MAX));
+		ctrl |= SNIFFER_DMA_CTRL_PACKED_MASK;
+	}
+
+	sniffer_update_dma_ctrl(chan, ~0, ctrl);
 
 	return 0;
 
 }
 
-static void running_irq(struct sniffer_local *lp) {
-	struct sniffer_dma_descriptor *dma_desc;
-	dma_addr_t dma_handle;
-	int full;
-	unsigned int dma_count;
-	unsigned int delta, free_space, i;
-	unsigned int tail, head;
+/*
+ * Buffers passed to a pipe by splice() must not be overwritten before the
+ * pipe released them, so the DMA only gets back the buffers in front of the
+ * first one still referred to.
+ */
+static unsigned int get_release_tail(struct sniffer_dma_channel *chan)
+{
+	unsigned int tail = sniffer_get_data_tail(chan);
 
-	head = lp->data_head;
+	while (chan->release_tail != tail &&
+	       !atomic_read(&chan->splice_refs[chan->release_tail]))
+		chan->release_tail = (chan->release_tail + 1) & (chan->buf_size - 1);
 
-	// check how many new entries arrived
-	dma_count = sniffer_get_dma_count(lp);
-	delta = dma_count - lp->dma_count;
-	lp->dma_count = dma_count;
+	return chan->release_tail;
+}
 
-	// allow reading new entries
-	head = (head + delta) & (lp->buf_size - 1);
-	smp_store_release(&lp->data_head, head);
-	wake_up_interruptible_sync(&lp->queue);
+/*
+ * Hand the buffers of all descriptors completed by the DMA back to it, as far
+ * as the reader released buffers. Descriptors which can not be refilled yet
+ * would stall the DMA without raising further interrupts, hence the refill
+ * is retried from a workqueue until the reader catches up.
+ */
+static void refill_dma_descriptors(struct sniffer_dma_channel *chan)
+{
+	struct sniffer_dma_descriptor *dma_desc;
+	dma_addr_t dma_handle;
+	unsigned int tail, free_space, i;
+	unsigned long flags;
+	bool pending;
 
-	tail = READ_ONCE(lp->data_tail);
+	spin_lock_irqsave(&chan->refill_lock, flags);
+
+	tail = get_release_tail(chan);
 
 	// fill as many descriptors as possible
-	free_space = min(CIRC_SPACE(lp->data_desc_head, tail, lp->buf_size), delta);
+	free_space = min(CIRC_SPACE(chan->data_desc_head, tail, chan->buf_size),
+			 chan->dma_count - chan->desc_refilled);
 
 	for (i = 0; i < free_space; i++) {
-		dma_desc = lp->dma_desc + lp->desc_tail;
+		dma_desc = chan->dma_desc + chan->desc_tail;
+
+		dma_handle = chan->dma_handle + ((chan->data_desc_head) << chan->buf_size_ld);
 
-		dma_handle = lp->dma_handle + ((lp->data_desc_head) << DMA_BUF_SIZE_LD);
+		sniffer_sync_buf_for_device(chan, chan->data_desc_head);
 
 		dma_desc->buf_addr = dma_handle;
-		dma_desc->buf_len = DMA_BUF_SIZE;
+		dma_desc->buf_len = 1 << chan->buf_size_ld;
 		WRITE_ONCE(dma_desc->flags, SNIFFER_DMA_DESC_FLAG_EMPTY);
 
-		lp->desc_tail = (lp->desc_tail + 1) & DMA_DESC_RING_MASK;
+		chan->desc_tail = (chan->desc_tail + 1) & DMA_DESC_RING_MASK;
+
+		chan->data_desc_head = (chan->data_desc_head + 1) & (chan->buf_size - 1);
+	}
+
+	chan->desc_refilled += free_space;
+	pending = chan->desc_refilled != chan->dma_count;
+
+	spin_unlock_irqrestore(&chan->refill_lock, flags);
+
+	if (pending)
+		schedule_delayed_work(&chan->refill_work, 1);
+}
+
+static void refill_work_handler(struct work_struct *work)
+{
+	struct sniffer_dma_channel *chan = container_of(to_delayed_work(work),
+						struct sniffer_dma_channel, refill_work);
+
+	refill_dma_descriptors(chan);
+}
+
+static unsigned int running_irq(struct sniffer_dma_channel *chan) {
+	struct sniffer_dma_descriptor *dma_desc;
+	unsigned int dma_count;
+	unsigned int delta, i;
+	unsigned int head, index;
+	u32 len;
+
+	head = chan->data_head;
 
-		lp->data_desc_head = (lp->data_desc_head + 1) & (lp->buf_size - 1);
+	// check how many new entries arrived
+	dma_count = sniffer_get_dma_count(chan);
+	delta = dma_count - chan->dma_count;
+
+	for (i = 0; i < delta; i++) {
+		index = (head + i) & (chan->buf_size - 1);
+		len = 1 << chan->buf_size_ld;
+
+		// save the fill level of packed buffers before their descriptors are reused
+		if (chan->packed) {
+			dma_desc = chan->dma_desc + ((chan->dma_count + i) & DMA_DESC_RING_MASK);
+			len = min_t(u32, READ_ONCE(dma_desc->buf_len), len);
+			chan->buf_fill[index] = len;
+		}
+
+		sniffer_sync_buf_for_cpu(chan, index, len);
 	}
 
+	chan->dma_count = dma_count;
+
+	// allow reading new entries
+	head = (head + delta) & (chan->buf_size - 1);
+	smp_store_release(&chan->data_head, head);
+	smp_store_release(&chan->mmap_ctrl->head, head);
+	wake_up_interruptible_sync(&chan->queue);
+
+	refill_dma_descriptors(chan);
+
+	return delta;
 }
 
-static void idle_irq(struct sniffer_local *lp) {
+static unsigned int idle_irq(struct sniffer_dma_channel *chan) {
 	struct sniffer_dma_descriptor *dma_desc;
+	unsigned int count = 0;
 
-	dma_desc = lp->dma_desc + lp->desc_tail;
+	dma_desc = chan->dma_desc + chan->desc_tail;
 
 	while (!(dma_desc->flags & SNIFFER_DMA_DESC_FLAG_EMPTY)) {
 		dma_desc->buf_len = DMA_BUF_SIZE;
 		dma_desc->flags = SNIFFER_DMA_DESC_FLAG_EMPTY;
 
-		lp->desc_tail = (lp->desc_tail + 1) & DMA_DESC_RING_MASK;
-		dma_desc = lp->dma_desc + lp->desc_tail;
+		chan->desc_tail = (chan->desc_tail + 1) & DMA_DESC_RING_MASK;
+		dma_desc = chan->dma_desc + chan->desc_tail;
+		count++;
 	}
+
+	return count;
+}
+
+/*
+ * sniffer_poll_ring - Process the completed descriptors
+ *
+ * Returns the number of descriptors processed.
+ */
+static unsigned int sniffer_poll_ring(struct sniffer_dma_channel *chan)
+{
+	if (mutex_is_locked(&chan->running))
+		return running_irq(chan);
+
+	return idle_irq(chan);
+}
+
+static bool sniffer_poll_pending(struct sniffer_dma_channel *chan)
+{
+	struct sniffer_dma_descriptor *dma_desc;
+
+	if (mutex_is_locked(&chan->running))
+		return sniffer_get_dma_count(chan) != chan->dma_count;
+
+	dma_desc = chan->dma_desc + chan->desc_tail;
+	return !(READ_ONCE(dma_desc->flags) & SNIFFER_DMA_DESC_FLAG_EMPTY);
 }
 
 static irqreturn_t sniffer_irq(int irq, void *dev_id)
 {
-	struct sniffer_local *lp = dev_id;
+	struct sniffer_dma_channel *chan = dev_id;
 
 	u32 reg;
 	bool triggered;
 
-	reg = sniffer_ior(lp->regs + SNIFFER_DMA_STATUS_OFFSET);
+	reg = sniffer_ior(chan->regs + SNIFFER_DMA_STATUS_OFFSET);
 	triggered = reg & SNIFFER_DMA_STATUS_IRQ_MASK;
 
 	if (!(triggered & 0x1)) // something else triggered the IRQ
 		return IRQ_NONE;
 
-	// reset IRQ
-	sniffer_iow(lp->regs + SNIFFER_DMA_STATUS_OFFSET, reg);
+	// mask and reset IRQ, the thread polls until the ring is drained
+	sniffer_update_dma_ctrl(chan, SNIFFER_DMA_CTRL_IRQ_MASK, 0);
+	sniffer_iow(chan->regs + SNIFFER_DMA_STATUS_OFFSET, reg);
+
+	return IRQ_WAKE_THREAD;
+}
+
+/*
+ * NAPI-like poll loop: with the interrupt masked, poll the packet count of
+ * the DMA until no further descriptors are completed. Under sustained load
+ * the thread sleeps after poll_budget descriptors, so it does not starve the
+ * reader, while the DMA continues on the remaining descriptors.
+ */
+static irqreturn_t sniffer_irq_thread(int irq, void *dev_id)
+{
+	struct sniffer_dma_channel *chan = dev_id;
+	unsigned int processed = 0;
+	unsigned int n;
+
+	for (;;) {
+		while ((n = sniffer_poll_ring(chan))) {
+			processed += n;
+
+			if (processed >= poll_budget) {
+				processed = 0;
+				usleep_range(poll_interval_us, 2 * poll_interval_us);
+			}
+		}
 
-	if (mutex_is_locked(&lp->running)) {
-		running_irq(lp);
-	} else {
-		idle_irq(lp);
+		// descriptors completed before unmasking do not raise an IRQ
+		sniffer_update_dma_ctrl(chan, 0, SNIFFER_DMA_CTRL_IRQ_MASK);
+
+		if (!sniffer_poll_pending(chan))
+			break;
+
+		sniffer_update_dma_ctrl(chan, SNIFFER_DMA_CTRL_IRQ_MASK, 0);
 	}
 
 	return IRQ_HANDLED;
@@ -230,24 +534,47 @@ static irqreturn_t sniffer_irq(int irq, void *dev_id)
 static int sniffer_probe(struct platform_device *pdev)
 {
 	int ret, irq;
+	unsigned int i;
 	struct sniffer_local *lp;
+	struct sniffer_dma_channel *chan;
+	struct resource *res;
 
 	lp = kzalloc(sizeof(struct sniffer_local), GFP_KERNEL);
 	if (!lp)
 		return -ENOMEM;
 
-	mutex_init(&lp->running);
+	mutex_init(&lp->mac_lock);
+	mutex_init(&lp->clock_lock);
 
-	lp->regs = devm_platform_get_and_ioremap_resource(pdev, 0, NULL);
+	lp->regs = devm_platform_get_and_ioremap_resource(pdev, 0, &res);
 	if (IS_ERR(lp->regs))
 		return PTR_ERR(lp->regs);
 
+	lp->regs_size = resource_size(res);
+
 	dev_dbg(&pdev->dev, "lp->regs = 0x%x\n", (unsigned int) virt_to_phys(lp->regs));
 
 	platform_set_drvdata(pdev, lp);
 
 	lp->dev = &pdev->dev;
 
+	// the per-port build of the FPGA has a DMA channel and an IRQ per port
+	ret = platform_irq_count(pdev);
+	if (ret < 0)
+		return ret;
+
+	lp->chan_count = clamp(ret, 1, SNIFFER_DMA_CHANNEL_MAX);
+	if (lp->regs_size < sniffer_dma_desc_offsets[lp->chan_count - 1] + 0x1000) {
+		dev_err(&pdev->dev, "Register space too small for %u DMA channels\n",
+			lp->chan_count);
+		return -EINVAL;
+	}
+
+	for (i = 0; i < lp->chan_count; i++) {
+		lp->chan[i].lp = lp;
+		lp->chan[i].index = i;
+	}
+
 	ret = sniffer_mdio_setup(lp);
 	if (ret) {
 		dev_err(&pdev->dev, "Error registering MDIO buses: %d\n", ret);
@@ -267,24 +594,31 @@ static int sniffer_probe(struct platform_device *pdev)
 		return ret;
 	}
 
-	irq = platform_get_irq(pdev, 0);
-	if (irq < 0) {
-		dev_err(&pdev->dev, "Couldn't get IRQ\n");
-	return irq;
-	}
-
-	ret = devm_request_irq(&pdev->dev, irq, sniffer_irq,
-			       IRQF_SHARED, pdev->name, lp);
-	if (ret) {
-		dev_err(&pdev->dev,
-			"Unable to request IRQ %d (error %d)\n", irq, ret);
-		return ret;
-	}
-
-	ret = sniffer_setup_miscdevice(lp);
-	if (ret) {
-		dev_err(&pdev->dev, "Unable to setup character device\n");
-		return ret;
+	for (i = 0; i < lp->chan_count; i++) {
+		chan = &lp->chan[i];
+
+		irq = platform_get_irq(pdev, i);
+		if (irq < 0) {
+			dev_err(&pdev->dev, "Couldn't get IRQ %u\n", i);
+			return irq;
+		}
+
+		chan->irq = irq;
+
+		ret = devm_request_threaded_irq(&pdev->dev, irq, sniffer_irq,
+						sniffer_irq_thread, IRQF_SHARED,
+						pdev->name, chan);
+		if (ret) {
+			dev_err(&pdev->dev,
+				"Unable to request IRQ %d (error %d)\n", irq, ret);
+			return ret;
+		}
+
+		ret = sniffer_setup_miscdevice(chan);
+		if (ret) {
+			dev_err(&pdev->dev, "Unable to setup character device\n");
+			return ret;
+		}
 	}
 
 	ret = sniffer_setup_sysfs(lp);
@@ -298,6 +632,7 @@ static int sniffer_probe(struct platform_device *pdev)
 static int sniffer_remove(struct platform_device *pdev)
 {
 	struct sniffer_local *lp = platform_get_drvdata(pdev);
+	struct sniffer_dma_channel *chan;
 	int i;
 
 
@@ -306,11 +641,28 @@ static int sniffer_remove(struct platform_device *pdev)
 	// TODO: shutdown DMA
 	// TODO: shutdown MACs
 
-	misc_deregister(&lp->misc_dev);
+	for (i = 0; i < lp->chan_count; i++) {
+		chan = &lp->chan[i];
+
+		misc_deregister(&chan->misc_dev);
+
+		cancel_delayed_work_sync(&chan->refill_work);
+	}
 
 	sniffer_mdio_teardown(lp);
 
-	dma_free_coherent(lp->dev, lp->buf_size << DMA_BUF_SIZE_LD, lp->buf, lp->dma_handle);
+	for (i = 0; i < lp->chan_count; i++) {
+		chan = &lp->chan[i];
+
+		if (sniffer_splice_busy(chan))
+			dev_info(lp->dev, "%s: waiting for pipes to release buffers of splice()\n",
+				 chan->name);
+		sniffer_wait_splice_released(chan);
+
+		sniffer_free_bufs(chan);
+		vfree(chan->mmap_ctrl);
+		kvfree(chan->splice_refs);
+	}
 
 	for (i = 0; i < SNIFFER_MDIO_BUS_COUNT; i++) {
 		phylink_stop(lp->phylink[i]);
@@ -8,6 +8,7 @@
 #include "sniffer.h"
 #include <linux/phy.h>
 #include <linux/ethtool.h>
+#include <linux/etherdevice.h>
 
 static ssize_t sniffer_show_powerdown(struct device *dev, struct device_attribute *attr,
 		char *buf)
@@ -26,17 +27,19 @@ static ssize_t sniffer_store_powerdown(struct device *dev, struct device_attribu
 	bool powerdown;
 	int ret;
 
-	if (!mutex_trylock(&lp->running)) {
-		dev_err(lp->dev,
-			"Powerdown mode can be changed only when not running");
-		return -EBUSY;
-	}
-
 	ret = kstrtobool(buf, &powerdown);
 	if (ret) {
 		return ret;
 	}
 
+	mutex_lock(&lp->mac_lock);
+	if (lp->mac_users) {
+		mutex_unlock(&lp->mac_lock);
+		dev_err(lp->dev,
+			"Powerdown mode can be changed only when not running");
+		return -EBUSY;
+	}
+
 	if (lp->powerdown != powerdown) {
 		int i;
 		for (i = 0; i < SNIFFER_MDIO_BUS_COUNT; i++) {
@@ -50,10 +53,10 @@ static ssize_t sniffer_store_powerdown(struct device *dev, struct device_attribu
 		}
 	}
 
-	mutex_unlock(&lp->running);
-
 	lp->powerdown = powerdown;
 
+	mutex_unlock(&lp->mac_lock);
+
 	return count;
 
 }
@@ -108,7 +111,7 @@ static ssize_t sniffer_store_speed(struct device *dev, struct device_attribute *
 	unsigned int speed;
 	int ret;
 
-	if (&lp->running) {
+	if (READ_ONCE(lp->mac_users)) {
 		dev_err(lp->dev, "Speed can be changed only when not running");
 		return -EBUSY;
 	}
@@ -472,19 +475,202 @@ static ssize_t sniffer_store_fifo2_overflow(struct device *dev, struct device_at
 	return count;
 }
 
+static ssize_t sniffer_show_mac1_snaplen(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_MAC1_SNAPLEN_OFFSET;
+	u32 reg_content;
+
+	reg_content = sniffer_ior(reg_adr);
+	return sysfs_emit(buf, "%u\n", reg_content);
+}
+
+static ssize_t sniffer_store_mac1_snaplen(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_MAC1_SNAPLEN_OFFSET;
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	// 0 captures whole frames
+	if (reg_content > U16_MAX) {
+		return -EINVAL;
+	}
+
+	sniffer_iow(reg_adr, reg_content);
+	return count;
+}
+
+static ssize_t sniffer_show_mac2_snaplen(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_MAC2_SNAPLEN_OFFSET;
+	u32 reg_content;
+
+	reg_content = sniffer_ior(reg_adr);
+	return sysfs_emit(buf, "%u\n", reg_content);
+}
+
+static ssize_t sniffer_store_mac2_snaplen(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_MAC2_SNAPLEN_OFFSET;
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	// 0 captures whole frames
+	if (reg_content > U16_MAX) {
+		return -EINVAL;
+	}
+
+	sniffer_iow(reg_adr, reg_content);
+	return count;
+}
+
+static ssize_t sniffer_show_fifo_histogram(struct sniffer_local *lp, unsigned int offset, char *buf)
+{
+	int len = 0;
+	int i;
+
+	for (i = 0; i < SNIFFER_MAC_FIFO_HIST_BUCKETS; i++) {
+		len += sysfs_emit_at(buf, len, "%u%c", sniffer_ior(lp->regs + offset + 4 * i),
+				     i == SNIFFER_MAC_FIFO_HIST_BUCKETS - 1 ? '\n' : ' ');
+	}
+
+	return len;
+}
+
+static ssize_t sniffer_store_fifo_histogram(struct sniffer_local *lp, unsigned int offset,
+                const char *buf, size_t count)
+{
+	u32 reg_content;
+	int ret;
+	int i;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	// only clearing is supported
+	if (reg_content) {
+		return -EINVAL;
+	}
+
+	for (i = 0; i < SNIFFER_MAC_FIFO_HIST_BUCKETS; i++) {
+		sniffer_iow(lp->regs + offset + 4 * i, 0);
+	}
+
+	return count;
+}
+
+static ssize_t sniffer_show_fifo1_high_water(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_FIFO1_HIGH_WATER_OFFSET;
+	u32 reg_content;
+
+	reg_content = sniffer_ior(reg_adr);
+	return sysfs_emit(buf, "%u\n", reg_content);
+}
+
+static ssize_t sniffer_store_fifo1_high_water(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_FIFO1_HIGH_WATER_OFFSET;
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	sniffer_iow(reg_adr, reg_content);
+	return count;
+}
+
+static ssize_t sniffer_show_fifo2_high_water(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_FIFO2_HIGH_WATER_OFFSET;
+	u32 reg_content;
+
+	reg_content = sniffer_ior(reg_adr);
+	return sysfs_emit(buf, "%u\n", reg_content);
+}
+
+static ssize_t sniffer_store_fifo2_high_water(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->regs + SNIFFER_MAC_FIFO2_HIGH_WATER_OFFSET;
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	sniffer_iow(reg_adr, reg_content);
+	return count;
+}
+
+static ssize_t sniffer_show_fifo1_histogram(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	return sniffer_show_fifo_histogram(dev_get_drvdata(dev), SNIFFER_MAC_FIFO1_HIST_OFFSET, buf);
+}
+
+static ssize_t sniffer_store_fifo1_histogram(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	return sniffer_store_fifo_histogram(dev_get_drvdata(dev), SNIFFER_MAC_FIFO1_HIST_OFFSET, buf, count);
+}
+
+static ssize_t sniffer_show_fifo2_histogram(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	return sniffer_show_fifo_histogram(dev_get_drvdata(dev), SNIFFER_MAC_FIFO2_HIST_OFFSET, buf);
+}
+
+static ssize_t sniffer_store_fifo2_histogram(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	return sniffer_store_fifo_histogram(dev_get_drvdata(dev), SNIFFER_MAC_FIFO2_HIST_OFFSET, buf, count);
+}
+
 static ssize_t sniffer_show_dma_count(struct device *dev, struct device_attribute *attr,
                 char *buf)
 {
 	struct sniffer_local *lp = dev_get_drvdata(dev);
 
-	return sysfs_emit(buf, "%u\n", sniffer_get_dma_count(lp));
+	return sysfs_emit(buf, "%u\n", sniffer_get_dma_count(&lp->chan[0]));
 }
 
 static ssize_t sniffer_store_dma_count(struct device *dev, struct device_attribute *attr,
                 const char *buf, size_t count)
 {
 	struct sniffer_local *lp = dev_get_drvdata(dev);
-	void __iomem *reg_adr = lp->regs + SNIFFER_DMA_PACKET_COUNT_OFFSET;
+	void __iomem *reg_adr = lp->chan[0].regs + SNIFFER_DMA_PACKET_COUNT_OFFSET;
 	u32 reg_content;
 	int ret;
 
@@ -497,6 +683,337 @@ static ssize_t sniffer_store_dma_count(struct device *dev, struct device_attribu
 	return count;
 }
 
+static ssize_t sniffer_show_dma2_count(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+
+	return sysfs_emit(buf, "%u\n", sniffer_get_dma_count(&lp->chan[1]));
+}
+
+static ssize_t sniffer_store_dma2_count(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->chan[1].regs + SNIFFER_DMA_PACKET_COUNT_OFFSET;
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	sniffer_iow(reg_adr, reg_content);
+	return count;
+}
+
+/*
+ * The interrupt coalescing applies to all DMA channels, it is read back from
+ * the first one. A count above 1 needs a timeout, otherwise the last buffers
+ * of a burst are only reported with the next one: the timeout has to be set
+ * before the count is raised and can only be disabled with a count of 1.
+ */
+static void sniffer_store_dma_reg(struct sniffer_local *lp, unsigned int offset, u32 value)
+{
+	unsigned int i;
+
+	for (i = 0; i < lp->chan_count; i++)
+		sniffer_iow(lp->chan[i].regs + offset, value);
+}
+
+static ssize_t sniffer_show_irq_coalesce_count(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->chan[0].regs + SNIFFER_DMA_IRQ_COALESCE_COUNT_OFFSET;
+	u32 reg_content;
+
+	reg_content = sniffer_ior(reg_adr);
+	return sysfs_emit(buf, "%u\n", reg_content);
+}
+
+static ssize_t sniffer_store_irq_coalesce_count(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	if (reg_content > 1 && !sniffer_ior(lp->chan[0].regs + SNIFFER_DMA_IRQ_COALESCE_TIME_OFFSET))
+		return -EINVAL;
+
+	sniffer_store_dma_reg(lp, SNIFFER_DMA_IRQ_COALESCE_COUNT_OFFSET, reg_content);
+	return count;
+}
+
+static ssize_t sniffer_show_irq_coalesce_time_ns(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	void __iomem *reg_adr = lp->chan[0].regs + SNIFFER_DMA_IRQ_COALESCE_TIME_OFFSET;
+	u32 reg_content;
+
+	reg_content = sniffer_ior(reg_adr);
+	return sysfs_emit(buf, "%u\n", reg_content);
+}
+
+static ssize_t sniffer_store_irq_coalesce_time_ns(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	if (!reg_content && sniffer_ior(lp->chan[0].regs + SNIFFER_DMA_IRQ_COALESCE_COUNT_OFFSET) > 1)
+		return -EINVAL;
+
+	sniffer_store_dma_reg(lp, SNIFFER_DMA_IRQ_COALESCE_TIME_OFFSET, reg_content);
+	return count;
+}
+
+static ssize_t sniffer_show_filter_reg(struct sniffer_local *lp, unsigned int offset, char *buf)
+{
+	return sysfs_emit(buf, "%u\n", sniffer_ior(lp->regs + offset));
+}
+
+static ssize_t sniffer_store_filter_reg(struct sniffer_local *lp, unsigned int offset,
+                const char *buf, size_t count)
+{
+	u32 reg_content;
+	int ret;
+
+	ret = kstrtouint(buf, 0, &reg_content);
+	if (ret) {
+		return ret;
+	}
+
+	sniffer_iow(lp->regs + offset, reg_content);
+	return count;
+}
+
+static ssize_t sniffer_show_filter_mac(struct sniffer_local *lp, unsigned int offset, char *buf)
+{
+	u32 lo = sniffer_ior(lp->regs + offset + SNIFFER_FILTER_MAC_LO);
+	u32 hi = sniffer_ior(lp->regs + offset + SNIFFER_FILTER_MAC_HI);
+	u8 mac[ETH_ALEN] = {hi >> 8, hi, lo >> 24, lo >> 16, lo >> 8, lo};
+
+	return sysfs_emit(buf, "%pM\n", mac);
+}
+
+static ssize_t sniffer_store_filter_mac(struct sniffer_local *lp, unsigned int offset,
+                const char *buf, size_t count)
+{
+	u8 mac[ETH_ALEN];
+
+	if (!mac_pton(buf, mac)) {
+		return -EINVAL;
+	}
+
+	sniffer_iow(lp->regs + offset + SNIFFER_FILTER_MAC_LO,
+		    (mac[2] << 24) | (mac[3] << 16) | (mac[4] << 8) | mac[5]);
+	sniffer_iow(lp->regs + offset + SNIFFER_FILTER_MAC_HI, (mac[0] << 8) | mac[1]);
+	return count;
+}
+
+// a rule is given as "<frame byte offset> <mask> <value>", lane i of mask
+// and value (bits 8*i+7:8*i) belong to frame byte offset+i
+static ssize_t sniffer_show_filter_rule(struct sniffer_local *lp, unsigned int offset, char *buf)
+{
+	void __iomem *reg_adr = lp->regs + offset;
+	u64 mask, value;
+
+	mask = ((u64) sniffer_ior(reg_adr + SNIFFER_FILTER_RULE_MASK_HI) << 32) |
+		sniffer_ior(reg_adr + SNIFFER_FILTER_RULE_MASK_LO);
+	value = ((u64) sniffer_ior(reg_adr + SNIFFER_FILTER_RULE_VALUE_HI) << 32) |
+		sniffer_ior(reg_adr + SNIFFER_FILTER_RULE_VALUE_LO);
+
+	return sysfs_emit(buf, "%u 0x%016llx 0x%016llx\n",
+			  sniffer_ior(reg_adr + SNIFFER_FILTER_RULE_BYTE_OFFSET), mask, value);
+}
+
+static ssize_t sniffer_store_filter_rule(struct sniffer_local *lp, unsigned int offset,
+                const char *buf, size_t count)
+{
+	void __iomem *reg_adr = lp->regs + offset;
+	unsigned int byte_offset;
+	u64 mask, value;
+
+	if (sscanf(buf, "%u %llx %llx", &byte_offset, &mask, &value) != 3 || byte_offset > U16_MAX) {
+		return -EINVAL;
+	}
+
+	sniffer_iow(reg_adr + SNIFFER_FILTER_RULE_BYTE_OFFSET, byte_offset);
+	sniffer_iow(reg_adr + SNIFFER_FILTER_RULE_MASK_LO, lower_32_bits(mask));
+	sniffer_iow(reg_adr + SNIFFER_FILTER_RULE_MASK_HI, upper_32_bits(mask));
+	sniffer_iow(reg_adr + SNIFFER_FILTER_RULE_VALUE_LO, lower_32_bits(value));
+	sniffer_iow(reg_adr + SNIFFER_FILTER_RULE_VALUE_HI, upper_32_bits(value));
+	return count;
+}
+
+// filter<port>_<name>, port counts from 1 like mac1/mac2
+#define SNIFFER_FILTER_ATTR(port, name, type, offset) \
+static ssize_t sniffer_show_filter##port##_##name(struct device *dev, struct device_attribute *attr, \
+                char *buf) \
+{ \
+	return sniffer_show_filter_##type(dev_get_drvdata(dev), offset, buf); \
+} \
+static ssize_t sniffer_store_filter##port##_##name(struct device *dev, struct device_attribute *attr, \
+                const char *buf, size_t count) \
+{ \
+	return sniffer_store_filter_##type(dev_get_drvdata(dev), offset, buf, count); \
+} \
+static DEVICE_ATTR(filter##port##_##name, S_IRUGO | S_IWUSR, sniffer_show_filter##port##_##name, \
+		   sniffer_store_filter##port##_##name)
+
+#define SNIFFER_FILTER_PORT_ATTRS(port) \
+SNIFFER_FILTER_ATTR(port, ctrl, reg, SNIFFER_FILTER_CTRL_OFFSET(port - 1)); \
+SNIFFER_FILTER_ATTR(port, ethertype, reg, SNIFFER_FILTER_ETHERTYPE_OFFSET(port - 1)); \
+SNIFFER_FILTER_ATTR(port, vlan_id, reg, SNIFFER_FILTER_VLAN_ID_OFFSET(port - 1)); \
+SNIFFER_FILTER_ATTR(port, dst_mac, mac, SNIFFER_FILTER_DST_MAC_OFFSET(port - 1)); \
+SNIFFER_FILTER_ATTR(port, src_mac, mac, SNIFFER_FILTER_SRC_MAC_OFFSET(port - 1)); \
+SNIFFER_FILTER_ATTR(port, dropped_frames, reg, SNIFFER_FILTER_DROPPED_FRAMES_OFFSET(port - 1)); \
+SNIFFER_FILTER_ATTR(port, dropped_bytes, reg, SNIFFER_FILTER_DROPPED_BYTES_OFFSET(port - 1)); \
+SNIFFER_FILTER_ATTR(port, rule0, rule, SNIFFER_FILTER_RULE_OFFSET(port - 1, 0)); \
+SNIFFER_FILTER_ATTR(port, rule1, rule, SNIFFER_FILTER_RULE_OFFSET(port - 1, 1)); \
+SNIFFER_FILTER_ATTR(port, rule2, rule, SNIFFER_FILTER_RULE_OFFSET(port - 1, 2)); \
+SNIFFER_FILTER_ATTR(port, rule3, rule, SNIFFER_FILTER_RULE_OFFSET(port - 1, 3))
+
+SNIFFER_FILTER_PORT_ATTRS(1);
+SNIFFER_FILTER_PORT_ATTRS(2);
+
+#define SNIFFER_FILTER_PORT_ATTR_LIST(port) \
+	&dev_attr_filter##port##_ctrl, \
+	&dev_attr_filter##port##_ethertype, \
+	&dev_attr_filter##port##_vlan_id, \
+	&dev_attr_filter##port##_dst_mac, \
+	&dev_attr_filter##port##_src_mac, \
+	&dev_attr_filter##port##_dropped_frames, \
+	&dev_attr_filter##port##_dropped_bytes, \
+	&dev_attr_filter##port##_rule0, \
+	&dev_attr_filter##port##_rule1, \
+	&dev_attr_filter##port##_rule2, \
+	&dev_attr_filter##port##_rule3
+
+static struct device_attribute *sniffer_filter_attrs[] = {
+	SNIFFER_FILTER_PORT_ATTR_LIST(1),
+	SNIFFER_FILTER_PORT_ATTR_LIST(2),
+};
+
+// the time base is given as "<seconds> <nanoseconds>"
+static ssize_t sniffer_show_clock_time(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	u32 sec, nsec;
+
+	sniffer_clock_get_time(lp, &sec, &nsec);
+	return sysfs_emit(buf, "%u %09u\n", sec, nsec);
+}
+
+static ssize_t sniffer_store_clock_time(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	struct sniffer_local *lp = dev_get_drvdata(dev);
+	u32 sec, nsec;
+	int ret;
+
+	if (sscanf(buf, "%u %u", &sec, &nsec) != 2) {
+		return -EINVAL;
+	}
+
+	ret = sniffer_clock_set_time(lp, sec, nsec);
+	if (ret) {
+		return ret;
+	}
+
+	return count;
+}
+
+static ssize_t sniffer_show_clock_ppb(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	return sysfs_emit(buf, "%d\n", sniffer_clock_get_ppb(dev_get_drvdata(dev)));
+}
+
+static ssize_t sniffer_store_clock_ppb(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	s32 ppb;
+	int ret;
+
+	ret = kstrtos32(buf, 0, &ppb);
+	if (ret) {
+		return ret;
+	}
+
+	ret = sniffer_clock_set_ppb(dev_get_drvdata(dev), ppb);
+	if (ret) {
+		return ret;
+	}
+
+	return count;
+}
+
+static ssize_t sniffer_show_clock_sync(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	return sysfs_emit(buf, "%d\n", sniffer_clock_get_sync(dev_get_drvdata(dev), NULL));
+}
+
+static ssize_t sniffer_store_clock_sync(struct device *dev, struct device_attribute *attr,
+                const char *buf, size_t count)
+{
+	bool enable;
+	int ret;
+
+	ret = kstrtobool(buf, &enable);
+	if (ret) {
+		return ret;
+	}
+
+	sniffer_clock_set_sync(dev_get_drvdata(dev), enable);
+
+	return count;
+}
+
+static ssize_t sniffer_show_clock_sync_locked(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	bool locked;
+
+	sniffer_clock_get_sync(dev_get_drvdata(dev), &locked);
+	return sysfs_emit(buf, "%d\n", locked);
+}
+
+static ssize_t sniffer_show_clock_sync_offset_ns(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	s32 offset_ns, ppb;
+
+	sniffer_clock_get_sync_state(dev_get_drvdata(dev), &offset_ns, &ppb);
+	return sysfs_emit(buf, "%d\n", offset_ns);
+}
+
+static ssize_t sniffer_show_clock_sync_ppb(struct device *dev, struct device_attribute *attr,
+                char *buf)
+{
+	s32 offset_ns, ppb;
+
+	sniffer_clock_get_sync_state(dev_get_drvdata(dev), &offset_ns, &ppb);
+	return sysfs_emit(buf, "%d\n", ppb);
+}
+
 static DEVICE_ATTR(speed, S_IRUGO | S_IWUSR, sniffer_show_speed, sniffer_store_speed);
 static DEVICE_ATTR(powerdown, S_IRUGO | S_IWUSR, sniffer_show_powerdown, sniffer_store_powerdown);
 static DEVICE_ATTR(mac1_start_frames, S_IRUGO | S_IWUSR, sniffer_show_mac1_start_frames, sniffer_store_mac1_start_frames);
@@ -511,12 +1028,28 @@ static DEVICE_ATTR(fifo1_good_frames, S_IRUGO | S_IWUSR, sniffer_show_fifo1_good
 static DEVICE_ATTR(fifo2_good_frames, S_IRUGO | S_IWUSR, sniffer_show_fifo2_good_frames, sniffer_store_fifo2_good_frames);
 static DEVICE_ATTR(fifo1_overflow, S_IRUGO | S_IWUSR, sniffer_show_fifo1_overflow, sniffer_store_fifo1_overflow);
 static DEVICE_ATTR(fifo2_overflow, S_IRUGO | S_IWUSR, sniffer_show_fifo2_overflow, sniffer_store_fifo2_overflow);
+static DEVICE_ATTR(mac1_snaplen, S_IRUGO | S_IWUSR, sniffer_show_mac1_snaplen, sniffer_store_mac1_snaplen);
+static DEVICE_ATTR(mac2_snaplen, S_IRUGO | S_IWUSR, sniffer_show_mac2_snaplen, sniffer_store_mac2_snaplen);
+static DEVICE_ATTR(fifo1_high_water, S_IRUGO | S_IWUSR, sniffer_show_fifo1_high_water, sniffer_store_fifo1_high_water);
+static DEVICE_ATTR(fifo2_high_water, S_IRUGO | S_IWUSR, sniffer_show_fifo2_high_water, sniffer_store_fifo2_high_water);
+static DEVICE_ATTR(fifo1_histogram, S_IRUGO | S_IWUSR, sniffer_show_fifo1_histogram, sniffer_store_fifo1_histogram);
+static DEVICE_ATTR(fifo2_histogram, S_IRUGO | S_IWUSR, sniffer_show_fifo2_histogram, sniffer_store_fifo2_histogram);
 static DEVICE_ATTR(dma_count, S_IRUGO | S_IWUSR, sniffer_show_dma_count, sniffer_store_dma_count);
+static DEVICE_ATTR(dma2_count, S_IRUGO | S_IWUSR, sniffer_show_dma2_count, sniffer_store_dma2_count);
+static DEVICE_ATTR(irq_coalesce_count, S_IRUGO | S_IWUSR, sniffer_show_irq_coalesce_count, sniffer_store_irq_coalesce_count);
+static DEVICE_ATTR(irq_coalesce_time_ns, S_IRUGO | S_IWUSR, sniffer_show_irq_coalesce_time_ns, sniffer_store_irq_coalesce_time_ns);
+static DEVICE_ATTR(clock_time, S_IRUGO | S_IWUSR, sniffer_show_clock_time, sniffer_store_clock_time);
+static DEVICE_ATTR(clock_ppb, S_IRUGO | S_IWUSR, sniffer_show_clock_ppb, sniffer_store_clock_ppb);
+static DEVICE_ATTR(clock_sync, S_IRUGO | S_IWUSR, sniffer_show_clock_sync, sniffer_store_clock_sync);
+static DEVICE_ATTR(clock_sync_locked, S_IRUGO, sniffer_show_clock_sync_locked, NULL);
+static DEVICE_ATTR(clock_sync_offset_ns, S_IRUGO, sniffer_show_clock_sync_offset_ns, NULL);
+static DEVICE_ATTR(clock_sync_ppb, S_IRUGO, sniffer_show_clock_sync_ppb, NULL);
 
 
 int sniffer_setup_sysfs(struct sniffer_local *lp)
 {
 	int ret;
+	int i;
 
 	ret = device_create_file(lp->dev, &dev_attr_powerdown);
 	if (ret) {
@@ -602,11 +1135,111 @@ int sniffer_setup_sysfs(struct sniffer_local *lp)
 		return ret;
 	}
 
+	ret = device_create_file(lp->dev, &dev_attr_mac1_snaplen);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register mac1_snaplen file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_mac2_snaplen);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register mac2_snaplen file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_fifo1_high_water);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register fifo1_high_water file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_fifo2_high_water);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register fifo2_high_water file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_fifo1_histogram);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register fifo1_histogram file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_fifo2_histogram);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register fifo2_histogram file\n");
+		return ret;
+	}
+
         ret = device_create_file(lp->dev, &dev_attr_dma_count);
 	if (ret) {
 		dev_err(lp->dev, "Unable to register dma_count file\n");
 		return ret;
 	}
 
+	if (lp->chan_count > 1) {
+		ret = device_create_file(lp->dev, &dev_attr_dma2_count);
+		if (ret) {
+			dev_err(lp->dev, "Unable to register dma2_count file\n");
+			return ret;
+		}
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_irq_coalesce_count);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register irq_coalesce_count file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_irq_coalesce_time_ns);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register irq_coalesce_time_ns file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_clock_time);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register clock_time file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_clock_ppb);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register clock_ppb file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_clock_sync);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register clock_sync file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_clock_sync_locked);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register clock_sync_locked file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_clock_sync_offset_ns);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register clock_sync_offset_ns file\n");
+		return ret;
+	}
+
+	ret = device_create_file(lp->dev, &dev_attr_clock_sync_ppb);
+	if (ret) {
+		dev_err(lp->dev, "Unable to register clock_sync_ppb file\n");
+		return ret;
+	}
+
+	for (i = 0; i < ARRAY_SIZE(sniffer_filter_attrs); i++) {
+		ret = device_create_file(lp->dev, sniffer_filter_attrs[i]);
+		if (ret) {
+			dev_err(lp->dev, "Unable to register %s file\n", sniffer_filter_attrs[i]->attr.name);
+			return ret;
+		}
+	}
+
 	return ret;
 }
@@ -0,0 +1,140 @@
+/* SPDX-License-Identifier: GPL-2.0-or-later WITH Linux-syscall-note */
+/*
+ * Driver for the Real-Time Sniffer aRTS
+ *
+ * Userspace interface of /dev/sniffer
+ *
+ * 2023 (c) Chris H. Meyer
+ */
+
+#ifndef _SNIFFER_UAPI_H
+#define _SNIFFER_UAPI_H
+
+#include <linux/ioctl.h>
+#include <linux/types.h>
+
+/*
+ * Memory mapped capture ring
+ *
+ * The ring is mapped with two mmap() calls on /dev/sniffer:
+ *
+ *   offset 0:                  control area (struct sniffer_mmap_ctrl)
+ *   offset ctrl->data_offset:  DMA buffers, ctrl->buf_count buffers of
+ *                              (1 << ctrl->buf_size_ld) bytes each
+ *
+ * Buffers in [tail, head) are owned by userspace and contain PCAP records
+ * (16 byte record header followed by the frame). The driver publishes new
+ * buffers by advancing head, userspace hands buffers back by advancing tail.
+ * Both indices wrap at buf_count, which is a power of two.
+ *
+ * Consumer:
+ *   head = load_acquire(&ctrl->head);
+ *   while (tail != head) {
+ *       process buffer tail;
+ *       tail = (tail + 1) & (ctrl->buf_count - 1);
+ *       store_release(&ctrl->tail, tail);
+ *   }
+ *
+ * Without SNIFFER_MMAP_FLAG_PACKED, each buffer holds exactly one record.
+ * With it, each buffer holds ctrl->buf_len[index] bytes of back to back
+ * records.
+ *
+ * poll() reports POLLIN while a buffer is in [tail, head), so the consumer
+ * can sleep in poll() once it caught up with head. Without a mapping,
+ * POLLIN means that read() returns data, O_NONBLOCK makes it return EAGAIN
+ * instead of sleeping.
+ */
+
+/*
+ * Record header
+ *
+ * Like the record header of a PCAP file with nanosecond timestamps
+ * (ts_sec, ts_nsec, incl_len, orig_len, little endian), except for the upper
+ * 16 bits of orig_len: bits [31:28] hold the port the frame was received on,
+ * bits [27:16] a sequence number counting the records of each port, loss
+ * markers included. read() clears them, consumers of the mapped ring have to
+ * mask orig_len before writing it to a PCAP file.
+ */
+#define SNIFFER_REC_HEADER_LEN 16
+#define SNIFFER_REC_ORIG_LEN_MASK 0xffff
+#define SNIFFER_REC_SEQ_SHIFT 16
+#define SNIFFER_REC_SEQ_MASK 0xfff
+#define SNIFFER_REC_PORT_SHIFT 28
+#define SNIFFER_REC_PORT_MASK 0xf
+
+/* ports of the sniffer, port 0 is MAC 1 */
+#define SNIFFER_PORT_COUNT 2
+
+/*
+ * Loss marker
+ *
+ * Frames dropped by the receive FIFO of a port are reported by a record of
+ * SNIFFER_MARKER_LEN bytes in front of the next record of the port. Its frame
+ * is a broadcast from 02:00:00:00:00:<port> with EtherType
+ * SNIFFER_MARKER_ETHERTYPE, timestamped with the first dropped frame. The
+ * last 4 bytes take the place of the FCS and are zero.
+ */
+#define SNIFFER_MARKER_ETHERTYPE 0x88b6
+#define SNIFFER_MARKER_MAGIC "aRTS"
+#define SNIFFER_MARKER_LEN 64
+
+#define SNIFFER_MARKER_TYPE_LOSS 1
+
+struct sniffer_marker {
+	__u8 dst[6];
+	__u8 src[6];
+	__be16 ethertype;
+	__u8 magic[4];
+	__u8 type;
+	__u8 port;
+	__be32 frames;	/* dropped frames */
+	__be32 bytes;	/* dropped bytes, FCS included */
+} __attribute__((packed));
+
+/*
+ * Time base of the timestamps
+ *
+ * SNIFFER_IOC_SET_TIME loads seconds and nanoseconds into the clock of the
+ * sniffer at once, SNIFFER_IOC_GET_TIME reads it. SNIFFER_IOC_SET_PPB trims
+ * the rate of the clock by the given parts per billion (-999999999 to
+ * 999999999), e.g. to follow a clock disciplined by NTP or PTP. The ioctls
+ * work on the open device, the sysfs attributes clock_time ("<sec> <nsec>")
+ * and clock_ppb do the same without opening it.
+ */
+struct sniffer_time {
+	__u32 sec;
+	__u32 nsec;
+};
+
+#define SNIFFER_IOC_MAGIC 0xa7
+
+#define SNIFFER_IOC_SET_TIME _IOW(SNIFFER_IOC_MAGIC, 1, struct sniffer_time)
+#define SNIFFER_IOC_GET_TIME _IOR(SNIFFER_IOC_MAGIC, 2, struct sniffer_time)
+#define SNIFFER_IOC_SET_PPB _IOW(SNIFFER_IOC_MAGIC, 3, __s32)
+#define SNIFFER_IOC_GET_PPB _IOR(SNIFFER_IOC_MAGIC, 4, __s32)
+
+#define SNIFFER_MMAP_VERSION 1
+
+#define SNIFFER_MMAP_FLAG_PACKED 0x1
+
+struct sniffer_mmap_ctrl {
+	__u32 version;
+	__u32 flags;
+	__u32 buf_size_ld;
+	__u32 buf_count;
+	__u32 data_offset;
+	__u32 reserved0[3];
+
+	/* written by the driver */
+	__u32 head;
+	__u32 reserved1[15];
+
+	/* written by userspace, in a separate cache line */
+	__u32 tail;
+	__u32 reserved2[15];
+
+	/* fill level of each buffer, only valid in packed mode */
+	__u32 buf_len[];
+};
+
+#endif /* _SNIFFER_UAPI_H */
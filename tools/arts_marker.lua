@@ -0,0 +1,73 @@
+--[[
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+]]
+
+--[[
+Wireshark dissector of the loss markers of aRTS
+
+A marker is a broadcast frame with EtherType 0x88b6 placed in the capture
+where the receive FIFO of a port dropped frames (see sniffer_uapi.h). It is
+shown as "aRTS loss marker" with a warning carrying the number of dropped
+frames, so the gaps of a capture can be listed with the filter
+"arts.lost_frames" or in the Expert Information.
+
+Copy the file to the personal Lua plugins folder of Wireshark, e.g.
+~/.local/lib/wireshark/plugins/.
+]]
+
+local arts = Proto("arts", "aRTS loss marker")
+
+local f_magic = ProtoField.string("arts.magic", "Magic")
+local f_type = ProtoField.uint8("arts.type", "Type", base.DEC, { [1] = "Loss" })
+local f_port = ProtoField.uint8("arts.port", "Port", base.DEC)
+local f_frames = ProtoField.uint32("arts.lost_frames", "Dropped frames", base.DEC)
+local f_bytes = ProtoField.uint32("arts.lost_bytes", "Dropped bytes", base.DEC)
+
+arts.fields = { f_magic, f_type, f_port, f_frames, f_bytes }
+
+local e_loss = ProtoExpert.new("arts.loss", "Frames dropped by the sniffer",
+    expert.group.SEQUENCE, expert.severity.WARN)
+
+arts.experts = { e_loss }
+
+function arts.dissector(buffer, pinfo, tree)
+    if buffer:len() < 14 or buffer(0, 4):string() ~= "aRTS" then
+        return 0
+    end
+
+    pinfo.cols.protocol = "aRTS"
+
+    local subtree = tree:add(arts, buffer(0, 14))
+    subtree:add(f_magic, buffer(0, 4))
+    subtree:add(f_type, buffer(4, 1))
+    subtree:add(f_port, buffer(5, 1))
+    subtree:add(f_frames, buffer(6, 4))
+    subtree:add(f_bytes, buffer(10, 4))
+
+    local port = buffer(5, 1):uint()
+    local frames = buffer(6, 4):uint()
+    local bytes = buffer(10, 4):uint()
+
+    local info = string.format("Port %d dropped %d frames (%d bytes)", port, frames, bytes)
+    pinfo.cols.info = info
+    subtree:add_proto_expert_info(e_loss, info)
+
+    return 14
+end
+
+DissectorTable.get("ethertype"):add(0x88b6, arts)
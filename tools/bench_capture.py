@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark of sniffer-capture against a slow sink
+
+The capture ring is stood in for by a pipe of the size of the ring: a
+generator writes records into it at a constant rate and drops them like the
+DMA controller once it is full. The consumer of the pipe writes into a FIFO
+drained by a rate limited sink, which stalls periodically like a disk
+writing back its cache. `cat`, i.e. the single threaded `cat /dev/sniffer >>
+capture.pcap`, is compared with sniffer-capture, which is built with the C
+compiler of the host.
+"""
+
+import argparse
+import fcntl
+import os
+import select
+import subprocess
+import tempfile
+import threading
+import time
+
+from bench_pcap_index import generate_capture
+from bench_read import IMIX
+from pcap_index import PCAP_HEADER_LEN, CaptureIndex
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "../sw/sources/meta-sniffer/recipes-core/sniffer-tools/files")
+UAPI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "../sw/sources/meta-sniffer/recipes-kernel/sniffer-module/files")
+
+F_SETPIPE_SZ = 1031
+TICK = 0.001
+
+
+def build_tool(out_dir, tool="sniffer-capture", cc="cc", libs=()):
+    """Compile a tool of sniffer-tools, returns the path of the binary"""
+    binary = os.path.join(out_dir, tool)
+    subprocess.run([cc, "-O2", "-pthread", "-I" + UAPI_DIR, os.path.join(TOOLS_DIR, tool + ".c"), *libs,
+                    "-o", binary], check=True)
+    return binary
+
+
+def record_chunks(records, chunk_len):
+    """Records of a synthetic capture, split at record boundaries into chunks of about chunk_len bytes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "records.pcap")
+        generate_capture(path, records, IMIX, port_bits=False)
+        with CaptureIndex(path) as index:
+            offsets = index.records["offset"].tolist()
+            data = bytes(index.mm[PCAP_HEADER_LEN:])
+
+    chunks = []
+    start = 0
+    for off in offsets[1:] + [len(data) + PCAP_HEADER_LEN]:
+        off -= PCAP_HEADER_LEN
+        if off - start >= chunk_len:
+            chunks.append(data[start:off])
+            start = off
+    return chunks
+
+
+def generate(fd, chunks, rate, seconds, stats):
+    """Write chunks at rate bytes/s into the pipe, dropping those not fitting"""
+    os.set_blocking(fd, False)
+
+    start = time.perf_counter()
+    sent = 0
+    i = 0
+    while True:
+        now = time.perf_counter() - start
+        if now >= seconds:
+            break
+        if sent > rate * now:
+            time.sleep(TICK)
+            continue
+
+        chunk = chunks[i % len(chunks)]
+        i += 1
+        sent += len(chunk)
+        stats["offered"] += len(chunk)
+
+        try:
+            n = os.write(fd, chunk)
+        except BlockingIOError:
+            stats["dropped"] += len(chunk)
+            continue
+
+        # a chunk started is completed, records are only dropped as a whole
+        while n < len(chunk):
+            select.select([], [fd], [])
+            n += os.write(fd, chunk[n:])
+
+    os.close(fd)
+
+
+def sink(path, rate, stall, stall_interval, stats):
+    """Read the FIFO at rate bytes/s at most, stalling for stall s every stall_interval s"""
+    with open(path, "rb", buffering=0) as f:
+        start = time.perf_counter()
+        next_stall = stall_interval
+        received = 0
+        while True:
+            data = f.read(1 << 20)
+            if not data:
+                break
+            received += len(data)
+
+            now = time.perf_counter() - start
+            if now >= next_stall:
+                time.sleep(stall)
+                next_stall += stall_interval
+            ahead = received / rate - now
+            if ahead > 0:
+                time.sleep(ahead)
+
+    stats["received"] = received
+
+
+def run(command, args, chunks):
+    stats = {"offered": 0, "dropped": 0, "received": 0}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fifo = os.path.join(tmp, "capture.pcap")
+        os.mkfifo(fifo)
+
+        read_fd, write_fd = os.pipe()
+        fcntl.fcntl(write_fd, F_SETPIPE_SZ, args.ring << 10)
+
+        sink_thread = threading.Thread(target=sink, args=(fifo, args.sink_rate * 1e6, args.stall_ms / 1000,
+                                                          args.stall_interval, stats))
+        sink_thread.start()
+
+        if command == "cat":
+            out = open(fifo, "wb")
+            proc = subprocess.Popen(["cat"], stdin=read_fd, stdout=out)
+            out.close()
+        else:
+            proc = subprocess.Popen(command + ["-d", "-", "-o", fifo], stdin=read_fd, stderr=subprocess.PIPE)
+        os.close(read_fd)
+
+        generate(write_fd, chunks, args.rate * 1e6, args.seconds, stats)
+        _, err = proc.communicate()
+        sink_thread.join()
+
+    stats["report"] = err.decode().strip() if err else ""
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sniffer-capture against a slow sink")
+    parser.add_argument("--rate", type=float, default=20, help="capture rate in MB/s")
+    parser.add_argument("--sink-rate", type=float, default=40, help="rate of the sink in MB/s")
+    parser.add_argument("--stall-ms", type=float, default=300, help="stall of the sink")
+    parser.add_argument("--stall-interval", type=float, default=2, help="seconds between stalls of the sink")
+    parser.add_argument("--ring", type=int, default=1024, help="size of the capture ring in KiB")
+    parser.add_argument("--queue", type=int, default=64, help="queue of sniffer-capture in MiB")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--capture", help="sniffer-capture binary (default: built from source)")
+    args = parser.parse_args()
+
+    chunks = record_chunks(20000, int(args.rate * 1e6 * TICK))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = args.capture or build_tool(tmp)
+
+        print(f"{args.rate} MB/s into a ring of {args.ring} KiB, sink {args.sink_rate} MB/s "
+              f"stalling {args.stall_ms} ms every {args.stall_interval} s")
+        print(f"{'consumer':<16} {'offered MB':>10} {'dropped MB':>10} {'dropped %':>9} {'written MB':>10}")
+        for name, command in [("cat", "cat"), ("sniffer-capture", [binary, "-q", str(args.queue)])]:
+            stats = run(command, args, chunks)
+            print(f"{name:<16} {stats['offered'] / 1e6:>10.1f} {stats['dropped'] / 1e6:>10.1f} "
+                  f"{100 * stats['dropped'] / stats['offered']:>9.2f} {stats['received'] / 1e6:>10.1f}")
+            if stats["report"]:
+                print("  " + stats["report"].replace("\n", "\n  "))
+
+            expected = stats["offered"] - stats["dropped"] + (0 if name == "cat" else PCAP_HEADER_LEN)
+            assert stats["received"] == expected, (stats["received"], expected)
+
+
+if __name__ == "__main__":
+    main()
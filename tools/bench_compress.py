@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark of sniffer-compress on synthetic cyclic EtherCAT traffic
+
+The sniffer sits between the master and the first slave: every cycle, the
+master sends a frame with an LRW datagram of the process image of a number
+of drives and a BRD of the AL status on port 0, which comes back on port 1
+with the inputs of the drives and the working counters filled in. From one
+cycle to the next, only the datagram index, the positions and the torques
+change.
+
+sniffer-compress, built with the C compiler of the host (needs the LZ4
+library and header), compresses the records with and without the delta
+step and with one and two workers, then expands them again, which has to
+give the PCAP file of `header` byte for byte. zlib at its fastest level is
+shown for comparison.
+"""
+
+import argparse
+import os
+import struct
+import subprocess
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from bench_capture import build_tool
+from pcap_index import PCAP_MAGIC_NSEC, RECORD_HEADER_LEN, REC_PORT_SHIFT
+
+START_SEC = 1700000000
+ETHERTYPE_ECAT = 0x88a4
+CMD_BRD = 0x07
+CMD_LRW = 0x0c
+REG_AL_STATUS = 0x0130
+AL_STATE_OP = 0x08
+MIN_FRAME = 60
+
+# process image of a drive in CiA 402 cyclic synchronous position mode
+DRIVE = np.dtype([("control", "<u2"), ("target", "<i4"), ("status", "<u2"), ("actual", "<i4"),
+                  ("torque", "<i2"), ("digital", "<u2")])
+
+# PCAP file header written by header.c and the tools of sniffer-tools
+PCAP_HEADER = struct.pack("<IHHiIII", PCAP_MAGIC_NSEC, 2, 4, -3600, 0, 2048, 1)
+
+
+def datagram(cmd, idx, address, data, wkc, more):
+    """EtherCAT datagrams of all cycles, data has a row per cycle"""
+    cycles = len(idx)
+    head = np.empty((cycles, 10), np.uint8)
+    head[:, 0] = cmd
+    head[:, 1] = idx
+    head[:, 2:6] = np.frombuffer(struct.pack("<I", address), np.uint8)
+    head[:, 6:8] = np.frombuffer(struct.pack("<H", data.shape[1] | (0x8000 if more else 0)), np.uint8)
+    head[:, 8:10] = 0
+    return np.hstack([head, data, np.broadcast_to(np.frombuffer(struct.pack("<H", wkc), np.uint8), (cycles, 2))])
+
+
+def ecat_frames(port, idx, datagrams):
+    """Ethernet frames of the master (port 0) or returning to it (port 1)"""
+    cycles = len(idx)
+    body = np.hstack(datagrams)
+    eth = struct.pack(">6s6sH", b"\xff" * 6, bytes([2, 0, 0, 0, 0, 1 + port]), ETHERTYPE_ECAT)
+    eth += struct.pack("<H", body.shape[1] | 1 << 12)
+    frames = np.hstack([np.broadcast_to(np.frombuffer(eth, np.uint8), (cycles, len(eth))), body])
+    if frames.shape[1] < MIN_FRAME:
+        frames = np.hstack([frames, np.zeros((cycles, MIN_FRAME - frames.shape[1]), np.uint8)])
+    return frames
+
+
+def ethercat_records(cycles, drives=8, cycle_ns=1000000, jitter_ns=500, seed=0):
+    """Records of cycles EtherCAT cycles as the capture ring holds them, i.e. without the PCAP header"""
+    rand = np.random.default_rng(seed)
+    idx = np.arange(cycles) & 0xff
+
+    # the setpoints follow slow ramps, the drives follow them with noise
+    velocity = np.cumsum(rand.integers(-2, 3, (cycles, drives)), axis=0) + 1000
+    image = np.zeros((cycles, drives), DRIVE)
+    image["control"] = 0x000f
+    image["target"] = np.cumsum(velocity, axis=0)
+    outputs = image.copy()
+    image["status"] = 0x1237
+    image["actual"] = image["target"] + rand.integers(-20, 21, (cycles, drives))
+    image["torque"] = rand.normal(300, 40, (cycles, drives)).astype(np.int16)
+    image["digital"] = (np.arange(cycles)[:, None] // 5000 + np.arange(drives)) & 0x3
+    inputs = image
+
+    al_idle = np.zeros((cycles, 2), np.uint8)
+    al_op = np.broadcast_to(np.frombuffer(struct.pack("<H", AL_STATE_OP), np.uint8), (cycles, 2))
+    frames = [
+        ecat_frames(0, idx, [datagram(CMD_LRW, idx, 0x10000, outputs.view(np.uint8).reshape(cycles, -1), 0, True),
+                             datagram(CMD_BRD, idx, REG_AL_STATUS << 16, al_idle, 0, False)]),
+        ecat_frames(1, idx, [datagram(CMD_LRW, idx, 0x10000, inputs.view(np.uint8).reshape(cycles, -1),
+                                      3 * drives, True),
+                             datagram(CMD_BRD, idx, REG_AL_STATUS << 16, al_op, drives, False)]),
+    ]
+
+    start = START_SEC * 10**9 + np.arange(cycles) * cycle_ns + np.rint(rand.normal(0, jitter_ns, cycles))
+    ts = [start.astype(np.int64), (start + 4000 + np.rint(rand.normal(0, 50, cycles))).astype(np.int64)]
+
+    records = []
+    for port in range(2):
+        length = frames[port].shape[1]
+        headers = np.empty((cycles, 4), "<u4")
+        headers[:, 0] = ts[port] // 10**9
+        headers[:, 1] = ts[port] % 10**9
+        headers[:, 2] = length
+        headers[:, 3] = length | port << REC_PORT_SHIFT
+        records.append(np.hstack([headers.view(np.uint8).reshape(cycles, RECORD_HEADER_LEN), frames[port]]))
+
+    # the frame of the master is always received before its return, both are of the same length
+    return np.stack(records, axis=1).tobytes()
+
+
+def build_compress(out_dir, cc="cc"):
+    return build_tool(out_dir, "sniffer-compress", cc, ["-llz4"])
+
+
+def compress(binary, source, output, options=()):
+    """Compress a file of records, returns the seconds taken and the report of the tool"""
+    start = time.perf_counter()
+    proc = subprocess.run([binary, "-d", source, "-o", output, *options], check=True, capture_output=True)
+    return time.perf_counter() - start, proc.stderr.decode().strip()
+
+
+def expand(binary, source, output):
+    start = time.perf_counter()
+    subprocess.run([binary, "-x", "-d", source, "-o", output], check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def zlib_blocks(data, block_size):
+    """Size and seconds of zlib at level 1 in blocks like sniffer-compress"""
+    start = time.perf_counter()
+    size = sum(len(zlib.compress(data[i:i + block_size], 1)) for i in range(0, len(data), block_size))
+    return size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sniffer-compress on synthetic EtherCAT traffic")
+    parser.add_argument("--cycles", type=int, default=200000)
+    parser.add_argument("--drives", type=int, default=8, help="drives in the process image")
+    parser.add_argument("--cycle-ns", type=int, default=1000000)
+    parser.add_argument("--block", type=int, default=256, help="block size in KiB")
+    parser.add_argument("--compress", help="sniffer-compress binary (default: built from source)")
+    args = parser.parse_args()
+
+    records = ethercat_records(args.cycles, args.drives, args.cycle_ns)
+    size = len(PCAP_HEADER) + len(records)
+    print(f"{2 * args.cycles} frames of {len(records) // (2 * args.cycles) - RECORD_HEADER_LEN} bytes, "
+          f"{size / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = args.compress or build_compress(tmp)
+        source = os.path.join(tmp, "records")
+        with open(source, "wb") as f:
+            f.write(records)
+
+        print(f"{'codec':<24} {'ratio':>6} {'MB/s':>8} {'expand MB/s':>11}")
+        zsize, zseconds = zlib_blocks(PCAP_HEADER + records, args.block << 10)
+        print(f"{'zlib -1':<24} {size / zsize:>6.2f} {size / zseconds / 1e6:>8.1f} {'':>11}")
+
+        for name, options in [("lz4", ["-R", "-j", "1"]), ("delta + lz4", ["-j", "1"]),
+                              ("delta + lz4, 2 workers", ["-j", "2"])]:
+            compressed = os.path.join(tmp, "capture.artz")
+            expanded = os.path.join(tmp, "capture.pcap")
+            seconds, report = compress(binary, source, compressed, ["-b", str(args.block), *options])
+            expand_seconds = expand(binary, compressed, expanded)
+
+            with open(expanded, "rb") as f:
+                assert f.read() == PCAP_HEADER + records, name
+
+            ratio = size / os.path.getsize(compressed)
+            print(f"{name:<24} {ratio:>6.2f} {size / seconds / 1e6:>8.1f} {size / expand_seconds / 1e6:>11.1f}")
+            print("  " + report.replace("\n", "\n  "))
+
+
+if __name__ == "__main__":
+    main()
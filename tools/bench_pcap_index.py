@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark of pcap_index on synthetic captures
+
+A capture of cyclic traffic on each port with jittered timestamps and
+occasional loss markers is generated, then indexed and evaluated by
+pcap_index. For comparison, the same statistics are computed by reading the
+capture record by record.
+"""
+
+import argparse
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from bench_read import IMIX
+from pcap_index import (MARKER_ETHERTYPE, MARKER_MAGIC, MARKER_TYPE_LOSS, PCAP_HEADER_LEN, PCAP_MAGIC_NSEC,
+                        RECORD_HEADER_LEN, REC_ORIG_LEN_MASK, REC_PORT_SHIFT, REC_SEQ_SHIFT, CaptureIndex,
+                        port_stats)
+
+PORTS = 2
+START_SEC = 1700000000
+
+
+def marker_frame(port, frames, length=64):
+    frame = bytearray(length)
+    frame[:6] = b"\xff" * 6
+    frame[6:12] = bytes([2, 0, 0, 0, 0, port])
+    frame[12:14] = MARKER_ETHERTYPE.to_bytes(2, "big")
+    frame[14:18] = MARKER_MAGIC
+    frame[18] = MARKER_TYPE_LOSS
+    frame[19] = port
+    frame[20:24] = frames.to_bytes(4, "big")
+    frame[24:28] = (frames * 64).to_bytes(4, "big")
+    return frame
+
+
+def generate_capture(path, records, mix, cycle_ns=(250000, 1000000), jitter_ns=500, markers=0,
+                     port_bits=True, seed=0):
+    """Write a capture of records frames, returns the ports, timestamps and lengths
+
+    Port p sends a frame every cycle_ns[p] with a normally distributed
+    jitter, the lengths are drawn from mix. markers frames are replaced by
+    loss markers of their port. Without port_bits, orig_len is written like
+    read() does, i.e. without port and sequence number."""
+    rand = np.random.default_rng(seed)
+    sizes = np.array([s for s, _ in mix])
+    weights = np.array([w for _, w in mix], np.float64)
+
+    # the ports share the records in proportion to their rate
+    rate = 1 / np.array(cycle_ns[:PORTS], np.float64)
+    per_port = np.floor(records * rate / rate.sum()).astype(np.int64)
+    per_port[0] += records - per_port.sum()
+
+    ts = np.concatenate([START_SEC * 10**9 + np.arange(n) * cycle_ns[p] +
+                         np.rint(rand.normal(0, jitter_ns, n)).astype(np.int64) for p, n in enumerate(per_port)])
+    port = np.repeat(np.arange(PORTS), per_port)
+    order = np.argsort(ts, kind="stable")
+    ts = ts[order]
+    port = port[order]
+
+    length = rand.choice(sizes, records, p=weights / weights.sum()).astype(np.int64)
+    marker = np.zeros(records, bool)
+    marker[rand.choice(records, markers, replace=False)] = True
+    length[marker] = 64
+
+    seq = np.zeros(records, np.int64)
+    for p in range(PORTS):
+        seq[port == p] = np.arange(per_port[p]) & 0xfff
+
+    headers = np.empty((records, 4), "<u4")
+    headers[:, 0] = ts // 10**9
+    headers[:, 1] = ts % 10**9
+    headers[:, 2] = length
+    headers[:, 3] = length
+    if port_bits:
+        headers[:, 3] |= ((seq << REC_SEQ_SHIFT) | (port << REC_PORT_SHIFT)).astype(np.uint32)
+
+    offsets = PCAP_HEADER_LEN + np.concatenate(([0], np.cumsum(length + RECORD_HEADER_LEN)[:-1]))
+    data = np.zeros(PCAP_HEADER_LEN + int((length + RECORD_HEADER_LEN).sum()), np.uint8)
+    data[:PCAP_HEADER_LEN] = np.frombuffer(struct.pack("<IHHiIII", PCAP_MAGIC_NSEC, 2, 4, 0, 0, 2048, 1), np.uint8)
+
+    span = np.arange(RECORD_HEADER_LEN)
+    header_bytes = headers.view(np.uint8).reshape(records, RECORD_HEADER_LEN)
+    for i in range(0, records, 1 << 18):
+        data[offsets[i:i + (1 << 18), None] + span] = header_bytes[i:i + (1 << 18)]
+
+    lost = rand.integers(1, 100, markers)
+    for k, i in enumerate(np.flatnonzero(marker)):
+        start = offsets[i] + RECORD_HEADER_LEN
+        data[start:start + 64] = np.frombuffer(marker_frame(int(port[i]), int(lost[k])), np.uint8)
+
+    data.tofile(path)
+
+    return {"port": port, "ts": ts, "length": length, "marker": marker, "lost": lost}
+
+
+def stats_by_record(path):
+    """Frames, bytes and inter-arrival times per port, reading record by record"""
+    stats = {}
+    last = {}
+    with open(path, "rb") as f:
+        f.read(PCAP_HEADER_LEN)
+        while True:
+            header = f.read(RECORD_HEADER_LEN)
+            if len(header) < RECORD_HEADER_LEN:
+                break
+            sec, nsec, incl_len, orig_len = struct.unpack("<IIII", header)
+            frame = f.read(incl_len)
+
+            port = orig_len >> REC_PORT_SHIFT
+            if frame[12:14] == MARKER_ETHERTYPE.to_bytes(2, "big") and frame[14:18] == MARKER_MAGIC:
+                continue
+
+            ts = sec * 10**9 + nsec
+            s = stats.setdefault(port, {"frames": 0, "bytes": 0, "interarrival": []})
+            s["frames"] += 1
+            s["bytes"] += orig_len & REC_ORIG_LEN_MASK
+            if port in last:
+                s["interarrival"].append(ts - last[port])
+            last[port] = ts
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pcap_index on a synthetic capture")
+    parser.add_argument("--size", type=int, default=256, help="size of the capture in MB")
+    parser.add_argument("--mix", choices=["64", "imix", "1518"], default="imix")
+    parser.add_argument("--markers", type=int, default=100)
+    parser.add_argument("--by-record", action="store_true",
+                        help="also compute the statistics record by record, for comparison")
+    parser.add_argument("--keep", help="write the capture to this file and keep it")
+    args = parser.parse_args()
+
+    mix = {"64": [(64, 1)], "imix": IMIX, "1518": [(1518, 1)]}[args.mix]
+    mean_len = sum(s * w for s, w in mix) / sum(w for _, w in mix)
+    records = int(args.size * 1e6 / (mean_len + RECORD_HEADER_LEN))
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "capture.pcap")
+    generate_capture(path, records, mix, markers=args.markers)
+    size = os.path.getsize(path)
+    print(f"capture: {records} records, {size / 1e6:.1f} MB, {args.mix}")
+
+    try:
+        # the first run only fills the page cache
+        with CaptureIndex(path) as index:
+            pass
+
+        start = time.perf_counter()
+        with CaptureIndex(path) as index:
+            offsets = time.perf_counter()
+            stats = port_stats(index.records)
+        done = time.perf_counter()
+
+        print(f"{'step':<12} {'s':>8} {'MB/s':>9} {'Mrec/s':>8}")
+        for step, seconds in [("index", offsets - start), ("statistics", done - offsets),
+                              ("total", done - start)]:
+            print(f"{step:<12} {seconds:>8.3f} {size / seconds / 1e6:>9.1f} {records / seconds / 1e6:>8.2f}")
+
+        for port, s in stats.items():
+            print(f"mac{port + 1}: {s['frames']} frames, {s['lost_frames']} lost, "
+                  f"jitter rms {s['jitter_rms_ns']:.0f} ns to a cycle of {s['cycle_ns']:.0f} ns")
+
+        if args.by_record:
+            start = time.perf_counter()
+            reference = stats_by_record(path)
+            seconds = time.perf_counter() - start
+            print(f"{'by record':<12} {seconds:>8.3f} {size / seconds / 1e6:>9.1f} {records / seconds / 1e6:>8.2f}")
+
+            for port, s in reference.items():
+                assert s["frames"] == stats[port]["frames"]
+                assert s["bytes"] == stats[port]["bytes"]
+    finally:
+        if not args.keep:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark of the read() policies of /dev/sniffer on a simulated ring
+
+SimulatedRing mirrors sniffer_read() of the driver: "single" returns at most
+the rest of one buffer per call (the former behaviour), "batched" returns all
+complete records fitting into the user buffer. The number of calls and bytes
+is taken from the simulation, the time is modelled from the cost of a
+syscall, the copy bandwidth and the cost of parsing a record header. The
+first two are measured on this machine unless given. These figures are a
+model estimate, not a measurement of the driver.
+
+With --device, read() is instead timed on a real file, e.g. /dev/sniffer on
+the board, a capture file or a FIFO fed by another process, and the figures
+are derived from the measured calls.
+"""
+
+import argparse
+import os
+import random
+import time
+
+from sniffer_ring import RECORD_HEADER, make_record
+
+IMIX = [(64, 7), (594, 4), (1518, 1)]
+
+
+class SimulatedRing:
+    """Ring of DMA buffers as seen by sniffer_read()"""
+
+    def __init__(self, buffers):
+        self.buffers = buffers
+        self.tail = 0
+        self.i = 0
+        self.rec_left = 0
+
+    def available(self):
+        return self.tail < len(self.buffers)
+
+    def records_span(self, buf, i, count):
+        end = i
+        while end < len(buf):
+            rec_end = min(end + RECORD_HEADER.size + RECORD_HEADER.unpack_from(buf, end)[2], len(buf))
+            if rec_end - i > count:
+                break
+            end = rec_end
+        return end - i
+
+    def release(self, buf):
+        if self.i >= len(buf):
+            self.i = 0
+            self.rec_left = 0
+            self.tail += 1
+
+    def read_single(self, out, count):
+        """Former sniffer_read(): the rest of the current buffer, at most"""
+        buf = self.buffers[self.tail]
+        n = min(count, len(buf) - self.i)
+        out[:n] = buf[self.i:self.i + n]
+        self.i += n
+        self.release(buf)
+        return n
+
+    def read_batched(self, out, count):
+        """sniffer_read(): as many complete records as fit into count"""
+        copied = 0
+
+        while copied < count and self.available():
+            buf = self.buffers[self.tail]
+
+            if self.rec_left:
+                n = min(self.rec_left, count - copied)
+            else:
+                n = self.records_span(buf, self.i, count - copied)
+                if not n:
+                    if copied:
+                        break
+                    self.rec_left = min(len(buf) - self.i,
+                            RECORD_HEADER.size + RECORD_HEADER.unpack_from(buf, self.i)[2])
+                    n = count
+
+            out[copied:copied + n] = buf[self.i:self.i + n]
+            self.i += n
+            copied += n
+            if self.rec_left:
+                self.rec_left -= n
+
+            self.release(buf)
+
+            if self.rec_left:
+                break
+
+        return copied
+
+
+def generate_buffers(count, mix, packed_size=0, seed=0):
+    rand = random.Random(seed)
+    sizes = [s for s, _ in mix]
+    weights = [w for _, w in mix]
+    records = [make_record(i, rand.choices(sizes, weights)[0]) for i in range(count)]
+
+    if not packed_size:
+        return records
+
+    buffers = []
+    buf = bytearray()
+    for record in records:
+        if len(buf) + len(record) > packed_size:
+            buffers.append(bytes(buf))
+            buf = bytearray()
+        buf += record
+    if buf:
+        buffers.append(bytes(buf))
+    return buffers
+
+
+def run(buffers, policy, bufsize):
+    """Drain the ring, returns the number of read() calls and the byte stream"""
+    ring = SimulatedRing(buffers)
+    read = ring.read_batched if policy == "batched" else ring.read_single
+    out = bytearray(bufsize)
+    stream = bytearray()
+
+    calls = 0
+    while ring.available():
+        n = read(out, bufsize)
+        stream += out[:n]
+        calls += 1
+
+    return calls, stream
+
+
+def measure_syscall_ns(iterations=200000):
+    """Cost of an empty read() syscall on this machine"""
+    fd = os.open(os.devnull, os.O_RDONLY)
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        os.read(fd, 0)
+    elapsed = time.perf_counter_ns() - start
+    os.close(fd)
+    return elapsed / iterations
+
+
+def measure_copy_mbps(size=1 << 20, iterations=200):
+    """Memory copy bandwidth, standing in for copy_to_user()"""
+    src = bytearray(size)
+    dst = bytearray(size)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        dst[:] = src
+    return size * iterations / (time.perf_counter() - start) / 1e6
+
+
+def measure_reads(path, bufsize, limit, seconds):
+    """Times read() on path up to EOF, limit bytes or seconds
+
+    Returns the number of calls, the bytes read and the elapsed time.
+    """
+    buf = bytearray(bufsize)
+    calls = 0
+    total = 0
+    # unbuffered, every readinto() is one read() syscall
+    with open(path, "rb", buffering=0) as f:
+        start = time.perf_counter()
+        deadline = start + seconds
+        while total < limit:
+            n = f.readinto(buf)
+            calls += 1
+            if not n:
+                break
+            total += n
+            if not calls % 64 and time.perf_counter() > deadline:
+                break
+        elapsed = time.perf_counter() - start
+    return calls, total, elapsed
+
+
+def main_device(args):
+    print(f"measured read() on {args.device}")
+    print(f"{'bufsize':>8} {'calls':>9} {'B/call':>9} {'calls/s':>11} {'MB/s':>9}")
+    for bufsize in args.bufsize:
+        calls, total, seconds = measure_reads(args.device, bufsize, args.limit, args.seconds)
+        print(f"{bufsize:>8} {calls:>9} {total / calls:>9.0f} "
+              f"{calls / seconds:>11.0f} {total / seconds / 1e6:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the read() policies of /dev/sniffer")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--mix", choices=["64", "imix"], default="64")
+    parser.add_argument("--packed", action="store_true", help="use 64 KiB packed buffers")
+    parser.add_argument("--bufsize", type=int, nargs="+", default=[4096, 65536, 1 << 20])
+    parser.add_argument("--syscall-ns", type=float,
+                        help="cost of a syscall (default: measured on this machine)")
+    parser.add_argument("--copy-mbps", type=float,
+                        help="copy_to_user() bandwidth (default: measured on this machine)")
+    parser.add_argument("--header-ns", type=float, default=50,
+                        help="cost of parsing a record header in uncached memory")
+    parser.add_argument("--device", help="time read() on this file instead of the model")
+    parser.add_argument("--limit", type=int, default=1 << 30,
+                        help="bytes read per bufsize with --device")
+    parser.add_argument("--seconds", type=float, default=10,
+                        help="time read per bufsize with --device")
+    args = parser.parse_args()
+
+    if args.device:
+        main_device(args)
+        return
+
+    syscall_ns = args.syscall_ns or measure_syscall_ns()
+    copy_mbps = args.copy_mbps or measure_copy_mbps()
+    print(f"model estimate from syscall: {syscall_ns:.0f} ns, copy: {copy_mbps:.0f} MB/s, "
+          f"header: {args.header_ns:.0f} ns")
+
+    mix = IMIX if args.mix == "imix" else [(64, 1)]
+    buffers = generate_buffers(args.records, mix, 65536 if args.packed else 0)
+    expected = b"".join(buffers)
+
+    print(f"{'policy':<8} {'bufsize':>8} {'calls':>9} {'rec/call':>9} {'calls/s':>11} {'MB/s':>9}")
+    for bufsize in args.bufsize:
+        for policy in ["single", "batched"]:
+            calls, stream = run(buffers, policy, bufsize)
+            assert stream == expected, f"{policy} read() corrupted the record stream"
+
+            seconds = (calls * syscall_ns + args.records * args.header_ns) * 1e-9 \
+                + len(stream) / (copy_mbps * 1e6)
+            print(f"{policy:<8} {bufsize:>8} {calls:>9} {args.records / calls:>9.1f} "
+                  f"{calls / seconds:>11.0f} {len(stream) / seconds / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
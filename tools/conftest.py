@@ -0,0 +1 @@
+# Makes the tools importable from the tests
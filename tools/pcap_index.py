@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Index and per port statistics of PCAP captures of the sniffer
+
+The capture is memory mapped and walked along the incl_len fields to find the
+offset of every record. The walk runs on all segments of the capture at once
+and is only continued record by record where the start of a segment was
+guessed wrong. Everything else (record headers, loss markers, statistics) is
+gathered from the mapping with NumPy on the whole index.
+
+The port of a record is taken from the upper bits of orig_len, which are
+kept by a raw dump of the capture ring (see sniffer_uapi.h). read() and the
+PCAP output of sniffer-mmap clear them, so such captures show all frames on
+port 0, except for the loss markers, which name their port themselves.
+"""
+
+import argparse
+import mmap
+import struct
+
+import numpy as np
+
+PCAP_HEADER_LEN = 24
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+RECORD_HEADER_LEN = 16
+
+# upper half of orig_len of the capture ring, see sniffer_uapi.h
+REC_ORIG_LEN_MASK = 0xffff
+REC_SEQ_SHIFT = 16
+REC_SEQ_MASK = 0xfff
+REC_PORT_SHIFT = 28
+REC_PORT_MASK = 0xf
+
+MARKER_ETHERTYPE = 0x88b6
+MARKER_MAGIC = b"aRTS"
+MARKER_TYPE_LOSS = 1
+# ethertype, magic, type, port, frames and bytes of a marker frame
+MARKER_FIELDS_LEN = 28
+
+RECORD_DTYPE = np.dtype([
+    ("offset", np.int64),
+    ("ts", np.int64),
+    ("incl_len", np.uint32),
+    ("orig_len", np.uint32),
+    ("port", np.uint8),
+    ("seq", np.uint16),
+    ("marker", np.bool_),
+    ("lost_frames", np.uint32),
+])
+
+# records gathered per step, bounds the size of the index arrays
+GATHER_BLOCK = 1 << 18
+# bytes of the capture walked from one guessed start
+SEGMENT_LEN = 1 << 18
+# offsets at the start of a segment tried as its first record
+SYNC_WINDOW = 256
+# plausible record headers a guessed start has to be followed by
+SYNC_RECORDS = 8
+
+
+def gather(data, offsets, length):
+    """length bytes at each offset, as an array of shape (len(offsets), length)"""
+    out = np.empty((len(offsets), length), np.uint8)
+    span = np.arange(length)
+    for i in range(0, len(offsets), GATHER_BLOCK):
+        block = offsets[i:i + GATHER_BLOCK]
+        out[i:i + len(block)] = data[block[:, None] + span]
+    return out
+
+
+class CaptureIndex:
+    """Records of a PCAP capture, with the file mapped for access to the frames"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"{path}: empty file")
+
+        try:
+            self.parse_header(path)
+            self.records = self.build_index()
+        except Exception:
+            self.close()
+            raise
+
+    def parse_header(self, path):
+        if len(self.mm) < PCAP_HEADER_LEN:
+            raise ValueError(f"{path}: too short for a PCAP header")
+
+        for endian in "<>":
+            magic, = struct.unpack_from(endian + "I", self.mm)
+            if magic in (PCAP_MAGIC_NSEC, PCAP_MAGIC_USEC):
+                break
+        else:
+            raise ValueError(f"{path}: not a PCAP file (magic {magic:#010x})")
+
+        self.endian = endian
+        self.nsec = magic == PCAP_MAGIC_NSEC
+        _, self.version_major, self.version_minor, self.thiszone, _, self.snaplen, self.linktype = \
+            struct.unpack_from(endian + "IHHiIII", self.mm)
+
+    def record_offsets(self):
+        """Offsets of the complete records, the walk along the incl_len fields
+
+        Every offset follows from the one before. So the capture is split into
+        segments, which are walked at once, each from a guess of its first
+        record. The walk from the file header then goes through the segments
+        in order: once it meets the chain of a segment, it follows the chain
+        up to the next segment. Where a guess was wrong, it goes on record by
+        record until it meets the chain, so the offsets are exactly those of a
+        walk from the start. On a laptop, this walks about 900 MB/s of
+        minimum sized frames, against 200 MB/s record by record.
+        """
+        incl_len = struct.Struct(self.endian + "I").unpack_from
+        size = len(self.mm)
+        last = size - RECORD_HEADER_LEN
+
+        if last < PCAP_HEADER_LEN:
+            self.truncated = size != PCAP_HEADER_LEN
+            return np.zeros(0, np.int64)
+
+        starts = np.arange(PCAP_HEADER_LEN, last + 1, SEGMENT_LEN, dtype=np.int64)
+        ends = np.append(starts[1:], last + 1)
+
+        # a 32 bit field at every offset of the mapping
+        fields = np.ndarray(size - 3, self.endian + "u4", self.mm, strides=(1,))
+        try:
+            guesses = self.guess_starts(fields, starts, ends)
+            chains, bounds, exits = self.walk_segments(fields, guesses, ends)
+        finally:
+            # the mapping can only be closed once no array refers to it
+            del fields
+
+        ends = ends.tolist()
+        exits = exits.tolist()
+        pieces = []
+        off = PCAP_HEADER_LEN
+        for i in range(len(starts)):
+            if off >= ends[i]:
+                # a record spans the whole segment
+                continue
+
+            chain = chains[bounds[i]:bounds[i + 1]]
+            k = np.searchsorted(chain, off)
+            if k == len(chain) or chain[k] != off:
+                met = set(chain.tolist())
+                offsets = []
+                while off < ends[i] and off not in met:
+                    offsets.append(off)
+                    off += RECORD_HEADER_LEN + incl_len(self.mm, off + 8)[0]
+                pieces.append(np.array(offsets, np.int64))
+                if off >= ends[i]:
+                    continue
+                k = np.searchsorted(chain, off)
+
+            pieces.append(chain[k:])
+            off = exits[i]
+
+        offsets = np.concatenate(pieces) if pieces else np.zeros(0, np.int64)
+
+        # a capture stopped while writing ends with a partial record
+        self.truncated = off != size
+        if off > size:
+            offsets = offsets[:-1]
+
+        return offsets
+
+    def guess_starts(self, fields, starts, ends):
+        """First offset of each segment followed by plausible record headers, -1 if none"""
+        last = len(fields) - 13
+        max_fraction = 1000000000 if self.nsec else 1000000
+        max_len = self.snaplen or 0xffffffff
+
+        guesses = np.full(len(starts), -1, np.int64)
+        guesses[0] = PCAP_HEADER_LEN
+        step = max(GATHER_BLOCK // SYNC_WINDOW, 1)
+
+        for i in range(1, len(starts), step):
+            segment = np.arange(i, min(i + step, len(starts)))
+            candidate = (starts[segment, None] + np.arange(SYNC_WINDOW)).ravel()
+            segment = np.repeat(segment, SYNC_WINDOW)
+            keep = candidate < ends[segment]
+            candidate, segment = candidate[keep], segment[keep]
+
+            off = candidate
+            for _ in range(SYNC_RECORDS):
+                # a chain reaching the end of the capture is taken as it is
+                inside = off <= last
+                header = np.minimum(off, last)
+                length = fields[header + 8]
+                plausible = ~inside | ((length > 0) & (length <= max_len) &
+                                       (fields[header + 12] >= length) &
+                                       (fields[header + 4] < max_fraction))
+                candidate, segment = candidate[plausible], segment[plausible]
+                off = np.where(inside, off + RECORD_HEADER_LEN + length, off)[plausible]
+
+            # the candidates are in order, the first of a segment is its lowest
+            segment, first = np.unique(segment, return_index=True)
+            guesses[segment] = candidate[first]
+
+        return guesses
+
+    def walk_segments(self, fields, guesses, ends):
+        """Walk every segment from its guess at once
+
+        Returns the offsets of the records walked, grouped by segment with the
+        bounds of each one, and the offsets where the walks left the segments.
+        """
+        off = guesses.copy()
+        walking = (off >= 0) & (off < ends)
+        records = np.zeros(len(ends), np.int64)
+        offsets = []
+        segments = []
+
+        while walking.any():
+            segment = np.flatnonzero(walking)
+            current = off[segment]
+            offsets.append(current)
+            segments.append(segment)
+            records[segment] += 1
+
+            current = current + RECORD_HEADER_LEN + fields[current + 8]
+            off[segment] = current
+            walking[segment] = current < ends[segment]
+
+        bounds = np.zeros(len(ends) + 1, np.int64)
+        np.cumsum(records, out=bounds[1:])
+
+        # a segment is walked in every step until it is left, so the step is
+        # the position of a record within its segment
+        chains = np.empty(bounds[-1], np.int64)
+        for step, (current, segment) in enumerate(zip(offsets, segments)):
+            chains[bounds[segment] + step] = current
+
+        return chains, bounds, off
+
+    def build_index(self):
+        offsets = self.record_offsets()
+        data = np.frombuffer(self.mm, np.uint8)
+        try:
+            headers = gather(data, offsets, RECORD_HEADER_LEN).view(self.endian + "u4")
+            records = np.zeros(len(offsets), RECORD_DTYPE)
+            records["offset"] = offsets
+            records["incl_len"] = headers[:, 2]
+
+            orig_len = headers[:, 3]
+            records["orig_len"] = orig_len & REC_ORIG_LEN_MASK
+            records["seq"] = (orig_len >> REC_SEQ_SHIFT) & REC_SEQ_MASK
+            records["port"] = (orig_len >> REC_PORT_SHIFT) & REC_PORT_MASK
+
+            fraction = headers[:, 1].astype(np.int64)
+            records["ts"] = headers[:, 0].astype(np.int64) * 1000000000 + \
+                (fraction if self.nsec else fraction * 1000)
+
+            self.find_markers(data, records)
+        finally:
+            # the mapping can only be closed once no array refers to it
+            del data
+
+        return records
+
+    def find_markers(self, data, records):
+        """Flag the loss markers, they carry their port and the dropped frames"""
+        candidates = np.flatnonzero(records["incl_len"] >= MARKER_FIELDS_LEN)
+        frame = records["offset"][candidates] + RECORD_HEADER_LEN
+
+        ethertype = gather(data, frame + 12, 2)
+        candidates = candidates[(ethertype[:, 0] == MARKER_ETHERTYPE >> 8) &
+                                (ethertype[:, 1] == MARKER_ETHERTYPE & 0xff)]
+        if not len(candidates):
+            return
+
+        fields = gather(data, records["offset"][candidates] + RECORD_HEADER_LEN + 14, MARKER_FIELDS_LEN - 14)
+        magic = np.frombuffer(MARKER_MAGIC, np.uint8)
+        is_marker = (fields[:, :4] == magic).all(axis=1) & (fields[:, 4] == MARKER_TYPE_LOSS)
+
+        markers = candidates[is_marker]
+        fields = fields[is_marker]
+        records["marker"][markers] = True
+        records["port"][markers] = fields[:, 5]
+        records["lost_frames"][markers] = np.ascontiguousarray(fields[:, 6:10]).view(">u4")[:, 0]
+
+    def frame(self, i):
+        """Bytes of the frame of record i"""
+        start = int(self.records["offset"][i]) + RECORD_HEADER_LEN
+        return self.mm[start:start + int(self.records["incl_len"][i])]
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.records)
+
+
+def cycle_jitter(interarrival, cycle_ns):
+    """Deviation of each inter-arrival time from the nearest multiple of the cycle
+
+    A frame missing from a cyclic stream doubles the gap, which is not
+    counted as jitter."""
+    cycles = np.maximum(np.rint(interarrival / cycle_ns), 1)
+    return interarrival - cycles * cycle_ns
+
+
+def port_stats(records, cycle_ns=None, window_ns=1000000):
+    """Statistics of the frames of each port, keyed by port
+
+    Inter-arrival times are taken between the frames of a port in the order
+    of their timestamps. The cycle for the jitter is the median inter-arrival
+    time unless given. The peak throughput is the highest one within a
+    window of window_ns."""
+    stats = {}
+    frames = records[~records["marker"]]
+
+    for port in np.unique(records["port"]).tolist():
+        port_frames = frames[frames["port"] == port]
+        order = np.argsort(port_frames["ts"], kind="stable")
+        ts = port_frames["ts"][order]
+        length = port_frames["orig_len"][order].astype(np.int64)
+        lost = int(records["lost_frames"][records["marker"] & (records["port"] == port)].sum())
+
+        port_stat = {
+            "frames": len(ts),
+            "bytes": int(length.sum()),
+            "lost_frames": lost,
+        }
+        stats[port] = port_stat
+        if len(ts) < 2:
+            continue
+
+        duration = int(ts[-1] - ts[0])
+        interarrival = np.diff(ts)
+        cycle = cycle_ns or float(np.median(interarrival))
+        jitter = np.abs(cycle_jitter(interarrival, cycle)) if cycle else np.zeros(len(interarrival))
+
+        # bytes of the windows holding frames, a jump of the clock must not
+        # allocate the empty windows in between
+        window = (ts - ts[0]) // window_ns
+        windows = np.add.reduceat(length, np.flatnonzero(np.diff(window, prepend=-1)))
+
+        port_stat.update({
+            "duration_ns": duration,
+            "frames_per_sec": (len(ts) - 1) / duration * 1e9 if duration else 0.0,
+            "throughput_bps": 8 * length[:-1].sum() / duration * 1e9 if duration else 0.0,
+            "peak_bps": 8 * windows.max() / window_ns * 1e9,
+            "interarrival_min_ns": int(interarrival.min()),
+            "interarrival_mean_ns": float(interarrival.mean()),
+            "interarrival_median_ns": float(np.median(interarrival)),
+            "interarrival_p99_ns": float(np.percentile(interarrival, 99)),
+            "interarrival_max_ns": int(interarrival.max()),
+            "cycle_ns": float(cycle),
+            "jitter_rms_ns": float(np.sqrt(np.mean(jitter**2))),
+            "jitter_p99_ns": float(np.percentile(jitter, 99)),
+            "jitter_max_ns": float(jitter.max()),
+        })
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per port statistics of a PCAP capture of the sniffer")
+    parser.add_argument("capture")
+    parser.add_argument("--cycle-ns", type=float,
+                        help="cycle of the traffic for the jitter (default: median inter-arrival time)")
+    parser.add_argument("--window-ns", type=int, default=1000000,
+                        help="window of the peak throughput")
+    args = parser.parse_args()
+
+    with CaptureIndex(args.capture) as index:
+        print(f"{len(index)} records, {'nanosecond' if index.nsec else 'microsecond'} timestamps"
+              f"{', truncated' if index.truncated else ''}")
+        stats = port_stats(index.records, args.cycle_ns, args.window_ns)
+
+    for port, s in stats.items():
+        print(f"mac{port + 1}: {s['frames']} frames, {s['bytes']} bytes, {s['lost_frames']} lost")
+        if "duration_ns" not in s:
+            continue
+        print(f"  throughput {s['throughput_bps'] / 1e6:.3f} Mbit/s, peak {s['peak_bps'] / 1e6:.3f} Mbit/s, "
+              f"{s['frames_per_sec']:.1f} frames/s")
+        print(f"  inter-arrival min {s['interarrival_min_ns']} ns, median {s['interarrival_median_ns']:.0f} ns, "
+              f"p99 {s['interarrival_p99_ns']:.0f} ns, max {s['interarrival_max_ns']} ns")
+        print(f"  jitter to {s['cycle_ns']:.0f} ns cycle: rms {s['jitter_rms_ns']:.1f} ns, "
+              f"p99 {s['jitter_p99_ns']:.0f} ns, max {s['jitter_max_ns']:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Simulator of the /dev/sniffer capture ring
+
+Models the DMA controller (descriptor ring, packed mode), the driver
+(running_irq, descriptor refill, mmap control area) and a userspace consumer
+advancing the tail of the memory mapped ring. The three are interleaved
+randomly while the ownership of every buffer is tracked, so that a violation
+of the head/tail protocol (DMA writing a buffer owned by userspace, records
+lost or reordered, a stalled DMA) raises an assertion.
+"""
+
+import argparse
+import random
+import struct
+
+DESC_RING_SIZE = 256
+RECORD_HEADER = struct.Struct("<IIII")
+
+# owners of a DMA buffer
+KERNEL = "kernel"
+DMA = "dma"
+USER = "user"
+
+
+def circ_space(head, tail, size):
+    return (tail - (head + 1)) & (size - 1)
+
+
+class Descriptor:
+    def __init__(self):
+        self.buf = None
+        self.buf_len = 0
+        self.empty = False
+
+
+class Dma:
+    """Model of dma_controller.v"""
+
+    def __init__(self, sim, packed=False, record_len=2048):
+        self.sim = sim
+        self.packed = packed
+        self.record_len = record_len
+        self.bram_addr = 0
+        self.count = 0
+        self.open = False
+        self.fill = 0
+
+    def write_record(self, record):
+        """Write a record, returns False if the DMA stalls on a descriptor"""
+        desc = self.sim.desc[self.bram_addr]
+        if not desc.empty:
+            return False
+
+        assert self.sim.owner[desc.buf] == DMA, \
+            f"DMA writes buffer {desc.buf} owned by {self.sim.owner[desc.buf]}"
+        assert len(record) <= min(desc.buf_len - self.fill, self.record_len)
+
+        offset = desc.buf << self.sim.buf_size_ld
+        self.sim.memory[offset + self.fill:offset + self.fill + len(record)] = record
+        self.fill += len(record)
+
+        if not self.packed or desc.buf_len - self.fill < self.record_len:
+            self.close()
+        else:
+            self.open = True
+
+        return True
+
+    def close(self):
+        desc = self.sim.desc[self.bram_addr]
+        desc.buf_len = self.fill
+        desc.empty = False
+
+        self.bram_addr = (self.bram_addr + 1) % DESC_RING_SIZE
+        self.count += 1
+        self.open = False
+        self.fill = 0
+
+    def timeout(self):
+        if self.open:
+            self.close()
+
+
+class Driver:
+    """Model of running_irq() and refill_dma_descriptors() of the driver"""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.dma_count = 0
+        self.data_head = 0
+        self.data_desc_head = 0
+        self.desc_tail = 0
+        self.desc_refilled = 0
+        self.buf_fill = [0] * sim.buf_count
+
+        # mmap control area
+        self.ctrl_head = 0
+        self.ctrl_tail = 0
+
+    def prepare(self):
+        for i in range(DESC_RING_SIZE):
+            self.give_to_dma(self.sim.desc[i])
+
+    def give_to_dma(self, desc):
+        assert self.sim.owner[self.data_desc_head] == KERNEL, \
+            f"Buffer {self.data_desc_head} is still owned by {self.sim.owner[self.data_desc_head]}"
+        self.sim.owner[self.data_desc_head] = DMA
+
+        desc.buf = self.data_desc_head
+        desc.buf_len = 1 << self.sim.buf_size_ld
+        desc.empty = True
+
+        self.data_desc_head = (self.data_desc_head + 1) & (self.sim.buf_count - 1)
+
+    def irq(self):
+        mask = self.sim.buf_count - 1
+        delta = self.sim.dma.count - self.dma_count
+
+        # the IRQ is only raised by completed descriptors
+        if not delta:
+            return
+
+        for i in range(delta):
+            desc = self.sim.desc[(self.dma_count + i) % DESC_RING_SIZE]
+            buf = (self.data_head + i) & mask
+            assert desc.buf == buf, "Descriptor completed out of order"
+            self.buf_fill[buf] = desc.buf_len
+            self.sim.owner[buf] = USER
+
+        self.dma_count = self.sim.dma.count
+        self.data_head = (self.data_head + delta) & mask
+        self.ctrl_head = self.data_head
+
+        self.refill()
+
+    def refill(self):
+        tail = self.ctrl_tail
+        free_space = min(circ_space(self.data_desc_head, tail, self.sim.buf_count),
+                         self.dma_count - self.desc_refilled)
+
+        for _ in range(free_space):
+            self.give_to_dma(self.sim.desc[self.desc_tail])
+            self.desc_tail = (self.desc_tail + 1) % DESC_RING_SIZE
+
+        self.desc_refilled += free_space
+
+    @property
+    def refill_pending(self):
+        return self.desc_refilled != self.dma_count
+
+
+class Consumer:
+    """Userspace consumer of the mapped ring, like sniffer-mmap"""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.tail = 0
+        self.records = []
+
+    def step(self, budget):
+        head = self.sim.driver.ctrl_head
+        consumed = 0
+
+        while self.tail != head and consumed < budget:
+            buf = self.tail
+            assert self.sim.owner[buf] == USER, \
+                f"Consumer reads buffer {buf} owned by {self.sim.owner[buf]}"
+
+            offset = buf << self.sim.buf_size_ld
+            if self.sim.packed:
+                length = self.sim.driver.buf_fill[buf]
+            else:
+                incl_len = RECORD_HEADER.unpack_from(self.sim.memory, offset)[2]
+                length = incl_len + RECORD_HEADER.size
+
+            data = self.sim.memory[offset:offset + length]
+            pos = 0
+            while pos < len(data):
+                seq, _, incl_len, _ = RECORD_HEADER.unpack_from(data, pos)
+                payload = data[pos + RECORD_HEADER.size:pos + RECORD_HEADER.size + incl_len]
+                assert payload == make_payload(seq, incl_len), f"Record {seq} is corrupted"
+                self.records.append(seq)
+                pos += RECORD_HEADER.size + incl_len
+            assert pos == len(data), "Buffer does not end at a record boundary"
+
+            self.sim.owner[buf] = KERNEL
+            self.tail = (self.tail + 1) & (self.sim.buf_count - 1)
+            self.sim.driver.ctrl_tail = self.tail
+            consumed += 1
+
+        return consumed
+
+
+def make_payload(seq, length):
+    return (seq.to_bytes(4, "little") * (length // 4 + 1))[:length]
+
+
+def make_record(seq, length):
+    return RECORD_HEADER.pack(seq, 0, length, length) + make_payload(seq, length)
+
+
+class Simulator:
+    def __init__(self, buf_count=512, packed=False, fifo_depth=16, seed=0,
+                 min_len=60, max_len=1518, refill_work=True):
+        assert buf_count & (buf_count - 1) == 0, "buffer count must be a power of two"
+        assert buf_count > DESC_RING_SIZE
+
+        self.rand = random.Random(seed)
+        self.packed = packed
+        self.buf_count = buf_count
+        self.buf_size_ld = 14 if packed else 11
+        self.memory = bytearray(buf_count << self.buf_size_ld)
+        self.owner = [KERNEL] * buf_count
+        self.desc = [Descriptor() for _ in range(DESC_RING_SIZE)]
+        self.fifo_depth = fifo_depth
+        self.min_len = min_len
+        self.max_len = max_len
+        # retry refilling descriptors without an IRQ, like refill_work
+        self.refill_work = refill_work
+
+        self.dma = Dma(self, packed=packed)
+        self.driver = Driver(self)
+        self.consumer = Consumer(self)
+
+        self.fifo = []
+        self.seq = 0
+        self.dropped = []
+        self.stalls = 0
+        self.fifo_high_water = 0
+
+        self.driver.prepare()
+
+    def receive_frame(self):
+        record = make_record(self.seq, self.rand.randint(self.min_len, self.max_len))
+        if len(self.fifo) < self.fifo_depth:
+            self.fifo.append((self.seq, record))
+            self.fifo_high_water = max(self.fifo_high_water, len(self.fifo))
+        else:
+            self.dropped.append(self.seq)
+        self.seq += 1
+
+    def dma_step(self):
+        if self.fifo:
+            if self.dma.write_record(self.fifo[0][1]):
+                self.fifo.pop(0)
+            else:
+                self.stalls += 1
+
+    def work(self):
+        if self.refill_work and self.driver.refill_pending:
+            self.driver.refill()
+
+    def run(self, steps, rx_weight=4, dma_weight=4, irq_weight=1, consumer_weight=1,
+            timeout_weight=1, work_weight=1):
+        events = [
+            (self.receive_frame, rx_weight),
+            (self.dma_step, dma_weight),
+            (self.driver.irq, irq_weight),
+            (lambda: self.consumer.step(self.rand.randint(1, 64)), consumer_weight),
+            (self.dma.timeout, timeout_weight if self.packed else 0),
+            (self.work, work_weight),
+        ]
+        funcs = [e[0] for e in events]
+        weights = [e[1] for e in events]
+
+        for _ in range(steps):
+            self.rand.choices(funcs, weights)[0]()
+
+        return self.drain()
+
+    def drain(self):
+        """Stop receiving and check that every frame arrives at the consumer"""
+        for _ in range(100 * (self.buf_count + len(self.fifo) + 10)):
+            self.dma_step()
+            self.dma.timeout()
+            self.driver.irq()
+            self.work()
+            self.consumer.step(self.buf_count)
+            if not self.fifo and not self.dma.open and self.consumer.tail == self.driver.ctrl_head:
+                break
+
+        assert not self.fifo, "DMA stalled with frames left in the FIFO"
+
+        received = self.consumer.records
+        expected = sorted(set(range(self.seq)) - set(self.dropped))
+        assert received == expected, "Records were lost or reordered"
+
+        return {
+            "frames": self.seq,
+            "received": len(received),
+            "dropped": len(self.dropped),
+            "dma_stalls": self.stalls,
+            "fifo_high_water": self.fifo_high_water,
+            "buffers": self.dma.count,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the /dev/sniffer capture ring")
+    parser.add_argument("--steps", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--buffers", type=int, default=512)
+    parser.add_argument("--packed", action="store_true")
+    parser.add_argument("--slow-consumer", action="store_true",
+                        help="let the consumer fall behind, so the ring runs full")
+    args = parser.parse_args()
+
+    sim = Simulator(buf_count=args.buffers, packed=args.packed, seed=args.seed)
+    stats = sim.run(args.steps, consumer_weight=0.05 if args.slow_consumer else 1)
+
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
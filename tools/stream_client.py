@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Client of the PCAP over TCP stream of sniffer-stream
+
+Stands in for Wireshark or tshark: receives the stream of a board, checks
+that it is a PCAP file with a consistent chain of records and optionally
+writes it to a file. The statistics tell whether the stream keeps up with
+the capture.
+"""
+
+import argparse
+import socket
+import struct
+import time
+
+from pcap_index import PCAP_HEADER_LEN, PCAP_MAGIC_NSEC, RECORD_HEADER_LEN
+
+RECV_SIZE = 1 << 20
+
+
+class StreamError(Exception):
+    pass
+
+
+class PcapStream:
+    """Records of a PCAP stream received in arbitrary pieces"""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.header = None
+        self.records = 0
+        self.bytes = 0
+
+    def feed(self, data):
+        """Add received bytes, returns the offsets of the complete records in them
+
+        The offsets are relative to the start of the stream."""
+        self.buf += data
+        offsets = []
+
+        if self.header is None:
+            if len(self.buf) < PCAP_HEADER_LEN:
+                return offsets
+            magic, = struct.unpack_from("<I", self.buf)
+            if magic != PCAP_MAGIC_NSEC:
+                raise StreamError(f"not a PCAP stream (magic {magic:#010x})")
+            self.header = bytes(self.buf[:PCAP_HEADER_LEN])
+            del self.buf[:PCAP_HEADER_LEN]
+            self.bytes = PCAP_HEADER_LEN
+
+        i = 0
+        while len(self.buf) - i >= RECORD_HEADER_LEN:
+            _, nsec, incl_len, orig_len = struct.unpack_from("<IIII", self.buf, i)
+            if nsec >= 10**9 or incl_len > orig_len:
+                raise StreamError(f"bogus record header at byte {self.bytes + i}")
+            if len(self.buf) - i < RECORD_HEADER_LEN + incl_len:
+                break
+            offsets.append(self.bytes + i)
+            i += RECORD_HEADER_LEN + incl_len
+
+        self.records += len(offsets)
+        self.bytes += i
+        del self.buf[:i]
+        return offsets
+
+
+def receive(host, port, output=None, seconds=None):
+    """Receive the stream until the server closes it or seconds passed, returns statistics"""
+    stream = PcapStream()
+    out = open(output, "wb") if output else None
+
+    with socket.create_connection((host, port)) as sock:
+        start = time.perf_counter()
+        while seconds is None or time.perf_counter() - start < seconds:
+            if seconds is not None:
+                sock.settimeout(max(seconds - (time.perf_counter() - start), 0.001))
+            try:
+                data = sock.recv(RECV_SIZE)
+            except socket.timeout:
+                break
+            if not data:
+                break
+            stream.feed(data)
+            if out:
+                out.write(data)
+        elapsed = time.perf_counter() - start
+
+    if out:
+        out.close()
+
+    return {
+        "records": stream.records,
+        "bytes": stream.bytes,
+        "partial_bytes": len(stream.buf),
+        "seconds": elapsed,
+        "throughput_mbps": stream.bytes / elapsed / 1e6 if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive and check the PCAP stream of sniffer-stream")
+    parser.add_argument("address", help="host:port of the board")
+    parser.add_argument("--output", "-o", help="write the stream to this PCAP file")
+    parser.add_argument("--seconds", type=float, help="stop after this time")
+    args = parser.parse_args()
+
+    host, port = args.address.rsplit(":", 1)
+    stats = receive(host, int(port), args.output, args.seconds)
+    print(f"{stats['records']} records, {stats['bytes']} bytes in {stats['seconds']:.1f} s "
+          f"({stats['throughput_mbps']:.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
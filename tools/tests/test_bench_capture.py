@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import subprocess
+
+import pytest
+
+from bench_capture import build_tool
+from bench_pcap_index import generate_capture
+from bench_read import IMIX
+from pcap_index import PCAP_HEADER_LEN, CaptureIndex
+
+pytestmark = pytest.mark.skipif(not shutil.which("cc"), reason="no C compiler")
+
+
+@pytest.mark.parametrize("options", [[], ["-s", "1", "-w", "64", "-q", "1"], ["-s", "1", "-w", "4", "-q", "1", "-D"]])
+def test_capture_files(tmp_path, options):
+    binary = build_tool(tmp_path)
+    source = tmp_path / "source.pcap"
+    generate_capture(source, 20000, IMIX, port_bits=False)
+    data = source.read_bytes()
+
+    subprocess.run([binary, "-d", "-", "-o", tmp_path / "capture.pcap"] + options,
+                   input=data[PCAP_HEADER_LEN:], check=True, capture_output=True)
+
+    files = sorted(tmp_path.glob("capture.pcap*"))
+    if options:
+        assert len(files) >= len(data) // (1 << 20)
+    else:
+        assert [path.name for path in files] == ["capture.pcap"]
+
+    records = b""
+    for path in files:
+        # every file is a capture of its own, ending with a complete record
+        with CaptureIndex(path) as index:
+            assert not index.truncated
+        records += path.read_bytes()[PCAP_HEADER_LEN:]
+
+    assert records == data[PCAP_HEADER_LEN:]
@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import subprocess
+
+import pytest
+
+from bench_compress import PCAP_HEADER, build_compress, ethercat_records
+from bench_pcap_index import generate_capture
+from bench_read import IMIX
+from pcap_index import PCAP_HEADER_LEN, CaptureIndex
+
+pytestmark = pytest.mark.skipif(not shutil.which("cc"), reason="no C compiler")
+
+
+@pytest.fixture(scope="module")
+def binary(tmp_path_factory):
+    try:
+        return build_compress(tmp_path_factory.mktemp("build"))
+    except subprocess.CalledProcessError:
+        pytest.skip("no LZ4 library")
+
+
+def roundtrip(binary, tmp_path, records, options=()):
+    compressed = tmp_path / "capture.artz"
+    subprocess.run([binary, "-d", "-", "-o", compressed, *options], input=records, check=True, capture_output=True)
+    expanded = subprocess.run([binary, "-x", "-d", compressed], check=True, capture_output=True).stdout
+    return expanded, compressed.stat().st_size
+
+
+@pytest.mark.parametrize("options", [[], ["-R"], ["-j", "1"], ["-j", "4", "-n", "4", "-b", "192", "-a", "8"]])
+def test_ethercat_roundtrip(binary, tmp_path, options):
+    records = ethercat_records(5000)
+    expanded, size = roundtrip(binary, tmp_path, records, options)
+
+    assert expanded == PCAP_HEADER + records
+    assert size < len(records) / 2
+
+
+def test_capture_roundtrip(binary, tmp_path):
+    source = tmp_path / "source.pcap"
+    generate_capture(source, 20000, IMIX, markers=50)
+    records = source.read_bytes()[PCAP_HEADER_LEN:]
+
+    expanded, _ = roundtrip(binary, tmp_path, records, ["-b", "192"])
+    (tmp_path / "expanded.pcap").write_bytes(expanded)
+
+    assert expanded == PCAP_HEADER + records
+    with CaptureIndex(tmp_path / "expanded.pcap") as index:
+        assert len(index.records) == 20000
+
+
+def test_delta_gain(binary, tmp_path):
+    records = ethercat_records(20000)
+    _, delta = roundtrip(binary, tmp_path, records)
+    _, plain = roundtrip(binary, tmp_path, records, ["-R"])
+
+    assert delta < 0.85 * plain
+
+
+def test_partial_record_dropped(binary, tmp_path):
+    records = ethercat_records(100)
+    expanded, _ = roundtrip(binary, tmp_path, records[:-10])
+
+    assert expanded == PCAP_HEADER + records[:-(len(records) // 200)]
+
+
+def test_truncated(binary, tmp_path):
+    compressed = tmp_path / "capture.artz"
+    subprocess.run([binary, "-d", "-", "-o", compressed], input=ethercat_records(5000), check=True,
+                   capture_output=True)
+    data = compressed.read_bytes()
+    compressed.write_bytes(data[:-100])
+
+    proc = subprocess.run([binary, "-x", "-d", compressed], capture_output=True)
+    assert proc.returncode
+    assert b"Truncated" in proc.stderr
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import threading
+
+import pytest
+
+from bench_read import IMIX, RECORD_HEADER, SimulatedRing, generate_buffers, measure_reads, run
+
+
+@pytest.mark.parametrize("packed", [0, 65536])
+@pytest.mark.parametrize("bufsize", [1, 17, 100, 1534, 4096, 65536])
+def test_batched_stream(packed, bufsize):
+    buffers = generate_buffers(2000, IMIX, packed)
+    _, stream = run(buffers, "batched", bufsize)
+    assert stream == b"".join(buffers)
+
+
+@pytest.mark.parametrize("packed", [0, 65536])
+def test_batched_whole_records(packed):
+    buffers = generate_buffers(2000, IMIX, packed)
+    ring = SimulatedRing(buffers)
+    out = bytearray(4096)
+
+    records = 0
+    while ring.available():
+        n = ring.read_batched(out, len(out))
+        assert n
+
+        pos = 0
+        while pos < n:
+            pos += RECORD_HEADER.size + RECORD_HEADER.unpack_from(out, pos)[2]
+            records += 1
+        assert pos == n, "read() returned a partial record"
+
+    assert records == 2000
+
+
+def test_batched_fewer_calls():
+    buffers = generate_buffers(2000, [(64, 1)])
+    single, _ = run(buffers, "single", 65536)
+    batched, _ = run(buffers, "batched", 65536)
+    assert single == 2000
+    assert batched == -(-2000 * 80 // 65536)
+
+
+def test_measure_reads_file(tmp_path):
+    path = tmp_path / "capture"
+    path.write_bytes(bytes(10000))
+
+    calls, total, seconds = measure_reads(path, 4096, 1 << 30, 10)
+    assert (calls, total) == (4, 10000)
+    assert seconds > 0
+
+    calls, total, _ = measure_reads(path, 4096, 5000, 10)
+    assert (calls, total) == (2, 8192)
+
+
+def test_measure_reads_fifo(tmp_path):
+    path = tmp_path / "fifo"
+    os.mkfifo(path)
+
+    def writer():
+        with open(path, "wb") as f:
+            f.write(bytes(100000))
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    calls, total, _ = measure_reads(path, 65536, 1 << 30, 10)
+    thread.join()
+
+    assert total == 100000
+    assert calls >= 3
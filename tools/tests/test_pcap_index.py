@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import struct
+
+import numpy as np
+import pytest
+
+import pcap_index
+from bench_pcap_index import generate_capture, marker_frame, stats_by_record
+from bench_read import IMIX
+from pcap_index import PCAP_MAGIC_NSEC, PCAP_MAGIC_USEC, CaptureIndex, cycle_jitter, port_stats
+
+
+def write_pcap(path, records, magic=PCAP_MAGIC_NSEC, endian="<"):
+    with open(path, "wb") as f:
+        f.write(struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 2048, 1))
+        for sec, frac, frame, orig_len in records:
+            f.write(struct.pack(endian + "IIII", sec, frac, len(frame), orig_len) + frame)
+
+
+@pytest.mark.parametrize("port_bits", [False, True])
+def test_index(tmp_path, port_bits):
+    path = tmp_path / "capture.pcap"
+    expected = generate_capture(path, 5000, IMIX, markers=20, port_bits=port_bits)
+
+    with CaptureIndex(path) as index:
+        records = index.records
+        assert len(index) == 5000
+        assert not index.truncated
+        assert (records["ts"] == expected["ts"]).all()
+        assert (records["incl_len"] == expected["length"]).all()
+        assert (records["orig_len"] == expected["length"]).all()
+        assert (records["marker"] == expected["marker"]).all()
+        assert records["lost_frames"].sum() == expected["lost"].sum()
+
+        if port_bits:
+            assert (records["port"] == expected["port"]).all()
+        else:
+            # only the markers tell their port
+            assert (records["port"][~records["marker"]] == 0).all()
+            assert (records["port"][records["marker"]] == expected["port"][expected["marker"]]).all()
+
+        i = int(np.flatnonzero(records["marker"])[0])
+        assert index.frame(i)[14:18] == b"aRTS"
+
+
+def test_stats_match_by_record(tmp_path):
+    path = tmp_path / "capture.pcap"
+    generate_capture(path, 20000, IMIX, markers=10)
+
+    with CaptureIndex(path) as index:
+        stats = port_stats(index.records)
+
+    reference = stats_by_record(path)
+    assert sorted(stats) == sorted(reference)
+    for port, s in reference.items():
+        interarrival = np.array(s["interarrival"])
+        assert stats[port]["frames"] == s["frames"]
+        assert stats[port]["bytes"] == s["bytes"]
+        assert stats[port]["interarrival_min_ns"] == interarrival.min()
+        assert stats[port]["interarrival_max_ns"] == interarrival.max()
+        assert stats[port]["interarrival_mean_ns"] == pytest.approx(interarrival.mean())
+
+
+def test_stats_cyclic(tmp_path):
+    path = tmp_path / "capture.pcap"
+    # 1 ms cycle, every 100 ns late or early by turns, the 5th frame missing
+    ts = [1000000 * k + (100 if k % 2 else -100) for k in range(1, 11) if k != 5]
+    write_pcap(path, [(0, t, bytes(100), 100) for t in ts])
+
+    with CaptureIndex(path) as index:
+        s = port_stats(index.records, cycle_ns=1000000)[0]
+
+    assert s["frames"] == 9
+    assert s["lost_frames"] == 0
+    assert s["duration_ns"] == ts[-1] - ts[0]
+    assert s["interarrival_min_ns"] == 1000000 - 200
+    assert s["interarrival_max_ns"] == 2000000
+    assert s["jitter_max_ns"] == 200
+    assert s["throughput_bps"] == pytest.approx(8 * 100 * 8 / (ts[-1] - ts[0]) * 1e9)
+    # the first two frames are 999800 ns apart, so they share a window of 1 ms
+    assert s["peak_bps"] == pytest.approx(8 * 200 * 1000)
+
+
+def test_stats_clock_jump(tmp_path):
+    path = tmp_path / "capture.pcap"
+    # the clock jumps by decades between two bursts, far more windows than fit in memory
+    records = [(1, 100 * k, bytes(100), 100) for k in range(3)]
+    records += [(4000000000, 100 * k, bytes(100), 100) for k in range(5)]
+    write_pcap(path, records)
+
+    with CaptureIndex(path) as index:
+        s = port_stats(index.records, window_ns=1000)[0]
+
+    assert s["frames"] == 8
+    assert s["peak_bps"] == pytest.approx(8 * 500 / 1000 * 1e9)
+
+
+def test_cycle_jitter():
+    jitter = cycle_jitter(np.array([990, 1010, 2005, 3000, 400]), 1000)
+    assert list(jitter) == [-10, 10, 5, 0, -600]
+
+
+@pytest.mark.parametrize("magic, endian", [(PCAP_MAGIC_USEC, "<"), (PCAP_MAGIC_NSEC, ">")])
+def test_header_variants(tmp_path, magic, endian):
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, [(5, 7, bytes(60), 64), (6, 0, marker_frame(1, 3), 64)], magic, endian)
+
+    with CaptureIndex(path) as index:
+        scale = 1000 if magic == PCAP_MAGIC_USEC else 1
+        assert list(index.records["ts"]) == [5 * 10**9 + 7 * scale, 6 * 10**9]
+        assert list(index.records["marker"]) == [False, True]
+        assert list(index.records["port"]) == [0, 1]
+        assert index.records["lost_frames"][1] == 3
+
+
+def test_truncated(tmp_path):
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, [(0, k, bytes(80), 80) for k in range(3)])
+    data = path.read_bytes()
+
+    for cut in [0, 10, 50]:
+        path.write_bytes(data[:len(data) - cut])
+        with CaptureIndex(path) as index:
+            assert len(index) == (3 if not cut else 2)
+            assert index.truncated == bool(cut)
+
+
+@pytest.mark.parametrize("segment_len", [64, 1000, 1 << 18])
+def test_segment_walk(tmp_path, monkeypatch, segment_len):
+    monkeypatch.setattr(pcap_index, "SEGMENT_LEN", segment_len)
+    path = tmp_path / "capture.pcap"
+    rand = np.random.default_rng(19)
+    # frames made of plausible record headers lead the guesses astray, some
+    # records are longer than a segment
+    fake = struct.pack("<IIII", 1, 2, 16, 16) * 8
+    frames = [fake, rand.bytes(3000), bytes(60)] + [rand.bytes(int(n)) for n in rand.integers(1, 200, 500)]
+    frames += [fake[:int(n)] for n in rand.integers(1, len(fake), 100)]
+    rand.shuffle(frames)
+    write_pcap(path, [(1, k, frame, len(frame)) for k, frame in enumerate(frames)])
+
+    expected = 24 + np.cumsum([0] + [16 + len(frame) for frame in frames[:-1]])
+    data = path.read_bytes()
+    for cut in [0, 5, 40]:
+        path.write_bytes(data[:len(data) - cut])
+        with CaptureIndex(path) as index:
+            assert (index.records["offset"] == expected[:len(expected) - bool(cut)]).all()
+            assert index.truncated == bool(cut)
+
+
+def test_not_pcap(tmp_path):
+    path = tmp_path / "capture.pcap"
+    path.write_bytes(bytes(100))
+
+    with pytest.raises(ValueError, match="not a PCAP file"):
+        CaptureIndex(path)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+
+from sniffer_ring import Simulator
+
+
+@pytest.mark.parametrize("packed", [False, True])
+@pytest.mark.parametrize("seed", range(4))
+def test_ring_protocol(packed, seed):
+    sim = Simulator(packed=packed, seed=seed)
+    stats = sim.run(20000)
+
+    assert stats["received"] + stats["dropped"] == stats["frames"]
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_ring_full(packed):
+    # the consumer falls behind, so the DMA runs out of buffers
+    sim = Simulator(packed=packed, seed=1, min_len=1400)
+    stats = sim.run(20000, consumer_weight=0.02)
+
+    assert stats["dma_stalls"] > 0
+    assert stats["received"] + stats["dropped"] == stats["frames"]
+
+
+def test_ring_full_without_refill_work():
+    # without retrying the refill, the DMA stays stalled once the ring ran full
+    sim = Simulator(seed=1, refill_work=False)
+
+    with pytest.raises(AssertionError, match="stalled"):
+        sim.run(20000, consumer_weight=0.02)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Copyright (c) 2023 Chris H. Meyer
+
+This file is part of aRTS.
+
+aRTS is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+aRTS is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with aRTS. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+
+from bench_capture import build_tool
+from bench_pcap_index import generate_capture
+from bench_read import IMIX
+from pcap_index import PCAP_HEADER_LEN, CaptureIndex
+from stream_client import PcapStream, StreamError, receive
+
+pytestmark = pytest.mark.skipif(not shutil.which("cc"), reason="no C compiler")
+
+
+def read_all(sock, out):
+    while True:
+        data = sock.recv(1 << 20)
+        if not data:
+            break
+        out += data
+
+
+def test_stream_feed():
+    stream = PcapStream()
+    with pytest.raises(StreamError):
+        stream.feed(b"\0" * PCAP_HEADER_LEN)
+
+
+def test_stream(tmp_path):
+    source = tmp_path / "source.pcap"
+    generate_capture(source, 60000, IMIX, port_bits=False)
+    data = source.read_bytes()
+    records = data[PCAP_HEADER_LEN:]
+    with CaptureIndex(source) as index:
+        boundaries = set((index.records["offset"] - PCAP_HEADER_LEN).tolist())
+
+    server = subprocess.Popen([build_tool(tmp_path, "sniffer-stream"), "-d", "-", "-p", "0", "-q", "2",
+                               "-b", "16", "-f", "10"],
+                              stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        port = int(server.stderr.readline().split()[-1])
+
+        fast = socket.create_connection(("127.0.0.1", port))
+        fast_data = bytearray()
+        fast_thread = threading.Thread(target=read_all, args=(fast, fast_data))
+        fast_thread.start()
+
+        # a client not reading at all, with little buffering on its side
+        slow = socket.socket()
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        slow.connect(("127.0.0.1", port))
+
+        late_path = tmp_path / "late.pcap"
+        late_stats = {}
+        late_thread = None
+        chunk = 64 << 10
+        for i in range(0, len(records), chunk):
+            server.stdin.write(records[i:i + chunk])
+            server.stdin.flush()
+            time.sleep(0.002)
+
+            if late_thread is None and i >= len(records) // 2:
+                late_thread = threading.Thread(
+                    target=lambda: late_stats.update(receive("127.0.0.1", port, late_path)))
+                late_thread.start()
+
+        server.stdin.close()
+        fast_thread.join(30)
+        late_thread.join(30)
+        assert server.wait(30) == 0
+        log = server.stderr.read().decode()
+    finally:
+        server.kill()
+
+    # the first client got everything
+    header = bytes(fast_data[:PCAP_HEADER_LEN])
+    assert header[:4] == data[:4]
+    assert fast_data[PCAP_HEADER_LEN:] == records
+
+    # the late one a PCAP file starting at a record boundary
+    late_data = late_path.read_bytes()
+    assert late_stats["partial_bytes"] == 0
+    assert late_stats["bytes"] == len(late_data)
+    assert late_data[:PCAP_HEADER_LEN] == header
+    start = len(records) - (len(late_data) - PCAP_HEADER_LEN)
+    assert start in boundaries
+    assert late_data[PCAP_HEADER_LEN:] == records[start:]
+
+    # the slow one was dropped instead of holding up the others
+    assert "too slow" in log
+    slow.close()
+    fast.close()